@@ -0,0 +1,43 @@
+"""add worker_heartbeats and position_leases tables
+
+Revision ID: b2c3d4e5f6a7
+Revises: a1b2c3d4e5f6
+Create Date: 2026-02-10 12:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b2c3d4e5f6a7'
+down_revision = 'a1b2c3d4e5f6'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'tbl_worker_heartbeats',
+        sa.Column('id', sa.Text(), nullable=False),
+        sa.Column('created_date', sa.DateTime(), nullable=False),
+        sa.Column('updated_date', sa.DateTime(), nullable=False),
+        sa.Column('heartbeat_date', sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_table(
+        'tbl_position_leases',
+        sa.Column('agent_position_id', sa.Integer(), nullable=False),
+        sa.Column('created_date', sa.DateTime(), nullable=False),
+        sa.Column('updated_date', sa.DateTime(), nullable=False),
+        sa.Column('worker_id', sa.Text(), nullable=False),
+        sa.Column('lease_expiry_date', sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint('agent_position_id'),
+    )
+    op.create_index('ix_tbl_position_leases_worker_id', 'tbl_position_leases', ['worker_id'])
+
+
+def downgrade():
+    op.drop_index('ix_tbl_position_leases_worker_id', table_name='tbl_position_leases')
+    op.drop_table('tbl_position_leases')
+    op.drop_table('tbl_worker_heartbeats')
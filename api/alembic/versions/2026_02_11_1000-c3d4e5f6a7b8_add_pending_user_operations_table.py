@@ -0,0 +1,44 @@
+"""add pending_user_operations table
+
+Revision ID: c3d4e5f6a7b8
+Revises: b2c3d4e5f6a7
+Create Date: 2026-02-11 10:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision = 'c3d4e5f6a7b8'
+down_revision = 'b2c3d4e5f6a7'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'tbl_pending_user_operations',
+        sa.Column('id', sa.Integer(), autoincrement=True, nullable=False),
+        sa.Column('created_date', sa.DateTime(), nullable=False),
+        sa.Column('updated_date', sa.DateTime(), nullable=False),
+        sa.Column('agent_id', postgresql.UUID(), nullable=False),
+        sa.Column('agent_position_id', sa.Integer(), nullable=True),
+        sa.Column('wallet_address', sa.Text(), nullable=False),
+        sa.Column('user_operation_hash', sa.Text(), nullable=False),
+        sa.Column('action_type', sa.Text(), nullable=False),
+        sa.Column('status', sa.Text(), nullable=False),
+        sa.Column('transaction_hash', sa.Text(), nullable=True),
+        sa.Column('details', postgresql.JSONB(), nullable=False),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('user_operation_hash', name='tbl_pending_user_operations_ux_user_operation_hash'),
+    )
+    op.create_index('ix_tbl_pending_user_operations_agent_id', 'tbl_pending_user_operations', ['agent_id'])
+    op.create_index('ix_tbl_pending_user_operations_status', 'tbl_pending_user_operations', ['status'])
+
+
+def downgrade():
+    op.drop_index('ix_tbl_pending_user_operations_status', table_name='tbl_pending_user_operations')
+    op.drop_index('ix_tbl_pending_user_operations_agent_id', table_name='tbl_pending_user_operations')
+    op.drop_table('tbl_pending_user_operations')
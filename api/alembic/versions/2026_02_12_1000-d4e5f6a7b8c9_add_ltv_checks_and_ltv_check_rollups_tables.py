@@ -0,0 +1,68 @@
+"""add ltv_checks and ltv_check_rollups tables
+
+Revision ID: d4e5f6a7b8c9
+Revises: c3d4e5f6a7b8
+Create Date: 2026-02-12 10:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd4e5f6a7b8c9'
+down_revision = 'c3d4e5f6a7b8'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'tbl_ltv_checks',
+        sa.Column('id', sa.BigInteger(), autoincrement=True, nullable=False),
+        sa.Column('agent_position_id', sa.Integer(), nullable=False),
+        sa.Column('check_date', sa.DateTime(), nullable=False),
+        sa.Column('current_ltv', sa.Float(), nullable=False),
+        sa.Column('target_ltv', sa.Float(), nullable=False),
+        sa.Column('max_ltv', sa.Float(), nullable=False),
+        sa.Column('decision_code', sa.SmallInteger(), nullable=False),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_index('ix_tbl_ltv_checks_agent_position_id_check_date', 'tbl_ltv_checks', ['agent_position_id', 'check_date'])
+    op.create_index('ix_tbl_ltv_checks_check_date', 'tbl_ltv_checks', ['check_date'])
+    op.create_table(
+        'tbl_ltv_check_rollups',
+        sa.Column('agent_position_id', sa.Integer(), nullable=False),
+        sa.Column('period_date', sa.DateTime(), nullable=False),
+        sa.Column('check_count', sa.Integer(), nullable=False),
+        sa.Column('action_count', sa.Integer(), nullable=False),
+        sa.Column('min_current_ltv', sa.Float(), nullable=False),
+        sa.Column('avg_current_ltv', sa.Float(), nullable=False),
+        sa.Column('max_current_ltv', sa.Float(), nullable=False),
+        sa.Column('avg_target_ltv', sa.Float(), nullable=False),
+        sa.Column('max_ltv', sa.Float(), nullable=False),
+        sa.PrimaryKeyConstraint('agent_position_id', 'period_date'),
+    )
+    # Move existing ltv_check rows out of the actions table into the time series
+    op.execute("""
+        INSERT INTO tbl_ltv_checks (agent_position_id, check_date, current_ltv, target_ltv, max_ltv, decision_code)
+        SELECT
+            value_id::integer,
+            created_date,
+            (details->>'current_ltv')::float,
+            (details->>'target_ltv')::float,
+            (details->>'max_ltv')::float,
+            CASE WHEN (details->>'needs_action')::boolean THEN
+                CASE value WHEN 'auto_repay' THEN 1 WHEN 'auto_optimize' THEN 2 WHEN 'manual_repay' THEN 3 ELSE 0 END
+            ELSE 0 END
+        FROM tbl_agent_actions
+        WHERE action_type = 'ltv_check' AND value_id IS NOT NULL
+    """)
+    op.execute("DELETE FROM tbl_agent_actions WHERE action_type = 'ltv_check'")
+
+
+def downgrade():
+    op.drop_table('tbl_ltv_check_rollups')
+    op.drop_index('ix_tbl_ltv_checks_check_date', table_name='tbl_ltv_checks')
+    op.drop_index('ix_tbl_ltv_checks_agent_position_id_check_date', table_name='tbl_ltv_checks')
+    op.drop_table('tbl_ltv_checks')
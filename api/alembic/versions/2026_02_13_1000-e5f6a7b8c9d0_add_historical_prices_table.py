@@ -0,0 +1,31 @@
+"""add historical_prices table
+
+Revision ID: e5f6a7b8c9d0
+Revises: d4e5f6a7b8c9
+Create Date: 2026-02-13 10:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e5f6a7b8c9d0'
+down_revision = 'd4e5f6a7b8c9'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'tbl_historical_prices',
+        sa.Column('chain_id', sa.Integer(), nullable=False),
+        sa.Column('asset_address', sa.Text(), nullable=False),
+        sa.Column('price_date', sa.DateTime(), nullable=False),
+        sa.Column('price_usd', sa.Float(), nullable=False),
+        sa.PrimaryKeyConstraint('chain_id', 'asset_address', 'price_date'),
+    )
+
+
+def downgrade():
+    op.drop_table('tbl_historical_prices')
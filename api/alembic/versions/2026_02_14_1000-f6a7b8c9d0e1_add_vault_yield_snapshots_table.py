@@ -0,0 +1,32 @@
+"""add vault_yield_snapshots table
+
+Revision ID: f6a7b8c9d0e1
+Revises: e5f6a7b8c9d0
+Create Date: 2026-02-14 10:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f6a7b8c9d0e1'
+down_revision = 'e5f6a7b8c9d0'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'tbl_vault_yield_snapshots',
+        sa.Column('chain_id', sa.Integer(), nullable=False),
+        sa.Column('vault_address', sa.Text(), nullable=False),
+        sa.Column('snapshot_date', sa.DateTime(), nullable=False),
+        sa.Column('apy', sa.Float(), nullable=False),
+        sa.Column('total_assets', sa.Numeric(precision=78, scale=0), nullable=False),
+        sa.PrimaryKeyConstraint('chain_id', 'vault_address', 'snapshot_date'),
+    )
+
+
+def downgrade():
+    op.drop_table('tbl_vault_yield_snapshots')
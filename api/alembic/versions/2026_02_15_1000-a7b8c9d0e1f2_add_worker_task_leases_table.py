@@ -0,0 +1,32 @@
+"""add worker_task_leases table
+
+Revision ID: a7b8c9d0e1f2
+Revises: f6a7b8c9d0e1
+Create Date: 2026-02-15 10:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a7b8c9d0e1f2'
+down_revision = 'f6a7b8c9d0e1'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'tbl_worker_task_leases',
+        sa.Column('task_name', sa.Text(), nullable=False),
+        sa.Column('created_date', sa.DateTime(), nullable=False),
+        sa.Column('updated_date', sa.DateTime(), nullable=False),
+        sa.Column('worker_id', sa.Text(), nullable=False),
+        sa.Column('lease_expiry_date', sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint('task_name'),
+    )
+
+
+def downgrade():
+    op.drop_table('tbl_worker_task_leases')
@@ -1,9 +1,13 @@
 import asyncio
 import base64
+import dataclasses
+import functools
+import time
 import typing
 import uuid
 from datetime import UTC
 from datetime import datetime
+from datetime import timedelta
 
 from core import logging
 from core.exceptions import BadRequestException
@@ -39,6 +43,7 @@ from money_hack.api.v1_resources import ClosePositionTransactionsData
 from money_hack.api.v1_resources import CollateralAsset
 from money_hack.api.v1_resources import CollateralMarketData
 from money_hack.api.v1_resources import EnsConstitutionResource
+from money_hack.api.v1_resources import LtvHistoryPoint
 from money_hack.api.v1_resources import Position
 from money_hack.api.v1_resources import PositionTransactionsData
 from money_hack.api.v1_resources import TransactionCall
@@ -46,9 +51,13 @@ from money_hack.api.v1_resources import UserConfig
 from money_hack.api.v1_resources import Wallet
 from money_hack.api.v1_resources import WithdrawPreview
 from money_hack.api.v1_resources import WithdrawTransactionsData
+from money_hack.api.v1_resources import YieldHistoryPoint
 from money_hack.blockchain_data.alchemy_client import AlchemyClient
+from money_hack.blockchain_data.hedged_price_resolver import ClientPriceSource
+from money_hack.blockchain_data.hedged_price_resolver import HedgedPriceResolver
 from money_hack.blockchain_data.moralis_client import MoralisClient
 from money_hack.blockchain_data.price_intelligence_service import PriceIntelligenceService
+from money_hack.blockchain_data.price_oracle import PriceOracle
 from money_hack.cross_chain_yield_manager import CrossChainManager
 from money_hack.external.coinbase_cdp_client import CoinbaseCdpClient
 from money_hack.external.ens_client import ENS_NAME_WRAPPER_ABI
@@ -61,18 +70,39 @@ from money_hack.external.ens_client import namehash
 from money_hack.external.lifi_client import LiFiClient
 from money_hack.external.telegram_client import TelegramClient
 from money_hack.forty_acres.forty_acres_client import FortyAcresClient
+from money_hack.model import AgentPosition
 from money_hack.morpho import morpho_abis
+from money_hack.morpho.action_planner import PositionActionPlan
+from money_hack.morpho.liquidation_price_index import PRICE_TICK_INTERVAL_SECONDS
+from money_hack.morpho.liquidation_price_index import LiquidationPriceIndex
+from money_hack.morpho.liquidation_price_index import calculate_trigger_prices
+from money_hack.morpho.ltv_manager import CRITICAL_LTV_THRESHOLD
+from money_hack.morpho.ltv_manager import LTV_DECISION_CODES
+from money_hack.morpho.ltv_manager import CycleSnapshot
+from money_hack.morpho.ltv_manager import LtvCheckResult
 from money_hack.morpho.ltv_manager import LtvManager
 from money_hack.morpho.morpho_client import MorphoClient
+from money_hack.morpho.morpho_client import MorphoMarket
+from money_hack.morpho.morpho_client import select_best_markets_by_collateral
+from money_hack.morpho.position_reader import OnchainPositionReader
+from money_hack.morpho.position_reader import OnchainPositionState
+from money_hack.morpho.position_reader import PositionReadRequest
 from money_hack.morpho.transaction_builder import MORPHO_BLUE_ADDRESS
 from money_hack.morpho.transaction_builder import TransactionBuilder
 from money_hack.morpho.transaction_builder import encode_transfer
 from money_hack.notification_service import NotificationService
+from money_hack.position_lease_manager import PositionLeaseManager
+from money_hack.position_scheduler import ACTION_FOLLOW_UP_SECONDS
+from money_hack.position_scheduler import POSITION_SYNC_INTERVAL_SECONDS
+from money_hack.position_scheduler import PositionScheduler
+from money_hack.position_scheduler import calculate_check_interval
 from money_hack.smart_wallets.coinbase_bundler import CoinbaseBundler
 from money_hack.smart_wallets.coinbase_constants import COINBASE_EIP7702PROXY_ADDRESS
 from money_hack.smart_wallets.coinbase_constants import COINBASE_SMART_WALLET_IMPLEMENTATION_ADDRESS
 from money_hack.smart_wallets.coinbase_smart_wallet import CoinbaseSmartWallet
 from money_hack.store.database_store import DatabaseStore
+from money_hack.user_operation_reconciler import UserOperationReconciler
+from money_hack.vault_yield_service import VaultYieldService
 
 JsonObject = dict[str, object]
 
@@ -133,6 +163,10 @@ class AgentManager(Authorizer):  # Core manager
         mainnetEthClient: RestEthClient | None = None,
         lifiClient: LiFiClient | None = None,
         crossChainManager: CrossChainManager | None = None,
+        onchainPositionReader: OnchainPositionReader | None = None,
+        userOperationReconciler: UserOperationReconciler | None = None,
+        priceOracle: PriceOracle | None = None,
+        vaultYieldService: VaultYieldService | None = None,
     ) -> None:
         self.chainId = chainId
         self.requester = requester
@@ -158,25 +192,32 @@ class AgentManager(Authorizer):  # Core manager
         self.chatHistoryStore = chatHistoryStore
         self.lifiClient = lifiClient
         self.crossChainManager = crossChainManager
+        self.onchainPositionReader = onchainPositionReader
+        self.userOperationReconciler = userOperationReconciler
+        self.priceOracle = priceOracle or PriceOracle(priceClient=HedgedPriceResolver(sources=[ClientPriceSource(name='alchemy', client=alchemyClient), ClientPriceSource(name='moralis', client=moralisClient)]))
+        self.vaultYieldService = vaultYieldService or VaultYieldService(vaultClient=fortyAcresClient, chainId=chainId, databaseStore=databaseStore)
         self._signatureSignerMap: dict[str, str] = {}
         self._userConfigsCache: dict[str, UserConfig] = {}
         self._lastDailyDigestSent: dict[str, datetime] = {}
+        self._walletUserOperationLocks: dict[str, asyncio.Lock] = {}
 
     async def _get_asset_price(self, assetAddress: str) -> float:
-        """Get the current USD price for an asset. Tries Alchemy first, falls back to Moralis."""
+        """Get the current USD price for an asset from the shared price oracle, which races Alchemy and Moralis."""
         try:
-            priceData = await self.alchemyClient.get_asset_current_price(chainId=self.chainId, assetAddress=assetAddress)
+            priceData = await self.priceOracle.get_asset_current_price(chainId=self.chainId, assetAddress=assetAddress)
+        except Exception as e:
+            logging.error(f'All price sources failed for {assetAddress}: {e}')
+            raise
+        return priceData.priceUsd
+
+    async def _get_asset_prices(self, assetAddresses: list[str]) -> dict[str, float]:
+        """Get current USD prices for several assets in one bulk request, keyed by the requested address. Assets no source can price are left out."""
+        try:
+            prices = await self.priceOracle.get_asset_current_prices(chainId=self.chainId, assetAddresses=assetAddresses)
         except Exception as e:  # noqa: BLE001
-            logging.warning(f'Alchemy price fetch failed for {assetAddress}, trying Moralis: {e}')
-            try:
-                priceData = await self.moralisClient.get_asset_current_price(chainId=self.chainId, assetAddress=assetAddress)
-            except Exception as e2:
-                logging.error(f'Both Alchemy and Moralis price fetch failed for {assetAddress}: {e2}')
-                raise
-            else:
-                return priceData.priceUsd
-        else:
-            return priceData.priceUsd
+            logging.error(f'Bulk price fetch failed for {assetAddresses}: {e}')
+            return {}
+        return {assetAddress: price.priceUsd for assetAddress, price in prices.items()}
 
     async def _get_price_analysis(self, assetSymbol: str) -> object | None:
         """Get price analysis for an asset by symbol (WETH, cbBTC). Used by chat tools."""
@@ -335,7 +376,7 @@ class AgentManager(Authorizer):  # Core manager
         borrowAmountRaw = int(borrowValue * 1e6)
         estimatedApy = 0.08
         try:
-            yieldApy = await self.fortyAcresClient.get_yield_apy(chainId=self.chainId)
+            yieldApy = await self.vaultYieldService.get_yield_apy()
             if yieldApy is not None:
                 estimatedApy = yieldApy
         except Exception:  # noqa: BLE001
@@ -530,11 +571,22 @@ class AgentManager(Authorizer):  # Core manager
         await self._make_deployer_transaction(params=params)
         logging.info(f'Delegation set for {agentWalletAddress}')
 
-    async def _send_user_operation(self, agentWalletAddress: str, calls: list[EncodedCall]) -> str:
+    def _get_wallet_user_operation_lock(self, walletAddress: str) -> asyncio.Lock:
+        normalizedWalletAddress = chain_util.normalize_address(walletAddress)
+        if normalizedWalletAddress not in self._walletUserOperationLocks:
+            self._walletUserOperationLocks[normalizedWalletAddress] = asyncio.Lock()
+        return self._walletUserOperationLocks[normalizedWalletAddress]
+
+    async def _validate_user_operation_calls(self, calls: list[EncodedCall]) -> None:
         if self.coinbaseSmartWallet is None or self.coinbaseBundler is None or self.coinbaseCdpClient is None:
             raise BadRequestException('Smart wallet infrastructure is not configured')
         self.coinbaseBundler.validate_calls(calls=calls, chainId=self.chainId)
         await self.coinbaseSmartWallet.validate_calls(calls=calls, chainId=self.chainId)
+
+    async def _build_and_send_user_operation(self, agentWalletAddress: str, calls: list[EncodedCall]) -> str:
+        """Build, sign and submit a user operation and return its hash. Callers must validate the calls and hold the wallet's user operation lock."""
+        if self.coinbaseSmartWallet is None or self.coinbaseBundler is None or self.coinbaseCdpClient is None:
+            raise BadRequestException('Smart wallet infrastructure is not configured')
         callData = await self.coinbaseSmartWallet.build_execute_call_data(chainId=self.chainId, calls=calls)
         userOperation = await self.coinbaseBundler.build_user_operation(
             chainId=self.chainId,
@@ -547,258 +599,451 @@ class AgentManager(Authorizer):  # Core manager
         userOperationSignature = self.coinbaseSmartWallet.encode_user_operation_signature(signature=signature)
         userOperationHash = await self.coinbaseBundler.send_user_operation(userOperation=userOperation, signature=userOperationSignature)
         logging.info(f'Sent user operation: {userOperationHash}')
-        receipt = await self.coinbaseBundler.wait_for_user_operation_receipt(userOperationHash=userOperationHash, raiseOnFailure=True)
+        return userOperationHash
+
+    async def _send_user_operation(self, agentWalletAddress: str, calls: list[EncodedCall]) -> str:
+        await self._validate_user_operation_calls(calls=calls)
+        if self.coinbaseBundler is None:
+            raise BadRequestException('Smart wallet infrastructure is not configured')
+        # NOTE: user operations for the same wallet share an entrypoint nonce so must be sent one at a time
+        async with self._get_wallet_user_operation_lock(walletAddress=agentWalletAddress):
+            userOperationHash = await self._build_and_send_user_operation(agentWalletAddress=agentWalletAddress, calls=calls)
+            receipt = await self.coinbaseBundler.wait_for_user_operation_receipt(userOperationHash=userOperationHash, raiseOnFailure=True)
         transactionHash = typing.cast(str, receipt['receipt']['transactionHash'])
         logging.info(f'User operation confirmed: {transactionHash}')
         return transactionHash
 
-    async def check_positions_once(self) -> None:
-        """Check all active positions once and take necessary actions. Should be called within a database context."""
+    async def _submit_tracked_user_operation(self, position: AgentPosition, agentWalletAddress: str, calls: list[EncodedCall], actionType: str, details: dict[str, object]) -> str:
+        """Submit a user operation without waiting for inclusion and hand it to the reconciler, which runs the action's completion hook once it lands."""
+        if self.userOperationReconciler is None:
+            raise BadRequestException('User operation reconciler is not configured')
+        await self._validate_user_operation_calls(calls=calls)
+        async with self._get_wallet_user_operation_lock(walletAddress=agentWalletAddress):
+            userOperationHash = await self._build_and_send_user_operation(agentWalletAddress=agentWalletAddress, calls=calls)
+        await self.userOperationReconciler.track_user_operation(
+            agentId=position.agentId,
+            agentPositionId=position.agentPositionId,
+            walletAddress=agentWalletAddress,
+            userOperationHash=userOperationHash,
+            actionType=actionType,
+            details=details,
+        )
+        return userOperationHash
+
+    async def check_positions_once(self, concurrency: int = 1) -> None:
+        """Check all active positions once and take necessary actions. Opens its own database contexts."""
+        positions = await self.databaseStore.run_in_own_context_connection(self.databaseStore.get_all_active_positions)
+        await self.check_positions(positions=positions, concurrency=concurrency)
+
+    async def check_due_positions(self, scheduler: PositionScheduler, concurrency: int = 1, priceIndex: LiquidationPriceIndex | None = None, leaseManager: PositionLeaseManager | None = None) -> float:
+        """Check the positions the scheduler has due and reschedule each from its distance to liquidation and recent volatility.
+        When a price index is given, positions whose trigger prices were crossed by the latest collateral prices are checked immediately.
+        When a lease manager is given, only positions leased to this worker are scheduled and checked.
+        Opens its own short database contexts so lease and heartbeat writes commit before any position is checked.
+        Returns the number of seconds until the next position is due.
+        """
+        if scheduler.should_sync():
+            activePositions = await self.databaseStore.run_in_own_context_connection(lambda: self._get_active_positions(leaseManager=leaseManager))
+            scheduler.sync_positions(positions=activePositions)
+            if priceIndex:
+                priceIndex.retain_positions(positionIds={position.agentPositionId for position in activePositions})
+        if priceIndex and priceIndex.should_tick():
+            await self._process_price_tick(scheduler=scheduler, priceIndex=priceIndex)
+        duePositions = scheduler.pop_due()
+        if leaseManager:
+            # NOTE: positions whose lease is about to lapse wait for the next rebalance to renew or hand them over, they stay scheduled so a renewed lease is checked again
+            leasedPositions: list[AgentPosition] = []
+            for position in duePositions:
+                if leaseManager.holds_lease(agentPositionId=position.agentPositionId):
+                    leasedPositions.append(position)
+                else:
+                    scheduler.schedule_after_sync(positionId=position.agentPositionId)
+            duePositions = leasedPositions
+        results = await self.check_positions(positions=duePositions, concurrency=concurrency) if duePositions else {}
+        hourlyVolatilities = await self._get_hourly_volatilities(collateralAddresses=list({position.collateralAsset for position in duePositions}))
+        now = time.time()
+        for position in duePositions:
+            result = results.get(position.agentPositionId)
+            if priceIndex:
+                triggerPrices = calculate_trigger_prices(result=result, collateralAddress=position.collateralAsset, policy=self.ltvManager.policy if self.ltvManager else None) if result else None
+                if triggerPrices is None:
+                    priceIndex.remove_position(positionId=position.agentPositionId)
+                else:
+                    priceIndex.update_position(triggers=triggerPrices)
+            if result is None:
+                # NOTE: failed and paused checks back off so they do not keep costing a check every cycle
+                scheduler.schedule_failed(positionId=position.agentPositionId, now=now)
+                continue
+            interval = calculate_check_interval(currentLtv=result.current_ltv, maxLtv=result.max_ltv, hourlyVolatility=hourlyVolatilities.get(position.collateralAsset.lower(), 0.0))
+            if result.needs_action:
+                interval = min(interval, ACTION_FOLLOW_UP_SECONDS)
+            scheduler.schedule_checked(positionId=position.agentPositionId, dueTime=now + interval)
+        nextDueTime = scheduler.get_next_due_time()
+        maxSleepSeconds = PRICE_TICK_INTERVAL_SECONDS if priceIndex and len(priceIndex.get_collateral_addresses()) > 0 else POSITION_SYNC_INTERVAL_SECONDS
+        if nextDueTime is None:
+            return maxSleepSeconds
+        return min(max(nextDueTime - time.time(), 0.0), maxSleepSeconds)
+
+    async def _get_active_positions(self, leaseManager: PositionLeaseManager | None = None) -> list[AgentPosition]:
+        activePositions = await self.databaseStore.get_all_active_positions()
+        if leaseManager:
+            activePositions = await leaseManager.rebalance(activePositions=activePositions)
+        return activePositions
+
+    async def _process_price_tick(self, scheduler: PositionScheduler, priceIndex: LiquidationPriceIndex) -> None:
+        if not self.ltvManager:
+            return
+        priceIndex.lastTickTime = time.time()
+        for collateralAddress in priceIndex.get_collateral_addresses():
+            try:
+                collateralPrice, historyPriceUsd = await self.ltvManager.get_collateral_price_with_usd(collateralAddress=collateralAddress)
+            except Exception as e:  # noqa: BLE001
+                logging.warning(f'Failed to get price tick for {collateralAddress}: {e}')
+                continue
+            if self.priceIntelligenceService and historyPriceUsd is not None:
+                self.priceIntelligenceService.record_price(chainId=self.chainId, assetAddress=collateralAddress, priceUsd=historyPriceUsd)
+            crossedPositionIds = priceIndex.on_price_tick(collateralAddress=collateralAddress, priceUsd=collateralPrice)
+            if crossedPositionIds:
+                logging.info(f'Price of {collateralAddress} moved to ${collateralPrice:,.2f}, crossing triggers for {len(crossedPositionIds)} positions')
+            for positionId in crossedPositionIds:
+                scheduler.schedule_now(positionId=positionId)
+
+    async def load_price_history(self) -> None:
+        if self.priceIntelligenceService:
+            await self.priceIntelligenceService.priceHistoryStore.load(chainId=self.chainId, assetAddresses=[collateral.address for collateral in SUPPORTED_COLLATERALS])
+
+    async def persist_price_history(self) -> None:
+        if self.priceIntelligenceService:
+            await self.priceIntelligenceService.priceHistoryStore.persist()
+
+    async def _get_hourly_volatilities(self, collateralAddresses: list[str]) -> dict[str, float]:
+        """Get the hourly volatility the scheduler should plan around for each collateral, keyed by lowercased address.
+        Uses the peak of the EWMA and short horizon volatilities from the recorded price history when available, and otherwise the larger of
+        the last hour's price change and the 24h hourly volatility.
+        """
+        if not self.priceIntelligenceService:
+            return {}
+        try:
+            riskMetrics = self.priceIntelligenceService.get_risk_metrics(chainId=self.chainId, assetAddresses=collateralAddresses)
+        except Exception as e:  # noqa: BLE001
+            logging.warning(f'Failed to compute risk metrics: {e}')
+            riskMetrics = {}
+        hourlyVolatilities = {assetAddress: metrics.get_peak_hourly_volatility() for assetAddress, metrics in riskMetrics.items() if metrics.has_enough_coverage()}
+        for collateralAddress in collateralAddresses:
+            if collateralAddress.lower() in hourlyVolatilities:
+                continue
+            try:
+                priceAnalysis = await self.priceIntelligenceService.get_price_analysis(chainId=self.chainId, assetAddress=collateralAddress)
+            except Exception as e:  # noqa: BLE001
+                logging.warning(f'Failed to get price analysis for {collateralAddress}: {e}')
+                continue
+            hourlyVolatilities[collateralAddress.lower()] = max(abs(priceAnalysis.change_1h_pct), priceAnalysis.volatility_24h)
+        return hourlyVolatilities
+
+    async def check_positions(self, positions: list[AgentPosition], concurrency: int = 1) -> dict[int, LtvCheckResult]:
+        """Check the given positions and take necessary actions, returning the LTV check result of each position that could be evaluated.
+        Up to `concurrency` positions are checked at the same time, each within its own database context, so this may be called with or without one.
+        """
         if not self.ltvManager or not self.notificationService:
             logging.error('LTV Manager or Notification Service not configured.')
-            return
-        CRITICAL_LTV_THRESHOLD = 0.80
-        positions = await self.databaseStore.get_all_active_positions()
-        logging.info(f'Checking LTV for {len(positions)} active positions')
+            return {}
+        logging.info(f'Checking LTV for {len(positions)} active positions (concurrency={concurrency})')
+        # NOTE: every on-chain read in the cycle is pinned to one block so each decision sees a consistent state
+        blockNumber = await self.ethClient.get_latest_block_number()
+        snapshot, positionStates = await asyncio.gather(
+            self.ltvManager.build_cycle_snapshot(collateralAddresses=[position.collateralAsset for position in positions], blockNumber=blockNumber, marketIds=[position.morphoMarketId for position in positions]),
+            self._read_position_states(positions=positions, blockNumber=blockNumber),
+        )
+        self._apply_expected_borrow_amounts(positions=positions, positionStates=positionStates, blockNumber=blockNumber)
+        snapshot.position_states = positionStates
+        if self.priceIntelligenceService:
+            for collateralAddress, priceUsd in snapshot.collateral_prices_usd.items():
+                self.priceIntelligenceService.record_price(chainId=self.chainId, assetAddress=collateralAddress, priceUsd=priceUsd)
+        semaphore = asyncio.Semaphore(max(concurrency, 1))
+        results = await asyncio.gather(*[self._check_position_in_own_context(position=position, snapshot=snapshot, semaphore=semaphore) for position in positions])
+        checkResults = {position.agentPositionId: result for position, result in zip(positions, results, strict=True) if result is not None}
+        try:
+            await self.databaseStore.run_in_own_context_connection(functools.partial(self.ltvManager.log_ltv_checks, results=list(checkResults.values())))
+        except Exception:  # noqa: BLE001
+            logging.exception('Failed to log LTV checks')
+        return checkResults
+
+    async def _read_position_states(self, positions: list[AgentPosition], blockNumber: int | None = None) -> dict[int, OnchainPositionState]:
+        """Batch read the on-chain state of every position. Positions missing from the result should be read individually."""
+        if not self.onchainPositionReader or len(positions) == 0:
+            return {}
+        agents = await self.databaseStore.run_in_own_context_connection(lambda: self.databaseStore.get_agents(agentIds=list({position.agentId for position in positions})))
+        agentWalletMap = {str(agent.agentId): agent.walletAddress for agent in agents}
+        readPositions = [position for position in positions if str(position.agentId) in agentWalletMap]
+        try:
+            states = await self.onchainPositionReader.read_positions(
+                requests=[PositionReadRequest(wallet_address=agentWalletMap[str(position.agentId)], morpho_market_id=position.morphoMarketId, collateral_address=position.collateralAsset) for position in readPositions],
+                blockNumber=blockNumber,
+            )
+        except Exception:  # noqa: BLE001
+            logging.exception('Failed to batch read on-chain positions, falling back to individual reads')
+            return {}
+        return {position.agentPositionId: state for position, state in zip(readPositions, states, strict=True) if state is not None}
+
+    def _apply_expected_borrow_amounts(self, positions: list[AgentPosition], positionStates: dict[int, OnchainPositionState], blockNumber: int) -> None:
+        # NOTE: the position reader converts borrow shares at the market's last update, market states read on chain at the same block add the interest accrued since
         for position in positions:
+            positionState = positionStates.get(position.agentPositionId)
+            if positionState is None or positionState.borrow_shares == 0:
+                continue
+            expectedBorrowAmount = self.morphoClient.get_expected_borrow_assets(chain_id=self.chainId, market_id=position.morphoMarketId, borrow_shares=positionState.borrow_shares, block_number=blockNumber)
+            if expectedBorrowAmount is not None:
+                positionState.borrow_amount = expectedBorrowAmount
+
+    async def _read_onchain_position_state(self, agentWalletAddress: str, morphoMarketId: str, collateralAddress: str, blockNumber: int | None = None) -> OnchainPositionState:
+        """Read the full on-chain state of one position, batched when a position reader is configured."""
+        if self.onchainPositionReader:
+            states = await self.onchainPositionReader.read_positions(requests=[PositionReadRequest(wallet_address=agentWalletAddress, morpho_market_id=morphoMarketId, collateral_address=collateralAddress)], blockNumber=blockNumber)
+            if states[0] is not None:
+                return states[0]
+        onchainCollateral, onchainBorrow, borrowShares = await self._get_onchain_position(agentWalletAddress=agentWalletAddress, morphoMarketId=morphoMarketId, blockNumber=blockNumber)
+        vaultShares, vaultAssets = await self._get_actual_vault_balance(agentWalletAddress=agentWalletAddress, blockNumber=blockNumber)
+        usdcAddress = constants.CHAIN_USDC_MAP[self.chainId]
+        return OnchainPositionState(
+            collateral_amount=onchainCollateral,
+            borrow_amount=onchainBorrow,
+            borrow_shares=borrowShares,
+            vault_shares=vaultShares,
+            vault_assets=vaultAssets,
+            wallet_collateral_balance=await self._get_erc20_balance(tokenAddress=collateralAddress, walletAddress=agentWalletAddress, blockNumber=blockNumber),
+            wallet_usdc_balance=await self._get_erc20_balance(tokenAddress=usdcAddress, walletAddress=agentWalletAddress, blockNumber=blockNumber),
+        )
+
+    async def _check_position_in_own_context(self, position: AgentPosition, snapshot: CycleSnapshot, semaphore: asyncio.Semaphore) -> LtvCheckResult | None:
+        async with semaphore:
             try:
-                # Look up collateral asset to get correct decimals
-                collateral = next((c for c in SUPPORTED_COLLATERALS if c.address.lower() == position.collateralAsset.lower()), None)
-                collateralDecimals = collateral.decimals if collateral else 18
-                agent = await self.databaseStore.get_agent(agentId=position.agentId)
-                if not agent:
-                    continue
-                # Read ENS constitution if agent has a name
-                constitution: EnsConstitution | None = None
-                if agent.ensName and self.mainnetEthClient:
-                    try:
-                        constitution = await self.ensClient.read_constitution(ethClient=self.mainnetEthClient, ensName=agent.ensName)
-                        logging.info(f'Read ENS constitution for {agent.ensName}: pause={constitution.pause}, max_ltv={constitution.max_ltv}')
-                    except Exception:  # noqa: BLE001
-                        logging.exception(f'Failed to read ENS constitution for {agent.ensName}')
-                # Emergency kill switch
-                if constitution and constitution.pause:
-                    logging.info(f'Agent {agent.ensName} is PAUSED by ENS constitution. Skipping all actions.')
-                    continue
-                # Fetch live on-chain values
-                onchainCollateral, onchainBorrow, _borrowShares = await self._get_onchain_position(
-                    agentWalletAddress=agent.walletAddress,
-                    morphoMarketId=position.morphoMarketId,
+                return await self.databaseStore.run_in_own_context_connection(lambda: self._check_position(position=position, snapshot=snapshot))
+            except Exception:  # noqa: BLE001
+                logging.exception(f'Error checking position {position.agentPositionId}')
+                return None
+
+    async def _check_position(self, position: AgentPosition, snapshot: CycleSnapshot | None = None) -> LtvCheckResult | None:
+        if not self.ltvManager or not self.notificationService:
+            return None
+        # Look up collateral asset to get correct decimals
+        collateral = next((c for c in SUPPORTED_COLLATERALS if c.address.lower() == position.collateralAsset.lower()), None)
+        collateralDecimals = collateral.decimals if collateral else 18
+        agent = await self.databaseStore.get_agent(agentId=position.agentId)
+        if not agent:
+            return None
+        # Read ENS constitution if agent has a name
+        constitution: EnsConstitution | None = None
+        if agent.ensName and self.mainnetEthClient:
+            try:
+                constitution = await self.ensClient.read_constitution(ethClient=self.mainnetEthClient, ensName=agent.ensName)
+                logging.info(f'Read ENS constitution for {agent.ensName}: pause={constitution.pause}, max_ltv={constitution.max_ltv}')
+            except Exception:  # noqa: BLE001
+                logging.exception(f'Failed to read ENS constitution for {agent.ensName}')
+        # Emergency kill switch
+        if constitution and constitution.pause:
+            logging.info(f'Agent {agent.ensName} is PAUSED by ENS constitution. Skipping all actions.')
+            return None
+        # Fetch live on-chain values (batched for the whole cycle when available)
+        positionState = snapshot.position_states.get(position.agentPositionId) if snapshot else None
+        if positionState is None:
+            positionState = await self._read_onchain_position_state(agentWalletAddress=agent.walletAddress, morphoMarketId=position.morphoMarketId, collateralAddress=position.collateralAsset, blockNumber=snapshot.block_number if snapshot else None)
+        onchainCollateral = positionState.collateral_amount
+        onchainBorrow = positionState.borrow_amount
+        onchainVaultAssets = positionState.vault_assets
+        hasPositionValue = onchainCollateral > 0 or onchainBorrow > 0 or (onchainVaultAssets or 0) > 0
+        result = await self.ltvManager.check_position_ltv(
+            position=position,
+            collateralDecimals=collateralDecimals,
+            onchainCollateral=onchainCollateral,
+            onchainBorrow=onchainBorrow,
+            onchainVaultAssets=onchainVaultAssets,
+            snapshot=snapshot,
+        )
+        # Apply ENS constitution overrides
+        if constitution:
+            result.policy_result = dataclasses.replace(result)
+        if constitution and constitution.max_ltv is not None and result.current_ltv > constitution.max_ltv and not (result.needs_action and result.action_type == 'auto_repay'):
+            logging.info(f'ENS constitution max-ltv {constitution.max_ltv:.2%} exceeded (current {result.current_ltv:.2%}), forcing repay')
+            collateralPriceUsd = await self.ltvManager.get_collateral_price(collateralAddress=position.collateralAsset, snapshot=snapshot)
+            collateralValueUsd = (onchainCollateral / (10**collateralDecimals)) * collateralPriceUsd
+            repayUsd = (result.current_ltv - constitution.max_ltv) * collateralValueUsd
+            result.needs_action = True
+            result.action_type = 'auto_repay'
+            result.action_amount = int(repayUsd * 1e6)
+            result.reason = f'ENS constitution max-ltv {constitution.max_ltv:.2%} exceeded'
+        if constitution and constitution.min_spread is not None and result.needs_action and result.action_type == 'auto_optimize':
+            marketData = await self.ltvManager.get_position_market(position=position, snapshot=snapshot)
+            borrowApy = marketData.borrow_apy if marketData else 0
+            yieldApy = await self.ltvManager.get_yield_apy(snapshot=snapshot) or 0
+            spread = yieldApy - borrowApy
+            if spread < constitution.min_spread:
+                logging.info(f'ENS constitution min-spread {constitution.min_spread:.4f} not met (spread={spread:.4f}), suppressing optimization')
+                result.needs_action = False
+                result.action_type = None
+                result.action_amount = None
+                result.reason = f'Spread {spread:.4f} below ENS constitution min-spread {constitution.min_spread:.4f}'
+        user = await self.databaseStore.get_user(userId=agent.userId)
+        if not user:
+            return result
+        # Handle Action
+        # NOTE: while an earlier user operation is in flight the wallet balances and nonce are unsettled, so optimizations and idle sweeps wait for it
+        # NOTE: repays never wait, a dropped or slow operation would otherwise block them until it times out while the LTV keeps rising
+        hasPendingUserOperation = self.userOperationReconciler is not None and await self.userOperationReconciler.has_pending_user_operations(agentId=agent.agentId)
+        canSendUserOperation = not hasPendingUserOperation
+        if hasPendingUserOperation:
+            logging.info(f'Position {position.agentPositionId}: Waiting for a pending user operation before taking any action other than a repay')
+        # NOTE: every action for this check is collected into one plan and sent as a single user operation
+        actionPlan = PositionActionPlan(position_id=position.agentPositionId)
+        if result.needs_action and result.action_type == 'auto_repay':
+            logging.info(f'Position {position.agentPositionId}: Auto-repaying {result.action_amount} USDC{" alongside a pending user operation" if hasPendingUserOperation else ""}')
+            actionPlan.add_repay(
+                repayAmount=result.action_amount or 0,
+                details={
+                    'should_notify': hasPositionValue,
+                    'repay_amount': float(result.action_amount or 0) / 1e6,
+                    'old_ltv': result.current_ltv,
+                    'new_ltv': result.target_ltv,
+                },
+            )
+        elif canSendUserOperation and result.needs_action and result.action_type == 'auto_optimize':
+            logging.info(f'Position {position.agentPositionId}: Auto-optimizing — borrowing {result.action_amount} USDC to maximize yield')
+            # Get price context for notification
+            priceContext = None
+            if self.priceIntelligenceService:
+                try:
+                    priceAnalysis = await self.priceIntelligenceService.get_price_analysis(
+                        chainId=self.chainId,
+                        assetAddress=position.collateralAsset,
+                    )
+                    priceContext = priceAnalysis.to_summary()
+                except Exception:  # noqa: BLE001
+                    pass
+            actionPlan.add_borrow(
+                borrowAmount=result.action_amount or 0,
+                details={
+                    'should_notify': hasPositionValue,
+                    'borrow_amount': float(result.action_amount or 0) / 1e6,
+                    'old_ltv': result.current_ltv,
+                    'new_ltv': result.target_ltv,
+                    'price_context': priceContext,
+                },
+            )
+        elif result.needs_action and result.action_type == 'manual_repay':
+            logging.info(f'Position {position.agentPositionId}: Vault has insufficient funds for auto-repay, warning user')
+            if hasPositionValue:
+                await self.notificationService.send_insufficient_vault_warning(
+                    agent=agent,
+                    user=user,
+                    currentLtv=result.current_ltv,
+                    maxLtv=result.max_ltv,
+                    requiredAmount=float(result.action_amount or 0) / 1e6,
+                )
+        # Deploy idle wallet assets into the position
+        walletCollateral = positionState.wallet_collateral_balance
+        walletUsdc = positionState.wallet_usdc_balance
+        # Deploy idle collateral: supply to Morpho + borrow USDC at target LTV + deposit to vault
+        if canSendUserOperation and walletCollateral > 0:
+            try:
+                collateralPriceUsd = await self.ltvManager.get_collateral_price(collateralAddress=position.collateralAsset, snapshot=snapshot)
+                collateralValueUsd = (walletCollateral / (10**collateralDecimals)) * collateralPriceUsd
+                if collateralValueUsd >= 0.01:
+                    borrowAmountRaw = int(position.targetLtv * collateralValueUsd * 1e6)
+                    logging.info(f'Position {position.agentPositionId}: Deploying idle collateral ({walletCollateral} raw) + borrowing ${borrowAmountRaw / 1e6:.2f} USDC')
+                    actionPlan.add_collateral_deployment(
+                        collateralAmount=walletCollateral,
+                        borrowAmount=borrowAmountRaw,
+                        details={
+                            'value': f'{walletCollateral}',
+                            'action_details': {'collateral_amount': walletCollateral, 'borrow_amount': borrowAmountRaw, 'collateral_value_usd': collateralValueUsd},
+                        },
+                    )
+            except Exception:  # noqa: BLE001
+                logging.exception(f'Failed to plan idle collateral deployment for position {position.agentPositionId}')
+        # Deploy idle USDC: deposit to vault
+        if canSendUserOperation and walletUsdc / 1e6 >= 0.01:
+            logging.info(f'Position {position.agentPositionId}: Depositing idle ${walletUsdc / 1e6:.2f} USDC to vault')
+            actionPlan.add_idle_usdc_deposit(
+                usdcAmount=walletUsdc,
+                details={
+                    'value': f'${walletUsdc / 1e6:.2f}',
+                    'action_details': {'usdc_amount': walletUsdc},
+                },
+            )
+        if not actionPlan.is_empty():
+            try:
+                transactions = await self.ltvManager.build_planned_action_transactions(
+                    position=position,
+                    plan=actionPlan,
+                    userAddress=agent.walletAddress,
+                    snapshot=snapshot,
                 )
-                _vaultShares, onchainVaultAssets = await self._get_actual_vault_balance(agentWalletAddress=agent.walletAddress)
-                hasPositionValue = onchainCollateral > 0 or onchainBorrow > 0 or (onchainVaultAssets or 0) > 0
-                result = await self.ltvManager.check_position_ltv(
+                calls = [EncodedCall(toAddress=tx.to, data=HexBytes(tx.data).hex(), value=int(tx.value)) for tx in transactions]
+                await self._submit_tracked_user_operation(
                     position=position,
-                    collateralDecimals=collateralDecimals,
-                    onchainCollateral=onchainCollateral,
-                    onchainBorrow=onchainBorrow,
-                    onchainVaultAssets=onchainVaultAssets,
+                    agentWalletAddress=agent.walletAddress,
+                    calls=calls,
+                    actionType='position_actions',
+                    details=actionPlan.to_details(),
                 )
-                await self.ltvManager.log_ltv_check(result)
-                # Apply ENS constitution overrides
-                if constitution and constitution.max_ltv is not None and result.current_ltv > constitution.max_ltv and not (result.needs_action and result.action_type == 'auto_repay'):
-                    logging.info(f'ENS constitution max-ltv {constitution.max_ltv:.2%} exceeded (current {result.current_ltv:.2%}), forcing repay')
-                    collateralPriceUsd = (await self.alchemyClient.get_asset_current_price(chainId=self.chainId, assetAddress=position.collateralAsset)).priceUsd
-                    collateralValueUsd = (onchainCollateral / (10**collateralDecimals)) * collateralPriceUsd
-                    repayUsd = (result.current_ltv - constitution.max_ltv) * collateralValueUsd
-                    result.needs_action = True
-                    result.action_type = 'auto_repay'
-                    result.action_amount = int(repayUsd * 1e6)
-                    result.reason = f'ENS constitution max-ltv {constitution.max_ltv:.2%} exceeded'
-                if constitution and constitution.min_spread is not None and result.needs_action and result.action_type == 'auto_optimize':
-                    marketData = await self.morphoClient.get_market(chain_id=self.chainId, collateral_address=position.collateralAsset)
-                    borrowApy = marketData.borrow_apy if marketData else 0
-                    vaultInfo = await self.fortyAcresClient.get_vault_info(chainId=self.chainId) if self.fortyAcresClient else None
-                    yieldApy = vaultInfo.apy if vaultInfo else 0
-                    spread = yieldApy - borrowApy
-                    if spread < constitution.min_spread:
-                        logging.info(f'ENS constitution min-spread {constitution.min_spread:.4f} not met (spread={spread:.4f}), suppressing optimization')
-                        result.needs_action = False
-                        result.action_type = None
-                        result.action_amount = None
-                        result.reason = f'Spread {spread:.4f} below ENS constitution min-spread {constitution.min_spread:.4f}'
-                user = await self.databaseStore.get_user(userId=agent.userId)
-                if not user:
-                    continue
-                # Handle Action
-                if result.needs_action and result.action_type == 'auto_repay':
-                    logging.info(f'Position {position.agentPositionId}: Auto-repaying {result.action_amount} USDC')
-                    try:
-                        actionTx = await self.ltvManager.build_auto_repay_transactions(
-                            position=position,
-                            repayAmount=result.action_amount or 0,
-                            userAddress=agent.walletAddress,
-                        )
-                        calls = [EncodedCall(toAddress=tx.to, data=HexBytes(tx.data).hex(), value=int(tx.value)) for tx in actionTx.transactions]
-                        await self._send_user_operation(
-                            agentWalletAddress=agent.walletAddress,
-                            calls=calls,
-                        )
-                        if hasPositionValue:
-                            await self.notificationService.send_auto_repay_success(
-                                agent=agent,
-                                user=user,
-                                repayAmount=float(result.action_amount or 0) / 1e6,
-                                oldLtv=result.current_ltv,
-                                newLtv=result.target_ltv,
-                            )
-                    except Exception:  # noqa: BLE001
-                        logging.exception(f'Failed to auto-repay for position {position.agentPositionId}')
-                elif result.needs_action and result.action_type == 'auto_optimize':
-                    logging.info(f'Position {position.agentPositionId}: Auto-optimizing — borrowing {result.action_amount} USDC to maximize yield')
-                    try:
-                        actionTx = await self.ltvManager.build_auto_borrow_transactions(
-                            position=position,
-                            borrowAmount=result.action_amount or 0,
-                            userAddress=agent.walletAddress,
-                        )
-                        calls = [EncodedCall(toAddress=tx.to, data=HexBytes(tx.data).hex(), value=int(tx.value)) for tx in actionTx.transactions]
-                        await self._send_user_operation(
-                            agentWalletAddress=agent.walletAddress,
-                            calls=calls,
-                        )
-                        # Get price context for notification
-                        priceContext = None
-                        if self.priceIntelligenceService:
-                            try:
-                                priceAnalysis = await self.priceIntelligenceService.get_price_analysis(
-                                    chainId=self.chainId,
-                                    assetAddress=position.collateralAsset,
-                                )
-                                priceContext = priceAnalysis.to_summary()
-                            except Exception:  # noqa: BLE001
-                                pass
-                        if hasPositionValue:
-                            await self.notificationService.send_auto_optimize_success(
-                                agent=agent,
-                                user=user,
-                                borrowAmount=float(result.action_amount or 0) / 1e6,
-                                oldLtv=result.current_ltv,
-                                newLtv=result.target_ltv,
-                                priceContext=priceContext,
-                            )
-                        # Cross-chain yield deployment removed — all yield stays on Base
-                    except Exception:  # noqa: BLE001
-                        logging.exception(f'Failed to auto-optimize for position {position.agentPositionId}')
-                elif result.needs_action and result.action_type == 'manual_repay':
-                    logging.info(f'Position {position.agentPositionId}: Vault has insufficient funds for auto-repay, warning user')
-                    if hasPositionValue:
-                        await self.notificationService.send_insufficient_vault_warning(
-                            agent=agent,
-                            user=user,
-                            currentLtv=result.current_ltv,
-                            maxLtv=result.max_ltv,
-                            requiredAmount=float(result.action_amount or 0) / 1e6,
-                        )
-                # Deploy idle wallet assets into the position
-                usdcAddress = constants.CHAIN_USDC_MAP[self.chainId]
-                walletCollateral = await self._get_erc20_balance(tokenAddress=position.collateralAsset, walletAddress=agent.walletAddress)
-                walletUsdc = await self._get_erc20_balance(tokenAddress=usdcAddress, walletAddress=agent.walletAddress)
-                # Deploy idle collateral: supply to Morpho + borrow USDC at target LTV + deposit to vault
-                if walletCollateral > 0:
-                    try:
-                        collateralPriceUsd = (await self.alchemyClient.get_asset_current_price(chainId=self.chainId, assetAddress=position.collateralAsset)).priceUsd
-                        collateralValueUsd = (walletCollateral / (10**collateralDecimals)) * collateralPriceUsd
-                        if collateralValueUsd >= 0.01:
-                            borrowAmountRaw = int(position.targetLtv * collateralValueUsd * 1e6)
-                            market = await self.morphoClient.get_market(chain_id=self.chainId, collateral_address=position.collateralAsset)
-                            if market is not None:
-                                transactions = self.ltvManager.transactionBuilder.build_position_transactions_from_market(
-                                    user_address=agent.walletAddress,
-                                    collateral_address=position.collateralAsset,
-                                    collateral_amount=walletCollateral,
-                                    borrow_amount=borrowAmountRaw,
-                                    market=market,
-                                )
-                                calls = [EncodedCall(toAddress=tx.to, data=HexBytes(tx.data).hex(), value=int(tx.value)) for tx in transactions]
-                                await self._send_user_operation(agentWalletAddress=agent.walletAddress, calls=calls)
-                                logging.info(f'Position {position.agentPositionId}: Deployed idle collateral ({walletCollateral} raw) + borrowed ${borrowAmountRaw / 1e6:.2f} USDC')
-                                await self.databaseStore.log_agent_action(
-                                    agentId=position.agentId,
-                                    actionType='deploy_idle_collateral',
-                                    value=f'{walletCollateral}',
-                                    valueId=str(position.agentPositionId),
-                                    details={'collateral_amount': walletCollateral, 'borrow_amount': borrowAmountRaw, 'collateral_value_usd': collateralValueUsd},
-                                )
-                    except Exception:  # noqa: BLE001
-                        logging.exception(f'Failed to deploy idle collateral for position {position.agentPositionId}')
-                # Deploy idle USDC: deposit to vault
-                if walletUsdc > 0:
-                    try:
-                        if walletUsdc / 1e6 >= 0.01:
-                            transactions = self.ltvManager.transactionBuilder.build_vault_deposit_transactions(
-                                user_address=agent.walletAddress,
-                                deposit_amount=walletUsdc,
-                            )
-                            calls = [EncodedCall(toAddress=tx.to, data=HexBytes(tx.data).hex(), value=int(tx.value)) for tx in transactions]
-                            await self._send_user_operation(agentWalletAddress=agent.walletAddress, calls=calls)
-                            logging.info(f'Position {position.agentPositionId}: Deposited idle ${walletUsdc / 1e6:.2f} USDC to vault')
-                            await self.databaseStore.log_agent_action(
-                                agentId=position.agentId,
-                                actionType='deploy_idle_usdc',
-                                value=f'${walletUsdc / 1e6:.2f}',
-                                valueId=str(position.agentPositionId),
-                                details={'usdc_amount': walletUsdc},
-                            )
-                    except Exception:  # noqa: BLE001
-                        logging.exception(f'Failed to deploy idle USDC for position {position.agentPositionId}')
-                # Cross-chain yield: poll pending actions and log results
-                if self.crossChainManager:
-                    try:
-                        statusResults = await self.crossChainManager.check_pending_actions(agentId=position.agentId)
-                        for statusResult in statusResults:
-                            await self.databaseStore.log_agent_action(
-                                agentId=position.agentId,
-                                actionType='cross_chain_status',
-                                value=statusResult.new_status,
-                                valueId=str(statusResult.action_id),
-                                details={
-                                    'old_status': statusResult.old_status,
-                                    'new_status': statusResult.new_status,
-                                    'is_complete': statusResult.is_complete,
-                                },
-                            )
-                            if statusResult.new_status == 'failed' and self.notificationService:
-                                await self.notificationService.send_cross_chain_failed(
-                                    agent=agent,
-                                    user=user,
-                                    actionId=statusResult.action_id,
-                                )
-                    except Exception:  # noqa: BLE001
-                        logging.exception(f'Failed to check cross-chain status for position {position.agentPositionId}')
-                # Handle Critical Threshold warning (even after action attempts)
-                currentLtv = result.current_ltv
-                maxLtv = result.max_ltv
-                isCritical = currentLtv >= CRITICAL_LTV_THRESHOLD * maxLtv and maxLtv > 0
-                canAgentManage = (onchainVaultAssets or 0) > 0
-                if isCritical and not canAgentManage:
-                    if hasPositionValue:
-                        await self.notificationService.send_critical_ltv_warning(
+                logging.info(f'Position {position.agentPositionId}: Submitted {len(actionPlan.actions)} actions in one user operation ({len(calls)} calls)')
+            except Exception:  # noqa: BLE001
+                logging.exception(f'Failed to send planned actions for position {position.agentPositionId}')
+        # Cross-chain yield: poll pending actions and log results
+        if self.crossChainManager:
+            try:
+                statusResults = await self.crossChainManager.check_pending_actions(agentId=position.agentId)
+                for statusResult in statusResults:
+                    await self.databaseStore.log_agent_action(
+                        agentId=position.agentId,
+                        actionType='cross_chain_status',
+                        value=statusResult.new_status,
+                        valueId=str(statusResult.action_id),
+                        details={
+                            'old_status': statusResult.old_status,
+                            'new_status': statusResult.new_status,
+                            'is_complete': statusResult.is_complete,
+                        },
+                    )
+                    if statusResult.new_status == 'failed' and self.notificationService:
+                        await self.notificationService.send_cross_chain_failed(
                             agent=agent,
                             user=user,
-                            currentLtv=currentLtv,
-                            maxLtv=maxLtv,
+                            actionId=statusResult.action_id,
                         )
-                DAILY_DIGEST_INTERVAL_SECONDS = 86400
-                now = datetime.now(UTC)
-                lastSent = self._lastDailyDigestSent.get(position.agentId)
-                shouldSendDigest = lastSent is None or (now - lastSent).total_seconds() >= DAILY_DIGEST_INTERVAL_SECONDS
-                if hasPositionValue and shouldSendDigest and not result.needs_action:
-                    priceData = await self.alchemyClient.get_asset_current_price(chainId=self.chainId, assetAddress=position.collateralAsset)
-                    collateralValue = (onchainCollateral / (10**collateralDecimals)) * priceData.priceUsd
-                    debtValue = onchainBorrow / 1e6
-                    await self.notificationService.send_daily_digest(
-                        agent=agent,
-                        user=user,
-                        currentLtv=currentLtv,
-                        collateralValue=collateralValue,
-                        debtValue=debtValue,
-                    )
-                    self._lastDailyDigestSent[position.agentId] = now
-                # ENS status writes are on mainnet — too expensive for every check cycle.
-                # Status is written via scripts/set_ens_constitution.py when needed.
             except Exception:  # noqa: BLE001
-                logging.exception(f'Error checking position {position.agentPositionId}')
+                logging.exception(f'Failed to check cross-chain status for position {position.agentPositionId}')
+        # Handle Critical Threshold warning (even after action attempts)
+        currentLtv = result.current_ltv
+        maxLtv = result.max_ltv
+        isCritical = currentLtv >= CRITICAL_LTV_THRESHOLD * maxLtv and maxLtv > 0
+        canAgentManage = (onchainVaultAssets or 0) > 0
+        if isCritical and not canAgentManage:
+            if hasPositionValue:
+                await self.notificationService.send_critical_ltv_warning(
+                    agent=agent,
+                    user=user,
+                    currentLtv=currentLtv,
+                    maxLtv=maxLtv,
+                )
+        DAILY_DIGEST_INTERVAL_SECONDS = 86400
+        now = datetime.now(UTC)
+        lastSent = self._lastDailyDigestSent.get(position.agentId)
+        shouldSendDigest = lastSent is None or (now - lastSent).total_seconds() >= DAILY_DIGEST_INTERVAL_SECONDS
+        if hasPositionValue and shouldSendDigest and not result.needs_action:
+            collateralPriceUsd = await self.ltvManager.get_collateral_price(collateralAddress=position.collateralAsset, snapshot=snapshot)
+            collateralValue = (onchainCollateral / (10**collateralDecimals)) * collateralPriceUsd
+            debtValue = onchainBorrow / 1e6
+            await self.notificationService.send_daily_digest(
+                agent=agent,
+                user=user,
+                currentLtv=currentLtv,
+                collateralValue=collateralValue,
+                debtValue=debtValue,
+            )
+            self._lastDailyDigestSent[position.agentId] = now
+        # ENS status writes are on mainnet — too expensive for every check cycle.
+        # Status is written via scripts/set_ens_constitution.py when needed.
+        return result
 
     async def _execute_agent_deploy_transactions(self, agentWalletAddress: str, userAddress: str, collateralAssetAddress: str, collateralAmount: str, targetLtv: float) -> str | None:
         if self.coinbaseCdpClient is None or self.coinbaseSmartWallet is None or self.coinbaseBundler is None or self.deployerPrivateKey is None:
@@ -840,7 +1085,7 @@ class AgentManager(Authorizer):  # Core manager
         normalized_address = chain_util.normalize_address(user_address)
         estimated_apy = 0.08
         try:
-            yield_apy = await self.fortyAcresClient.get_yield_apy(chainId=self.chainId)
+            yield_apy = await self.vaultYieldService.get_yield_apy()
             if yield_apy is not None:
                 estimated_apy = yield_apy
         except Exception:  # noqa: BLE001
@@ -914,21 +1159,13 @@ class AgentManager(Authorizer):  # Core manager
         if dbPosition is None:
             return None
         collateral = next((c for c in SUPPORTED_COLLATERALS if c.address.lower() == dbPosition.collateralAsset.lower()), SUPPORTED_COLLATERALS[0])
-        # Fetch all on-chain data: collateral amount, borrow amount, vault balance, price
-        try:
-            onchainCollateral, onchainBorrow, _borrowShares = await self._get_onchain_position(
-                agentWalletAddress=agent.walletAddress,
-                morphoMarketId=dbPosition.morphoMarketId,
-            )
-        except Exception:  # noqa: BLE001
-            logging.exception('Failed to fetch on-chain position from Morpho Blue')
-            onchainCollateral = 0
-            onchainBorrow = 0
-        _actualVaultShares, actualVaultAssets = await self._get_actual_vault_balance(agentWalletAddress=agent.walletAddress)
-        # Fetch wallet balances (free tokens not deposited into Morpho/vault)
-        usdcAddress = constants.CHAIN_USDC_MAP[self.chainId]
-        walletCollateralBalance = await self._get_erc20_balance(tokenAddress=dbPosition.collateralAsset, walletAddress=agent.walletAddress)
-        walletUsdcBalance = await self._get_erc20_balance(tokenAddress=usdcAddress, walletAddress=agent.walletAddress)
+        # Fetch all on-chain data: collateral amount, borrow amount, vault balance and free wallet balances
+        positionState = await self._read_onchain_position_state(agentWalletAddress=agent.walletAddress, morphoMarketId=dbPosition.morphoMarketId, collateralAddress=dbPosition.collateralAsset)
+        onchainCollateral = positionState.collateral_amount
+        onchainBorrow = positionState.borrow_amount
+        actualVaultAssets = positionState.vault_assets
+        walletCollateralBalance = positionState.wallet_collateral_balance
+        walletUsdcBalance = positionState.wallet_usdc_balance
         collateralAmountHuman = onchainCollateral / (10**collateral.decimals)
         walletCollateralHuman = walletCollateralBalance / (10**collateral.decimals)
         borrowValueUsd = onchainBorrow / 1e6
@@ -941,11 +1178,11 @@ class AgentManager(Authorizer):  # Core manager
             walletCollateralValueUsd = 0.0
         walletUsdcValueUsd = walletUsdcBalance / 1e6
         currentLtv = borrowValueUsd / collateralValueUsd if collateralValueUsd > 0 else 0
-        market = await self.morphoClient.get_market(chain_id=self.chainId, collateral_address=dbPosition.collateralAsset)
+        market = await self._get_position_market(position=dbPosition)
         maxLtv = market.lltv if market else 0.86
         estimatedApy = 0.08
         try:
-            yieldApy = await self.fortyAcresClient.get_yield_apy(chainId=self.chainId)
+            yieldApy = await self.vaultYieldService.get_yield_apy()
             if yieldApy is not None:
                 estimatedApy = yieldApy
         except Exception:  # noqa: BLE001
@@ -975,7 +1212,7 @@ class AgentManager(Authorizer):  # Core manager
         )
         return position
 
-    async def _get_actual_vault_balance(self, agentWalletAddress: str) -> tuple[int, int]:
+    async def _get_actual_vault_balance(self, agentWalletAddress: str, blockNumber: int | None = None) -> tuple[int, int]:
         """Get actual vault shares and their USDC value from on-chain data.
         Returns: (shares, assets_in_usdc)
         """
@@ -984,6 +1221,7 @@ class AgentManager(Authorizer):  # Core manager
             contractAbi=morpho_abis.ERC4626_VAULT_ABI,
             functionName='balanceOf',
             arguments={'account': agentWalletAddress},
+            blockNumber=blockNumber,
         )
         shares = int(sharesResponse[0])
         if shares == 0:
@@ -993,6 +1231,7 @@ class AgentManager(Authorizer):  # Core manager
             contractAbi=morpho_abis.ERC4626_VAULT_ABI,
             functionName='convertToAssets',
             arguments={'shares': shares},
+            blockNumber=blockNumber,
         )
         assets = int(assetsResponse[0])
         return shares, assets
@@ -1014,7 +1253,14 @@ class AgentManager(Authorizer):  # Core manager
             agent = agents[0]
         return user, agent
 
-    async def _get_onchain_position(self, agentWalletAddress: str, morphoMarketId: str) -> tuple[int, int, int]:
+    async def _get_position_market(self, position: AgentPosition) -> MorphoMarket | None:
+        # NOTE: the position's own market is used when it has one, positions created without a market fall back to the collateral's best market
+        market = await self.morphoClient.get_market_by_id(chain_id=self.chainId, market_id=position.morphoMarketId)
+        if market is not None:
+            return market
+        return await self.morphoClient.get_market(chain_id=self.chainId, collateral_address=position.collateralAsset)
+
+    async def _get_onchain_position(self, agentWalletAddress: str, morphoMarketId: str, blockNumber: int | None = None) -> tuple[int, int, int]:
         """Get live collateral and borrow amounts from Morpho Blue contract.
         Returns: (collateral_amount_raw, borrow_amount_raw_usdc, borrow_shares)
         """
@@ -1027,17 +1273,23 @@ class AgentManager(Authorizer):  # Core manager
             contractAbi=morpho_abis.MORPHO_BLUE_ABI,
             functionName='position',
             arguments={'id': marketIdBytes, 'user': agentWalletAddress},
+            blockNumber=blockNumber,
         )
         collateralAmount = int(positionResponse[2])
         borrowShares = int(positionResponse[1])
         if borrowShares == 0:
             return collateralAmount, 0, 0
+        # NOTE: a market state already read on chain converts the shares with interest accrued, without another market() call
+        expectedBorrowAmount = self.morphoClient.get_expected_borrow_assets(chain_id=self.chainId, market_id=morphoMarketId, borrow_shares=borrowShares, block_number=blockNumber)
+        if expectedBorrowAmount is not None:
+            return collateralAmount, expectedBorrowAmount, borrowShares
         # Fetch market state to convert borrowShares -> borrowAssets
         marketResponse = await self.ethClient.call_function_by_name(
             toAddress=MORPHO_BLUE_ADDRESS,
             contractAbi=morpho_abis.MORPHO_BLUE_ABI,
             functionName='market',
             arguments={'id': marketIdBytes},
+            blockNumber=blockNumber,
         )
         totalBorrowAssets = int(marketResponse[2])
         totalBorrowShares = int(marketResponse[3])
@@ -1047,24 +1299,23 @@ class AgentManager(Authorizer):  # Core manager
         borrowAmount = (borrowShares * totalBorrowAssets + totalBorrowShares - 1) // totalBorrowShares
         return collateralAmount, borrowAmount, borrowShares
 
-    async def _get_erc20_balance(self, tokenAddress: str, walletAddress: str) -> int:
+    async def _get_erc20_balance(self, tokenAddress: str, walletAddress: str, blockNumber: int | None = None) -> int:
         """Get ERC20 token balance for a wallet address."""
         response = await self.ethClient.call_function_by_name(
             toAddress=tokenAddress,
             contractAbi=ERC20_BALANCE_ABI,
             functionName='balanceOf',
             arguments={'account': walletAddress},
+            blockNumber=blockNumber,
         )
         return int(response[0])
 
     async def get_market_data(self) -> tuple[list[CollateralMarketData], float, str, str]:
         collateralMarkets: list[CollateralMarketData] = []
+        # NOTE: one sweep of every USDC market answers all collaterals, rather than a query per collateral
+        bestMarkets = select_best_markets_by_collateral(markets=await self.morphoClient.list_markets(chain_id=self.chainId))
         for collateral in SUPPORTED_COLLATERALS:
-            market = await self.morphoClient.get_market(
-                chain_id=self.chainId,
-                collateral_address=collateral.address,
-                loan_address=None,
-            )
+            market = bestMarkets.get(chain_util.normalize_address(collateral.address))
             if market is None:
                 raise ValueError(f'No Morpho market found for collateral {collateral.symbol} ({collateral.address})')
             collateralMarkets.append(
@@ -1076,11 +1327,15 @@ class AgentManager(Authorizer):  # Core manager
                     market_id=market.unique_key,
                 )
             )
-        yieldApy = await self.fortyAcresClient.get_yield_apy(chainId=self.chainId)
+        yieldApy = await self.vaultYieldService.get_yield_apy()
         if yieldApy is None:
             raise ValueError('Failed to get Yo.xyz yield APY')
         return collateralMarkets, yieldApy, YO_VAULT_ADDRESS, YO_VAULT_NAME
 
+    async def get_yield_history(self, days: int) -> list[YieldHistoryPoint]:
+        snapshots = await self.vaultYieldService.list_yield_snapshots(since=datetime.now(tz=UTC) - timedelta(days=days))
+        return [YieldHistoryPoint(date=snapshot.snapshotDate, apy=snapshot.apy, total_assets=str(snapshot.totalAssets)) for snapshot in snapshots]
+
     async def _calc_withdraw_preview(self, userAddress: str, withdrawAmountRaw: int, agent_id: str | None = None) -> WithdrawPreview:
         _user, agent = await self._resolve_agent(userAddress, agent_id)
         dbPosition = await self.databaseStore.get_position_by_agent(agentId=agent.agentId)
@@ -1098,7 +1353,7 @@ class AgentManager(Authorizer):  # Core manager
             collateralValueUsd = collateralAmountHuman * priceUsd
         except Exception:  # noqa: BLE001
             collateralValueUsd = 0.0
-        market = await self.morphoClient.get_market(chain_id=self.chainId, collateral_address=dbPosition.collateralAsset)
+        market = await self._get_position_market(position=dbPosition)
         maxLtv = market.lltv if market else 0.86
         vaultRaw = actualVaultAssets
         borrowRaw = onchainBorrow
@@ -1184,7 +1439,7 @@ class AgentManager(Authorizer):  # Core manager
         dbPosition = await self.databaseStore.get_position_by_agent(agentId=agent.agentId)
         if dbPosition is None:
             raise NotFoundException(message='No active position found')
-        market = await self.morphoClient.get_market(chain_id=self.chainId, collateral_address=dbPosition.collateralAsset)
+        market = await self._get_position_market(position=dbPosition)
         if market is None:
             raise ValueError(f'No Morpho market found for collateral {dbPosition.collateralAsset}')
         usdcAddress = constants.CHAIN_USDC_MAP.get(self.chainId)
@@ -1229,7 +1484,7 @@ class AgentManager(Authorizer):  # Core manager
         dbPosition = await self.databaseStore.get_position_by_agent(agentId=agent.agentId)
         if dbPosition is None:
             raise NotFoundException(message='No active position found')
-        market = await self.morphoClient.get_market(chain_id=self.chainId, collateral_address=dbPosition.collateralAsset)
+        market = await self._get_position_market(position=dbPosition)
         if market is None:
             raise ValueError(f'No Morpho market found for collateral {dbPosition.collateralAsset}')
         usdcAddress = constants.CHAIN_USDC_MAP.get(self.chainId)
@@ -1290,6 +1545,8 @@ class AgentManager(Authorizer):  # Core manager
         supportedAddresses = {c.address.lower() for c in SUPPORTED_COLLATERALS}
         if usdcAddress:
             supportedAddresses.add(usdcAddress.lower())
+        pricesUsd = await self._get_asset_prices(assetAddresses=[c.address for c in SUPPORTED_COLLATERALS])
+        collateralPricesUsd = {assetAddress.lower(): priceUsd for assetAddress, priceUsd in pricesUsd.items()}
         assetBalances: list[AssetBalance] = []
         for clientBalance in clientAssetBalances:
             normalizedBalance = clientBalance.assetAddress.lower()
@@ -1304,16 +1561,9 @@ class AgentManager(Authorizer):  # Core manager
                 decimals = 6
             else:
                 continue
-            try:
-                if symbol == 'USDC':
-                    balanceHuman = clientBalance.balance / (10**decimals)
-                    balanceUsd = balanceHuman  # USDC is $1
-                else:
-                    priceUsd = await self._get_asset_price(assetAddress=clientBalance.assetAddress)
-                    balanceHuman = clientBalance.balance / (10**decimals)
-                    balanceUsd = balanceHuman * priceUsd
-            except Exception:  # noqa: BLE001
-                balanceUsd = 0.0
+            balanceHuman = clientBalance.balance / (10**decimals)
+            # NOTE: USDC is valued at $1
+            balanceUsd = balanceHuman if symbol == 'USDC' else balanceHuman * collateralPricesUsd.get(normalizedBalance, 0.0)
             assetBalances.append(
                 AssetBalance(
                     asset_address=clientBalance.assetAddress,
@@ -1702,6 +1952,44 @@ class AgentManager(Authorizer):  # Core manager
             for thought in thoughts
         ]
 
+    async def get_agent_ltv_history(self, agent_id: str, days: int) -> list[LtvHistoryPoint]:
+        """Get the LTV time series of an agent's position, oldest first. Hours past the raw check retention come from their hourly rollups."""
+        agent = await self.databaseStore.get_agent(agentId=agent_id)
+        if agent is None:
+            raise NotFoundException(message='Agent not found')
+        dbPosition = await self.databaseStore.get_position_by_agent(agentId=agent.agentId)
+        if dbPosition is None:
+            return []
+        since = datetime.now(tz=UTC) - timedelta(days=days)
+        rollups = await self.databaseStore.get_ltv_check_rollups(agentPositionId=dbPosition.agentPositionId, since=since)
+        ltvChecks = await self.databaseStore.get_ltv_checks(agentPositionId=dbPosition.agentPositionId, since=since)
+        # NOTE: raw checks are deleted as they are rolled up, so every rollup is older than the oldest remaining check
+        return [
+            LtvHistoryPoint(
+                date=rollup.periodDate,
+                current_ltv=rollup.avgCurrentLtv,
+                min_current_ltv=rollup.minCurrentLtv,
+                max_current_ltv=rollup.maxCurrentLtv,
+                target_ltv=rollup.avgTargetLtv,
+                max_ltv=rollup.maxLtv,
+                check_count=rollup.checkCount,
+                action_count=rollup.actionCount,
+            )
+            for rollup in rollups
+        ] + [
+            LtvHistoryPoint(
+                date=ltvCheck.checkDate,
+                current_ltv=ltvCheck.currentLtv,
+                min_current_ltv=ltvCheck.currentLtv,
+                max_current_ltv=ltvCheck.currentLtv,
+                target_ltv=ltvCheck.targetLtv,
+                max_ltv=ltvCheck.maxLtv,
+                check_count=1,
+                action_count=1 if ltvCheck.decisionCode != LTV_DECISION_CODES[None] else 0,
+            )
+            for ltvCheck in ltvChecks
+        ]
+
     async def get_agent_position(self, agent_id: str) -> Position | None:
         """Get position for a specific agent."""
         agent = await self.databaseStore.get_agent(agentId=agent_id)
@@ -1711,16 +1999,14 @@ class AgentManager(Authorizer):  # Core manager
         if dbPosition is None:
             return None
         collateral = next((c for c in SUPPORTED_COLLATERALS if c.address.lower() == dbPosition.collateralAsset.lower()), SUPPORTED_COLLATERALS[0])
-        onchainCollateral, onchainBorrow, _borrowShares = await self._get_onchain_position(
-            agentWalletAddress=agent.walletAddress,
-            morphoMarketId=dbPosition.morphoMarketId,
-        )
-        _actualVaultShares, actualVaultAssets = await self._get_actual_vault_balance(agentWalletAddress=agent.walletAddress)
-        walletCollateralBalance = await self._get_erc20_balance(tokenAddress=dbPosition.collateralAsset, walletAddress=agent.walletAddress)
-        usdcAddress = constants.CHAIN_USDC_MAP.get(self.chainId)
-        if usdcAddress is None:
+        if self.chainId not in constants.CHAIN_USDC_MAP:
             raise ValueError(f'USDC not supported on chain {self.chainId}')
-        walletUsdcBalance = await self._get_erc20_balance(tokenAddress=usdcAddress, walletAddress=agent.walletAddress)
+        positionState = await self._read_onchain_position_state(agentWalletAddress=agent.walletAddress, morphoMarketId=dbPosition.morphoMarketId, collateralAddress=dbPosition.collateralAsset)
+        onchainCollateral = positionState.collateral_amount
+        onchainBorrow = positionState.borrow_amount
+        actualVaultAssets = positionState.vault_assets
+        walletCollateralBalance = positionState.wallet_collateral_balance
+        walletUsdcBalance = positionState.wallet_usdc_balance
         try:
             collateralPriceUsd = await self._get_asset_price(assetAddress=dbPosition.collateralAsset)
             collateralValueUsd = onchainCollateral * collateralPriceUsd / (10 ** collateral.decimals)
@@ -1732,11 +2018,11 @@ class AgentManager(Authorizer):  # Core manager
         borrowValueUsd = onchainBorrow / 1e6
         walletUsdcValueUsd = walletUsdcBalance / 1e6
         currentLtv = borrowValueUsd / collateralValueUsd if collateralValueUsd > 0 else 0
-        market = await self.morphoClient.get_market(chain_id=self.chainId, collateral_address=dbPosition.collateralAsset)
+        market = await self._get_position_market(position=dbPosition)
         maxLtv = market.lltv if market else 0.86
         estimatedApy = 0.08
         try:
-            yieldApy = await self.fortyAcresClient.get_yield_apy(chainId=self.chainId)
+            yieldApy = await self.vaultYieldService.get_yield_apy()
             if yieldApy is not None:
                 estimatedApy = yieldApy
         except Exception:  # noqa: BLE001
@@ -1771,14 +2057,11 @@ class AgentManager(Authorizer):  # Core manager
         agent = await self.databaseStore.get_agent(agentId=agent_id)
         if agent is None:
             raise NotFoundException(message='Agent not found')
+        pricesUsd = await self._get_asset_prices(assetAddresses=[collateral.address for collateral in SUPPORTED_COLLATERALS])
         balances: list[AssetBalance] = []
         for collateral in SUPPORTED_COLLATERALS:
             balance = await self._get_erc20_balance(tokenAddress=collateral.address, walletAddress=agent.walletAddress)
-            try:
-                priceUsd = await self._get_asset_price(assetAddress=collateral.address)
-                balanceUsd = balance * priceUsd / (10 ** collateral.decimals)
-            except Exception:  # noqa: BLE001
-                balanceUsd = 0.0
+            balanceUsd = balance * pricesUsd.get(collateral.address, 0.0) / (10 ** collateral.decimals)
             balances.append(
                 AssetBalance(
                     asset_address=collateral.address,
@@ -147,6 +147,12 @@ def create_v1_routes(agentManager: AgentManager) -> list[Route]:
         collateralMarkets, yieldApy, vaultAddress, vaultName = await agentManager.get_market_data()
         return endpoints.GetMarketDataResponse(collateral_markets=collateralMarkets, yield_apy=yieldApy, yield_vault_address=vaultAddress, yield_vault_name=vaultName)
 
+    @json_route(requestType=endpoints.GetYieldHistoryRequest, responseType=endpoints.GetYieldHistoryResponse)
+    async def get_yield_history(request: KibaApiRequest[endpoints.GetYieldHistoryRequest]) -> endpoints.GetYieldHistoryResponse:
+        days = min(max(int(request.query_params.get('days') or 30), 1), 365)
+        points = await agentManager.get_yield_history(days=days)
+        return endpoints.GetYieldHistoryResponse(points=points)
+
     @json_route(requestType=endpoints.GetWalletRequest, responseType=endpoints.GetWalletResponse)
     @authorize_signature(authorizer=agentManager)
     async def get_wallet(request: KibaApiRequest[endpoints.GetWalletRequest]) -> endpoints.GetWalletResponse:
@@ -310,6 +316,14 @@ def create_v1_routes(agentManager: AgentManager) -> list[Route]:
         position = await agentManager.get_agent_position(agent_id=agentId)
         return endpoints.GetAgentPositionResponse(position=position)
 
+    @json_route(requestType=endpoints.GetAgentLtvHistoryRequest, responseType=endpoints.GetAgentLtvHistoryResponse)
+    @authorize_signature(authorizer=agentManager)
+    async def get_agent_ltv_history(request: KibaApiRequest[endpoints.GetAgentLtvHistoryRequest]) -> endpoints.GetAgentLtvHistoryResponse:
+        agentId = request.path_params.get('agentId', '')
+        days = min(max(int(request.query_params.get('days') or 7), 1), 365)
+        points = await agentManager.get_agent_ltv_history(agent_id=agentId, days=days)
+        return endpoints.GetAgentLtvHistoryResponse(points=points)
+
     @json_route(requestType=endpoints.GetAgentWalletRequest, responseType=endpoints.GetAgentWalletResponse)
     @authorize_signature(authorizer=agentManager)
     async def get_agent_wallet(request: KibaApiRequest[endpoints.GetAgentWalletRequest]) -> endpoints.GetAgentWalletResponse:
@@ -327,6 +341,7 @@ def create_v1_routes(agentManager: AgentManager) -> list[Route]:
     return [
         Route('/v1/collaterals', endpoint=get_supported_collaterals, methods=['GET']),
         Route('/v1/market-data', endpoint=get_market_data, methods=['GET']),
+        Route('/v1/market-data/yield-history', endpoint=get_yield_history, methods=['GET']),
         Route('/v1/wallets/{walletAddress:str}', endpoint=get_wallet, methods=['GET']),
         Route('/v1/users/{userAddress:str}/config', endpoint=get_user_config, methods=['GET']),
         Route('/v1/users/{userAddress:str}/config', endpoint=update_user_config, methods=['POST']),
@@ -354,6 +369,7 @@ def create_v1_routes(agentManager: AgentManager) -> list[Route]:
         Route('/v1/users/{userAddress:str}/agents/{agentId:str}/chat/history', endpoint=get_chat_history, methods=['GET']),
         Route('/v1/agents/{agentId:str}/thoughts', endpoint=get_agent_thoughts, methods=['GET']),
         Route('/v1/agents/{agentId:str}/position', endpoint=get_agent_position, methods=['GET']),
+        Route('/v1/agents/{agentId:str}/ltv-history', endpoint=get_agent_ltv_history, methods=['GET']),
         Route('/v1/agents/{agentId:str}/wallet', endpoint=get_agent_wallet, methods=['GET']),
         Route('/v1/agents/{agentId:str}/ens-constitution', endpoint=get_agent_ens_constitution, methods=['GET']),
     ]
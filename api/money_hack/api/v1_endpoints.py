@@ -93,6 +93,14 @@ class GetMarketDataResponse(BaseModel):
     yield_vault_name: str
 
 
+class GetYieldHistoryRequest(BaseModel):
+    pass
+
+
+class GetYieldHistoryResponse(BaseModel):
+    points: list[resources.YieldHistoryPoint]
+
+
 class GetWalletRequest(BaseModel):
     pass
 
@@ -288,6 +296,14 @@ class GetAgentPositionResponse(BaseModel):
     position: resources.Position | None
 
 
+class GetAgentLtvHistoryRequest(BaseModel):
+    pass
+
+
+class GetAgentLtvHistoryResponse(BaseModel):
+    points: list[resources.LtvHistoryPoint]
+
+
 class GetAgentWalletRequest(BaseModel):
     pass
 
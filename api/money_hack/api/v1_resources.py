@@ -57,6 +57,23 @@ class CollateralMarketData(BaseModel):
     market_id: str | None
 
 
+class YieldHistoryPoint(BaseModel):
+    date: datetime
+    apy: float
+    total_assets: str
+
+
+class LtvHistoryPoint(BaseModel):
+    date: datetime
+    current_ltv: float
+    min_current_ltv: float
+    max_current_ltv: float
+    target_ltv: float
+    max_ltv: float
+    check_count: int
+    action_count: int
+
+
 class AssetBalance(BaseModel):
     asset_address: str
     asset_symbol: str
@@ -0,0 +1,429 @@
+import asyncio
+import collections
+import datetime as dt
+import random
+import socket
+import time
+import typing
+from dataclasses import dataclass
+from dataclasses import field
+
+import uvicorn
+from core import logging
+from core.exceptions import KibaException
+from eth_abi import decode
+from eth_abi import encode
+from eth_utils import function_signature_to_4byte_selector
+from eth_utils import keccak
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse
+from starlette.responses import Response
+from starlette.routing import Route
+
+from money_hack import constants
+
+MULTICALL3_AGGREGATE3_SELECTOR = function_signature_to_4byte_selector('aggregate3((address,bool,bytes)[])')
+MORPHO_POSITION_SELECTOR = function_signature_to_4byte_selector('position(bytes32,address)')
+MORPHO_MARKET_SELECTOR = function_signature_to_4byte_selector('market(bytes32)')
+MORPHO_ORACLE_PRICE_SELECTOR = function_signature_to_4byte_selector('price()')
+ERC20_BALANCE_OF_SELECTOR = function_signature_to_4byte_selector('balanceOf(address)')
+ERC20_DECIMALS_SELECTOR = function_signature_to_4byte_selector('decimals()')
+ERC4626_CONVERT_TO_ASSETS_SELECTOR = function_signature_to_4byte_selector('convertToAssets(uint256)')
+ENTRYPOINT_GET_NONCE_SELECTOR = function_signature_to_4byte_selector('getNonce(address,uint192)')
+ENTRYPOINT_GET_USER_OP_HASH_SELECTOR = function_signature_to_4byte_selector('getUserOpHash((address,uint256,bytes,bytes,uint256,uint256,uint256,uint256,uint256,bytes,bytes))')
+
+# NOTE: vault share prices grow by one part in this many per block so APY calculations see a positive rate
+VAULT_RATE_PRECISION = 10**12
+STUB_MARKET_TOTAL_BORROW = 10**15
+
+
+@dataclass
+class StubServiceConfig:
+    latency_seconds: float = 0.0
+    latency_jitter_seconds: float = 0.0
+    error_rate: float = 0.0
+
+
+@dataclass
+class StubWalletState:
+    """The on-chain state the JSON-RPC stub reports for one agent wallet. Borrow shares convert 1:1 to borrow assets."""
+
+    collateral_amount: int
+    borrow_shares: int
+    vault_shares: int
+    wallet_collateral_balance: int = 0
+    wallet_usdc_balance: int = 0
+
+
+@dataclass
+class StubMarket:
+    unique_key: str
+    collateral_address: str
+    collateral_symbol: str
+    collateral_decimals: int
+    lltv: float = 0.86
+    borrow_apy: float = 0.05
+    supply_apy: float = 0.04
+    utilization: float = 0.9
+
+    def get_oracle_address(self) -> str:
+        return '0x' + keccak(text=f'oracle-{self.unique_key}')[-20:].hex()
+
+
+@dataclass
+class StubChainState:
+    """Synthetic chain state shared by the JSON-RPC and bundler stubs. Blocks advance with wall clock time at Base's block time."""
+
+    usdc_address: str
+    vault_address: str
+    start_block_number: int = 30_000_000
+    start_timestamp: int = field(default_factory=lambda: int(time.time()))
+    wallets: dict[str, StubWalletState] = field(default_factory=dict)
+    # NOTE: raw Morpho oracle prices keyed by lowercased oracle address, scaled by 1e36 like the real oracles
+    oracle_prices: dict[str, int] = field(default_factory=dict)
+
+    def get_block_number(self) -> int:
+        return self.start_block_number + int((time.time() - self.start_timestamp) / constants.BASE_BLOCK_TIME_SECONDS)
+
+    def get_block_timestamp(self, blockNumber: int) -> int:
+        return self.start_timestamp + (blockNumber - self.start_block_number) * constants.BASE_BLOCK_TIME_SECONDS
+
+    def get_wallet(self, walletAddress: str) -> StubWalletState | None:
+        return self.wallets.get(walletAddress.lower())
+
+
+class StubService:
+    """Base for an in-process HTTP stub of an external service. Every request is counted and delayed by the configured latency,
+    and fails with a 503 at the configured error rate.
+    """
+
+    name = 'stub'
+
+    def __init__(self, config: StubServiceConfig | None = None, seed: int = 0) -> None:
+        self.config = config or StubServiceConfig()
+        self.random = random.Random(seed)  # noqa: S311
+        self.requestCount = 0
+        self.errorCount = 0
+        self.methodCounts: collections.Counter[str] = collections.Counter()
+
+    def get_routes(self) -> list[Route]:
+        raise NotImplementedError
+
+    def build_app(self) -> Starlette:
+        return Starlette(routes=self.get_routes())
+
+    async def _simulate_network(self) -> Response | None:
+        self.requestCount += 1
+        latencySeconds = self.config.latency_seconds + self.random.uniform(0, self.config.latency_jitter_seconds)
+        if latencySeconds > 0:
+            await asyncio.sleep(latencySeconds)
+        if self.config.error_rate > 0 and self.random.random() < self.config.error_rate:
+            self.errorCount += 1
+            return JSONResponse(content={'error': f'{self.name} stub injected error'}, status_code=503)
+        return None
+
+
+class JsonRpcStubService(StubService):
+    """Answers JSON-RPC requests from a table of method handlers. Unknown methods return a method-not-found error."""
+
+    name = 'json-rpc'
+
+    def get_routes(self) -> list[Route]:
+        return [Route('/', endpoint=self._handle_request, methods=['POST'])]
+
+    def get_method_handlers(self) -> dict[str, typing.Callable[[list[typing.Any]], typing.Any]]:  # type: ignore[explicit-any]
+        raise NotImplementedError
+
+    def _handle_rpc_call(self, rpcRequest: dict[str, typing.Any]) -> dict[str, typing.Any]:  # type: ignore[explicit-any]
+        method = str(rpcRequest.get('method'))
+        self.methodCounts[method] += 1
+        handler = self.get_method_handlers().get(method)
+        if handler is None:
+            return {'jsonrpc': '2.0', 'id': rpcRequest.get('id'), 'error': {'code': -32601, 'message': f'Method {method} not supported by {self.name} stub'}}
+        return {'jsonrpc': '2.0', 'id': rpcRequest.get('id'), 'result': handler(list(rpcRequest.get('params') or []))}
+
+    async def _handle_request(self, request: Request) -> Response:
+        errorResponse = await self._simulate_network()
+        if errorResponse is not None:
+            return errorResponse
+        body = await request.json()
+        if isinstance(body, list):
+            return JSONResponse(content=[self._handle_rpc_call(rpcRequest=rpcRequest) for rpcRequest in body])
+        return JSONResponse(content=self._handle_rpc_call(rpcRequest=body))
+
+
+class ChainRpcStubService(JsonRpcStubService):
+    """Stands in for the Base RPC. eth_call understands Multicall3 aggregate3, Morpho position, market and oracle price reads,
+    ERC20 balances, vault share conversions and the entrypoint nonce. Other calls return a zero word.
+    """
+
+    name = 'rpc'
+
+    def __init__(self, chainState: StubChainState, config: StubServiceConfig | None = None, seed: int = 0) -> None:
+        super().__init__(config=config, seed=seed)
+        self.chainState = chainState
+
+    def get_method_handlers(self) -> dict[str, typing.Callable[[list[typing.Any]], typing.Any]]:  # type: ignore[explicit-any]
+        return {
+            'eth_chainId': lambda _params: hex(constants.BASE_CHAIN_ID),
+            'eth_blockNumber': lambda _params: hex(self.chainState.get_block_number()),
+            'eth_getBlockByNumber': self._get_block_by_number,
+            'eth_call': self._eth_call,
+            'eth_getBalance': lambda _params: hex(0),
+            'eth_getTransactionCount': lambda _params: hex(0),
+            'eth_gasPrice': lambda _params: hex(10**7),
+            'eth_maxPriorityFeePerGas': lambda _params: hex(10**6),
+        }
+
+    def _parse_block_number(self, blockParam: typing.Any) -> int:  # type: ignore[explicit-any]
+        if isinstance(blockParam, str) and blockParam.startswith('0x'):
+            return int(blockParam, 16)
+        return self.chainState.get_block_number()
+
+    def _get_block_by_number(self, params: list[typing.Any]) -> dict[str, typing.Any]:  # type: ignore[explicit-any]
+        blockNumber = self._parse_block_number(blockParam=params[0] if params else 'latest')
+        return {
+            'number': hex(blockNumber),
+            'hash': '0x' + keccak(blockNumber.to_bytes(32, 'big')).hex(),
+            'timestamp': hex(self.chainState.get_block_timestamp(blockNumber=blockNumber)),
+            'baseFeePerGas': hex(10**7),
+            'transactions': [],
+        }
+
+    def _eth_call(self, params: list[typing.Any]) -> str:  # type: ignore[explicit-any]
+        transaction = params[0]
+        blockNumber = self._parse_block_number(blockParam=params[1] if len(params) > 1 else 'latest')
+        callData = bytes.fromhex(str(transaction.get('data') or transaction.get('input') or '0x').removeprefix('0x'))
+        return '0x' + self._call_contract(toAddress=str(transaction.get('to', '')), callData=callData, blockNumber=blockNumber).hex()
+
+    def _call_contract(self, toAddress: str, callData: bytes, blockNumber: int) -> bytes:
+        selector = callData[:4]
+        arguments = callData[4:]
+        if selector == MULTICALL3_AGGREGATE3_SELECTOR:
+            (calls,) = decode(['(address,bool,bytes)[]'], arguments)
+            results = [(True, self._call_contract(toAddress=target, callData=bytes(innerCallData), blockNumber=blockNumber)) for target, _allowFailure, innerCallData in calls]
+            return encode(['(bool,bytes)[]'], [results])
+        if selector == MORPHO_POSITION_SELECTOR:
+            _marketId, walletAddress = decode(['bytes32', 'address'], arguments)
+            wallet = self.chainState.get_wallet(walletAddress=walletAddress)
+            return encode(['uint256', 'uint128', 'uint128'], [0, wallet.borrow_shares if wallet else 0, wallet.collateral_amount if wallet else 0])
+        if selector == MORPHO_MARKET_SELECTOR:
+            lastUpdate = self.chainState.get_block_timestamp(blockNumber=blockNumber)
+            return encode(['uint128'] * 6, [STUB_MARKET_TOTAL_BORROW * 2, STUB_MARKET_TOTAL_BORROW * 2, STUB_MARKET_TOTAL_BORROW, STUB_MARKET_TOTAL_BORROW, lastUpdate, 0])
+        if selector == MORPHO_ORACLE_PRICE_SELECTOR:
+            return encode(['uint256'], [self.chainState.oracle_prices.get(toAddress.lower(), 0)])
+        if selector == ERC20_BALANCE_OF_SELECTOR:
+            (walletAddress,) = decode(['address'], arguments)
+            wallet = self.chainState.get_wallet(walletAddress=walletAddress)
+            if wallet is None:
+                balance = 0
+            elif toAddress.lower() == self.chainState.vault_address.lower():
+                balance = wallet.vault_shares
+            elif toAddress.lower() == self.chainState.usdc_address.lower():
+                balance = wallet.wallet_usdc_balance
+            else:
+                balance = wallet.wallet_collateral_balance
+            return encode(['uint256'], [balance])
+        if selector == ERC4626_CONVERT_TO_ASSETS_SELECTOR:
+            (shares,) = decode(['uint256'], arguments)
+            return encode(['uint256'], [shares * (VAULT_RATE_PRECISION + blockNumber) // VAULT_RATE_PRECISION])
+        if selector == ERC20_DECIMALS_SELECTOR:
+            return encode(['uint8'], [6])
+        if selector == ENTRYPOINT_GET_NONCE_SELECTOR:
+            return encode(['uint256'], [0])
+        if selector == ENTRYPOINT_GET_USER_OP_HASH_SELECTOR:
+            return keccak(callData)
+        return bytes(32)
+
+
+class BundlerStubService(ChainRpcStubService):
+    """Stands in for the Coinbase paymaster and bundler. Every user operation is accepted and its receipt is available immediately."""
+
+    name = 'bundler'
+
+    def get_method_handlers(self) -> dict[str, typing.Callable[[list[typing.Any]], typing.Any]]:  # type: ignore[explicit-any]
+        return {
+            **super().get_method_handlers(),
+            'pm_getPaymasterStubData': lambda _params: {'paymasterAndData': '0x'},
+            'pm_getPaymasterData': lambda _params: {'paymasterAndData': '0x'},
+            'eth_estimateUserOperationGas': lambda _params: {'callGasLimit': hex(300_000), 'verificationGasLimit': hex(300_000), 'preVerificationGas': hex(100_000)},
+            'eth_sendUserOperation': self._send_user_operation,
+            'eth_getUserOperationReceipt': self._get_user_operation_receipt,
+        }
+
+    def _send_user_operation(self, params: list[typing.Any]) -> str:  # type: ignore[explicit-any]
+        userOperation = params[0]
+        return '0x' + keccak(text=f'{userOperation.get("sender")}-{userOperation.get("callData")}-{time.time()}').hex()
+
+    def _get_user_operation_receipt(self, params: list[typing.Any]) -> dict[str, typing.Any]:  # type: ignore[explicit-any]
+        userOperationHash = str(params[0])
+        return {
+            'userOpHash': userOperationHash,
+            'success': True,
+            'reason': '',
+            'logs': [],
+            'receipt': {'transactionHash': '0x' + keccak(hexstr=userOperationHash).hex()},
+        }
+
+
+class AlchemyPricesStubService(StubService):
+    """Stands in for the Alchemy Prices API. Current prices are fixed and historical series are a small random walk around them."""
+
+    name = 'alchemy-prices'
+
+    def __init__(self, pricesUsd: dict[str, float], config: StubServiceConfig | None = None, seed: int = 0) -> None:
+        super().__init__(config=config, seed=seed)
+        self.pricesUsd = {address.lower(): priceUsd for address, priceUsd in pricesUsd.items()}
+
+    def get_routes(self) -> list[Route]:
+        return [
+            Route('/{apiKey}/tokens/by-address', endpoint=self._get_prices_by_address, methods=['POST']),
+            Route('/{apiKey}/tokens/historical', endpoint=self._get_historical_prices, methods=['POST']),
+        ]
+
+    async def _get_prices_by_address(self, request: Request) -> Response:
+        errorResponse = await self._simulate_network()
+        if errorResponse is not None:
+            return errorResponse
+        self.methodCounts['tokens/by-address'] += 1
+        body = await request.json()
+        data = []
+        for addressItem in body.get('addresses', []):
+            priceUsd = self.pricesUsd.get(str(addressItem['address']).lower())
+            if priceUsd is None:
+                data.append({'network': addressItem['network'], 'address': addressItem['address'], 'prices': [], 'error': 'Token not found'})
+                continue
+            data.append({'network': addressItem['network'], 'address': addressItem['address'], 'prices': [{'currency': 'usd', 'value': f'{priceUsd}', 'lastUpdatedAt': ''}]})
+        return JSONResponse(content={'data': data})
+
+    async def _get_historical_prices(self, request: Request) -> Response:
+        errorResponse = await self._simulate_network()
+        if errorResponse is not None:
+            return errorResponse
+        self.methodCounts['tokens/historical'] += 1
+        body = await request.json()
+        priceUsd = self.pricesUsd.get(str(body.get('address', '')).lower())
+        if priceUsd is None:
+            return JSONResponse(content={'data': []})
+        intervalSeconds = 60 * 60 * 24 if body.get('interval') == '1d' else 60 * 60
+        startTimestamp = int(dt.datetime.fromisoformat(body['startTime']).timestamp())
+        endTimestamp = int(dt.datetime.fromisoformat(body['endTime']).timestamp())
+        points = []
+        for pointTimestamp in range(startTimestamp - startTimestamp % intervalSeconds, endTimestamp + 1, intervalSeconds):
+            priceUsd *= 1 + self.random.gauss(0, 0.002)
+            points.append({'value': f'{priceUsd}', 'timestamp': dt.datetime.fromtimestamp(pointTimestamp, tz=dt.UTC).strftime('%Y-%m-%dT%H:%M:%SZ')})
+        return JSONResponse(content={'data': points})
+
+
+class MorphoGraphqlStubService(StubService):
+    """Stands in for the Morpho Blue GraphQL API, answering market list and market by unique key queries from a fixed set of markets."""
+
+    name = 'morpho-graphql'
+
+    def __init__(self, markets: list[StubMarket], loanAddress: str, config: StubServiceConfig | None = None, seed: int = 0) -> None:
+        super().__init__(config=config, seed=seed)
+        self.markets = markets
+        self.loanAddress = loanAddress
+
+    def get_routes(self) -> list[Route]:
+        return [Route('/', endpoint=self._handle_query, methods=['POST'])]
+
+    def _build_market_item(self, market: StubMarket) -> dict[str, typing.Any]:  # type: ignore[explicit-any]
+        return {
+            'uniqueKey': market.unique_key,
+            'lltv': str(int(market.lltv * 1e18)),
+            'collateralAsset': {'address': market.collateral_address, 'symbol': market.collateral_symbol, 'decimals': market.collateral_decimals},
+            'loanAsset': {'address': self.loanAddress, 'symbol': 'USDC', 'decimals': 6},
+            'oracleAddress': market.get_oracle_address(),
+            'irmAddress': '0x' + keccak(text=f'irm-{market.unique_key}')[-20:].hex(),
+            'state': {
+                'borrowApy': market.borrow_apy,
+                'supplyApy': market.supply_apy,
+                'utilization': market.utilization,
+                'supplyAssets': str(STUB_MARKET_TOTAL_BORROW * 2),
+                'borrowAssets': str(STUB_MARKET_TOTAL_BORROW),
+            },
+            'oracleInfo': {'type': 'ChainlinkOracle'},
+        }
+
+    async def _handle_query(self, request: Request) -> Response:
+        errorResponse = await self._simulate_network()
+        if errorResponse is not None:
+            return errorResponse
+        body = await request.json()
+        variables = body.get('variables') or {}
+        uniqueKey = variables.get('uniqueKey')
+        if uniqueKey is not None:
+            self.methodCounts['marketByUniqueKey'] += 1
+            market = next((market for market in self.markets if market.unique_key.lower() == str(uniqueKey).lower()), None)
+            return JSONResponse(content={'data': {'marketByUniqueKey': self._build_market_item(market=market) if market else None}})
+        collateralAddress = variables.get('collateralAssetAddress')
+        self.methodCounts['markets'] += 1
+        markets = [market for market in self.markets if collateralAddress is None or market.collateral_address.lower() == str(collateralAddress).lower()]
+        items = [self._build_market_item(market=market) for market in markets]
+        return JSONResponse(content={'data': {'markets': {'items': items, 'pageInfo': {'countTotal': len(items), 'count': len(items), 'limit': 100, 'skip': 0}}}})
+
+
+class CdpStubService(StubService):
+    """Stands in for the Coinbase CDP wallet API, signing any hash with a fixed dummy signature."""
+
+    name = 'cdp'
+
+    def get_routes(self) -> list[Route]:
+        return [Route('/evm/accounts/{walletAddress}/sign', endpoint=self._sign_hash, methods=['POST'])]
+
+    async def _sign_hash(self, request: Request) -> Response:  # noqa: ARG002
+        errorResponse = await self._simulate_network()
+        if errorResponse is not None:
+            return errorResponse
+        self.methodCounts['sign'] += 1
+        return JSONResponse(content={'signature': '0x' + '11' * 65})
+
+
+class _StubServer(uvicorn.Server):
+    """A uvicorn server that sets an event once startup has finished, whether or not it succeeded."""
+
+    def __init__(self, config: uvicorn.Config) -> None:
+        super().__init__(config=config)
+        self.startupFinished = asyncio.Event()
+
+    async def startup(self, sockets: list[socket.socket] | None = None) -> None:
+        try:
+            await super().startup(sockets=sockets)
+        finally:
+            self.startupFinished.set()
+
+
+class StubServiceRunner:
+    """Serves each stub service from its own uvicorn server on a free localhost port within the current event loop."""
+
+    def __init__(self, services: list[StubService]) -> None:
+        self.services = services
+        self._servers: list[_StubServer] = []
+        self._tasks: list[asyncio.Task[None]] = []
+        self.urls: dict[str, str] = {}
+
+    async def start(self) -> None:
+        for service in self.services:
+            serverSocket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            serverSocket.bind(('127.0.0.1', 0))
+            port = serverSocket.getsockname()[1]
+            server = _StubServer(config=uvicorn.Config(app=service.build_app(), log_level='warning', lifespan='off', access_log=False))
+            self._servers.append(server)
+            self._tasks.append(asyncio.create_task(server.serve(sockets=[serverSocket])))
+            self.urls[service.name] = f'http://127.0.0.1:{port}'
+        await asyncio.gather(*[server.startupFinished.wait() for server in self._servers])
+        failedServiceNames = [service.name for service, server in zip(self.services, self._servers, strict=True) if not server.started]
+        if failedServiceNames:
+            await self.stop()
+            raise KibaException(f'Failed to start stub services: {failedServiceNames}')
+        logging.info(f'Started stub services: {self.urls}')
+
+    async def stop(self) -> None:
+        for server in self._servers:
+            server.should_exit = True
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    def get_request_counts(self) -> dict[str, int]:
+        return {service.name: service.requestCount for service in self.services}
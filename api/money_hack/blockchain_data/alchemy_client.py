@@ -15,14 +15,26 @@ from pydantic import BaseModel
 
 from money_hack import constants
 from money_hack import util
+from money_hack.blockchain_data.block_time_index import BlockTimeIndex
 from money_hack.blockchain_data.blockchain_data_client import BlockchainDataClient
 from money_hack.blockchain_data.blockchain_data_client import ClientAsset
 from money_hack.blockchain_data.blockchain_data_client import ClientAssetBalance
+from money_hack.blockchain_data.blockchain_data_client import ClientAssetHistoricPrice
 from money_hack.blockchain_data.blockchain_data_client import ClientAssetPrice
 from money_hack.blockchain_data.blockchain_data_client import ClientWalletErc20Transfer
 from money_hack.blockchain_data.blockchain_data_client import PriceNotFoundException
 from money_hack.blockchain_data.findblock_client import FindBlockClient
 
+DEFAULT_ALCHEMY_PRICES_API_URL = 'https://api.g.alchemy.com/prices/v1'
+# NOTE: the prices api rejects tokens/by-address requests with more addresses than this
+ALCHEMY_PRICES_MAX_ADDRESSES_PER_REQUEST = 25
+# NOTE: the longest time range the prices api accepts in one tokens/historical request for each interval
+ALCHEMY_HISTORICAL_PRICES_MAX_RANGE = {
+    '5m': datetime.timedelta(days=7),
+    '1h': datetime.timedelta(days=30),
+    '1d': datetime.timedelta(days=365),
+}
+
 
 class NftOwner(BaseModel):
     ownerAddress: str
@@ -30,11 +42,13 @@ class NftOwner(BaseModel):
 
 
 class AlchemyClient(BlockchainDataClient):
-    def __init__(self, requester: Requester, apiKey: str, cache: Cache, findBlockClient: FindBlockClient) -> None:
+    def __init__(self, requester: Requester, apiKey: str, cache: Cache, findBlockClient: FindBlockClient, pricesApiUrl: str = DEFAULT_ALCHEMY_PRICES_API_URL, blockTimeIndex: BlockTimeIndex | None = None) -> None:
         self.requester = requester
         self.apiKey = apiKey
         self.cache = cache
         self.findBlockClient = findBlockClient
+        self.pricesApiUrl = pricesApiUrl
+        self.blockTimeIndex = blockTimeIndex
 
     def _get_network_name(self, chainId: int) -> str:
         if chainId == constants.ETH_CHAIN_ID:
@@ -64,7 +78,7 @@ class AlchemyClient(BlockchainDataClient):
         return responseData['result']
 
     async def _make_prices_api_request(self, dataDict: JsonObject, path: str) -> typing.Any:  # type: ignore[explicit-any]
-        url = f'https://api.g.alchemy.com/prices/v1/{self.apiKey}/{path}'
+        url = f'{self.pricesApiUrl}/{self.apiKey}/{path}'
         headers = {'accept': 'application/json'}
         try:
             response = await self.requester.post_json(url=url, headers=headers, dataDict=dataDict, timeout=60)
@@ -126,7 +140,49 @@ class AlchemyClient(BlockchainDataClient):
         )
         return assetPrice
 
-    async def _get_block_timestamp(self, chainId: int, blockNumber: int) -> int:
+    async def _get_asset_current_prices_chunk(self, chainId: int, assetAddresses: list[str]) -> dict[str, ClientAssetPrice]:
+        networkName = self._get_network_name(chainId=chainId)
+        try:
+            responseData = await self._make_prices_api_request(
+                path='tokens/by-address',
+                dataDict={
+                    'addresses': [{'network': networkName, 'address': assetAddress} for assetAddress in assetAddresses],
+                },
+            )
+        except NotFoundException:
+            if len(assetAddresses) == 1:
+                return {}
+            # NOTE: a single unknown token can fail the whole request, so price each address on its own to keep the others
+            logging.warning(f'Bulk price request on chain {chainId} failed with an unknown token, retrying {len(assetAddresses)} addresses individually')
+            chunkResults = await asyncio.gather(*[self._get_asset_current_prices_chunk(chainId=chainId, assetAddresses=[assetAddress]) for assetAddress in assetAddresses])
+            return {assetAddress: price for chunkResult in chunkResults for assetAddress, price in chunkResult.items()}
+        requestedAddressMap = {assetAddress.lower(): assetAddress for assetAddress in assetAddresses}
+        prices: dict[str, ClientAssetPrice] = {}
+        for priceData in responseData['data']:
+            assetAddress = requestedAddressMap.get(str(priceData.get('address', '')).lower())
+            if assetAddress is None:
+                continue
+            price = next((price for price in (priceData.get('prices') or []) if price['currency'].lower() == 'usd'), None)
+            if price is None:
+                continue
+            prices[assetAddress] = ClientAssetPrice(priceUsd=float(price['value']))
+        return prices
+
+    async def get_asset_current_prices(self, chainId: int, assetAddresses: list[str]) -> dict[str, ClientAssetPrice]:
+        uniqueAddresses = list({assetAddress.lower(): assetAddress for assetAddress in assetAddresses}.values())
+        if not uniqueAddresses:
+            return {}
+        chunks = [uniqueAddresses[index : index + ALCHEMY_PRICES_MAX_ADDRESSES_PER_REQUEST] for index in range(0, len(uniqueAddresses), ALCHEMY_PRICES_MAX_ADDRESSES_PER_REQUEST)]
+        chunkResults = await asyncio.gather(*[self._get_asset_current_prices_chunk(chainId=chainId, assetAddresses=chunk) for chunk in chunks])
+        prices = {assetAddress: price for chunkResult in chunkResults for assetAddress, price in chunkResult.items()}
+        missingAddresses = [assetAddress for assetAddress in uniqueAddresses if assetAddress not in prices]
+        if missingAddresses:
+            logging.warning(f'No current price found for {len(missingAddresses)} assets on chain {chainId}: {missingAddresses}')
+        return prices
+
+    async def get_block_timestamp(self, chainId: int, blockNumber: int) -> int:
+        if self.blockTimeIndex is not None and self.blockTimeIndex.supports_chain(chainId=chainId):
+            return await self.blockTimeIndex.get_block_timestamp(chainId=chainId, blockNumber=blockNumber)
         cacheKey = f'alchemy-block-timestamp-{chainId}-{blockNumber}'
         cachedTimestamp = await util.get_json_from_optional_cache(cache=self.cache, key=cacheKey)
         if cachedTimestamp is not None:
@@ -145,7 +201,7 @@ class AlchemyClient(BlockchainDataClient):
         return timestamp
 
     async def get_asset_price_at_block(self, chainId: int, assetAddress: str, blockNumber: int) -> ClientAssetPrice:
-        timestamp = await self._get_block_timestamp(chainId=chainId, blockNumber=blockNumber)
+        timestamp = await self.get_block_timestamp(chainId=chainId, blockNumber=blockNumber)
         blockDatetime = datetime.datetime.fromtimestamp(timestamp, tz=datetime.UTC)
         responseData = await self._make_prices_api_request(
             path='tokens/historical',
@@ -180,6 +236,34 @@ class AlchemyClient(BlockchainDataClient):
         assetPrice = ClientAssetPrice(priceUsd=float(priceData['value']))
         return assetPrice
 
+    async def list_asset_historic_prices(self, chainId: int, assetAddress: str, startDate: datetime.datetime, endDate: datetime.datetime, interval: str = '1h') -> list[ClientAssetHistoricPrice]:
+        """List the asset's prices between startDate and endDate at the given interval, oldest first, splitting the range into as few requests as the api allows."""
+        maxRange = ALCHEMY_HISTORICAL_PRICES_MAX_RANGE[interval]
+        historicPrices: list[ClientAssetHistoricPrice] = []
+        chunkStartDate = startDate
+        while chunkStartDate < endDate:
+            chunkEndDate = min(chunkStartDate + maxRange, endDate)
+            responseData = await self._make_prices_api_request(
+                path='tokens/historical',
+                dataDict={
+                    'startTime': date_util.datetime_to_string(dt=chunkStartDate, dateFormat='%Y-%m-%dT%H:%M:%SZ'),
+                    'endTime': date_util.datetime_to_string(dt=chunkEndDate, dateFormat='%Y-%m-%dT%H:%M:%SZ'),
+                    'interval': interval,
+                    'network': self._get_network_name(chainId=chainId),
+                    'address': assetAddress,
+                },
+            )
+            for point in responseData.get('data') or []:
+                if not point.get('value') or not point.get('timestamp'):
+                    continue
+                pointDate = datetime.datetime.fromisoformat(point['timestamp'])
+                # NOTE: consecutive chunks share their boundary point
+                if historicPrices and pointDate <= historicPrices[-1].date:
+                    continue
+                historicPrices.append(ClientAssetHistoricPrice(date=pointDate, priceUsd=float(point['value'])))
+            chunkStartDate = chunkEndDate
+        return historicPrices
+
     async def get_wallet_asset_balances(self, chainId: int, walletAddress: str) -> list[ClientAssetBalance]:
         ethResponseData = await self._make_method_request(
             chainId=chainId,
@@ -214,6 +298,8 @@ class AlchemyClient(BlockchainDataClient):
         return balances
 
     async def get_block_number_at_date_start(self, chainId: int, date: datetime.date) -> int:
+        if self.blockTimeIndex is not None and self.blockTimeIndex.supports_chain(chainId=chainId):
+            return await self.blockTimeIndex.get_block_number_at_date_start(chainId=chainId, date=date)
         return await self.findBlockClient.get_block_number_at_date_start(chainId=chainId, date=date)
 
     async def list_wallet_erc20_transfers(self, chainId: int, walletAddress: str, fromBlock: int, toBlock: int) -> list[ClientWalletErc20Transfer]:
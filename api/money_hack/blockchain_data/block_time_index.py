@@ -0,0 +1,165 @@
+import asyncio
+import bisect
+import datetime as dt
+import time
+
+from core import logging
+from core.caching.cache import Cache
+from core.exceptions import NotFoundException
+from core.util import date_util
+from core.web3.eth_client import RestEthClient
+
+from money_hack import constants
+from money_hack import util
+from money_hack.blockchain_data.findblock_client import FindBlockClient
+
+BLOCK_TIME_INDEX_CACHE_EXPIRY_SECONDS = 60 * 60 * 24 * 365
+# NOTE: anchors added within this delay of each other are persisted together in one cache write
+BLOCK_TIME_INDEX_PERSIST_DELAY_SECONDS = 30
+# NOTE: estimates on a fixed block time chain land on the right block first time unless the chain stalled, so this only bounds pathological cases
+MAX_BLOCK_ESTIMATE_ATTEMPTS = 4
+# NOTE: anchors on chains without a fixed block time never become redundant, so their number is capped
+MAX_ANCHORS_PER_CHAIN = 10000
+
+
+class BlockTimeIndex:
+    """Converts between block numbers and timestamps from a sparse set of verified anchor blocks per chain.
+    On chains with a fixed block time, two anchors whose timestamps are exactly the block time apart per block pin down every block
+    between them, so lookups inside a verified span need no RPC call and lookups outside it need one to extend it.
+    Anchors that add nothing are dropped, and the rest are persisted to the cache so the index keeps growing across restarts.
+    Chains without a fixed block time are answered from exact anchors only, falling back to FindBlock for timestamp lookups.
+    """
+
+    def __init__(self, ethClients: dict[int, RestEthClient], findBlockClient: FindBlockClient | None = None, cache: Cache | None = None, persistDelaySeconds: float = BLOCK_TIME_INDEX_PERSIST_DELAY_SECONDS) -> None:
+        self.ethClients = ethClients
+        self.findBlockClient = findBlockClient
+        self.cache = cache
+        self.persistDelaySeconds = persistDelaySeconds
+        self._anchors: dict[int, list[tuple[int, int]]] = {}
+        self._persistTasks: dict[int, asyncio.Task[None]] = {}
+        self._fullChainIds: set[int] = set()
+
+    def supports_chain(self, chainId: int) -> bool:
+        return chainId in self.ethClients
+
+    @staticmethod
+    def _get_cache_key(chainId: int) -> str:
+        return f'block-time-index-{chainId}'
+
+    def _get_eth_client(self, chainId: int) -> RestEthClient:
+        ethClient = self.ethClients.get(chainId)
+        if ethClient is None:
+            raise NotFoundException(f'No eth client configured for chain {chainId}')
+        return ethClient
+
+    async def _get_anchors(self, chainId: int) -> list[tuple[int, int]]:
+        anchors = self._anchors.get(chainId)
+        if anchors is not None:
+            return anchors
+        anchors = []
+        self._anchors[chainId] = anchors
+        try:
+            anchorsData = await util.get_json_from_optional_cache(cache=self.cache, key=self._get_cache_key(chainId=chainId))
+        except Exception as e:  # noqa: BLE001
+            logging.warning(f'Failed to load block time index for chain {chainId}: {e}')
+            anchorsData = None
+        # NOTE: anchors added while the cache was being read are kept alongside the loaded ones
+        for blockNumber, timestamp in anchorsData or []:
+            self._insert_anchor(chainId=chainId, anchors=anchors, blockNumber=int(blockNumber), timestamp=int(timestamp))
+        return anchors
+
+    @staticmethod
+    def _is_regular_span(chainId: int, start: tuple[int, int], end: tuple[int, int]) -> bool:
+        blockTimeSeconds = constants.CHAIN_BLOCK_TIME_SECONDS_MAP.get(chainId)
+        if blockTimeSeconds is None:
+            return False
+        return end[1] - start[1] == (end[0] - start[0]) * blockTimeSeconds
+
+    def _insert_anchor(self, chainId: int, anchors: list[tuple[int, int]], blockNumber: int, timestamp: int) -> bool:
+        """Insert an anchor, pruning any it makes redundant, and return whether the anchors changed."""
+        index = bisect.bisect_left(anchors, (blockNumber, timestamp))
+        if index < len(anchors) and anchors[index][0] == blockNumber:
+            return False
+        if len(anchors) >= MAX_ANCHORS_PER_CHAIN:
+            if chainId not in self._fullChainIds:
+                self._fullChainIds.add(chainId)
+                logging.warning(f'Block time index for chain {chainId} reached {MAX_ANCHORS_PER_CHAIN} anchors, new blocks will not be indexed')
+            return False
+        anchors.insert(index, (blockNumber, timestamp))
+        # NOTE: an anchor inside one regular span is redundant because its neighbours already pin it down
+        for middleIndex in (index + 1, index, index - 1):
+            if 0 < middleIndex < len(anchors) - 1 and self._is_regular_span(chainId=chainId, start=anchors[middleIndex - 1], end=anchors[middleIndex]) and self._is_regular_span(chainId=chainId, start=anchors[middleIndex], end=anchors[middleIndex + 1]):
+                del anchors[middleIndex]
+        return True
+
+    async def _persist_after_delay(self, chainId: int) -> None:
+        await asyncio.sleep(self.persistDelaySeconds)
+        # NOTE: unregistered before saving so anchors added during the save schedule another one
+        del self._persistTasks[chainId]
+        anchors = self._anchors.get(chainId, [])
+        try:
+            await util.save_json_to_optional_cache(cache=self.cache, key=self._get_cache_key(chainId=chainId), value=[list(anchor) for anchor in anchors], expirySeconds=BLOCK_TIME_INDEX_CACHE_EXPIRY_SECONDS)
+        except Exception as e:  # noqa: BLE001
+            logging.warning(f'Failed to persist block time index for chain {chainId}: {e}')
+
+    async def _add_anchor(self, chainId: int, blockNumber: int, timestamp: int) -> None:
+        anchors = await self._get_anchors(chainId=chainId)
+        hasChanged = self._insert_anchor(chainId=chainId, anchors=anchors, blockNumber=blockNumber, timestamp=timestamp)
+        if hasChanged and self.cache is not None and chainId not in self._persistTasks:
+            self._persistTasks[chainId] = asyncio.create_task(self._persist_after_delay(chainId=chainId))
+
+    async def _fetch_block_timestamp(self, chainId: int, blockNumber: int) -> int:
+        blockData = await self._get_eth_client(chainId=chainId).get_block(blockNumber=blockNumber)
+        timestamp = int(blockData['timestamp'])
+        await self._add_anchor(chainId=chainId, blockNumber=blockNumber, timestamp=timestamp)
+        return timestamp
+
+    def _find_timestamp(self, chainId: int, anchors: list[tuple[int, int]], blockNumber: int) -> int | None:
+        index = bisect.bisect_left(anchors, (blockNumber, -1))
+        if index < len(anchors) and anchors[index][0] == blockNumber:
+            return anchors[index][1]
+        if 0 < index < len(anchors) and self._is_regular_span(chainId=chainId, start=anchors[index - 1], end=anchors[index]):
+            return anchors[index - 1][1] + (blockNumber - anchors[index - 1][0]) * constants.CHAIN_BLOCK_TIME_SECONDS_MAP[chainId]
+        return None
+
+    async def get_block_timestamp(self, chainId: int, blockNumber: int) -> int:
+        anchors = await self._get_anchors(chainId=chainId)
+        timestamp = self._find_timestamp(chainId=chainId, anchors=anchors, blockNumber=blockNumber)
+        if timestamp is not None:
+            return timestamp
+        return await self._fetch_block_timestamp(chainId=chainId, blockNumber=blockNumber)
+
+    async def get_block_number_at_timestamp(self, chainId: int, timestamp: int) -> int:
+        """Return the last block produced at or before timestamp."""
+        blockTimeSeconds = constants.CHAIN_BLOCK_TIME_SECONDS_MAP.get(chainId)
+        if blockTimeSeconds is None or not self.supports_chain(chainId=chainId):
+            if self.findBlockClient is None:
+                raise NotFoundException(f'Cannot look up blocks by timestamp on chain {chainId}')
+            return await self.findBlockClient.get_block_number_at_timestamp(chainId=chainId, timestamp=timestamp)
+        anchors = await self._get_anchors(chainId=chainId)
+        index = bisect.bisect_right([anchorTimestamp for _blockNumber, anchorTimestamp in anchors], timestamp)
+        if 0 < index < len(anchors) and self._is_regular_span(chainId=chainId, start=anchors[index - 1], end=anchors[index]):
+            return anchors[index - 1][0] + (timestamp - anchors[index - 1][1]) // blockTimeSeconds
+        if len(anchors) == 0 or (index == len(anchors) and timestamp >= time.time() - blockTimeSeconds):
+            # NOTE: nothing to estimate from yet, or the block may not have been produced, so the chain head is the starting point
+            latestBlockNumber = await self._get_eth_client(chainId=chainId).get_latest_block_number()
+            latestTimestamp = await self.get_block_timestamp(chainId=chainId, blockNumber=latestBlockNumber)
+            if timestamp >= latestTimestamp:
+                return latestBlockNumber
+            anchors = await self._get_anchors(chainId=chainId)
+            index = bisect.bisect_right([anchorTimestamp for _blockNumber, anchorTimestamp in anchors], timestamp)
+        referenceBlockNumber, referenceTimestamp = anchors[index - 1] if index > 0 else anchors[index]
+        estimatedBlockNumber = max(referenceBlockNumber + (timestamp - referenceTimestamp) // blockTimeSeconds, 0)
+        for _ in range(MAX_BLOCK_ESTIMATE_ATTEMPTS):
+            estimatedTimestamp = await self.get_block_timestamp(chainId=chainId, blockNumber=estimatedBlockNumber)
+            if estimatedTimestamp <= timestamp < estimatedTimestamp + blockTimeSeconds or (estimatedBlockNumber == 0 and timestamp < estimatedTimestamp):
+                return estimatedBlockNumber
+            estimatedBlockNumber = max(estimatedBlockNumber + (timestamp - estimatedTimestamp) // blockTimeSeconds, 0)
+        if self.findBlockClient is None:
+            raise NotFoundException(f'Could not find the block at timestamp {timestamp} on chain {chainId}')
+        logging.warning(f'Block estimate for timestamp {timestamp} on chain {chainId} did not converge, asking FindBlock')
+        return await self.findBlockClient.get_block_number_at_timestamp(chainId=chainId, timestamp=timestamp)
+
+    async def get_block_number_at_date_start(self, chainId: int, date: dt.date) -> int:
+        timestamp = date_util.start_of_day(dt=date_util.datetime_from_date(date=date))
+        return await self.get_block_number_at_timestamp(chainId=chainId, timestamp=int(timestamp.timestamp()))
@@ -1,3 +1,4 @@
+import asyncio
 import datetime
 from abc import ABC
 from abc import abstractmethod
@@ -26,6 +27,11 @@ class ClientAssetPrice(BaseModel):
     priceUsd: float
 
 
+class ClientAssetHistoricPrice(BaseModel):
+    date: datetime.datetime
+    priceUsd: float
+
+
 class ClientAssetBalance(BaseModel):
     assetAddress: str
     balance: int
@@ -60,6 +66,19 @@ class BlockchainDataClient(ABC):
     async def get_asset_current_price(self, chainId: int, assetAddress: str) -> ClientAssetPrice:
         raise NotImplementedError
 
+    async def get_asset_current_prices(self, chainId: int, assetAddresses: list[str]) -> dict[str, ClientAssetPrice]:
+        """Get current prices for several assets, keyed by the requested address. Assets without a price are left out."""
+        uniqueAddresses = list({assetAddress.lower(): assetAddress for assetAddress in assetAddresses}.values())
+        priceResults = await asyncio.gather(*[self.get_asset_current_price(chainId=chainId, assetAddress=assetAddress) for assetAddress in uniqueAddresses], return_exceptions=True)
+        prices: dict[str, ClientAssetPrice] = {}
+        for assetAddress, priceResult in zip(uniqueAddresses, priceResults, strict=True):
+            if isinstance(priceResult, NotFoundException):
+                continue
+            if isinstance(priceResult, BaseException):
+                raise priceResult
+            prices[assetAddress] = priceResult
+        return prices
+
     @abstractmethod
     async def get_asset_price_at_block(self, chainId: int, assetAddress: str, blockNumber: int) -> ClientAssetPrice:
         raise NotImplementedError
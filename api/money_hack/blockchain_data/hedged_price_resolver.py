@@ -0,0 +1,191 @@
+import asyncio
+import collections
+import math
+import time
+import typing
+from abc import ABC
+from abc import abstractmethod
+
+from core import logging
+from core.exceptions import NotFoundException
+
+from money_hack.blockchain_data.blockchain_data_client import BlockchainDataClient
+from money_hack.blockchain_data.blockchain_data_client import ClientAssetPrice
+from money_hack.blockchain_data.blockchain_data_client import PriceNotFoundException
+
+LATENCY_EWMA_ALPHA = 0.2
+ERROR_EWMA_ALPHA = 0.1
+LATENCY_WINDOW_SIZE = 100
+# NOTE: assumed latency for a source that has not answered yet, so untried sources keep their configured order
+DEFAULT_SOURCE_LATENCY_SECONDS = 1.0
+MIN_HEDGE_DELAY_SECONDS = 0.05
+MAX_HEDGE_DELAY_SECONDS = 5.0
+# NOTE: sources failing this often are ranked as if they were this much slower
+MAX_ERROR_RATE_PENALTY = 20.0
+
+ResultType = typing.TypeVar('ResultType')
+
+
+class PriceSource(ABC):
+    """A provider of current asset prices that the hedged resolver can race against others."""
+
+    name: str
+
+    @abstractmethod
+    async def get_asset_current_price(self, chainId: int, assetAddress: str) -> ClientAssetPrice:
+        raise NotImplementedError
+
+    async def get_asset_current_prices(self, chainId: int, assetAddresses: list[str]) -> dict[str, ClientAssetPrice]:
+        uniqueAddresses = list({assetAddress.lower(): assetAddress for assetAddress in assetAddresses}.values())
+        priceResults = await asyncio.gather(*[self.get_asset_current_price(chainId=chainId, assetAddress=assetAddress) for assetAddress in uniqueAddresses], return_exceptions=True)
+        prices: dict[str, ClientAssetPrice] = {}
+        for assetAddress, priceResult in zip(uniqueAddresses, priceResults, strict=True):
+            if isinstance(priceResult, NotFoundException):
+                continue
+            if isinstance(priceResult, BaseException):
+                raise priceResult
+            prices[assetAddress] = priceResult
+        return prices
+
+
+class ClientPriceSource(PriceSource):
+    """Exposes the current price endpoints of a blockchain data client, such as Alchemy or Moralis, as a price source."""
+
+    def __init__(self, name: str, client: BlockchainDataClient) -> None:
+        self.name = name
+        self.client = client
+
+    async def get_asset_current_price(self, chainId: int, assetAddress: str) -> ClientAssetPrice:
+        return await self.client.get_asset_current_price(chainId=chainId, assetAddress=assetAddress)
+
+    async def get_asset_current_prices(self, chainId: int, assetAddresses: list[str]) -> dict[str, ClientAssetPrice]:
+        return await self.client.get_asset_current_prices(chainId=chainId, assetAddresses=assetAddresses)
+
+
+class _SourceStats:
+    def __init__(self) -> None:
+        self.latencyEwma: float | None = None
+        self.errorEwma = 0.0
+        self.recentLatencies: collections.deque[float] = collections.deque(maxlen=LATENCY_WINDOW_SIZE)
+
+    def record_success(self, latencySeconds: float) -> None:
+        self.latencyEwma = latencySeconds if self.latencyEwma is None else self.latencyEwma + LATENCY_EWMA_ALPHA * (latencySeconds - self.latencyEwma)
+        self.errorEwma -= ERROR_EWMA_ALPHA * self.errorEwma
+        self.recentLatencies.append(latencySeconds)
+
+    def record_error(self) -> None:
+        self.errorEwma += ERROR_EWMA_ALPHA * (1 - self.errorEwma)
+
+    def get_expected_latency(self) -> float:
+        latency = self.latencyEwma if self.latencyEwma is not None else DEFAULT_SOURCE_LATENCY_SECONDS
+        return latency * min(1 / max(1 - self.errorEwma, 1 / MAX_ERROR_RATE_PENALTY), MAX_ERROR_RATE_PENALTY)
+
+    def get_hedge_delay(self) -> float:
+        if len(self.recentLatencies) == 0:
+            return MAX_HEDGE_DELAY_SECONDS
+        sortedLatencies = sorted(self.recentLatencies)
+        p95Latency = sortedLatencies[min(math.ceil(len(sortedLatencies) * 0.95) - 1, len(sortedLatencies) - 1)]
+        return min(max(p95Latency, MIN_HEDGE_DELAY_SECONDS), MAX_HEDGE_DELAY_SECONDS)
+
+
+class HedgedPriceResolver(PriceSource):
+    """Fetches current prices by racing several price sources.
+    The source with the lowest expected latency is asked first. If it has not answered within its p95 latency, the next source is asked too,
+    and the first valid answer wins. A source that fails hands over to the next one straight away.
+    Latency and error rates are tracked per source as EWMAs so the order adapts to how providers are behaving.
+    """
+
+    name = 'hedged'
+
+    def __init__(self, sources: list[PriceSource]) -> None:
+        if len(sources) == 0:
+            raise ValueError('HedgedPriceResolver needs at least one price source')
+        self.sources = sources
+        self._sourceStats = {source.name: _SourceStats() for source in sources}
+
+    def get_source_order(self) -> list[PriceSource]:
+        # NOTE: sorted is stable so sources with equal expected latency keep their configured order
+        return sorted(self.sources, key=lambda source: self._sourceStats[source.name].get_expected_latency())
+
+    async def _timed_request(self, source: PriceSource, requestFactory: typing.Callable[[PriceSource], typing.Awaitable[ResultType]], isValid: typing.Callable[[ResultType], bool]) -> ResultType:
+        startTime = time.monotonic()
+        try:
+            result = await requestFactory(source)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            self._sourceStats[source.name].record_error()
+            raise
+        if not isValid(result):
+            self._sourceStats[source.name].record_error()
+            raise PriceNotFoundException(f'Price source {source.name} returned no valid price')
+        self._sourceStats[source.name].record_success(latencySeconds=time.monotonic() - startTime)
+        return result
+
+    async def _race(self, requestFactory: typing.Callable[[PriceSource], typing.Awaitable[ResultType]], isValid: typing.Callable[[ResultType], bool], description: str) -> ResultType:
+        pendingSources = self.get_source_order()
+        runningTasks: dict[asyncio.Task[ResultType], PriceSource] = {}
+        lastError: BaseException | None = None
+
+        def start_next_source() -> PriceSource:
+            source = pendingSources.pop(0)
+            runningTasks[asyncio.create_task(self._timed_request(source=source, requestFactory=requestFactory, isValid=isValid))] = source
+            return source
+
+        try:
+            lastStartedSource = start_next_source()
+            while runningTasks:
+                hedgeDelay = self._sourceStats[lastStartedSource.name].get_hedge_delay() if pendingSources else None
+                doneTasks, _ = await asyncio.wait(runningTasks.keys(), timeout=hedgeDelay, return_when=asyncio.FIRST_COMPLETED)
+                if not doneTasks:
+                    logging.info(f'Hedging price request for {description} to {pendingSources[0].name} after {hedgeDelay:.2f}s without an answer from {lastStartedSource.name}')
+                    lastStartedSource = start_next_source()
+                    continue
+                for doneTask in doneTasks:
+                    source = runningTasks.pop(doneTask)
+                    taskError = doneTask.exception()
+                    if taskError is None:
+                        return doneTask.result()
+                    logging.warning(f'Price source {source.name} failed for {description}: {taskError}')
+                    lastError = taskError
+                # NOTE: a failed source hands over to the next one without waiting for the hedge delay
+                if pendingSources:
+                    lastStartedSource = start_next_source()
+            raise PriceNotFoundException(f'All price sources failed for {description}: {lastError}')
+        finally:
+            for runningTask in runningTasks:
+                if not runningTask.done():
+                    runningTask.cancel()
+                elif not runningTask.cancelled():
+                    # NOTE: retrieved so losing answers that completed in the same step are not reported as unhandled
+                    runningTask.exception()
+
+    async def get_asset_current_price(self, chainId: int, assetAddress: str) -> ClientAssetPrice:
+        return await self._race(
+            requestFactory=lambda source: source.get_asset_current_price(chainId=chainId, assetAddress=assetAddress),
+            isValid=lambda price: math.isfinite(price.priceUsd) and price.priceUsd > 0,
+            description=f'{assetAddress} on chain {chainId}',
+        )
+
+    async def get_asset_current_prices(self, chainId: int, assetAddresses: list[str]) -> dict[str, ClientAssetPrice]:
+        """Race the sources' bulk requests, then resolve any assets the winning answer left out one by one."""
+        uniqueAddresses = list({assetAddress.lower(): assetAddress for assetAddress in assetAddresses}.values())
+        if len(uniqueAddresses) == 0:
+            return {}
+        try:
+            prices = await self._race(
+                requestFactory=lambda source: source.get_asset_current_prices(chainId=chainId, assetAddresses=uniqueAddresses),
+                isValid=lambda prices: len(prices) > 0 and all(math.isfinite(price.priceUsd) and price.priceUsd > 0 for price in prices.values()),
+                description=f'{len(uniqueAddresses)} assets on chain {chainId}',
+            )
+        except NotFoundException:
+            prices = {}
+        missingAddresses = [assetAddress for assetAddress in uniqueAddresses if assetAddress not in prices]
+        priceResults = await asyncio.gather(*[self.get_asset_current_price(chainId=chainId, assetAddress=assetAddress) for assetAddress in missingAddresses], return_exceptions=True)
+        for assetAddress, priceResult in zip(missingAddresses, priceResults, strict=True):
+            if isinstance(priceResult, asyncio.CancelledError):
+                raise priceResult
+            if isinstance(priceResult, BaseException):
+                continue
+            prices[assetAddress] = priceResult
+        return prices
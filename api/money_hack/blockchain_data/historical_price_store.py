@@ -0,0 +1,158 @@
+import asyncio
+import datetime as dt
+import itertools
+import time
+
+from core import logging
+from core.util import chain_util
+from core.util import date_util
+
+from money_hack.blockchain_data.alchemy_client import AlchemyClient
+from money_hack.blockchain_data.blockchain_data_client import ClientAssetHistoricPrice
+from money_hack.blockchain_data.blockchain_data_client import PriceNotFoundException
+from money_hack.model import HistoricalPrice
+from money_hack.store.database_store import DatabaseStore
+
+HISTORICAL_PRICE_INTERVAL = '1h'
+HISTORICAL_PRICE_INTERVAL_SECONDS = 60 * 60
+# NOTE: stored points further apart than this are treated as a hole in the data rather than interpolated across
+MAX_INTERPOLATION_GAP_SECONDS = HISTORICAL_PRICE_INTERVAL_SECONDS * 2
+# NOTE: backfills cover whole aligned blocks so a walk through time fetches each stretch of history once
+BACKFILL_BLOCK_SECONDS = 60 * 60 * 24 * 7
+
+
+def _to_timestamp(date: dt.datetime) -> float:
+    return date_util.datetime_to_utc_naive_datetime(dt=date).replace(tzinfo=dt.UTC).timestamp()
+
+
+def _from_timestamp(timestamp: float) -> dt.datetime:
+    return dt.datetime.fromtimestamp(timestamp, tz=dt.UTC)
+
+
+def interpolate_price(before: HistoricalPrice, after: HistoricalPrice, date: dt.datetime) -> float:
+    """Linearly interpolate between two stored prices at date, which must lie between them."""
+    beforeTimestamp = _to_timestamp(date=before.priceDate)
+    afterTimestamp = _to_timestamp(date=after.priceDate)
+    if afterTimestamp <= beforeTimestamp:
+        return before.priceUsd
+    fraction = (_to_timestamp(date=date) - beforeTimestamp) / (afterTimestamp - beforeTimestamp)
+    return before.priceUsd + (after.priceUsd - before.priceUsd) * fraction
+
+
+class HistoricalPriceStore:
+    """Historical asset prices served from a local table, backfilled from Alchemy's prices api in bulk ranges.
+    Historical prices never change, so each stretch of history is fetched once as hourly points and every later lookup is answered from the
+    database, interpolating between the stored points either side of the requested time.
+    """
+
+    def __init__(self, databaseStore: DatabaseStore, alchemyClient: AlchemyClient) -> None:
+        self.databaseStore = databaseStore
+        self.alchemyClient = alchemyClient
+        # NOTE: blocks already backfilled by this process, with when, so blocks with no data upstream are not refetched on every lookup
+        self._backfilledBlocks: dict[tuple[int, str, int], float] = {}
+        self._inflightBackfills: dict[tuple[int, str, int], asyncio.Task[None]] = {}
+
+    @staticmethod
+    def _get_block_starts(startTimestamp: float, endTimestamp: float) -> list[int]:
+        firstBlockStart = int(startTimestamp // BACKFILL_BLOCK_SECONDS) * BACKFILL_BLOCK_SECONDS
+        return list(range(firstBlockStart, int(endTimestamp) + 1, BACKFILL_BLOCK_SECONDS))
+
+    def _is_block_backfilled(self, key: tuple[int, str, int]) -> bool:
+        backfilledTime = self._backfilledBlocks.get(key)
+        if backfilledTime is None:
+            return False
+        # NOTE: the block containing now keeps gaining points so it is only trusted for one interval after it was fetched
+        blockEndTimestamp = key[2] + BACKFILL_BLOCK_SECONDS
+        return backfilledTime >= blockEndTimestamp or time.time() - backfilledTime < HISTORICAL_PRICE_INTERVAL_SECONDS
+
+    async def _backfill_block(self, chainId: int, assetAddress: str, blockStart: int) -> None:
+        blockEndTimestamp = min(blockStart + BACKFILL_BLOCK_SECONDS, time.time())
+        historicPrices = await self.alchemyClient.list_asset_historic_prices(
+            chainId=chainId,
+            assetAddress=assetAddress,
+            startDate=_from_timestamp(timestamp=blockStart),
+            endDate=_from_timestamp(timestamp=blockEndTimestamp),
+            interval=HISTORICAL_PRICE_INTERVAL,
+        )
+        # NOTE: the backfill task is shared by every caller waiting on it, so it commits through its own connection rather than the creator's
+        await self.databaseStore.run_in_own_context_connection(lambda: self.save_prices(chainId=chainId, assetAddress=assetAddress, historicPrices=historicPrices))
+        self._backfilledBlocks[(chainId, assetAddress, blockStart)] = time.time()
+        logging.info(f'Backfilled {len(historicPrices)} historical prices for {assetAddress} on chain {chainId} from {_from_timestamp(timestamp=blockStart).date()}')
+
+    def _on_backfill_done(self, key: tuple[int, str, int], task: asyncio.Task[None]) -> None:
+        self._inflightBackfills.pop(key, None)
+        # NOTE: retrieving the exception here keeps backfills whose callers were cancelled from being reported as unhandled
+        if not task.cancelled() and task.exception() is not None:
+            logging.warning(f'Historical price backfill for {key[1]} on chain {key[0]} failed: {task.exception()}')
+
+    def _get_inflight_backfill(self, key: tuple[int, str, int]) -> asyncio.Task[None]:
+        backfill = self._inflightBackfills.get(key)
+        if backfill is None:
+            backfill = asyncio.create_task(self._backfill_block(chainId=key[0], assetAddress=key[1], blockStart=key[2]))
+            self._inflightBackfills[key] = backfill
+            backfill.add_done_callback(lambda task: self._on_backfill_done(key=key, task=task))
+        return backfill
+
+    async def backfill(self, chainId: int, assetAddress: str, startDate: dt.datetime, endDate: dt.datetime) -> None:
+        """Make sure every block overlapping the range has been fetched into the table. Concurrent callers share in-flight backfills."""
+        assetAddress = chain_util.normalize_address(assetAddress)
+        backfills: list[asyncio.Task[None]] = []
+        for blockStart in self._get_block_starts(startTimestamp=_to_timestamp(date=startDate), endTimestamp=min(_to_timestamp(date=endDate), time.time())):
+            key = (chainId, assetAddress, blockStart)
+            if self._is_block_backfilled(key=key):
+                continue
+            backfills.append(self._get_inflight_backfill(key=key))
+        # NOTE: shielded so one caller being cancelled does not cancel the backfill for everyone waiting on it
+        await asyncio.gather(*[asyncio.shield(backfill) for backfill in backfills])
+
+    async def save_prices(self, chainId: int, assetAddress: str, historicPrices: list[ClientAssetHistoricPrice]) -> None:
+        await self.databaseStore.create_historical_prices(
+            historicalPrices=[
+                {
+                    'chainId': chainId,
+                    'assetAddress': chain_util.normalize_address(assetAddress),
+                    'priceDate': date_util.datetime_to_utc_naive_datetime(dt=historicPrice.date),
+                    'priceUsd': historicPrice.priceUsd,
+                }
+                for historicPrice in historicPrices
+            ],
+        )
+
+    async def _get_stored_price_at(self, chainId: int, assetAddress: str, date: dt.datetime) -> float | None:
+        # NOTE: run one after the other since a connection can only serve one statement at a time
+        before = await self.databaseStore.get_historical_price_at_or_before(chainId=chainId, assetAddress=assetAddress, date=date)
+        after = await self.databaseStore.get_historical_price_at_or_after(chainId=chainId, assetAddress=assetAddress, date=date)
+        dateTimestamp = _to_timestamp(date=date)
+        if before is not None and after is not None and _to_timestamp(date=after.priceDate) - _to_timestamp(date=before.priceDate) <= MAX_INTERPOLATION_GAP_SECONDS:
+            return interpolate_price(before=before, after=after, date=date)
+        # NOTE: the hour in progress has no point after it yet, so the latest point stands in while it is recent enough
+        if before is not None and after is None and time.time() - dateTimestamp < MAX_INTERPOLATION_GAP_SECONDS and dateTimestamp - _to_timestamp(date=before.priceDate) <= MAX_INTERPOLATION_GAP_SECONDS:
+            return before.priceUsd
+        return None
+
+    async def get_price_at(self, chainId: int, assetAddress: str, date: dt.datetime) -> float:
+        """Return the asset's USD price at date, backfilling the surrounding history first if the table does not cover it."""
+        price = await self._get_stored_price_at(chainId=chainId, assetAddress=assetAddress, date=date)
+        if price is not None:
+            return price
+        gapDelta = dt.timedelta(seconds=MAX_INTERPOLATION_GAP_SECONDS)
+        await self.backfill(chainId=chainId, assetAddress=assetAddress, startDate=date - gapDelta, endDate=date + gapDelta)
+        price = await self._get_stored_price_at(chainId=chainId, assetAddress=assetAddress, date=date)
+        if price is None:
+            raise PriceNotFoundException(f'No historical price found for asset {assetAddress} on chain {chainId} at {date}')
+        return price
+
+    async def list_prices(self, chainId: int, assetAddress: str, startDate: dt.datetime, endDate: dt.datetime) -> list[HistoricalPrice]:
+        """List the stored prices between startDate and endDate, oldest first, backfilling first if the range has holes."""
+        historicalPrices = await self.databaseStore.list_historical_prices(chainId=chainId, assetAddress=assetAddress, startDate=startDate, endDate=endDate)
+        if self._covers_range(historicalPrices=historicalPrices, startDate=startDate, endDate=endDate):
+            return historicalPrices
+        await self.backfill(chainId=chainId, assetAddress=assetAddress, startDate=startDate, endDate=endDate)
+        return await self.databaseStore.list_historical_prices(chainId=chainId, assetAddress=assetAddress, startDate=startDate, endDate=endDate)
+
+    @staticmethod
+    def _covers_range(historicalPrices: list[HistoricalPrice], startDate: dt.datetime, endDate: dt.datetime) -> bool:
+        if len(historicalPrices) == 0:
+            return False
+        timestamps = [_to_timestamp(date=startDate)] + [_to_timestamp(date=historicalPrice.priceDate) for historicalPrice in historicalPrices] + [min(_to_timestamp(date=endDate), time.time())]
+        return all(nextTimestamp - timestamp <= MAX_INTERPOLATION_GAP_SECONDS for timestamp, nextTimestamp in itertools.pairwise(timestamps))
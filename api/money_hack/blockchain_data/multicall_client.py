@@ -0,0 +1,158 @@
+# mypy: disable-error-code="typeddict-unknown-key"
+
+import asyncio
+import typing
+from dataclasses import dataclass
+
+from core import logging
+from core.util import chain_util
+from core.web3.eth_client import ABI
+from core.web3.eth_client import RestEthClient
+from eth_abi import decode
+from eth_typing import ABIComponent
+
+MULTICALL3_ADDRESS = '0xcA11bde05977b3631167028862bE2a173976CA11'
+
+MULTICALL3_ABI: ABI = [
+    {
+        'inputs': [
+            {
+                'components': [
+                    {'internalType': 'address', 'name': 'target', 'type': 'address'},
+                    {'internalType': 'bool', 'name': 'allowFailure', 'type': 'bool'},
+                    {'internalType': 'bytes', 'name': 'callData', 'type': 'bytes'},
+                ],
+                'internalType': 'struct Multicall3.Call3[]',
+                'name': 'calls',
+                'type': 'tuple[]',
+            }
+        ],
+        'name': 'aggregate3',
+        'outputs': [
+            {
+                'components': [
+                    {'internalType': 'bool', 'name': 'success', 'type': 'bool'},
+                    {'internalType': 'bytes', 'name': 'returnData', 'type': 'bytes'},
+                ],
+                'internalType': 'struct Multicall3.Result[]',
+                'name': 'returnData',
+                'type': 'tuple[]',
+            }
+        ],
+        'stateMutability': 'payable',
+        'type': 'function',
+    },
+    {
+        'inputs': [],
+        'name': 'getCurrentBlockTimestamp',
+        'outputs': [{'internalType': 'uint256', 'name': 'timestamp', 'type': 'uint256'}],
+        'stateMutability': 'view',
+        'type': 'function',
+    },
+]
+
+# NOTE: keeps each aggregate3 request comfortably under common RPC eth_call payload limits
+DEFAULT_MAX_CALLDATA_BYTES = 24_000
+# NOTE: abi encoding overhead of a single Call3 tuple (offset, target, allowFailure, bytes offset and length)
+CALL3_OVERHEAD_BYTES = 5 * 32
+# NOTE: results pinned to a block never change so the most recent blocks are memoized
+MAX_MEMOIZED_BLOCKS = 4
+
+
+@dataclass
+class MulticallRequest:
+    toAddress: str
+    contractAbi: ABI
+    functionName: str
+    arguments: dict[str, object] | None = None
+
+
+def _get_abi_type_string(abiParam: ABIComponent) -> str:
+    abiType = abiParam['type']
+    if not abiType.startswith('tuple'):
+        return abiType
+    componentTypes = ','.join(_get_abi_type_string(abiParam=component) for component in abiParam.get('components', []))
+    return f'({componentTypes}){abiType[len("tuple") :]}'
+
+
+def _get_output_types(contractAbi: ABI, functionName: str) -> list[str]:
+    for item in contractAbi:
+        if item['type'] == 'function' and item['name'] == functionName:
+            return [_get_abi_type_string(abiParam=output) for output in item.get('outputs', [])]
+    raise ValueError(f'Function {functionName} not found in contract abi')
+
+
+class MulticallClient:
+    """Batches read-only contract calls into Multicall3 aggregate3 requests.
+    Each call is sent with allowFailure so a single revert only loses that call's result.
+    Calls pinned to a block number are memoized per block so repeated reads within a cycle are only sent once.
+    """
+
+    def __init__(self, ethClient: RestEthClient, maxCalldataBytes: int = DEFAULT_MAX_CALLDATA_BYTES) -> None:
+        self.ethClient = ethClient
+        self.maxCalldataBytes = maxCalldataBytes
+        self._blockResultsCache: dict[int, dict[tuple[str, bytes], tuple[bool, bytes]]] = {}
+
+    def _get_block_results_cache(self, blockNumber: int) -> dict[tuple[str, bytes], tuple[bool, bytes]]:
+        blockResults = self._blockResultsCache.get(blockNumber)
+        if blockResults is None:
+            blockResults = {}
+            self._blockResultsCache[blockNumber] = blockResults
+            for staleBlockNumber in sorted(self._blockResultsCache)[:-MAX_MEMOIZED_BLOCKS]:
+                del self._blockResultsCache[staleBlockNumber]
+        return blockResults
+
+    def _chunk_calls(self, encodedCalls: list[tuple[str, bytes]]) -> list[list[int]]:
+        chunks: list[list[int]] = []
+        currentChunk: list[int] = []
+        currentSize = 0
+        for index, (_toAddress, callData) in enumerate(encodedCalls):
+            callSize = len(callData) + CALL3_OVERHEAD_BYTES
+            if currentChunk and currentSize + callSize > self.maxCalldataBytes:
+                chunks.append(currentChunk)
+                currentChunk = []
+                currentSize = 0
+            currentChunk.append(index)
+            currentSize += callSize
+        if currentChunk:
+            chunks.append(currentChunk)
+        return chunks
+
+    async def _aggregate(self, encodedCalls: list[tuple[str, bytes]], blockNumber: int | None) -> list[tuple[bool, bytes]]:
+        response = await self.ethClient.call_function_by_name(
+            toAddress=MULTICALL3_ADDRESS,
+            contractAbi=MULTICALL3_ABI,
+            functionName='aggregate3',
+            arguments={'calls': [(toAddress, True, callData) for toAddress, callData in encodedCalls]},
+            blockNumber=blockNumber,
+        )
+        return [(bool(success), bytes(returnData)) for success, returnData in response[0]]
+
+    async def call_many(self, requests: list[MulticallRequest], blockNumber: int | None = None) -> list[list[typing.Any] | None]:  # type: ignore[explicit-any]
+        """Execute all requests and return their decoded outputs in order, with None for calls that reverted or could not be decoded."""
+        if len(requests) == 0:
+            return []
+        encodedCalls: list[tuple[str, bytes]] = []
+        for request in requests:
+            callData = chain_util.encode_transaction_data_by_name(contractAbi=request.contractAbi, functionName=request.functionName, arguments=request.arguments or {})
+            encodedCalls.append((chain_util.normalize_address(request.toAddress), bytes.fromhex(callData.removeprefix('0x'))))
+        blockResults = self._get_block_results_cache(blockNumber=blockNumber) if blockNumber is not None else {}
+        uniqueCalls = list(dict.fromkeys(encodedCall for encodedCall in encodedCalls if encodedCall not in blockResults))
+        chunks = self._chunk_calls(encodedCalls=uniqueCalls)
+        chunkResults = await asyncio.gather(*[self._aggregate(encodedCalls=[uniqueCalls[index] for index in chunk], blockNumber=blockNumber) for chunk in chunks])
+        callResults = {encodedCall: blockResults[encodedCall] for encodedCall in encodedCalls if encodedCall in blockResults}
+        for chunk, chunkResult in zip(chunks, chunkResults, strict=True):
+            for index, callResult in zip(chunk, chunkResult, strict=True):
+                callResults[uniqueCalls[index]] = callResult
+        if blockNumber is not None:
+            blockResults.update(callResults)
+        results: list[list[typing.Any] | None] = [None] * len(requests)  # type: ignore[explicit-any]
+        for index, (request, encodedCall) in enumerate(zip(requests, encodedCalls, strict=True)):
+            success, returnData = callResults[encodedCall]
+            if not success:
+                continue
+            try:
+                results[index] = list(decode(_get_output_types(contractAbi=request.contractAbi, functionName=request.functionName), returnData))
+            except Exception as e:  # noqa: BLE001
+                logging.warning(f'Failed to decode multicall result for {request.functionName} on {request.toAddress}: {e}')
+        return results
@@ -0,0 +1,220 @@
+import collections
+import math
+import time
+from dataclasses import dataclass
+
+import numpy as np
+from core import logging
+from core.caching.cache import Cache
+
+from money_hack import util
+from money_hack.blockchain_data.price_risk_analytics import FloatArray
+
+# NOTE: samples arriving closer together than this are dropped so the buffer covers 7 days at a bounded size
+PRICE_HISTORY_MIN_SAMPLE_INTERVAL_SECONDS = 30
+PRICE_HISTORY_WINDOW_SECONDS = {'1h': 60 * 60, '24h': 60 * 60 * 24, '7d': 60 * 60 * 24 * 7}
+# NOTE: a window only counts as covered once its oldest sample is at least this fraction of the window old
+PRICE_HISTORY_MIN_COVERAGE = 0.9
+PRICE_HISTORY_PERSIST_INTERVAL_SECONDS = 300
+PRICE_HISTORY_CAPACITY = PRICE_HISTORY_WINDOW_SECONDS['7d'] // PRICE_HISTORY_MIN_SAMPLE_INTERVAL_SECONDS + 1
+# NOTE: a spread needs at least two returns, with fewer the volatility is reported as zero
+PRICE_HISTORY_MIN_VOLATILITY_RETURNS = 2
+
+
+@dataclass
+class PriceSample:
+    timestamp: float
+    price_usd: float
+    # log return since the previous sample, scaled to one hour so volatility stays comparable however often prices are read
+    hourly_return: float | None = None
+
+
+@dataclass
+class PriceStatistics:
+    current_price_usd: float
+    last_sample_time: float
+    change_1h_pct: float | None
+    change_24h_pct: float | None
+    change_7d_pct: float | None
+    volatility_24h: float | None  # standard deviation of hourly-scaled returns over 24h
+    sample_count: int
+
+
+class _RollingWindow:
+    """Samples within the last windowSeconds with a running mean and variance of their returns.
+    Welford updates on both append and eviction keep every update O(1).
+    """
+
+    def __init__(self, windowSeconds: float) -> None:
+        self.windowSeconds = windowSeconds
+        self.samples: collections.deque[PriceSample] = collections.deque()
+        self._returnCount = 0
+        self._returnMean = 0.0
+        self._returnM2 = 0.0
+
+    def append(self, sample: PriceSample) -> None:
+        self.samples.append(sample)
+        if sample.hourly_return is not None:
+            self._returnCount += 1
+            delta = sample.hourly_return - self._returnMean
+            self._returnMean += delta / self._returnCount
+            self._returnM2 += delta * (sample.hourly_return - self._returnMean)
+        self.evict(now=sample.timestamp)
+
+    def evict(self, now: float) -> None:
+        while self.samples and now - self.samples[0].timestamp > self.windowSeconds:
+            sample = self.samples.popleft()
+            if sample.hourly_return is None:
+                continue
+            if self._returnCount <= 1:
+                self._returnCount = 0
+                self._returnMean = 0.0
+                self._returnM2 = 0.0
+                continue
+            delta = sample.hourly_return - self._returnMean
+            self._returnCount -= 1
+            self._returnMean -= delta / self._returnCount
+            self._returnM2 = max(self._returnM2 - delta * (sample.hourly_return - self._returnMean), 0.0)
+
+    def is_covered(self, now: float) -> bool:
+        return len(self.samples) > 0 and now - self.samples[0].timestamp >= self.windowSeconds * PRICE_HISTORY_MIN_COVERAGE
+
+    def get_change(self, currentPrice: float) -> float:
+        basePrice = self.samples[0].price_usd
+        return (currentPrice - basePrice) / basePrice if basePrice > 0 else 0.0
+
+    def get_volatility(self) -> float:
+        if self._returnCount < PRICE_HISTORY_MIN_VOLATILITY_RETURNS:
+            return 0.0
+        return math.sqrt(self._returnM2 / self._returnCount)
+
+
+class AssetPriceHistory:
+    """Append-only price samples for one asset, kept as a ring buffer spanning the longest rolling window.
+    Samples are also written to fixed-size arrays so vectorized analytics can read them without conversion.
+    """
+
+    def __init__(self) -> None:
+        self.windows = {name: _RollingWindow(windowSeconds=windowSeconds) for name, windowSeconds in PRICE_HISTORY_WINDOW_SECONDS.items()}
+        self.lastSample: PriceSample | None = None
+        self._timestamps = np.zeros(PRICE_HISTORY_CAPACITY)
+        self._prices = np.zeros(PRICE_HISTORY_CAPACITY)
+        self._sampleCount = 0
+
+    def add_price(self, priceUsd: float, timestamp: float) -> bool:
+        """Append a price, returning False when it was dropped for being too close to, or older than, the previous sample."""
+        if priceUsd <= 0:
+            return False
+        hourlyReturn: float | None = None
+        if self.lastSample is not None:
+            elapsedSeconds = timestamp - self.lastSample.timestamp
+            if elapsedSeconds < PRICE_HISTORY_MIN_SAMPLE_INTERVAL_SECONDS:
+                return False
+            hourlyReturn = math.log(priceUsd / self.lastSample.price_usd) * math.sqrt(3600 / elapsedSeconds)
+        sample = PriceSample(timestamp=timestamp, price_usd=priceUsd, hourly_return=hourlyReturn)
+        for window in self.windows.values():
+            window.append(sample=sample)
+        self.lastSample = sample
+        ringIndex = self._sampleCount % PRICE_HISTORY_CAPACITY
+        self._timestamps[ringIndex] = timestamp
+        self._prices[ringIndex] = priceUsd
+        self._sampleCount += 1
+        return True
+
+    def get_sample_arrays(self) -> tuple[FloatArray, FloatArray]:
+        """Return copies of the buffered sample timestamps and prices, oldest first."""
+        if self._sampleCount <= PRICE_HISTORY_CAPACITY:
+            return self._timestamps[: self._sampleCount].copy(), self._prices[: self._sampleCount].copy()
+        ringIndex = self._sampleCount % PRICE_HISTORY_CAPACITY
+        return np.concatenate((self._timestamps[ringIndex:], self._timestamps[:ringIndex])), np.concatenate((self._prices[ringIndex:], self._prices[:ringIndex]))
+
+    def get_samples(self) -> list[PriceSample]:
+        return list(self.windows['7d'].samples)
+
+    def get_statistics(self, now: float) -> PriceStatistics | None:
+        if self.lastSample is None:
+            return None
+        for window in self.windows.values():
+            window.evict(now=now)
+        currentPrice = self.lastSample.price_usd
+        window1h = self.windows['1h']
+        window24h = self.windows['24h']
+        window7d = self.windows['7d']
+        return PriceStatistics(
+            current_price_usd=currentPrice,
+            last_sample_time=self.lastSample.timestamp,
+            change_1h_pct=window1h.get_change(currentPrice=currentPrice) if window1h.is_covered(now=now) else None,
+            change_24h_pct=window24h.get_change(currentPrice=currentPrice) if window24h.is_covered(now=now) else None,
+            change_7d_pct=window7d.get_change(currentPrice=currentPrice) if window7d.is_covered(now=now) else None,
+            volatility_24h=window24h.get_volatility() if window24h.is_covered(now=now) else None,
+            sample_count=len(window7d.samples),
+        )
+
+
+class PriceHistoryStore:
+    """Rolling per-asset price history fed by the prices the worker already reads.
+    Statistics are maintained incrementally so analysis needs no calls to a historical price API once a window is covered.
+    Histories are persisted to the cache so a restarted worker keeps its coverage.
+    """
+
+    def __init__(self, cache: Cache | None = None) -> None:
+        self.cache = cache
+        self._histories: dict[tuple[int, str], AssetPriceHistory] = {}
+
+    @staticmethod
+    def _get_cache_key(chainId: int, assetAddress: str) -> str:
+        return f'price-history-{chainId}-{assetAddress.lower()}'
+
+    def _get_history(self, chainId: int, assetAddress: str) -> AssetPriceHistory:
+        key = (chainId, assetAddress.lower())
+        history = self._histories.get(key)
+        if history is None:
+            history = AssetPriceHistory()
+            self._histories[key] = history
+        return history
+
+    def record_price(self, chainId: int, assetAddress: str, priceUsd: float, timestamp: float | None = None) -> None:
+        self._get_history(chainId=chainId, assetAddress=assetAddress).add_price(priceUsd=priceUsd, timestamp=timestamp if timestamp is not None else time.time())
+
+    def get_statistics(self, chainId: int, assetAddress: str) -> PriceStatistics | None:
+        history = self._histories.get((chainId, assetAddress.lower()))
+        if history is None:
+            return None
+        return history.get_statistics(now=time.time())
+
+    def get_sample_arrays(self, chainId: int, assetAddresses: list[str]) -> dict[str, tuple[FloatArray, FloatArray]]:
+        """Return the buffered sample timestamps and prices of each asset with a history, keyed by lowercased address."""
+        sampleArrays: dict[str, tuple[FloatArray, FloatArray]] = {}
+        for assetAddress in assetAddresses:
+            history = self._histories.get((chainId, assetAddress.lower()))
+            if history is not None:
+                sampleArrays[assetAddress.lower()] = history.get_sample_arrays()
+        return sampleArrays
+
+    async def load(self, chainId: int, assetAddresses: list[str]) -> None:
+        """Restore persisted histories for the given assets. Samples already recorded in this process are kept."""
+        for assetAddress in assetAddresses:
+            try:
+                samplesData = await util.get_json_from_optional_cache(cache=self.cache, key=self._get_cache_key(chainId=chainId, assetAddress=assetAddress))
+            except Exception as e:  # noqa: BLE001
+                logging.warning(f'Failed to load price history for {assetAddress}: {e}')
+                continue
+            if not samplesData:
+                continue
+            existingHistory = self._histories.get((chainId, assetAddress.lower()))
+            history = AssetPriceHistory()
+            for timestamp, priceUsd in samplesData:
+                history.add_price(priceUsd=float(priceUsd), timestamp=float(timestamp))
+            if existingHistory is not None:
+                for sample in existingHistory.get_samples():
+                    history.add_price(priceUsd=sample.price_usd, timestamp=sample.timestamp)
+            self._histories[(chainId, assetAddress.lower())] = history
+            logging.info(f'Loaded {len(samplesData)} price history samples for {assetAddress}')
+
+    async def persist(self) -> None:
+        for (chainId, assetAddress), history in list(self._histories.items()):
+            samplesData = [[sample.timestamp, sample.price_usd] for sample in history.get_samples()]
+            try:
+                await util.save_json_to_optional_cache(cache=self.cache, key=self._get_cache_key(chainId=chainId, assetAddress=assetAddress), value=samplesData, expirySeconds=PRICE_HISTORY_WINDOW_SECONDS['7d'])
+            except Exception as e:  # noqa: BLE001
+                logging.warning(f'Failed to persist price history for {assetAddress}: {e}')
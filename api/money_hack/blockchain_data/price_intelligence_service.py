@@ -1,11 +1,19 @@
+import datetime
 import math
 import time
 from dataclasses import dataclass
 
 from core import logging
 from core.requester import Requester
+from core.util import date_util
 
 from money_hack.blockchain_data.alchemy_client import AlchemyClient
+from money_hack.blockchain_data.historical_price_store import HistoricalPriceStore
+from money_hack.blockchain_data.price_history_store import PriceHistoryStore
+from money_hack.blockchain_data.price_history_store import PriceStatistics
+from money_hack.blockchain_data.price_oracle import PriceOracle
+from money_hack.blockchain_data.price_risk_analytics import RiskMetrics
+from money_hack.blockchain_data.price_risk_analytics import compute_risk_metrics
 
 
 @dataclass
@@ -17,20 +25,26 @@ class PriceAnalysis:
     change_7d_pct: float
     volatility_24h: float  # standard deviation of hourly returns over 24h
     trend: str  # 'up', 'down', 'sideways'
+    risk_metrics: RiskMetrics | None = None  # only available once the recorded price history covers a day
 
     def is_volatile(self, threshold: float = 0.02) -> bool:
         """Check if recent price action exceeds volatility threshold."""
+        if self.risk_metrics is not None and self.risk_metrics.is_volatile(threshold=threshold):
+            return True
         return abs(self.change_1h_pct) > threshold or self.volatility_24h > threshold
 
     def to_summary(self) -> str:
         direction = '+' if self.change_1h_pct >= 0 else ''
-        return (
+        summary = (
             f'Price: ${self.current_price_usd:,.2f} | '
             f'1h: {direction}{self.change_1h_pct:.2%} | '
             f'24h: {"+" if self.change_24h_pct >= 0 else ""}{self.change_24h_pct:.2%} | '
             f'7d: {"+" if self.change_7d_pct >= 0 else ""}{self.change_7d_pct:.2%} | '
             f'Vol(24h): {self.volatility_24h:.2%} | Trend: {self.trend}'
         )
+        if self.risk_metrics is not None:
+            summary += f' | Vol(EWMA): {self.risk_metrics.ewma_volatility:.2%} | Max drawdown(24h): {self.risk_metrics.max_drawdown_24h:.2%}'
+        return summary
 
 
 @dataclass
@@ -40,15 +54,33 @@ class _CacheEntry:
 
 
 CACHE_TTL_SECONDS = 900  # 15 minutes
+# NOTE: the recorded history is only used while the worker keeps feeding it, otherwise its latest price is too old
+MAX_HISTORY_SAMPLE_AGE_SECONDS = 300
+HISTORICAL_PRICE_INTERVAL_SECONDS = {'1h': 60 * 60, '1d': 60 * 60 * 24}
 
 
 class PriceIntelligenceService:
-    """Provides historical price analysis using Alchemy's price APIs."""
-
-    def __init__(self, alchemyClient: AlchemyClient, requester: Requester) -> None:
+    """Provides historical price analysis from the recorded price history, falling back to Alchemy's price APIs until the history covers a day."""
+
+    def __init__(
+        self,
+        alchemyClient: AlchemyClient,
+        requester: Requester,
+        priceOracle: PriceOracle | None = None,
+        priceHistoryStore: PriceHistoryStore | None = None,
+        historicalPriceStore: HistoricalPriceStore | None = None,
+    ) -> None:
         self.alchemyClient = alchemyClient
         self.requester = requester
+        self.priceOracle = priceOracle or PriceOracle(priceClient=alchemyClient)
+        self.priceHistoryStore = priceHistoryStore or PriceHistoryStore()
+        self.historicalPriceStore = historicalPriceStore
         self._cache: dict[str, _CacheEntry] = {}
+        self._dailyPricesCache: dict[str, tuple[float, list[float]]] = {}
+
+    def record_price(self, chainId: int, assetAddress: str, priceUsd: float) -> None:
+        """Add a price read elsewhere to the asset's rolling history."""
+        self.priceHistoryStore.record_price(chainId=chainId, assetAddress=assetAddress, priceUsd=priceUsd)
 
     def _get_cached(self, key: str) -> PriceAnalysis | None:
         entry = self._cache.get(key)
@@ -62,14 +94,27 @@ class PriceIntelligenceService:
     def _set_cached(self, key: str, analysis: PriceAnalysis) -> None:
         self._cache[key] = _CacheEntry(analysis=analysis, timestamp=time.time())
 
-    async def _fetch_historical_prices(self, chainId: int, assetAddress: str, hours: int, interval: str = '1h') -> list[float]:
-        """Fetch historical prices from Alchemy for the given time window."""
-        import datetime
-
-        from core.util import date_util
+    async def _list_stored_historical_prices(self, historicalPriceStore: HistoricalPriceStore, chainId: int, assetAddress: str, startTime: datetime.datetime, endTime: datetime.datetime, interval: str) -> list[float]:
+        """List prices from the local historical price table, thinned out to the requested interval."""
+        historicalPrices = await historicalPriceStore.list_prices(chainId=chainId, assetAddress=assetAddress, startDate=startTime, endDate=endTime)
+        intervalSeconds = HISTORICAL_PRICE_INTERVAL_SECONDS[interval]
+        prices: list[float] = []
+        lastPriceDate: datetime.datetime | None = None
+        for historicalPrice in historicalPrices:
+            if lastPriceDate is None or (historicalPrice.priceDate - lastPriceDate).total_seconds() >= intervalSeconds:
+                prices.append(historicalPrice.priceUsd)
+                lastPriceDate = historicalPrice.priceDate
+        return prices
 
+    async def _fetch_historical_prices(self, chainId: int, assetAddress: str, hours: int, interval: str = '1h') -> list[float]:
+        """Fetch historical prices for the given time window, from the local historical price table when one is configured, otherwise from Alchemy."""
         now = datetime.datetime.now(tz=datetime.UTC)
         startTime = now - datetime.timedelta(hours=hours)
+        if self.historicalPriceStore is not None:
+            try:
+                return await self._list_stored_historical_prices(historicalPriceStore=self.historicalPriceStore, chainId=chainId, assetAddress=assetAddress, startTime=startTime, endTime=now, interval=interval)
+            except Exception as e:  # noqa: BLE001
+                logging.warning(f'Failed to list stored historical prices for {assetAddress}: {e}')
         networkName = self.alchemyClient._get_network_name(chainId=chainId)
         try:
             responseData = await self.alchemyClient._make_prices_api_request(
@@ -110,22 +155,62 @@ class PriceIntelligenceService:
             return 'down'
         return 'sideways'
 
+    def get_risk_metrics(self, chainId: int, assetAddresses: list[str]) -> dict[str, RiskMetrics]:
+        """Compute risk metrics for all the given assets in one vectorized pass over their recorded price history, keyed by lowercased address.
+        Assets without enough recorded samples are left out.
+        """
+        sampleArrays = self.priceHistoryStore.get_sample_arrays(chainId=chainId, assetAddresses=assetAddresses)
+        return compute_risk_metrics(histories=sampleArrays, now=time.time())
+
+    async def _get_daily_prices(self, chainId: int, assetAddress: str) -> list[float]:
+        cacheKey = f'{chainId}-{assetAddress.lower()}'
+        cachedEntry = self._dailyPricesCache.get(cacheKey)
+        if cachedEntry is not None and time.time() - cachedEntry[0] <= CACHE_TTL_SECONDS:
+            return cachedEntry[1]
+        dailyPrices = await self._fetch_historical_prices(chainId=chainId, assetAddress=assetAddress, hours=168, interval='1d')
+        self._dailyPricesCache[cacheKey] = (time.time(), dailyPrices)
+        return dailyPrices
+
+    async def _build_analysis_from_history(self, chainId: int, assetAddress: str, statistics: PriceStatistics) -> PriceAnalysis:
+        currentPrice = statistics.current_price_usd
+        change24h = statistics.change_24h_pct or 0.0
+        change7d = statistics.change_7d_pct
+        if change7d is None:
+            dailyPrices = await self._get_daily_prices(chainId=chainId, assetAddress=assetAddress)
+            change7d = (currentPrice - dailyPrices[0]) / dailyPrices[0] if dailyPrices and dailyPrices[0] > 0 else 0.0
+        return PriceAnalysis(
+            asset_address=assetAddress,
+            current_price_usd=currentPrice,
+            change_1h_pct=statistics.change_1h_pct or 0.0,
+            change_24h_pct=change24h,
+            change_7d_pct=change7d,
+            volatility_24h=statistics.volatility_24h or 0.0,
+            trend=self._determine_trend(change_24h=change24h, change_7d=change7d),
+            risk_metrics=self.get_risk_metrics(chainId=chainId, assetAddresses=[assetAddress]).get(assetAddress.lower()),
+        )
+
     async def get_price_analysis(self, chainId: int, assetAddress: str) -> PriceAnalysis:
-        """Get comprehensive price analysis for an asset. Cached for 15 minutes."""
+        """Get comprehensive price analysis for an asset.
+        Built from the recorded price history once it covers the last day, otherwise from Alchemy's historical prices and cached for 15 minutes.
+        """
+        statistics = self.priceHistoryStore.get_statistics(chainId=chainId, assetAddress=assetAddress)
+        if statistics is not None and statistics.change_24h_pct is not None and time.time() - statistics.last_sample_time <= MAX_HISTORY_SAMPLE_AGE_SECONDS:
+            return await self._build_analysis_from_history(chainId=chainId, assetAddress=assetAddress, statistics=statistics)
         cacheKey = f'{chainId}-{assetAddress.lower()}'
         cached = self._get_cached(cacheKey)
         if cached is not None:
             return cached
 
         # Fetch current price
-        currentPriceData = await self.alchemyClient.get_asset_current_price(chainId=chainId, assetAddress=assetAddress)
+        currentPriceData = await self.priceOracle.get_asset_current_price(chainId=chainId, assetAddress=assetAddress)
         currentPrice = currentPriceData.priceUsd
+        self.record_price(chainId=chainId, assetAddress=assetAddress, priceUsd=currentPrice)
 
         # Fetch 24h hourly prices for volatility and short-term changes
         hourlyPrices = await self._fetch_historical_prices(chainId=chainId, assetAddress=assetAddress, hours=24, interval='1h')
 
         # Fetch 7d daily prices for longer-term trend
-        dailyPrices = await self._fetch_historical_prices(chainId=chainId, assetAddress=assetAddress, hours=168, interval='1d')
+        dailyPrices = await self._get_daily_prices(chainId=chainId, assetAddress=assetAddress)
 
         # Calculate changes
         change1h = 0.0
@@ -0,0 +1,126 @@
+import asyncio
+import time
+from dataclasses import dataclass
+
+from core import logging
+
+from money_hack.blockchain_data.blockchain_data_client import BlockchainDataClient
+from money_hack.blockchain_data.blockchain_data_client import ClientAssetPrice
+from money_hack.blockchain_data.blockchain_data_client import PriceNotFoundException
+from money_hack.blockchain_data.hedged_price_resolver import PriceSource
+
+DEFAULT_PRICE_TTL_SECONDS = 5.0
+# NOTE: prices older than the ttl but within this age are served immediately while a refresh runs in the background
+DEFAULT_PRICE_MAX_STALE_SECONDS = 30.0
+
+
+@dataclass
+class _PriceEntry:
+    price: ClientAssetPrice
+    fetchedTime: float
+
+
+class PriceOracle:
+    """Shared source of current asset prices in front of a price client.
+    Prices are cached per asset for a short ttl, concurrent callers for the same asset share one in-flight request,
+    and prices past the ttl but not yet too stale are returned straight away while they are refreshed in the background.
+    Price API load therefore scales with the number of distinct assets rather than with callers.
+    """
+
+    def __init__(self, priceClient: BlockchainDataClient | PriceSource, ttlSeconds: float = DEFAULT_PRICE_TTL_SECONDS, maxStaleSeconds: float = DEFAULT_PRICE_MAX_STALE_SECONDS) -> None:
+        self.priceClient = priceClient
+        self.ttlSeconds = ttlSeconds
+        self.maxStaleSeconds = max(maxStaleSeconds, ttlSeconds)
+        self._entries: dict[tuple[int, str], _PriceEntry] = {}
+        self._inflightRequests: dict[tuple[int, str], asyncio.Task[ClientAssetPrice]] = {}
+
+    async def _fetch_price(self, chainId: int, assetAddress: str) -> ClientAssetPrice:
+        price = await self.priceClient.get_asset_current_price(chainId=chainId, assetAddress=assetAddress)
+        self._entries[(chainId, assetAddress.lower())] = _PriceEntry(price=price, fetchedTime=time.time())
+        return price
+
+    async def _fetch_prices(self, chainId: int, assetAddresses: list[str]) -> dict[str, ClientAssetPrice]:
+        prices = await self.priceClient.get_asset_current_prices(chainId=chainId, assetAddresses=assetAddresses)
+        fetchedTime = time.time()
+        for assetAddress, price in prices.items():
+            self._entries[(chainId, assetAddress.lower())] = _PriceEntry(price=price, fetchedTime=fetchedTime)
+        return prices
+
+    async def _get_price_from_bulk_request(self, bulkRequest: asyncio.Task[dict[str, ClientAssetPrice]], chainId: int, assetAddress: str) -> ClientAssetPrice:
+        prices = await bulkRequest
+        price = prices.get(assetAddress)
+        if price is None:
+            raise PriceNotFoundException(f'Price not found for asset {assetAddress} on chain {chainId}')
+        return price
+
+    def _on_request_done(self, key: tuple[int, str], task: asyncio.Task[ClientAssetPrice]) -> None:
+        if self._inflightRequests.get(key) is task:
+            del self._inflightRequests[key]
+        # NOTE: retrieving the exception here keeps failed background refreshes nobody awaited from being reported as unhandled
+        if not task.cancelled() and task.exception() is not None:
+            logging.warning(f'Price request for {key[1]} on chain {key[0]} failed: {task.exception()}')
+
+    def _register_inflight_request(self, key: tuple[int, str], request: asyncio.Task[ClientAssetPrice]) -> None:
+        self._inflightRequests[key] = request
+        request.add_done_callback(lambda task: self._on_request_done(key=key, task=task))
+
+    def _get_inflight_requests(self, chainId: int, assetAddresses: list[str]) -> dict[str, asyncio.Task[ClientAssetPrice]]:
+        # NOTE: finished requests are treated as missing as their done callback may not have removed them yet
+        missingAddresses = list({assetAddress.lower(): assetAddress for assetAddress in assetAddresses if (chainId, assetAddress.lower()) not in self._inflightRequests or self._inflightRequests[(chainId, assetAddress.lower())].done()}.values())
+        if len(missingAddresses) == 1:
+            self._register_inflight_request(key=(chainId, missingAddresses[0].lower()), request=asyncio.create_task(self._fetch_price(chainId=chainId, assetAddress=missingAddresses[0])))
+        elif len(missingAddresses) > 1:
+            # NOTE: every missing asset is fetched in one bulk request, each asset still gets its own task so later callers can join it
+            bulkRequest = asyncio.create_task(self._fetch_prices(chainId=chainId, assetAddresses=missingAddresses))
+            for assetAddress in missingAddresses:
+                self._register_inflight_request(key=(chainId, assetAddress.lower()), request=asyncio.create_task(self._get_price_from_bulk_request(bulkRequest=bulkRequest, chainId=chainId, assetAddress=assetAddress)))
+        return {assetAddress: self._inflightRequests[(chainId, assetAddress.lower())] for assetAddress in assetAddresses}
+
+    def _get_inflight_request(self, chainId: int, assetAddress: str) -> asyncio.Task[ClientAssetPrice]:
+        return self._get_inflight_requests(chainId=chainId, assetAddresses=[assetAddress])[assetAddress]
+
+    def _get_usable_entry(self, chainId: int, assetAddress: str) -> _PriceEntry | None:
+        entry = self._entries.get((chainId, assetAddress.lower()))
+        if entry is None or time.time() - entry.fetchedTime > self.maxStaleSeconds:
+            return None
+        return entry
+
+    def _is_fresh(self, entry: _PriceEntry) -> bool:
+        return time.time() - entry.fetchedTime <= self.ttlSeconds
+
+    async def get_asset_current_price(self, chainId: int, assetAddress: str) -> ClientAssetPrice:
+        entry = self._get_usable_entry(chainId=chainId, assetAddress=assetAddress)
+        if entry is not None:
+            if not self._is_fresh(entry=entry):
+                self._get_inflight_request(chainId=chainId, assetAddress=assetAddress)
+            return entry.price
+        # NOTE: shielded so one caller being cancelled does not cancel the request for everyone waiting on it
+        return await asyncio.shield(self._get_inflight_request(chainId=chainId, assetAddress=assetAddress))
+
+    async def get_asset_current_prices(self, chainId: int, assetAddresses: list[str]) -> dict[str, ClientAssetPrice]:
+        """Get current prices for several assets, keyed by the requested address, fetching everything uncached in one bulk request.
+        Assets whose price could not be fetched are left out.
+        """
+        prices: dict[str, ClientAssetPrice] = {}
+        staleAddresses: list[str] = []
+        missingAddresses: list[str] = []
+        for assetAddress in assetAddresses:
+            entry = self._get_usable_entry(chainId=chainId, assetAddress=assetAddress)
+            if entry is None:
+                missingAddresses.append(assetAddress)
+                continue
+            prices[assetAddress] = entry.price
+            if not self._is_fresh(entry=entry):
+                staleAddresses.append(assetAddress)
+        if staleAddresses:
+            self._get_inflight_requests(chainId=chainId, assetAddresses=staleAddresses)
+        if missingAddresses:
+            inflightRequests = self._get_inflight_requests(chainId=chainId, assetAddresses=missingAddresses)
+            priceResults = await asyncio.gather(*[asyncio.shield(inflightRequests[assetAddress]) for assetAddress in missingAddresses], return_exceptions=True)
+            for assetAddress, priceResult in zip(missingAddresses, priceResults, strict=True):
+                if isinstance(priceResult, asyncio.CancelledError):
+                    raise priceResult
+                if isinstance(priceResult, BaseException):
+                    continue
+                prices[assetAddress] = priceResult
+        return prices
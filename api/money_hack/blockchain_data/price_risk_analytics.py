@@ -0,0 +1,128 @@
+import math
+from dataclasses import dataclass
+
+import numpy as np
+import numpy.typing as npt
+
+FloatArray = npt.NDArray[np.float64]
+
+RISK_HORIZON_SECONDS = {'15m': 60 * 15, '1h': 60 * 60, '4h': 60 * 60 * 4, '24h': 60 * 60 * 24}
+RISK_LOOKBACK_SECONDS = max(RISK_HORIZON_SECONDS.values())
+EWMA_HALF_LIFE_SECONDS = 60 * 60 * 2
+RANGE_BAR_SECONDS = 60 * 60
+RANGE_BAR_COUNT = RISK_LOOKBACK_SECONDS // RANGE_BAR_SECONDS
+# NOTE: Parkinson's estimator scales the mean squared log high/low range by 1 / (4 ln 2) to recover the variance
+PARKINSON_SCALE = 1 / (4 * math.log(2))
+MIN_RISK_SAMPLE_COUNT = 3
+# NOTE: a standard deviation needs at least two returns to be meaningful
+MIN_VOLATILITY_RETURN_COUNT = 2
+# NOTE: metrics from less history than this are too noisy to plan check intervals around
+MIN_RISK_COVERAGE_SECONDS = 60 * 60
+
+
+@dataclass
+class RiskMetrics:
+    """Risk measures for one asset over its recent price history. Volatilities are standard deviations of returns scaled to one hour."""
+
+    asset_address: str
+    sample_count: int
+    coverage_seconds: float  # age of the oldest sample used
+    ewma_volatility: float
+    volatility_15m: float
+    volatility_1h: float
+    volatility_4h: float
+    volatility_24h: float
+    max_drawdown_24h: float  # largest peak to trough fall within the last 24h, as a fraction of the peak
+    range_volatility_24h: float  # Parkinson estimate from hourly high/low ranges
+
+    def get_peak_hourly_volatility(self) -> float:
+        """The highest of the short horizon and EWMA volatilities, so bursts raise it quickly and calm periods lower it gradually."""
+        return max(self.ewma_volatility, self.volatility_15m, self.volatility_1h)
+
+    def has_enough_coverage(self) -> bool:
+        return self.coverage_seconds >= MIN_RISK_COVERAGE_SECONDS
+
+    def is_volatile(self, threshold: float) -> bool:
+        return self.get_peak_hourly_volatility() > threshold or self.max_drawdown_24h > threshold * 2
+
+
+def _pad_histories(histories: list[tuple[FloatArray, FloatArray]], now: float) -> tuple[FloatArray, FloatArray]:
+    """Stack each asset's samples from the lookback window (plus the sample before it, for the first return) into NaN-padded 2D arrays."""
+    windows: list[tuple[FloatArray, FloatArray]] = []
+    for timestamps, prices in histories:
+        startIndex = max(int(np.searchsorted(timestamps, now - RISK_LOOKBACK_SECONDS, side='left')) - 1, 0)
+        windows.append((timestamps[startIndex:], prices[startIndex:]))
+    width = max(len(timestamps) for timestamps, _prices in windows)
+    paddedTimestamps = np.full((len(windows), width), np.nan)
+    paddedPrices = np.full((len(windows), width), np.nan)
+    for index, (timestamps, prices) in enumerate(windows):
+        paddedTimestamps[index, : len(timestamps)] = timestamps
+        paddedPrices[index, : len(prices)] = prices
+    return paddedTimestamps, paddedPrices
+
+
+def _masked_std(values: FloatArray, mask: npt.NDArray[np.bool_]) -> FloatArray:
+    counts = mask.sum(axis=1)
+    safeCounts = np.maximum(counts, 1)
+    maskedValues = np.where(mask, values, 0.0)
+    means = maskedValues.sum(axis=1) / safeCounts
+    variances = np.where(mask, (values - means[:, None]) ** 2, 0.0).sum(axis=1) / safeCounts
+    return np.where(counts >= MIN_VOLATILITY_RETURN_COUNT, np.sqrt(variances), 0.0)
+
+
+def compute_risk_metrics(histories: dict[str, tuple[FloatArray, FloatArray]], now: float) -> dict[str, RiskMetrics]:
+    """Compute risk metrics for every asset at once from its sample timestamps and prices, both sorted by time.
+    Assets with fewer than MIN_RISK_SAMPLE_COUNT samples within the lookback window are left out.
+    """
+    assetAddresses = [assetAddress for assetAddress, (timestamps, _prices) in histories.items() if len(timestamps) >= MIN_RISK_SAMPLE_COUNT]
+    if len(assetAddresses) == 0:
+        return {}
+    timestamps, prices = _pad_histories(histories=[histories[assetAddress] for assetAddress in assetAddresses], now=now)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        elapsedSeconds = np.diff(timestamps, axis=1)
+        hourlyReturns = np.diff(np.log(prices), axis=1) * np.sqrt(3600 / elapsedSeconds)
+        returnAges = now - timestamps[:, 1:]
+        isValidReturn = np.isfinite(hourlyReturns) & (elapsedSeconds > 0)
+        horizonVolatilities = {name: _masked_std(values=hourlyReturns, mask=isValidReturn & (returnAges <= horizonSeconds)) for name, horizonSeconds in RISK_HORIZON_SECONDS.items()}
+        # NOTE: zero-mean EWMA variance with weights decaying by sample age so irregular sampling is handled
+        ewmaWeights = np.where(isValidReturn & (returnAges <= RISK_LOOKBACK_SECONDS), np.exp(-math.log(2) * returnAges / EWMA_HALF_LIFE_SECONDS), 0.0)
+        ewmaWeightTotals = ewmaWeights.sum(axis=1)
+        ewmaVolatilities = np.sqrt(np.where(ewmaWeightTotals > 0, (ewmaWeights * np.where(isValidReturn, hourlyReturns, 0.0) ** 2).sum(axis=1) / np.maximum(ewmaWeightTotals, 1e-12), 0.0))
+        isInLookback = np.isfinite(prices) & (now - timestamps <= RISK_LOOKBACK_SECONDS)
+        lookbackPrices = np.where(isInLookback, prices, np.nan)
+        runningPeaks = np.fmax.accumulate(lookbackPrices, axis=1)
+        drawdowns = np.where(isInLookback, 1 - lookbackPrices / runningPeaks, 0.0)
+        maxDrawdowns = drawdowns.max(axis=1)
+        barIndices = np.where(isInLookback, np.floor((timestamps - (now - RISK_LOOKBACK_SECONDS)) / RANGE_BAR_SECONDS), 0).astype(np.int64).clip(0, RANGE_BAR_COUNT - 1)
+        # NOTE: samples are sorted by time within each asset so the flattened bar indices are sorted and each bar is one contiguous run
+        flatBarIndices = (np.arange(len(assetAddresses))[:, None] * RANGE_BAR_COUNT + barIndices)[isInLookback]
+        barPrices = prices[isInLookback]
+        barStarts = np.flatnonzero(np.concatenate(([True], flatBarIndices[1:] != flatBarIndices[:-1])))
+        barHighs = np.full(len(assetAddresses) * RANGE_BAR_COUNT, -np.inf)
+        barLows = np.full(len(assetAddresses) * RANGE_BAR_COUNT, np.inf)
+        barHighs[flatBarIndices[barStarts]] = np.maximum.reduceat(barPrices, barStarts)
+        barLows[flatBarIndices[barStarts]] = np.minimum.reduceat(barPrices, barStarts)
+        assetBarHighs = barHighs.reshape(len(assetAddresses), RANGE_BAR_COUNT)
+        assetBarLows = barLows.reshape(len(assetAddresses), RANGE_BAR_COUNT)
+        hasBar = np.isfinite(assetBarHighs)
+        squaredLogRanges = np.where(hasBar, np.log(assetBarHighs / assetBarLows) ** 2, 0.0)
+        rangeVolatilities = np.sqrt(PARKINSON_SCALE * squaredLogRanges.sum(axis=1) / np.maximum(hasBar.sum(axis=1), 1))
+    sampleCounts = isInLookback.sum(axis=1)
+    coverageSeconds = now - np.where(isInLookback, timestamps, np.inf).min(axis=1)
+    return {
+        assetAddress: RiskMetrics(
+            asset_address=assetAddress,
+            sample_count=int(sampleCounts[index]),
+            coverage_seconds=float(coverageSeconds[index]),
+            ewma_volatility=float(ewmaVolatilities[index]),
+            volatility_15m=float(horizonVolatilities['15m'][index]),
+            volatility_1h=float(horizonVolatilities['1h'][index]),
+            volatility_4h=float(horizonVolatilities['4h'][index]),
+            volatility_24h=float(horizonVolatilities['24h'][index]),
+            max_drawdown_24h=float(maxDrawdowns[index]),
+            range_volatility_24h=float(rangeVolatilities[index]),
+        )
+        for index, assetAddress in enumerate(assetAddresses)
+        # NOTE: assets whose samples have gone stale have too few, or no, samples left in the lookback window to measure
+        if sampleCounts[index] >= MIN_RISK_SAMPLE_COUNT
+    }
@@ -9,6 +9,12 @@ SECONDS_PER_HOUR = 3600
 SECONDS_PER_YEAR = 365.25 * 24 * SECONDS_PER_HOUR
 BASE_BLOCK_TIME_SECONDS = 2
 
+# NOTE: only chains that produce blocks at exactly this interval, so block numbers and timestamps map onto each other linearly
+CHAIN_BLOCK_TIME_SECONDS_MAP: dict[int, int] = {
+    BASE_CHAIN_ID: BASE_BLOCK_TIME_SECONDS,
+    BASE_SEPOLIA_CHAIN_ID: BASE_BLOCK_TIME_SECONDS,
+}
+
 CHAIN_USDC_MAP: dict[int, str] = {
     ETH_CHAIN_ID: '0xA0b86991c6218b36c1d19D4a2e9Eb0cE3606eB48',
     BASE_CHAIN_ID: '0x833589fCD6eDb6E08f4c7C32D4f71b54bdA02913',
@@ -18,23 +18,39 @@ from money_hack.agent.tools import GetPositionTool
 from money_hack.agent.tools import GetPriceAnalysisTool
 from money_hack.agent.tools import SetTargetLtvTool
 from money_hack.agent_manager import AgentManager
+from money_hack.blockchain_data.alchemy_client import DEFAULT_ALCHEMY_PRICES_API_URL
 from money_hack.blockchain_data.alchemy_client import AlchemyClient
+from money_hack.blockchain_data.block_time_index import BlockTimeIndex
 from money_hack.blockchain_data.blockscout_client import BlockscoutClient
 from money_hack.blockchain_data.findblock_client import FindBlockClient
+from money_hack.blockchain_data.hedged_price_resolver import ClientPriceSource
+from money_hack.blockchain_data.hedged_price_resolver import HedgedPriceResolver
+from money_hack.blockchain_data.hedged_price_resolver import PriceSource
+from money_hack.blockchain_data.historical_price_store import HistoricalPriceStore
 from money_hack.blockchain_data.moralis_client import MoralisClient
+from money_hack.blockchain_data.multicall_client import MulticallClient
+from money_hack.blockchain_data.price_history_store import PriceHistoryStore
 from money_hack.blockchain_data.price_intelligence_service import PriceIntelligenceService
+from money_hack.blockchain_data.price_oracle import PriceOracle
 from money_hack.cross_chain_yield_manager import CrossChainManager
+from money_hack.external.coinbase_cdp_client import DEFAULT_CDP_API_URL
 from money_hack.external.coinbase_cdp_client import CoinbaseCdpClient
 from money_hack.external.ens_client import EnsClient
 from money_hack.external.lifi_client import LiFiClient
 from money_hack.external.telegram_client import TelegramClient
 from money_hack.forty_acres.forty_acres_client import FortyAcresClient
 from money_hack.morpho.ltv_manager import LtvManager
+from money_hack.morpho.market_state_reader import MorphoMarketStateReader
 from money_hack.morpho.morpho_client import MorphoClient
+from money_hack.morpho.oracle_price_reader import MorphoOraclePriceReader
+from money_hack.morpho.oracle_price_reader import MorphoOraclePriceSource
+from money_hack.morpho.position_reader import OnchainPositionReader
 from money_hack.notification_service import NotificationService
 from money_hack.smart_wallets.coinbase_bundler import CoinbaseBundler
 from money_hack.smart_wallets.coinbase_smart_wallet import CoinbaseSmartWallet
 from money_hack.store.database_store import DatabaseStore
+from money_hack.user_operation_reconciler import UserOperationReconciler
+from money_hack.vault_yield_service import VaultYieldService
 
 BASE_CHAIN_ID = 8453
 BASE_RPC_URL = os.environ['BASE_RPC_URL']
@@ -45,6 +61,14 @@ CDP_API_KEY_PRIVATE_KEY = os.environ['CDP_API_KEY_PRIVATE_KEY']
 DEPLOYER_PRIVATE_KEY = os.environ['DEPLOYER_PRIVATE_KEY']
 MORALIS_API_KEY = os.environ['MORALIS_API_KEY']
 ALCHEMY_API_KEY = os.environ['ALCHEMY_API_KEY']
+ALCHEMY_PRICES_API_URL = os.environ.get('ALCHEMY_PRICES_API_URL', DEFAULT_ALCHEMY_PRICES_API_URL)
+MORPHO_GRAPHQL_URL = os.environ.get('MORPHO_GRAPHQL_URL', MorphoClient.GRAPHQL_URL)
+# NOTE: 'onchain' reads Morpho market state from the Morpho Blue contract, leaving the GraphQL API to market discovery
+MORPHO_MARKET_STATE_SOURCE = os.environ.get('MORPHO_MARKET_STATE_SOURCE', 'graphql')
+CDP_API_URL = os.environ.get('CDP_API_URL', DEFAULT_CDP_API_URL)
+PRICE_ORACLE_TTL_SECONDS = float(os.environ.get('PRICE_ORACLE_TTL_SECONDS', '5'))
+PRICE_ORACLE_MAX_STALE_SECONDS = float(os.environ.get('PRICE_ORACLE_MAX_STALE_SECONDS', '30'))
+VAULT_YIELD_MAX_STALE_SECONDS = float(os.environ.get('VAULT_YIELD_MAX_STALE_SECONDS', '1800'))
 MAINNET_RPC_URL = os.environ.get('MAINNET_RPC_URL', f'https://eth-mainnet.g.alchemy.com/v2/{ALCHEMY_API_KEY}')
 BLOCKSCOUT_API_KEY = os.environ['BLOCKSCOUT_API_KEY']
 TELEGRAM_API_TOKEN = os.environ['TELEGRAM_API_TOKEN']
@@ -66,10 +90,25 @@ def create_agent_manager() -> AgentManager:
     paymasterEthClient = RestEthClient(url=BASE_PAYMASTER_RPC_URL, chainId=BASE_CHAIN_ID, requester=requester) if BASE_PAYMASTER_RPC_URL else None
     moralisClient = MoralisClient(requester=requester, apiKey=MORALIS_API_KEY, cache=cache)
     findBlockClient = FindBlockClient(requester=requester, cache=cache)
-    alchemyClient = AlchemyClient(requester=requester, apiKey=ALCHEMY_API_KEY, cache=cache, findBlockClient=findBlockClient)
-    morphoClient = MorphoClient(requester=requester)
+    blockTimeIndex = BlockTimeIndex(ethClients={BASE_CHAIN_ID: ethClient, constants.ETH_CHAIN_ID: mainnetEthClient}, findBlockClient=findBlockClient, cache=cache)
+    alchemyClient = AlchemyClient(requester=requester, apiKey=ALCHEMY_API_KEY, cache=cache, findBlockClient=findBlockClient, pricesApiUrl=ALCHEMY_PRICES_API_URL, blockTimeIndex=blockTimeIndex)
+    multicallClient = MulticallClient(ethClient=ethClient)
+    marketStateReader = MorphoMarketStateReader(chainId=BASE_CHAIN_ID, multicallClient=multicallClient) if MORPHO_MARKET_STATE_SOURCE == 'onchain' else None
+    morphoClient = MorphoClient(requester=requester, graphqlUrl=MORPHO_GRAPHQL_URL, marketStateReader=marketStateReader)
+    oraclePriceReader = MorphoOraclePriceReader(multicallClient=multicallClient)
+    clientPriceSources: list[PriceSource] = [
+        ClientPriceSource(name='alchemy', client=alchemyClient),
+        ClientPriceSource(name='moralis', client=moralisClient),
+    ]
+    priceResolver = HedgedPriceResolver(
+        sources=[
+            *clientPriceSources,
+            MorphoOraclePriceSource(morphoClient=morphoClient, oraclePriceReader=oraclePriceReader, loanAssetPriceSource=HedgedPriceResolver(sources=clientPriceSources)),
+        ],
+    )
+    priceOracle = PriceOracle(priceClient=priceResolver, ttlSeconds=PRICE_ORACLE_TTL_SECONDS, maxStaleSeconds=PRICE_ORACLE_MAX_STALE_SECONDS)
     blockscoutClient = BlockscoutClient(requester=requester, cache=cache, apiKey=BLOCKSCOUT_API_KEY)
-    fortyAcresClient = FortyAcresClient(requester=requester, ethClient=ethClient, blockscoutClient=blockscoutClient)
+    fortyAcresClient = FortyAcresClient(requester=requester, ethClient=ethClient, blockscoutClient=blockscoutClient, blockTimeIndex=blockTimeIndex)
     telegramClient = TelegramClient(
         requester=requester,
         botToken=TELEGRAM_API_TOKEN,
@@ -84,6 +123,7 @@ def create_agent_manager() -> AgentManager:
             walletSecret=CDP_WALLET_SECRET,
             apiKeyName=CDP_API_KEY_NAME,
             apiKeyPrivateKey=CDP_API_KEY_PRIVATE_KEY,
+            apiUrl=CDP_API_URL,
         )
         if CDP_WALLET_SECRET and CDP_API_KEY_NAME and CDP_API_KEY_PRIVATE_KEY
         else None
@@ -94,9 +134,11 @@ def create_agent_manager() -> AgentManager:
     databaseConnectionString = f'postgresql+asyncpg://{DB_USERNAME}:{encodedPassword}@{DB_HOST}:{DB_PORT}/{DB_NAME}'
     database = Database(connectionString=databaseConnectionString)
     databaseStore = DatabaseStore(database=database)
+    vaultYieldService = VaultYieldService(vaultClient=fortyAcresClient, chainId=BASE_CHAIN_ID, databaseStore=databaseStore, maxStaleSeconds=VAULT_YIELD_MAX_STALE_SECONDS)
     geminiLlm = GeminiLLM(apiKey=GEMINI_API_KEY, requester=requester) if GEMINI_API_KEY else None
     chatHistoryStore = ChatHistoryStore(database=database)
-    priceIntelligenceService = PriceIntelligenceService(alchemyClient=alchemyClient, requester=requester)
+    historicalPriceStore = HistoricalPriceStore(databaseStore=databaseStore, alchemyClient=alchemyClient)
+    priceIntelligenceService = PriceIntelligenceService(alchemyClient=alchemyClient, requester=requester, priceOracle=priceOracle, priceHistoryStore=PriceHistoryStore(cache=cache), historicalPriceStore=historicalPriceStore)
     chatTools: list[ChatTool[Any, Any]] = [  # type: ignore[explicit-any]
         GetPositionTool(),
         GetMarketDataTool(),
@@ -111,7 +153,9 @@ def create_agent_manager() -> AgentManager:
     yoVaultAddress = '0x0000000f2eB9f69274678c76222B35eEc7588a65'
     ltvManager = None
     notificationService = None
+    onchainPositionReader = None
     if usdcAddress:
+        onchainPositionReader = OnchainPositionReader(multicallClient=multicallClient, usdcAddress=usdcAddress, vaultAddress=yoVaultAddress)
         ltvManager = LtvManager(
             chainId=BASE_CHAIN_ID,
             usdcAddress=usdcAddress,
@@ -121,12 +165,17 @@ def create_agent_manager() -> AgentManager:
             databaseStore=databaseStore,
             priceIntelligenceService=priceIntelligenceService,
             fortyAcresClient=fortyAcresClient,
+            priceOracle=priceOracle,
+            oraclePriceReader=oraclePriceReader,
+            vaultYieldService=vaultYieldService,
         )
         notificationService = NotificationService(
             telegramClient=telegramClient,
             databaseStore=databaseStore,
         )
 
+    userOperationReconciler = UserOperationReconciler(databaseStore=databaseStore, coinbaseBundler=coinbaseBundler, notificationService=notificationService) if coinbaseBundler else None
+
     lifiClient = LiFiClient(requester=requester)
     crossChainManager = CrossChainManager(
         lifiClient=lifiClient,
@@ -156,5 +205,9 @@ def create_agent_manager() -> AgentManager:
         mainnetEthClient=mainnetEthClient,
         lifiClient=lifiClient,
         crossChainManager=crossChainManager,
+        onchainPositionReader=onchainPositionReader,
+        userOperationReconciler=userOperationReconciler,
+        priceOracle=priceOracle,
+        vaultYieldService=vaultYieldService,
     )
     return agentManager
@@ -41,6 +41,8 @@ EXIUW5mGS06YxfSUsxHzL9Tj00+GMm/Gvl0+4/+Vn8IXVHjQOSPNEy3EnqCiH/OW
 8v0IMC32CeGrX7mGbU+MzlsCAwEAAQ==
 -----END PUBLIC KEY-----"""
 
+DEFAULT_CDP_API_URL = 'https://api.cdp.coinbase.com/platform/v2'
+
 
 class ClientAssetBalance(BaseModel):
     assetAddress: str
@@ -62,11 +64,13 @@ class CoinbaseCdpClient:
         walletSecret: str,
         apiKeyName: str,
         apiKeyPrivateKey: str,
+        apiUrl: str = DEFAULT_CDP_API_URL,
     ) -> None:
         self.requester = requester
         self.walletSecret = walletSecret
         self.apiKeyName = apiKeyName
         self.apiKeyPrivateKey = apiKeyPrivateKey
+        self.apiUrl = apiUrl
 
     def _parse_private_key(self, keyString: str) -> PrivateKeyTypes:
         keyData = keyString.encode()
@@ -148,7 +152,7 @@ class CoinbaseCdpClient:
 
     async def create_eoa(self, name: str) -> str:
         method = RestMethod.POST
-        url = 'https://api.cdp.coinbase.com/platform/v2/evm/accounts'
+        url = f'{self.apiUrl}/evm/accounts'
         payload = {
             'name': name,
         }
@@ -159,7 +163,7 @@ class CoinbaseCdpClient:
 
     async def get_eoa_by_name(self, name: str) -> str:
         method = RestMethod.GET
-        url = f'https://api.cdp.coinbase.com/platform/v2/evm/accounts/by-name/{name}'
+        url = f'{self.apiUrl}/evm/accounts/by-name/{name}'
         headers = self._build_api_headers(url=url, method=method)
         response = await self.requester.make_request(method=method, url=url, headers=headers)
         responseDict = response.json()
@@ -167,7 +171,7 @@ class CoinbaseCdpClient:
 
     async def import_eoa(self, privateKey: str, name: str) -> None:
         method = RestMethod.POST
-        url = 'https://api.cdp.coinbase.com/platform/v2/evm/accounts/import'
+        url = f'{self.apiUrl}/evm/accounts/import'
         privateKeyHex = privateKey.removeprefix('0x')
         privateKeyBytes = bytes.fromhex(privateKeyHex)
         publicKey = typing.cast(asymmetric.rsa.RSAPublicKey, serialization.load_pem_public_key(data=IMPORT_ACCOUNT_PUBLIC_RSA_KEY.encode()))
@@ -189,7 +193,7 @@ class CoinbaseCdpClient:
 
     async def sign_hash(self, walletAddress: str, messageHash: str) -> str:
         method = RestMethod.POST
-        url = f'https://api.cdp.coinbase.com/platform/v2/evm/accounts/{walletAddress}/sign'
+        url = f'{self.apiUrl}/evm/accounts/{walletAddress}/sign'
         dataDict = {'hash': messageHash}
         headers = self._build_wallet_api_headers(url=url, method=method, body=dataDict)
         response = await self.requester.make_request(method=method, url=url, dataDict=dataDict, headers=headers)
@@ -198,7 +202,7 @@ class CoinbaseCdpClient:
 
     async def sign_transaction(self, walletAddress: str, transactionDict: TxParams) -> str:
         method = RestMethod.POST
-        url = f'https://api.cdp.coinbase.com/platform/v2/evm/accounts/{walletAddress}/sign/transaction'
+        url = f'{self.apiUrl}/evm/accounts/{walletAddress}/sign/transaction'
         transactionParts = [
             int(transactionDict['chainId'], 16) if isinstance(transactionDict['chainId'], str) else transactionDict['chainId'],  # type: ignore[unreachable]
             int(transactionDict['nonce'], 16) if isinstance(transactionDict['nonce'], str) else transactionDict['nonce'],  # type: ignore[unreachable]
@@ -228,7 +232,7 @@ class CoinbaseCdpClient:
         allBalances: list[ClientAssetBalance] = []
         pageToken: str | None = None
         method = RestMethod.GET
-        url = f'https://api.cdp.coinbase.com/platform/v2/evm/token-balances/{network}/{walletAddress}'
+        url = f'{self.apiUrl}/evm/token-balances/{network}/{walletAddress}'
         dataDict: JsonObject = {'pageSize': 50}
         while True:
             if pageToken:
@@ -6,6 +6,7 @@ from core.web3.eth_client import RestEthClient
 from pydantic import BaseModel
 
 from money_hack import constants
+from money_hack.blockchain_data.block_time_index import BlockTimeIndex
 from money_hack.blockchain_data.blockscout_client import BlockscoutClient
 from money_hack.forty_acres import forty_acres_abis
 
@@ -25,25 +26,30 @@ class FortyAcresVaultInfo(BaseModel):
 
 
 class FortyAcresClient:
-    def __init__(self, requester: Requester, ethClient: RestEthClient, blockscoutClient: BlockscoutClient) -> None:
+    def __init__(self, requester: Requester, ethClient: RestEthClient, blockscoutClient: BlockscoutClient, blockTimeIndex: BlockTimeIndex | None = None) -> None:
         self.requester = requester
         self.ethClient = ethClient
         self.blockscoutClient = blockscoutClient
+        self.blockTimeIndex = blockTimeIndex
 
-    async def _calculate_apy_from_share_price_updates(self, _chainId: int, vaultAddress: str, decimals: int) -> float:
+    async def _get_block_timestamp(self, chainId: int, blockNumber: int) -> int:
+        if self.blockTimeIndex is not None and self.blockTimeIndex.supports_chain(chainId=chainId):
+            return await self.blockTimeIndex.get_block_timestamp(chainId=chainId, blockNumber=blockNumber)
+        blockData = await self.ethClient.get_block(blockNumber=blockNumber)
+        return int(blockData['timestamp'])
+
+    async def _calculate_apy_from_share_price_updates(self, chainId: int, vaultAddress: str, decimals: int) -> float:
         latestBlock = await self.ethClient.get_latest_block_number()
         maxLookbackBlocks = int((7 * 24 * constants.SECONDS_PER_HOUR) / constants.BASE_BLOCK_TIME_SECONDS)
         fromBlock = max(latestBlock - maxLookbackBlocks, 0)
         rate1Response = await self.ethClient.call_function_by_name(toAddress=vaultAddress, contractAbi=forty_acres_abis.VAULT_ABI, functionName='convertToAssets', arguments={'shares': 10**decimals}, blockNumber=fromBlock)
         rate2Response = await self.ethClient.call_function_by_name(toAddress=vaultAddress, contractAbi=forty_acres_abis.VAULT_ABI, functionName='convertToAssets', arguments={'shares': 10**decimals}, blockNumber=latestBlock)
-        blockData1, blockData2 = await asyncio.gather(
-            self.ethClient.get_block(blockNumber=fromBlock),
-            self.ethClient.get_block(blockNumber=latestBlock),
+        timestamp1, timestamp2 = await asyncio.gather(
+            self._get_block_timestamp(chainId=chainId, blockNumber=fromBlock),
+            self._get_block_timestamp(chainId=chainId, blockNumber=latestBlock),
         )
         rate1 = int(rate1Response[0])
         rate2 = int(rate2Response[0])
-        timestamp1 = int(blockData1['timestamp'])
-        timestamp2 = int(blockData2['timestamp'])
         if rate1 <= 0 or rate2 <= rate1:
             raise ValueError(f'Invalid share price data for {vaultAddress}: rate1={rate1}, rate2={rate2}')
         secondsElapsed = timestamp2 - timestamp1
@@ -66,7 +72,7 @@ class FortyAcresClient:
             self.ethClient.call_function_by_name(toAddress=vaultAddress, contractAbi=forty_acres_abis.VAULT_ABI, functionName='totalAssets'),
         )
         decimals = int(decimalsResponse[0])
-        apy = await self._calculate_apy_from_share_price_updates(_chainId=chainId, vaultAddress=vaultAddress, decimals=decimals)
+        apy = await self._calculate_apy_from_share_price_updates(chainId=chainId, vaultAddress=vaultAddress, decimals=decimals)
         logging.info(f'40acres vault info loaded: {nameResponse[0]}, TVL: {int(totalAssetsResponse[0]) / 10**6:.2f} USDC, APY: {apy:.2%}')
         return FortyAcresVaultInfo(
             address=vaultAddress,
@@ -84,4 +90,4 @@ class FortyAcresClient:
             return None
         decimalsResponse = await self.ethClient.call_function_by_name(toAddress=vaultAddress, contractAbi=forty_acres_abis.VAULT_ABI, functionName='decimals')
         decimals = int(decimalsResponse[0])
-        return await self._calculate_apy_from_share_price_updates(_chainId=chainId, vaultAddress=vaultAddress, decimals=decimals)
+        return await self._calculate_apy_from_share_price_updates(chainId=chainId, vaultAddress=vaultAddress, decimals=decimals)
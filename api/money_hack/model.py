@@ -84,3 +84,77 @@ class CrossChainAction(BaseModel):
     bridgeName: str | None
     status: str
     details: JsonObject
+
+
+class WorkerHeartbeat(BaseModel):
+    workerId: str
+    createdDate: datetime.datetime
+    updatedDate: datetime.datetime
+    heartbeatDate: datetime.datetime
+
+
+class PositionLease(BaseModel):
+    agentPositionId: int
+    createdDate: datetime.datetime
+    updatedDate: datetime.datetime
+    workerId: str
+    leaseExpiryDate: datetime.datetime
+
+
+class WorkerTaskLease(BaseModel):
+    taskName: str
+    createdDate: datetime.datetime
+    updatedDate: datetime.datetime
+    workerId: str
+    leaseExpiryDate: datetime.datetime
+
+
+class PendingUserOperation(BaseModel):
+    pendingUserOperationId: int
+    createdDate: datetime.datetime
+    updatedDate: datetime.datetime
+    agentId: str
+    agentPositionId: int | None
+    walletAddress: str
+    userOperationHash: str
+    actionType: str
+    status: str
+    transactionHash: str | None
+    details: JsonObject
+
+
+class LtvCheck(BaseModel):
+    ltvCheckId: int
+    agentPositionId: int
+    checkDate: datetime.datetime
+    currentLtv: float
+    targetLtv: float
+    maxLtv: float
+    decisionCode: int
+
+
+class LtvCheckRollup(BaseModel):
+    agentPositionId: int
+    periodDate: datetime.datetime
+    checkCount: int
+    actionCount: int
+    minCurrentLtv: float
+    avgCurrentLtv: float
+    maxCurrentLtv: float
+    avgTargetLtv: float
+    maxLtv: float
+
+
+class HistoricalPrice(BaseModel):
+    chainId: int
+    assetAddress: str
+    priceDate: datetime.datetime
+    priceUsd: float
+
+
+class VaultYieldSnapshot(BaseModel):
+    chainId: int
+    vaultAddress: str
+    snapshotDate: datetime.datetime
+    apy: float
+    totalAssets: int
@@ -0,0 +1,58 @@
+from dataclasses import dataclass
+from dataclasses import field
+
+
+@dataclass
+class PlannedAction:
+    action_type: str
+    details: dict[str, object]
+
+
+@dataclass
+class PositionActionPlan:
+    """All actions chosen for a position in one check, reduced to net token flows so they can be sent as a single user operation.
+    Borrows and repays net into one debt change, and the USDC they move together with idle wallet USDC nets into one vault deposit or withdrawal.
+    """
+
+    position_id: int
+    collateral_supply_amount: int = 0
+    borrow_amount: int = 0
+    repay_amount: int = 0
+    idle_usdc_amount: int = 0
+    actions: list[PlannedAction] = field(default_factory=list)
+
+    def add_repay(self, repayAmount: int, details: dict[str, object]) -> None:
+        self.repay_amount += repayAmount
+        self.actions.append(PlannedAction(action_type='auto_repay', details=details))
+
+    def add_borrow(self, borrowAmount: int, details: dict[str, object]) -> None:
+        self.borrow_amount += borrowAmount
+        self.actions.append(PlannedAction(action_type='auto_optimize', details=details))
+
+    def add_collateral_deployment(self, collateralAmount: int, borrowAmount: int, details: dict[str, object]) -> None:
+        self.collateral_supply_amount += collateralAmount
+        self.borrow_amount += borrowAmount
+        self.actions.append(PlannedAction(action_type='deploy_idle_collateral', details=details))
+
+    def add_idle_usdc_deposit(self, usdcAmount: int, details: dict[str, object]) -> None:
+        self.idle_usdc_amount += usdcAmount
+        self.actions.append(PlannedAction(action_type='deploy_idle_usdc', details=details))
+
+    def is_empty(self) -> bool:
+        return len(self.actions) == 0
+
+    def get_debt_change(self) -> int:
+        """Net change in Morpho debt: positive to borrow, negative to repay."""
+        return self.borrow_amount - self.repay_amount
+
+    def get_vault_change(self) -> int:
+        """Net change in vault assets after borrowed and idle USDC fund any repay: positive to deposit, negative to withdraw."""
+        return self.idle_usdc_amount + self.borrow_amount - self.repay_amount
+
+    def to_details(self) -> dict[str, object]:
+        return {
+            'actions': [{'action_type': action.action_type, **action.details} for action in self.actions],
+            'collateral_supply_amount': self.collateral_supply_amount,
+            'debt_change': self.get_debt_change(),
+            'vault_change': self.get_vault_change(),
+        }
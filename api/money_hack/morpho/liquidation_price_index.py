@@ -0,0 +1,117 @@
+import bisect
+import time
+from dataclasses import dataclass
+
+from core.util import chain_util
+
+from money_hack.morpho.ltv_manager import CRITICAL_LTV_THRESHOLD
+from money_hack.morpho.ltv_manager import LtvCheckResult
+from money_hack.morpho.ltv_manager import LtvPolicy
+
+PRICE_TICK_INTERVAL_SECONDS = 10.0
+
+
+@dataclass
+class PositionTriggerPrices:
+    """Collateral prices at which a position crosses each band. Falling triggers fire when the price drops to or below them, the optimize trigger when the price rises to or above it."""
+
+    position_id: int
+    collateral_address: str
+    repay_price: float | None
+    critical_price: float | None
+    liquidation_price: float | None
+    optimize_price: float | None
+
+
+def calculate_trigger_prices(result: LtvCheckResult, collateralAddress: str, policy: LtvPolicy | None = None) -> PositionTriggerPrices | None:
+    """Derive trigger prices from a check result using the policy's margins. As LTV = debt / (collateral * price), the price for any LTV threshold is currentLtv * price / threshold."""
+    policy = policy or LtvPolicy()
+    if result.collateral_price_usd is None or result.current_ltv <= 0 or result.max_ltv <= 0:
+        return None
+    debtPerCollateral = result.current_ltv * result.collateral_price_usd
+    lowerThreshold = result.target_ltv - policy.margin_lower
+    return PositionTriggerPrices(
+        position_id=result.position_id,
+        collateral_address=chain_util.normalize_address(collateralAddress),
+        repay_price=debtPerCollateral / (result.target_ltv + policy.margin_upper),
+        critical_price=debtPerCollateral / (CRITICAL_LTV_THRESHOLD * result.max_ltv),
+        liquidation_price=debtPerCollateral / result.max_ltv,
+        optimize_price=debtPerCollateral / lowerThreshold if lowerThreshold > 0 else None,
+    )
+
+
+class _SortedTriggers:
+    def __init__(self) -> None:
+        self.entries: list[tuple[float, int]] = []
+
+    def add(self, price: float, positionId: int) -> None:
+        bisect.insort(self.entries, (price, positionId))
+
+    def remove(self, price: float, positionId: int) -> None:
+        index = bisect.bisect_left(self.entries, (price, positionId))
+        if index < len(self.entries) and self.entries[index] == (price, positionId):
+            del self.entries[index]
+
+    def get_position_ids_between(self, minPrice: float, maxPrice: float) -> set[int]:
+        startIndex = bisect.bisect_left(self.entries, (minPrice, -1))
+        endIndex = bisect.bisect_right(self.entries, (maxPrice, float('inf')))
+        return {positionId for _price, positionId in self.entries[startIndex:endIndex]}
+
+
+class LiquidationPriceIndex:
+    """Sorted per-collateral index of position trigger prices.
+    On a price tick only the positions whose repay, critical, liquidation or optimize price lies between
+    the previous and the new price are returned, in O(log n + k).
+    """
+
+    def __init__(self) -> None:
+        self._fallingTriggers: dict[str, _SortedTriggers] = {}
+        self._risingTriggers: dict[str, _SortedTriggers] = {}
+        self._positionTriggers: dict[int, PositionTriggerPrices] = {}
+        self._lastPrices: dict[str, float] = {}
+        self.lastTickTime: float | None = None
+
+    def get_collateral_addresses(self) -> list[str]:
+        return sorted({triggers.collateral_address for triggers in self._positionTriggers.values()})
+
+    def should_tick(self, now: float | None = None) -> bool:
+        now = now if now is not None else time.time()
+        return len(self._positionTriggers) > 0 and (self.lastTickTime is None or now - self.lastTickTime >= PRICE_TICK_INTERVAL_SECONDS)
+
+    def remove_position(self, positionId: int) -> None:
+        triggers = self._positionTriggers.pop(positionId, None)
+        if triggers is None:
+            return
+        for price in (triggers.repay_price, triggers.critical_price, triggers.liquidation_price):
+            if price is not None:
+                self._fallingTriggers[triggers.collateral_address].remove(price=price, positionId=positionId)
+        if triggers.optimize_price is not None:
+            self._risingTriggers[triggers.collateral_address].remove(price=triggers.optimize_price, positionId=positionId)
+
+    def update_position(self, triggers: PositionTriggerPrices) -> None:
+        self.remove_position(positionId=triggers.position_id)
+        self._positionTriggers[triggers.position_id] = triggers
+        fallingTriggers = self._fallingTriggers.setdefault(triggers.collateral_address, _SortedTriggers())
+        for price in (triggers.repay_price, triggers.critical_price, triggers.liquidation_price):
+            if price is not None:
+                fallingTriggers.add(price=price, positionId=triggers.position_id)
+        if triggers.optimize_price is not None:
+            self._risingTriggers.setdefault(triggers.collateral_address, _SortedTriggers()).add(price=triggers.optimize_price, positionId=triggers.position_id)
+
+    def retain_positions(self, positionIds: set[int]) -> None:
+        for positionId in list(self._positionTriggers):
+            if positionId not in positionIds:
+                self.remove_position(positionId=positionId)
+
+    def on_price_tick(self, collateralAddress: str, priceUsd: float) -> set[int]:
+        """Record a new price and return the ids of positions with a trigger crossed since the previous tick."""
+        collateralAddress = chain_util.normalize_address(collateralAddress)
+        lastPrice = self._lastPrices.get(collateralAddress)
+        self._lastPrices[collateralAddress] = priceUsd
+        if lastPrice is None or priceUsd == lastPrice:
+            return set()
+        if priceUsd < lastPrice:
+            fallingTriggers = self._fallingTriggers.get(collateralAddress)
+            return fallingTriggers.get_position_ids_between(minPrice=priceUsd, maxPrice=lastPrice) if fallingTriggers else set()
+        risingTriggers = self._risingTriggers.get(collateralAddress)
+        return risingTriggers.get_position_ids_between(minPrice=lastPrice, maxPrice=priceUsd) if risingTriggers else set()
@@ -0,0 +1,139 @@
+from dataclasses import dataclass
+
+import numpy as np
+import numpy.typing as npt
+
+from money_hack.morpho.ltv_manager import CRITICAL_LTV_THRESHOLD
+from money_hack.morpho.ltv_manager import LtvPolicy
+
+HOURS_PER_YEAR = 24 * 365
+# NOTE: matches the 24 hourly prices PriceIntelligenceService uses for volatility_24h
+VOLATILITY_WINDOW_HOURS = 24
+
+FloatArray = npt.NDArray[np.float64]
+
+
+@dataclass
+class BacktestPositions:
+    """Synthetic positions as parallel arrays. Collateral is in collateral units, debt and vault assets in USD."""
+
+    collateral_amounts: FloatArray
+    debt_usd: FloatArray
+    vault_assets_usd: FloatArray
+    target_ltvs: FloatArray
+
+    @classmethod
+    def at_target(cls, collateralAmounts: FloatArray, targetLtvs: FloatArray, initialPriceUsd: float) -> 'BacktestPositions':
+        """Positions opened at their target LTV with all borrowed USDC deposited in the vault, as deploy_agent does."""
+        debtUsd = collateralAmounts * initialPriceUsd * targetLtvs
+        return cls(collateral_amounts=collateralAmounts.astype(np.float64), debt_usd=debtUsd, vault_assets_usd=debtUsd.copy(), target_ltvs=targetLtvs.astype(np.float64))
+
+
+@dataclass
+class BacktestResult:
+    policy: LtvPolicy
+    position_count: int
+    step_count: int
+    repay_count: int
+    manual_repay_count: int
+    borrow_count: int
+    suppressed_borrow_count: int
+    user_operation_count: int
+    near_liquidation_count: int
+    near_liquidation_position_count: int
+    liquidation_count: int
+
+
+def calculate_price_changes(pricesUsd: FloatArray) -> tuple[FloatArray, FloatArray]:
+    """Return the 1h change and 24h volatility at every hourly step, computed the same way as PriceIntelligenceService."""
+    returns = np.zeros_like(pricesUsd)
+    returns[1:] = np.diff(pricesUsd) / pricesUsd[:-1]
+    volatilities = np.zeros_like(pricesUsd)
+    windowSize = VOLATILITY_WINDOW_HOURS - 1
+    if len(returns) > windowSize:
+        windows = np.lib.stride_tricks.sliding_window_view(returns[1:], windowSize)
+        volatilities[windowSize:] = windows.std(axis=1)
+    return returns, volatilities
+
+
+def run_backtest(
+    pricesUsd: FloatArray,
+    positions: BacktestPositions,
+    maxLtv: float,
+    borrowApy: float,
+    yieldApy: float | None,
+    policy: LtvPolicy | None = None,
+) -> BacktestResult:
+    """Replay an hourly collateral price series through the LtvManager decision rules for every position at once.
+    Each step mirrors check_position_ltv: repay down to target above the upper margin (manual when the vault cannot cover it),
+    borrow up to target below the lower margin unless the amount is under the minimum or the profitability or volatility gates
+    suppress it. Debt and vault assets accrue interest between steps and positions at or above the LLTV are liquidated.
+    """
+    policy = policy or LtvPolicy()
+    collateralAmounts = positions.collateral_amounts.astype(np.float64)
+    debtUsd = positions.debt_usd.astype(np.float64).copy()
+    vaultAssetsUsd = positions.vault_assets_usd.astype(np.float64).copy()
+    targetLtvs = positions.target_ltvs.astype(np.float64)
+    upperThresholds = targetLtvs + policy.margin_upper
+    lowerThresholds = targetLtvs - policy.margin_lower
+    isActive = np.ones(len(collateralAmounts), dtype=bool)
+    wasNearLiquidation = np.zeros(len(collateralAmounts), dtype=bool)
+    returns, volatilities = calculate_price_changes(pricesUsd=pricesUsd)
+    isVolatile = (np.abs(returns) > policy.volatility_threshold) | (volatilities > policy.volatility_threshold)
+    spread = yieldApy - borrowApy if yieldApy is not None else None
+    debtGrowth = 1 + borrowApy / HOURS_PER_YEAR
+    vaultGrowth = 1 + (yieldApy or 0) / HOURS_PER_YEAR
+    repayCount = 0
+    manualRepayCount = 0
+    borrowCount = 0
+    suppressedBorrowCount = 0
+    nearLiquidationCount = 0
+    liquidationCount = 0
+    for step, priceUsd in enumerate(pricesUsd):
+        collateralValuesUsd = collateralAmounts * priceUsd
+        hasCollateral = isActive & (collateralValuesUsd > 0)
+        currentLtvs = np.divide(debtUsd, collateralValuesUsd, out=np.zeros_like(debtUsd), where=hasCollateral)
+        isLiquidated = hasCollateral & (currentLtvs >= maxLtv)
+        liquidationCount += int(isLiquidated.sum())
+        isActive &= ~isLiquidated
+        hasCollateral &= ~isLiquidated
+        # Repay down to target when above the upper threshold
+        repayAmountsUsd = debtUsd - targetLtvs * collateralValuesUsd
+        needsRepay = hasCollateral & (currentLtvs > upperThresholds) & (repayAmountsUsd >= policy.min_action_value_usd)
+        canAutoRepay = needsRepay & (vaultAssetsUsd >= repayAmountsUsd)
+        repayCount += int(canAutoRepay.sum())
+        manualRepayCount += int((needsRepay & ~canAutoRepay).sum())
+        debtUsd = np.where(canAutoRepay, debtUsd - repayAmountsUsd, debtUsd)
+        vaultAssetsUsd = np.where(canAutoRepay, vaultAssetsUsd - repayAmountsUsd, vaultAssetsUsd)
+        # Borrow up to target when below the lower threshold and the optimize gates pass
+        borrowAmountsUsd = targetLtvs * collateralValuesUsd - debtUsd
+        wantsBorrow = hasCollateral & (currentLtvs < lowerThresholds) & (borrowAmountsUsd >= policy.min_action_value_usd)
+        isSuppressed = np.full_like(wantsBorrow, fill_value=bool(isVolatile[step]))
+        if spread is not None:
+            isSuppressed |= (spread <= 0) | (borrowAmountsUsd * spread < policy.min_optimize_annual_gain_usd)
+        canBorrow = wantsBorrow & ~isSuppressed
+        borrowCount += int(canBorrow.sum())
+        suppressedBorrowCount += int((wantsBorrow & isSuppressed).sum())
+        debtUsd = np.where(canBorrow, debtUsd + borrowAmountsUsd, debtUsd)
+        vaultAssetsUsd = np.where(canBorrow, vaultAssetsUsd + borrowAmountsUsd, vaultAssetsUsd)
+        # Positions left at or above the critical threshold would trigger a critical warning
+        postActionLtvs = np.divide(debtUsd, collateralValuesUsd, out=np.zeros_like(debtUsd), where=hasCollateral)
+        isNearLiquidation = hasCollateral & (postActionLtvs >= CRITICAL_LTV_THRESHOLD * maxLtv)
+        nearLiquidationCount += int(isNearLiquidation.sum())
+        wasNearLiquidation |= isNearLiquidation
+        debtUsd = np.where(isActive, debtUsd * debtGrowth, debtUsd)
+        vaultAssetsUsd = np.where(isActive, vaultAssetsUsd * vaultGrowth, vaultAssetsUsd)
+    return BacktestResult(
+        policy=policy,
+        position_count=len(collateralAmounts),
+        step_count=len(pricesUsd),
+        repay_count=repayCount,
+        manual_repay_count=manualRepayCount,
+        borrow_count=borrowCount,
+        suppressed_borrow_count=suppressedBorrowCount,
+        # NOTE: each automatic repay or borrow is sent as one user operation
+        user_operation_count=repayCount + borrowCount,
+        near_liquidation_count=nearLiquidationCount,
+        near_liquidation_position_count=int(wasNearLiquidation.sum()),
+        liquidation_count=liquidationCount,
+    )
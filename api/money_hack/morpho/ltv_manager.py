@@ -1,17 +1,26 @@
 from __future__ import annotations
 
+import asyncio
 from dataclasses import dataclass
+from dataclasses import field
 from typing import TYPE_CHECKING
 
 from core import logging
 from core.util import chain_util
+from core.util import date_util
 
 from money_hack.api.v1_resources import TransactionCall
 from money_hack.blockchain_data.alchemy_client import AlchemyClient
+from money_hack.blockchain_data.price_oracle import PriceOracle
 from money_hack.model import AgentPosition
+from money_hack.morpho.action_planner import PositionActionPlan
 from money_hack.morpho.morpho_client import MorphoClient
+from money_hack.morpho.morpho_client import MorphoMarket
+from money_hack.morpho.oracle_price_reader import MorphoOraclePriceReader
+from money_hack.morpho.position_reader import OnchainPositionState
 from money_hack.morpho.transaction_builder import TransactionBuilder
 from money_hack.store.database_store import DatabaseStore
+from money_hack.vault_yield_service import VaultYieldService
 
 if TYPE_CHECKING:
     from money_hack.blockchain_data.price_intelligence_service import PriceIntelligenceService
@@ -22,6 +31,22 @@ LTV_MARGIN_LOWER = 0.05
 MIN_ACTION_VALUE_USD = 1.0
 MIN_OPTIMIZE_ANNUAL_GAIN_USD = 100.0
 VOLATILITY_THRESHOLD = 0.02  # 2% — suppress optimization if 1h change exceeds this
+# NOTE: stored as small integers so the LTV time series stays narrow, 0 means no action was needed
+LTV_DECISION_CODES: dict[str | None, int] = {None: 0, 'auto_repay': 1, 'auto_optimize': 2, 'manual_repay': 3}
+LTV_CHECK_RETENTION_DAYS = 7
+LTV_CHECK_ROLLUP_INTERVAL_SECONDS = 3600
+CRITICAL_LTV_THRESHOLD = 0.80  # warn users when LTV reaches this fraction of the LLTV
+
+
+@dataclass
+class LtvPolicy:
+    """Thresholds that drive LtvManager decisions, kept together so the same settings can be replayed offline by the backtester."""
+
+    margin_upper: float = LTV_MARGIN_UPPER
+    margin_lower: float = LTV_MARGIN_LOWER
+    min_action_value_usd: float = MIN_ACTION_VALUE_USD
+    min_optimize_annual_gain_usd: float = MIN_OPTIMIZE_ANNUAL_GAIN_USD
+    volatility_threshold: float = VOLATILITY_THRESHOLD
 
 
 @dataclass
@@ -35,6 +60,9 @@ class LtvCheckResult:
     action_type: str | None
     action_amount: int | None
     reason: str
+    collateral_price_usd: float | None = None
+    # NOTE: the result as the LTV policy decided it, kept when agent overrides change the decision so the time series records the policy's view
+    policy_result: LtvCheckResult | None = None
 
 
 @dataclass
@@ -46,6 +74,32 @@ class LtvActionTransactions:
     vault_withdraw_amount: int
 
 
+@dataclass
+class CycleSnapshot:
+    """Data shared by every position checked in one monitoring cycle. Prices and markets are keyed by normalized collateral address, on-chain states by position id.
+    Markets are also kept by lowercased unique key so positions resolve their own market.
+    On-chain states are all read at block_number so decisions within a cycle see one consistent chain state.
+    """
+
+    collateral_prices: dict[str, float] = field(default_factory=dict)
+    # NOTE: Morpho oracle prices are in loan asset units, these are the same prices in USD for recording price history
+    collateral_prices_usd: dict[str, float] = field(default_factory=dict)
+    markets: dict[str, MorphoMarket] = field(default_factory=dict)
+    markets_by_id: dict[str, MorphoMarket] = field(default_factory=dict)
+    yield_apy: float | None = None
+    block_number: int | None = None
+    position_states: dict[int, OnchainPositionState] = field(default_factory=dict)
+
+    def get_collateral_price(self, collateralAddress: str) -> float | None:
+        return self.collateral_prices.get(chain_util.normalize_address(collateralAddress))
+
+    def get_market(self, collateralAddress: str) -> MorphoMarket | None:
+        return self.markets.get(chain_util.normalize_address(collateralAddress))
+
+    def get_market_by_id(self, marketId: str) -> MorphoMarket | None:
+        return self.markets_by_id.get(marketId.lower())
+
+
 class LtvManager:
     """Manages LTV monitoring and automatic adjustments for positions."""
 
@@ -59,6 +113,10 @@ class LtvManager:
         databaseStore: DatabaseStore,
         priceIntelligenceService: PriceIntelligenceService | None = None,
         fortyAcresClient: FortyAcresClient | None = None,
+        policy: LtvPolicy | None = None,
+        priceOracle: PriceOracle | None = None,
+        oraclePriceReader: MorphoOraclePriceReader | None = None,
+        vaultYieldService: VaultYieldService | None = None,
     ) -> None:
         self.chainId = chainId
         self.usdcAddress = usdcAddress
@@ -68,12 +126,147 @@ class LtvManager:
         self.databaseStore = databaseStore
         self.priceIntelligenceService = priceIntelligenceService
         self.fortyAcresClient = fortyAcresClient
+        self.policy = policy or LtvPolicy()
+        self.priceOracle = priceOracle or PriceOracle(priceClient=alchemyClient)
+        self.oraclePriceReader = oraclePriceReader
+        self.vaultYieldService = vaultYieldService or (VaultYieldService(vaultClient=fortyAcresClient, chainId=chainId) if fortyAcresClient else None)
         self.transactionBuilder = TransactionBuilder(chainId=chainId, usdcAddress=usdcAddress, yoVaultAddress=yoVaultAddress)
 
-    async def _get_collateral_price(self, collateralAddress: str) -> float:
-        priceData = await self.alchemyClient.get_asset_current_price(chainId=self.chainId, assetAddress=collateralAddress)
+    async def build_cycle_snapshot(self, collateralAddresses: list[str], blockNumber: int | None = None, marketIds: list[str] | None = None) -> CycleSnapshot:
+        """Fetch prices, markets and vault APY once for all collaterals in a cycle. Values that fail to load are left out so callers fall back to live fetches.
+        Collateral prices come from each market's Morpho oracle at blockNumber when an oracle reader is configured, and from the price oracle otherwise.
+        When Morpho market state is read on chain, the collaterals' markets and the given position market ids are all read at blockNumber.
+        """
+        normalizedAddresses = sorted({chain_util.normalize_address(collateralAddress) for collateralAddress in collateralAddresses})
+        marketResults = await asyncio.gather(*[self.morphoClient.get_market(chain_id=self.chainId, collateral_address=collateralAddress) for collateralAddress in normalizedAddresses], return_exceptions=True)
+        snapshot = CycleSnapshot(block_number=blockNumber)
+        for collateralAddress, marketResult in zip(normalizedAddresses, marketResults, strict=True):
+            if isinstance(marketResult, BaseException):
+                logging.warning(f'Failed to load market for {collateralAddress} into cycle snapshot: {marketResult}')
+            elif marketResult is not None:
+                snapshot.markets[collateralAddress] = marketResult
+                snapshot.markets_by_id[marketResult.unique_key.lower()] = marketResult
+        await self._load_snapshot_markets_by_id(snapshot=snapshot, marketIds=marketIds or [])
+        if self.morphoClient.uses_onchain_state(chain_id=self.chainId):
+            await self._refresh_snapshot_market_states(snapshot=snapshot, marketIds=marketIds or [])
+        oraclePrices = await self._read_oracle_collateral_prices(markets=list(snapshot.markets.values()), blockNumber=blockNumber)
+        snapshot.collateral_prices.update(oraclePrices)
+        if oraclePrices:
+            loanAssetPriceUsd = await self._get_loan_asset_price_usd()
+            if loanAssetPriceUsd is not None:
+                snapshot.collateral_prices_usd.update({collateralAddress: price * loanAssetPriceUsd for collateralAddress, price in oraclePrices.items()})
+        missingPriceAddresses = [collateralAddress for collateralAddress in normalizedAddresses if collateralAddress not in snapshot.collateral_prices]
+        if missingPriceAddresses:
+            try:
+                prices = await self.priceOracle.get_asset_current_prices(chainId=self.chainId, assetAddresses=missingPriceAddresses)
+            except Exception as e:  # noqa: BLE001
+                logging.warning(f'Failed to load prices into cycle snapshot: {e}')
+                prices = {}
+            for collateralAddress in missingPriceAddresses:
+                price = prices.get(collateralAddress)
+                if price is None:
+                    logging.warning(f'Failed to load price for {collateralAddress} into cycle snapshot')
+                else:
+                    snapshot.collateral_prices[collateralAddress] = price.priceUsd
+                    snapshot.collateral_prices_usd[collateralAddress] = price.priceUsd
+        if self.vaultYieldService:
+            try:
+                snapshot.yield_apy = await self.vaultYieldService.get_yield_apy()
+            except Exception as e:  # noqa: BLE001
+                logging.warning(f'Failed to load yield APY into cycle snapshot: {e}')
+        return snapshot
+
+    async def _load_snapshot_markets_by_id(self, snapshot: CycleSnapshot, marketIds: list[str]) -> None:
+        missingMarketIds = sorted({marketId.lower() for marketId in marketIds if marketId} - snapshot.markets_by_id.keys())
+        marketResults = await asyncio.gather(*[self.morphoClient.get_market_by_id(chain_id=self.chainId, market_id=marketId) for marketId in missingMarketIds], return_exceptions=True)
+        for marketId, marketResult in zip(missingMarketIds, marketResults, strict=True):
+            if isinstance(marketResult, BaseException):
+                logging.warning(f'Failed to load market {marketId} into cycle snapshot: {marketResult}')
+            elif marketResult is not None:
+                snapshot.markets_by_id[marketId] = marketResult
+
+    async def _refresh_snapshot_market_states(self, snapshot: CycleSnapshot, marketIds: list[str]) -> None:
+        # NOTE: position market ids that failed to load are still read so their on-chain state is pinned to the snapshot block
+        refreshMarketIds = sorted(snapshot.markets_by_id.keys() | {marketId.lower() for marketId in marketIds if marketId})
+        try:
+            refreshedMarkets = await self.morphoClient.refresh_market_states(chain_id=self.chainId, market_ids=refreshMarketIds, block_number=snapshot.block_number)
+        except Exception as e:  # noqa: BLE001
+            logging.warning(f'Failed to read Morpho market states on chain, keeping the cached markets: {e}')
+            return
+        for collateralAddress, market in snapshot.markets.items():
+            snapshot.markets[collateralAddress] = refreshedMarkets.get(market.unique_key.lower(), market)
+        for marketId, market in snapshot.markets_by_id.items():
+            snapshot.markets_by_id[marketId] = refreshedMarkets.get(marketId, market)
+
+    async def _read_oracle_collateral_prices(self, markets: list[MorphoMarket], blockNumber: int | None = None) -> dict[str, float]:
+        if not self.oraclePriceReader or len(markets) == 0:
+            return {}
+        try:
+            return await self.oraclePriceReader.read_collateral_prices(markets=markets, blockNumber=blockNumber)
+        except Exception as e:  # noqa: BLE001
+            logging.warning(f'Failed to read Morpho oracle prices, falling back to the price oracle: {e}')
+            return {}
+
+    async def _get_loan_asset_price_usd(self) -> float | None:
+        try:
+            priceData = await self.priceOracle.get_asset_current_price(chainId=self.chainId, assetAddress=self.usdcAddress)
+        except Exception as e:  # noqa: BLE001
+            logging.warning(f'Failed to get USDC price: {e}')
+            return None
         return priceData.priceUsd
 
+    async def _read_collateral_price(self, collateralAddress: str, snapshot: CycleSnapshot | None = None) -> tuple[float, bool]:
+        """Return the collateral price and whether it is in loan asset units from the Morpho oracle rather than in USD."""
+        if self.oraclePriceReader:
+            market = await self.get_market(collateralAddress=collateralAddress, snapshot=snapshot)
+            if market is not None:
+                oraclePrices = await self._read_oracle_collateral_prices(markets=[market], blockNumber=snapshot.block_number if snapshot else None)
+                oraclePrice = oraclePrices.get(chain_util.normalize_address(collateralAddress))
+                if oraclePrice is not None:
+                    return oraclePrice, True
+        priceData = await self.priceOracle.get_asset_current_price(chainId=self.chainId, assetAddress=collateralAddress)
+        return priceData.priceUsd, False
+
+    async def get_collateral_price(self, collateralAddress: str, snapshot: CycleSnapshot | None = None) -> float:
+        snapshotPrice = snapshot.get_collateral_price(collateralAddress=collateralAddress) if snapshot else None
+        if snapshotPrice is not None:
+            return snapshotPrice
+        price, _isLoanAssetPrice = await self._read_collateral_price(collateralAddress=collateralAddress, snapshot=snapshot)
+        return price
+
+    async def get_collateral_price_with_usd(self, collateralAddress: str) -> tuple[float, float | None]:
+        """Return the collateral price LTVs are computed with together with the same price in USD, which is None if it could not be converted."""
+        price, isLoanAssetPrice = await self._read_collateral_price(collateralAddress=collateralAddress)
+        if not isLoanAssetPrice:
+            return price, price
+        loanAssetPriceUsd = await self._get_loan_asset_price_usd()
+        return price, price * loanAssetPriceUsd if loanAssetPriceUsd is not None else None
+
+    async def get_market(self, collateralAddress: str, snapshot: CycleSnapshot | None = None) -> MorphoMarket | None:
+        snapshotMarket = snapshot.get_market(collateralAddress=collateralAddress) if snapshot else None
+        if snapshotMarket is not None:
+            return snapshotMarket
+        return await self.morphoClient.get_market(chain_id=self.chainId, collateral_address=collateralAddress)
+
+    async def get_position_market(self, position: AgentPosition, snapshot: CycleSnapshot | None = None) -> MorphoMarket | None:
+        """Get the market a position was opened in by its market id, falling back to the collateral's market for positions without one."""
+        if not position.morphoMarketId:
+            return await self.get_market(collateralAddress=position.collateralAsset, snapshot=snapshot)
+        snapshotMarket = snapshot.get_market_by_id(marketId=position.morphoMarketId) if snapshot else None
+        if snapshotMarket is not None:
+            return snapshotMarket
+        market = await self.morphoClient.get_market_by_id(chain_id=self.chainId, market_id=position.morphoMarketId)
+        if market is not None:
+            return market
+        return await self.get_market(collateralAddress=position.collateralAsset, snapshot=snapshot)
+
+    async def get_yield_apy(self, snapshot: CycleSnapshot | None = None) -> float | None:
+        if snapshot is not None and snapshot.yield_apy is not None:
+            return snapshot.yield_apy
+        if not self.vaultYieldService:
+            return None
+        return await self.vaultYieldService.get_yield_apy()
+
     async def check_position_ltv(
         self,
         position: AgentPosition,
@@ -81,11 +274,12 @@ class LtvManager:
         onchainCollateral: int | None = None,
         onchainBorrow: int | None = None,
         onchainVaultAssets: int | None = None,
+        snapshot: CycleSnapshot | None = None,
     ) -> LtvCheckResult:
         """Check if a position needs LTV adjustment.
         Requires onchainCollateral, onchainBorrow, and onchainVaultAssets from live on-chain data.
         """
-        market = await self.morphoClient.get_market(chain_id=self.chainId, collateral_address=position.collateralAsset)
+        market = await self.get_position_market(position=position, snapshot=snapshot)
         if market is None:
             return LtvCheckResult(
                 position_id=position.agentPositionId,
@@ -99,7 +293,7 @@ class LtvManager:
                 reason='Market not found',
             )
         try:
-            collateralPriceUsd = await self._get_collateral_price(position.collateralAsset)
+            collateralPriceUsd = await self.get_collateral_price(collateralAddress=position.collateralAsset, snapshot=snapshot)
         except Exception as e:  # noqa: BLE001
             logging.warning(f'Failed to get collateral price for {position.collateralAsset}: {e}')
             return LtvCheckResult(
@@ -144,17 +338,18 @@ class LtvManager:
             )
         currentLtv = borrowValueUsd / collateralValueUsd
         maxLtv = market.lltv
-        upperThreshold = position.targetLtv + LTV_MARGIN_UPPER
-        lowerThreshold = position.targetLtv - LTV_MARGIN_LOWER
+        upperThreshold = position.targetLtv + self.policy.margin_upper
+        lowerThreshold = position.targetLtv - self.policy.margin_lower
         if currentLtv > upperThreshold:
             repayAmount = int((borrowValueUsd - position.targetLtv * collateralValueUsd) * 1e6)
-            if repayAmount / 1e6 < MIN_ACTION_VALUE_USD:
+            if repayAmount / 1e6 < self.policy.min_action_value_usd:
                 return LtvCheckResult(
                     position_id=position.agentPositionId,
                     agent_id=position.agentId,
                     current_ltv=currentLtv,
                     target_ltv=position.targetLtv,
                     max_ltv=maxLtv,
+                    collateral_price_usd=collateralPriceUsd,
                     needs_action=False,
                     action_type=None,
                     action_amount=None,
@@ -174,6 +369,7 @@ class LtvManager:
                 current_ltv=currentLtv,
                 target_ltv=position.targetLtv,
                 max_ltv=maxLtv,
+                collateral_price_usd=collateralPriceUsd,
                 needs_action=True,
                 action_type=actionType,
                 action_amount=repayAmount,
@@ -181,13 +377,14 @@ class LtvManager:
             )
         if currentLtv < lowerThreshold:
             borrowAmount = int((position.targetLtv * collateralValueUsd - borrowValueUsd) * 1e6)
-            if borrowAmount / 1e6 < MIN_ACTION_VALUE_USD:
+            if borrowAmount / 1e6 < self.policy.min_action_value_usd:
                 return LtvCheckResult(
                     position_id=position.agentPositionId,
                     agent_id=position.agentId,
                     current_ltv=currentLtv,
                     target_ltv=position.targetLtv,
                     max_ltv=maxLtv,
+                    collateral_price_usd=collateralPriceUsd,
                     needs_action=False,
                     action_type=None,
                     action_amount=None,
@@ -198,6 +395,7 @@ class LtvManager:
                 borrowAmountUsd=borrowAmount / 1e6,
                 borrowApy=market.borrow_apy,
                 collateralAddress=position.collateralAsset,
+                snapshot=snapshot,
             )
             if optimizeSuppressed:
                 return LtvCheckResult(
@@ -206,6 +404,7 @@ class LtvManager:
                     current_ltv=currentLtv,
                     target_ltv=position.targetLtv,
                     max_ltv=maxLtv,
+                    collateral_price_usd=collateralPriceUsd,
                     needs_action=False,
                     action_type=None,
                     action_amount=None,
@@ -217,6 +416,7 @@ class LtvManager:
                 current_ltv=currentLtv,
                 target_ltv=position.targetLtv,
                 max_ltv=maxLtv,
+                collateral_price_usd=collateralPriceUsd,
                 needs_action=True,
                 action_type='auto_optimize',
                 action_amount=borrowAmount,
@@ -228,25 +428,26 @@ class LtvManager:
             current_ltv=currentLtv,
             target_ltv=position.targetLtv,
             max_ltv=maxLtv,
+            collateral_price_usd=collateralPriceUsd,
             needs_action=False,
             action_type=None,
             action_amount=None,
             reason=f'LTV {currentLtv:.2%} within acceptable range',
         )
 
-    async def _check_optimize_gates(self, borrowAmountUsd: float, borrowApy: float, collateralAddress: str) -> tuple[bool, str]:
+    async def _check_optimize_gates(self, borrowAmountUsd: float, borrowApy: float, collateralAddress: str, snapshot: CycleSnapshot | None = None) -> tuple[bool, str]:
         """Check profitability and volatility gates before auto-optimizing. Returns (suppressed, reason)."""
         # Gate 1: Profitability — yield must exceed borrow cost
-        if self.fortyAcresClient:
+        if self.vaultYieldService:
             try:
-                yieldApy = await self.fortyAcresClient.get_yield_apy(chainId=self.chainId)
+                yieldApy = await self.get_yield_apy(snapshot=snapshot)
                 if yieldApy is not None:
                     spread = yieldApy - borrowApy
                     if spread <= 0:
                         return True, f'Optimization suppressed: negative spread (yield {yieldApy:.2%} - borrow {borrowApy:.2%} = {spread:.2%})'
                     projectedAnnualGain = borrowAmountUsd * spread
-                    if projectedAnnualGain < MIN_OPTIMIZE_ANNUAL_GAIN_USD:
-                        return True, f'Optimization suppressed: projected annual gain ${projectedAnnualGain:.2f} below ${MIN_OPTIMIZE_ANNUAL_GAIN_USD:.0f} minimum'
+                    if projectedAnnualGain < self.policy.min_optimize_annual_gain_usd:
+                        return True, f'Optimization suppressed: projected annual gain ${projectedAnnualGain:.2f} below ${self.policy.min_optimize_annual_gain_usd:.0f} minimum'
             except Exception as e:  # noqa: BLE001
                 logging.warning(f'Failed to check yield APY for optimization gate: {e}')
 
@@ -254,16 +455,17 @@ class LtvManager:
         if self.priceIntelligenceService:
             try:
                 priceAnalysis = await self.priceIntelligenceService.get_price_analysis(chainId=self.chainId, assetAddress=collateralAddress)
-                if priceAnalysis.is_volatile(threshold=VOLATILITY_THRESHOLD):
-                    return True, (f'Optimization suppressed: high volatility (1h change: {priceAnalysis.change_1h_pct:+.2%}, 24h vol: {priceAnalysis.volatility_24h:.2%})')
+                if priceAnalysis.is_volatile(threshold=self.policy.volatility_threshold):
+                    riskDetails = f', peak vol: {priceAnalysis.risk_metrics.get_peak_hourly_volatility():.2%}, 24h drawdown: {priceAnalysis.risk_metrics.max_drawdown_24h:.2%}' if priceAnalysis.risk_metrics else ''
+                    return True, (f'Optimization suppressed: high volatility (1h change: {priceAnalysis.change_1h_pct:+.2%}, 24h vol: {priceAnalysis.volatility_24h:.2%}{riskDetails})')
             except Exception as e:  # noqa: BLE001
                 logging.warning(f'Failed to check price volatility for optimization gate: {e}')
 
         return False, ''
 
-    async def build_auto_repay_transactions(self, position: AgentPosition, repayAmount: int, userAddress: str) -> LtvActionTransactions:
+    async def build_auto_repay_transactions(self, position: AgentPosition, repayAmount: int, userAddress: str, snapshot: CycleSnapshot | None = None) -> LtvActionTransactions:
         """Build transactions to auto-repay debt (withdraw from vault, repay to Morpho)."""
-        market = await self.morphoClient.get_market(chain_id=self.chainId, collateral_address=position.collateralAsset)
+        market = await self.get_position_market(position=position, snapshot=snapshot)
         if market is None:
             raise ValueError(f'No market found for collateral {position.collateralAsset}')
         normalizedAddress = chain_util.normalize_address(userAddress)
@@ -284,9 +486,9 @@ class LtvManager:
             vault_withdraw_amount=vaultWithdrawAmount,
         )
 
-    async def build_auto_borrow_transactions(self, position: AgentPosition, borrowAmount: int, userAddress: str) -> LtvActionTransactions:
+    async def build_auto_borrow_transactions(self, position: AgentPosition, borrowAmount: int, userAddress: str, snapshot: CycleSnapshot | None = None) -> LtvActionTransactions:
         """Build transactions to auto-borrow more USDC and deposit to vault."""
-        market = await self.morphoClient.get_market(chain_id=self.chainId, collateral_address=position.collateralAsset)
+        market = await self.get_position_market(position=position, snapshot=snapshot)
         if market is None:
             raise ValueError(f'No market found for collateral {position.collateralAsset}')
         normalizedAddress = chain_util.normalize_address(userAddress)
@@ -305,19 +507,38 @@ class LtvManager:
             vault_withdraw_amount=0,
         )
 
-    async def log_ltv_check(self, result: LtvCheckResult) -> None:
-        """Log an LTV check result as an agent action."""
-        await self.databaseStore.log_agent_action(
-            agentId=result.agent_id,
-            actionType='ltv_check',
-            value=result.action_type or 'no_action',
-            valueId=str(result.position_id),
-            details={
-                'current_ltv': result.current_ltv,
-                'target_ltv': result.target_ltv,
-                'max_ltv': result.max_ltv,
-                'needs_action': result.needs_action,
-                'action_amount': result.action_amount,
-                'reason': result.reason,
-            },
+    async def build_planned_action_transactions(self, position: AgentPosition, plan: PositionActionPlan, userAddress: str, snapshot: CycleSnapshot | None = None) -> list[TransactionCall]:
+        """Build a single call bundle carrying out every action in the plan."""
+        market = await self.get_position_market(position=position, snapshot=snapshot)
+        if market is None:
+            raise ValueError(f'No market found for collateral {position.collateralAsset}')
+        return self.transactionBuilder.build_net_position_transactions_from_market(
+            user_address=chain_util.normalize_address(userAddress),
+            collateral_address=position.collateralAsset,
+            collateral_supply_amount=plan.collateral_supply_amount,
+            debt_change=plan.get_debt_change(),
+            vault_change=plan.get_vault_change(),
+            market=market,
+        )
+
+    async def log_ltv_checks(self, results: list[LtvCheckResult]) -> None:
+        """Record a cycle's LTV check results in the LTV time series with a single insert, as the policy decided them before any overrides."""
+        checkDate = date_util.datetime_from_now()
+        results = [result.policy_result or result for result in results]
+        await self.databaseStore.create_ltv_checks(
+            ltvChecks=[
+                {
+                    'agentPositionId': result.position_id,
+                    'checkDate': checkDate,
+                    'currentLtv': result.current_ltv,
+                    'targetLtv': result.target_ltv,
+                    'maxLtv': result.max_ltv,
+                    'decisionCode': LTV_DECISION_CODES.get(result.action_type, LTV_DECISION_CODES[None]) if result.needs_action else LTV_DECISION_CODES[None],
+                }
+                for result in results
+            ]
         )
+
+    async def rollup_ltv_checks(self) -> None:
+        """Downsample LTV checks older than the retention window into hourly rollups."""
+        await self.databaseStore.rollup_ltv_checks(before=date_util.datetime_from_now(days=-LTV_CHECK_RETENTION_DAYS))
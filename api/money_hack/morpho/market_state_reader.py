@@ -0,0 +1,165 @@
+import math
+from dataclasses import dataclass
+
+from core.util import chain_util
+from web3 import Web3
+
+from money_hack import constants
+from money_hack.blockchain_data.multicall_client import MULTICALL3_ABI
+from money_hack.blockchain_data.multicall_client import MULTICALL3_ADDRESS
+from money_hack.blockchain_data.multicall_client import MulticallClient
+from money_hack.blockchain_data.multicall_client import MulticallRequest
+from money_hack.morpho import morpho_abis
+from money_hack.morpho.transaction_builder import MORPHO_BLUE_ADDRESS
+
+WAD = 10**18
+# NOTE: Morpho Blue converts between shares and assets with one virtual asset and 1e6 virtual shares to guard against inflation attacks
+MORPHO_VIRTUAL_ASSETS = 1
+MORPHO_VIRTUAL_SHARES = 10**6
+ZERO_ADDRESS = '0x0000000000000000000000000000000000000000'
+
+
+def w_taylor_compounded(rate: int, seconds: int) -> int:
+    """Morpho Blue's third order approximation of e^(rate * seconds) - 1, in WAD, used when accruing interest."""
+    firstTerm = rate * seconds
+    secondTerm = firstTerm * firstTerm // (2 * WAD)
+    thirdTerm = secondTerm * firstTerm // (3 * WAD)
+    return firstTerm + secondTerm + thirdTerm
+
+
+def rate_to_apy(ratePerSecond: int) -> float:
+    """Convert a continuously compounded per second WAD rate into an APY."""
+    return math.expm1(ratePerSecond * constants.SECONDS_PER_YEAR / WAD)
+
+
+@dataclass
+class MorphoMarketParams:
+    loan_address: str
+    collateral_address: str
+    oracle_address: str
+    irm_address: str
+    lltv: int
+
+    def to_tuple(self) -> tuple[str, str, str, str, int]:
+        return (Web3.to_checksum_address(self.loan_address), Web3.to_checksum_address(self.collateral_address), Web3.to_checksum_address(self.oracle_address), Web3.to_checksum_address(self.irm_address), self.lltv)
+
+
+@dataclass
+class MorphoMarketState:
+    """A Morpho Blue market as stored on chain at block_number, with the IRM's borrow rate at that block.
+    Totals are as of last_update, the expected_* methods accrue interest up to a later timestamp the same way the contract would.
+    """
+
+    market_id: str
+    total_supply_assets: int
+    total_supply_shares: int
+    total_borrow_assets: int
+    total_borrow_shares: int
+    last_update: int
+    fee: int
+    borrow_rate: int  # Per second borrow rate (18 decimals)
+    timestamp: int  # Timestamp of the block the state was read at
+    block_number: int | None = None
+
+    def get_expected_totals(self, timestamp: int) -> tuple[int, int]:
+        """Return (total_supply_assets, total_borrow_assets) with interest accrued up to timestamp."""
+        elapsedSeconds = max(timestamp - self.last_update, 0)
+        interest = self.total_borrow_assets * w_taylor_compounded(rate=self.borrow_rate, seconds=elapsedSeconds) // WAD
+        return self.total_supply_assets + interest, self.total_borrow_assets + interest
+
+    def get_expected_borrow_assets(self, borrowShares: int, timestamp: int) -> int:
+        """Convert borrow shares to assets with interest accrued up to timestamp, rounding up like the contract does for debt."""
+        if borrowShares == 0:
+            return 0
+        _totalSupplyAssets, totalBorrowAssets = self.get_expected_totals(timestamp=timestamp)
+        totalAssets = totalBorrowAssets + MORPHO_VIRTUAL_ASSETS
+        totalShares = self.total_borrow_shares + MORPHO_VIRTUAL_SHARES
+        return (borrowShares * totalAssets + totalShares - 1) // totalShares
+
+    def get_utilization(self) -> float:
+        totalSupplyAssets, totalBorrowAssets = self.get_expected_totals(timestamp=self.timestamp)
+        return totalBorrowAssets / totalSupplyAssets if totalSupplyAssets > 0 else 0.0
+
+    def get_borrow_apy(self) -> float:
+        return rate_to_apy(ratePerSecond=self.borrow_rate)
+
+    def get_supply_apy(self) -> float:
+        return self.get_borrow_apy() * self.get_utilization() * (1 - self.fee / WAD)
+
+
+class MorphoMarketStateReader:
+    """Reads Morpho Blue market state straight from the contract on one chain, with the IRM's current borrow rate.
+    The first round trip reads market(id) for every market together with the block timestamp, and idToMarketParams(id) for markets not seen before,
+    whose params never change and are kept for the life of the process. The second reads borrowRateView from each market's IRM.
+    Both go through Multicall3, so reads pinned to a cycle's block share that block's memoized results with the position reads.
+    """
+
+    def __init__(self, chainId: int, multicallClient: MulticallClient) -> None:
+        self.chainId = chainId
+        self.multicallClient = multicallClient
+        self._marketParams: dict[str, MorphoMarketParams] = {}
+
+    @staticmethod
+    def _market_id_to_bytes(marketId: str) -> bytes:
+        return bytes.fromhex(marketId.removeprefix('0x'))
+
+    async def read_market_states(self, marketIds: list[str], blockNumber: int | None = None) -> dict[str, MorphoMarketState]:
+        """Return the state of each market keyed by lowercased market id. Markets whose reads fail are left out."""
+        uniqueMarketIds = sorted({marketId.lower() for marketId in marketIds})
+        if len(uniqueMarketIds) == 0:
+            return {}
+        missingParamIds = [marketId for marketId in uniqueMarketIds if marketId not in self._marketParams]
+        calls = [MulticallRequest(toAddress=MULTICALL3_ADDRESS, contractAbi=MULTICALL3_ABI, functionName='getCurrentBlockTimestamp')]
+        calls += [MulticallRequest(toAddress=MORPHO_BLUE_ADDRESS, contractAbi=morpho_abis.MORPHO_BLUE_ABI, functionName='market', arguments={'id': self._market_id_to_bytes(marketId=marketId)}) for marketId in uniqueMarketIds]
+        calls += [MulticallRequest(toAddress=MORPHO_BLUE_ADDRESS, contractAbi=morpho_abis.MORPHO_BLUE_ABI, functionName='idToMarketParams', arguments={'id': self._market_id_to_bytes(marketId=marketId)}) for marketId in missingParamIds]
+        results = await self.multicallClient.call_many(requests=calls, blockNumber=blockNumber)
+        timestampResult = results[0]
+        if timestampResult is None:
+            return {}
+        timestamp = int(timestampResult[0])
+        marketValues = {marketId: [int(value) for value in result] for marketId, result in zip(uniqueMarketIds, results[1 : 1 + len(uniqueMarketIds)], strict=True) if result is not None}
+        for marketId, paramsResult in zip(missingParamIds, results[1 + len(uniqueMarketIds) :], strict=True):
+            # NOTE: ids that were never created have no last update and return zeroed params, which must not be cached as a real market
+            if paramsResult is not None and marketId in marketValues and marketValues[marketId][4] > 0:
+                self._marketParams[marketId] = MorphoMarketParams(
+                    loan_address=chain_util.normalize_address(str(paramsResult[0])),
+                    collateral_address=chain_util.normalize_address(str(paramsResult[1])),
+                    oracle_address=chain_util.normalize_address(str(paramsResult[2])),
+                    irm_address=chain_util.normalize_address(str(paramsResult[3])),
+                    lltv=int(paramsResult[4]),
+                )
+        readMarketIds = [marketId for marketId in uniqueMarketIds if marketId in marketValues and marketId in self._marketParams]
+        # NOTE: markets created without an IRM never accrue interest, so there is no rate to read for them
+        rateMarketIds = [marketId for marketId in readMarketIds if self._marketParams[marketId].irm_address != ZERO_ADDRESS]
+        rateResults = await self.multicallClient.call_many(
+            requests=[
+                MulticallRequest(
+                    toAddress=self._marketParams[marketId].irm_address,
+                    contractAbi=morpho_abis.MORPHO_IRM_ABI,
+                    functionName='borrowRateView',
+                    arguments={'marketParams': self._marketParams[marketId].to_tuple(), 'market': tuple(marketValues[marketId])},
+                )
+                for marketId in rateMarketIds
+            ],
+            blockNumber=blockNumber,
+        )
+        borrowRates = {marketId: int(result[0]) for marketId, result in zip(rateMarketIds, rateResults, strict=True) if result is not None}
+        states: dict[str, MorphoMarketState] = {}
+        for marketId in readMarketIds:
+            borrowRate = borrowRates.get(marketId, 0 if self._marketParams[marketId].irm_address == ZERO_ADDRESS else None)
+            if borrowRate is None:
+                continue
+            totalSupplyAssets, totalSupplyShares, totalBorrowAssets, totalBorrowShares, lastUpdate, fee = marketValues[marketId]
+            states[marketId] = MorphoMarketState(
+                market_id=marketId,
+                total_supply_assets=totalSupplyAssets,
+                total_supply_shares=totalSupplyShares,
+                total_borrow_assets=totalBorrowAssets,
+                total_borrow_shares=totalBorrowShares,
+                last_update=lastUpdate,
+                fee=fee,
+                borrow_rate=borrowRate,
+                timestamp=timestamp,
+                block_number=blockNumber,
+            )
+        return states
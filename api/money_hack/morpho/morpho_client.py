@@ -1,4 +1,7 @@
+import asyncio
+import time
 import typing
+from dataclasses import dataclass
 
 from core import logging
 from core.requester import Requester
@@ -7,6 +10,13 @@ from pydantic import BaseModel
 
 from money_hack import constants
 from money_hack.morpho import morpho_queries
+from money_hack.morpho.market_state_reader import MorphoMarketState
+from money_hack.morpho.market_state_reader import MorphoMarketStateReader
+
+# NOTE: only rates and totals expire, oracle, IRM and LLTV are fixed when a Morpho market is created
+MORPHO_MARKET_STATE_TTL_SECONDS = 60
+# NOTE: when state is read on chain the API is only asked which markets exist for a collateral, which rarely changes
+MORPHO_MARKET_DISCOVERY_TTL_SECONDS = 60 * 60
 
 
 class MorphoMarket(BaseModel):
@@ -31,18 +41,62 @@ class MorphoMarket(BaseModel):
     total_borrow: int  # Total borrowed assets (raw)
 
 
+def select_best_market(markets: list[MorphoMarket]) -> MorphoMarket | None:
+    """Return the market with the highest liquidity (most total supply), or None if there are none."""
+    if not markets:
+        return None
+    return max(markets, key=lambda m: m.total_supply)
+
+
+def select_best_markets_by_collateral(markets: list[MorphoMarket]) -> dict[str, MorphoMarket]:
+    """Return the best market for each collateral, keyed by normalized collateral address."""
+    bestMarkets: dict[str, MorphoMarket] = {}
+    for market in markets:
+        collateralAddress = chain_util.normalize_address(market.collateral_address)
+        bestMarket = bestMarkets.get(collateralAddress)
+        if bestMarket is None or market.total_supply > bestMarket.total_supply:
+            bestMarkets[collateralAddress] = market
+    return bestMarkets
+
+
+@dataclass
+class _MarketEntry:
+    market: MorphoMarket
+    stateFetchedTime: float
+
+
+@dataclass
+class _MarketListEntry:
+    uniqueKeys: list[str]
+    fetchedTime: float
+
+
 class MorphoClient:
-    """Client for fetching Morpho lending market data (borrow rates, etc.)"""
+    """Client for fetching Morpho lending market data (borrow rates, etc.)
+    Markets are kept in an in-process registry keyed by unique key. Their params never change so entries are kept for the life of the process,
+    while their state is refetched once it is older than stateTtlSeconds. Concurrent lookups share one in-flight query, and when a refresh fails
+    the last known market is served instead.
+    With a marketStateReader, state on its chain is read from the Morpho Blue contract and rates are computed locally, so the API is only
+    used to discover markets and their token metadata.
+    """
 
     GRAPHQL_URL = 'https://blue-api.morpho.org/graphql'
 
-    def __init__(self, requester: Requester) -> None:
+    def __init__(self, requester: Requester, graphqlUrl: str = GRAPHQL_URL, stateTtlSeconds: float = MORPHO_MARKET_STATE_TTL_SECONDS, marketStateReader: MorphoMarketStateReader | None = None) -> None:
         self.requester = requester
+        self.graphqlUrl = graphqlUrl
+        self.stateTtlSeconds = stateTtlSeconds
+        self.marketStateReader = marketStateReader
+        self._markets: dict[tuple[int, str], _MarketEntry] = {}
+        self._onchainStates: dict[tuple[int, str], MorphoMarketState] = {}
+        self._collateralMarkets: dict[tuple[int, str, str], _MarketListEntry] = {}
+        self._loanMarkets: dict[tuple[int, str], _MarketListEntry] = {}
+        self._inflightQueries: dict[tuple[str, int, str, str], asyncio.Task[list[MorphoMarket]]] = {}
 
     async def _query_graphql(self, query: str, variables: dict[str, typing.Any]) -> dict[str, typing.Any]:  # type: ignore[explicit-any]
         """Execute a GraphQL query against Morpho's API"""
         response = await self.requester.post_json(
-            url=self.GRAPHQL_URL,
+            url=self.graphqlUrl,
             dataDict={
                 'query': query,
                 'variables': variables,
@@ -51,6 +105,197 @@ class MorphoClient:
         )
         return dict(response.json())
 
+    def _is_fresh(self, fetchedTime: float) -> bool:
+        return time.time() - fetchedTime < self.stateTtlSeconds
+
+    def uses_onchain_state(self, chain_id: int) -> bool:
+        return self.marketStateReader is not None and self.marketStateReader.chainId == chain_id
+
+    def _is_discovery_fresh(self, chainId: int, entry: _MarketListEntry) -> bool:
+        discoveryTtlSeconds = MORPHO_MARKET_DISCOVERY_TTL_SECONDS if self.uses_onchain_state(chain_id=chainId) else self.stateTtlSeconds
+        return time.time() - entry.fetchedTime < discoveryTtlSeconds
+
+    def _is_market_list_fresh(self, chainId: int, entry: _MarketListEntry) -> bool:
+        if not self._is_discovery_fresh(chainId=chainId, entry=entry):
+            return False
+        marketEntries = [self._markets.get((chainId, uniqueKey)) for uniqueKey in entry.uniqueKeys]
+        return all(marketEntry is not None and self._is_fresh(fetchedTime=marketEntry.stateFetchedTime) for marketEntry in marketEntries)
+
+    def _store_markets(self, chainId: int, markets: list[MorphoMarket], fetchedTime: float) -> None:
+        for market in markets:
+            self._markets[(chainId, market.unique_key.lower())] = _MarketEntry(market=market, stateFetchedTime=fetchedTime)
+
+    def _get_cached_market(self, chainId: int, uniqueKey: str) -> MorphoMarket | None:
+        entry = self._markets.get((chainId, uniqueKey.lower()))
+        return entry.market if entry else None
+
+    def _on_query_done(self, key: tuple[str, int, str, str], task: asyncio.Task[list[MorphoMarket]]) -> None:
+        self._inflightQueries.pop(key, None)
+        # NOTE: retrieving the exception here keeps queries whose callers were cancelled from being reported as unhandled
+        if not task.cancelled() and task.exception() is not None:
+            logging.warning(f'Morpho market query {key} failed: {task.exception()}')
+
+    @staticmethod
+    def _apply_onchain_state(market: MorphoMarket, state: MorphoMarketState) -> MorphoMarket:
+        totalSupplyAssets, totalBorrowAssets = state.get_expected_totals(timestamp=state.timestamp)
+        return market.model_copy(
+            update={
+                'borrow_apy': state.get_borrow_apy(),
+                'supply_apy': state.get_supply_apy(),
+                'utilization': state.get_utilization(),
+                'total_supply': totalSupplyAssets,
+                'total_borrow': totalBorrowAssets,
+            }
+        )
+
+    async def refresh_market_states(self, chain_id: int, market_ids: list[str], block_number: int | None = None) -> dict[str, MorphoMarket]:
+        """
+        Read the state of markets from the Morpho Blue contract and update the registry with locally computed rates.
+
+        Args:
+            chain_id: Chain ID, must be the chain of the configured market state reader
+            market_ids: Unique keys of the markets to refresh
+            block_number: Block to read at, defaults to the latest
+
+        Returns:
+            The refreshed markets keyed by lowercased unique key. Markets that failed to read or have not been seen in the registry are left out
+        """
+        if self.marketStateReader is None or not self.uses_onchain_state(chain_id=chain_id):
+            raise ValueError(f'No Morpho market state reader configured for chain {chain_id}')
+        states = await self.marketStateReader.read_market_states(marketIds=market_ids, blockNumber=block_number)
+        refreshedTime = time.time()
+        refreshedMarkets: dict[str, MorphoMarket] = {}
+        for uniqueKey, state in states.items():
+            self._onchainStates[(chain_id, uniqueKey)] = state
+            entry = self._markets.get((chain_id, uniqueKey))
+            if entry is None:
+                continue
+            market = self._apply_onchain_state(market=entry.market, state=state)
+            self._markets[(chain_id, uniqueKey)] = _MarketEntry(market=market, stateFetchedTime=refreshedTime)
+            refreshedMarkets[uniqueKey] = market
+        return refreshedMarkets
+
+    def get_expected_borrow_assets(self, chain_id: int, market_id: str, borrow_shares: int, block_number: int | None = None) -> int | None:
+        """
+        Convert borrow shares to assets with interest accrued, from the last on-chain state read for the market.
+
+        Args:
+            chain_id: Chain ID
+            market_id: Unique key of the market
+            borrow_shares: Borrow shares of the position
+            block_number: Block the shares were read at, or None for the latest
+
+        Returns:
+            Borrow assets (raw), or None if no state read at that block (or recently, for the latest) is held
+        """
+        state = self._onchainStates.get((chain_id, market_id.lower()))
+        if state is None:
+            return None
+        if block_number is not None:
+            return state.get_expected_borrow_assets(borrowShares=borrow_shares, timestamp=state.timestamp) if state.block_number == block_number else None
+        if time.time() - state.timestamp >= self.stateTtlSeconds:
+            return None
+        return state.get_expected_borrow_assets(borrowShares=borrow_shares, timestamp=int(time.time()))
+
+    async def _read_onchain_markets(self, chainId: int, uniqueKeys: list[str]) -> list[MorphoMarket]:
+        await self.refresh_market_states(chain_id=chainId, market_ids=uniqueKeys)
+        return [market for market in (self._get_cached_market(chainId=chainId, uniqueKey=uniqueKey) for uniqueKey in uniqueKeys) if market is not None]
+
+    async def _query_market_page(self, query: str, variables: dict[str, typing.Any], skip: int) -> dict[str, typing.Any]:  # type: ignore[explicit-any]
+        response = await self._query_graphql(query=query, variables={**variables, 'skip': skip})
+        return dict(response.get('data', {}).get('markets', {}))
+
+    async def _query_all_markets(self, query: str, variables: dict[str, typing.Any]) -> list[dict[str, typing.Any]]:  # type: ignore[explicit-any]
+        """Fetch every page of a markets query. The first page gives the total count, the rest are fetched concurrently."""
+        firstPage = await self._query_market_page(query=query, variables=variables, skip=0)
+        items = list(firstPage.get('items', []))
+        countTotal = int((firstPage.get('pageInfo') or {}).get('countTotal') or len(items))
+        remainingPages = await asyncio.gather(*[self._query_market_page(query=query, variables=variables, skip=skip) for skip in range(morpho_queries.MARKETS_PAGE_SIZE, countTotal, morpho_queries.MARKETS_PAGE_SIZE)])
+        for page in remainingPages:
+            items.extend(page.get('items', []))
+        return items
+
+    async def _fetch_markets_for_collateral(self, chainId: int, collateralAddress: str, loanAddress: str) -> list[MorphoMarket]:
+        entry = self._collateralMarkets.get((chainId, collateralAddress, loanAddress))
+        if entry is not None and self.uses_onchain_state(chain_id=chainId) and self._is_discovery_fresh(chainId=chainId, entry=entry):
+            return await self._read_onchain_markets(chainId=chainId, uniqueKeys=entry.uniqueKeys)
+        marketItems = await self._query_all_markets(
+            query=morpho_queries.LIST_MARKETS_QUERY,
+            variables={
+                'chainId': chainId,
+                'collateralAssetAddress': collateralAddress,
+                'loanAssetAddress': loanAddress,
+            },
+        )
+        markets = [self._parse_market(m, chainId) for m in marketItems]
+        fetchedTime = time.time()
+        self._store_markets(chainId=chainId, markets=markets, fetchedTime=fetchedTime)
+        self._collateralMarkets[(chainId, collateralAddress, loanAddress)] = _MarketListEntry(uniqueKeys=[market.unique_key.lower() for market in markets], fetchedTime=fetchedTime)
+        if not markets:
+            logging.warning(f'No Morpho market found for {collateralAddress} -> {loanAddress} on chain {chainId}')
+        return markets
+
+    async def _fetch_markets_for_loan_asset(self, chainId: int, loanAddress: str) -> list[MorphoMarket]:
+        entry = self._loanMarkets.get((chainId, loanAddress))
+        if entry is not None and self.uses_onchain_state(chain_id=chainId) and self._is_discovery_fresh(chainId=chainId, entry=entry):
+            return await self._read_onchain_markets(chainId=chainId, uniqueKeys=entry.uniqueKeys)
+        marketItems = await self._query_all_markets(
+            query=morpho_queries.LIST_MARKETS_BY_LOAN_ASSET_QUERY,
+            variables={
+                'chainId': chainId,
+                'loanAssetAddress': loanAddress,
+            },
+        )
+        # NOTE: items without a collateral asset are idle markets that cannot be borrowed from
+        markets = [self._parse_market(m, chainId) for m in marketItems if m.get('collateralAsset')]
+        fetchedTime = time.time()
+        self._store_markets(chainId=chainId, markets=markets, fetchedTime=fetchedTime)
+        self._loanMarkets[(chainId, loanAddress)] = _MarketListEntry(uniqueKeys=[market.unique_key.lower() for market in markets], fetchedTime=fetchedTime)
+        # NOTE: the sweep also answers every per collateral lookup for this loan asset until it expires
+        collateralMarketKeys: dict[str, list[str]] = {}
+        for market in markets:
+            collateralMarketKeys.setdefault(market.collateral_address, []).append(market.unique_key.lower())
+        for collateralAddress, uniqueKeys in collateralMarketKeys.items():
+            self._collateralMarkets[(chainId, collateralAddress, loanAddress)] = _MarketListEntry(uniqueKeys=uniqueKeys, fetchedTime=fetchedTime)
+        logging.info(f'Loaded {len(markets)} Morpho markets for loan asset {loanAddress} on chain {chainId}')
+        return markets
+
+    async def _fetch_market_by_id(self, chainId: int, uniqueKey: str) -> list[MorphoMarket]:
+        if (chainId, uniqueKey) in self._markets and self.uses_onchain_state(chain_id=chainId):
+            return await self._read_onchain_markets(chainId=chainId, uniqueKeys=[uniqueKey])
+        response = await self._query_graphql(
+            query=morpho_queries.MARKET_BY_UNIQUE_KEY_QUERY,
+            variables={
+                'uniqueKey': uniqueKey,
+                'chainId': chainId,
+            },
+        )
+        marketDict = (response.get('data') or {}).get('marketByUniqueKey')
+        if not marketDict:
+            logging.warning(f'No Morpho market found with id {uniqueKey} on chain {chainId}')
+            return []
+        markets = [self._parse_market(marketDict, chainId)]
+        self._store_markets(chainId=chainId, markets=markets, fetchedTime=time.time())
+        return markets
+
+    def _get_inflight_query(self, key: tuple[str, int, str, str]) -> asyncio.Task[list[MorphoMarket]]:
+        query = self._inflightQueries.get(key)
+        if query is None:
+            queryType, chainId, address, loanAddress = key
+            if queryType == 'id':
+                query = asyncio.create_task(self._fetch_market_by_id(chainId=chainId, uniqueKey=address))
+            elif queryType == 'loan':
+                query = asyncio.create_task(self._fetch_markets_for_loan_asset(chainId=chainId, loanAddress=address))
+            else:
+                query = asyncio.create_task(self._fetch_markets_for_collateral(chainId=chainId, collateralAddress=address, loanAddress=loanAddress))
+            self._inflightQueries[key] = query
+            query.add_done_callback(lambda task: self._on_query_done(key=key, task=task))
+        return query
+
+    async def _run_shared_query(self, key: tuple[str, int, str, str]) -> list[MorphoMarket]:
+        # NOTE: shielded so one caller being cancelled does not cancel the query for everyone waiting on it
+        return await asyncio.shield(self._get_inflight_query(key=key))
+
     async def get_market(
         self,
         chain_id: int,
@@ -68,31 +313,37 @@ class MorphoClient:
         Returns:
             MorphoMarket with borrow rates, or None if no market exists
         """
-        collateral_address = chain_util.normalize_address(collateral_address)
-        if loan_address is None:
-            loan_address = constants.CHAIN_USDC_MAP.get(chain_id)
-            if loan_address is None:
-                return None
-        loan_address = chain_util.normalize_address(loan_address)
-
-        response = await self._query_graphql(
-            query=morpho_queries.LIST_MARKETS_QUERY,
-            variables={
-                'skip': 0,
-                'chainId': chain_id,
-                'collateralAssetAddress': collateral_address,
-                'loanAssetAddress': loan_address,
-            },
-        )
-
-        markets = response.get('data', {}).get('markets', {}).get('items', [])
+        markets = await self.get_markets_for_collateral(chain_id=chain_id, collateral_address=collateral_address, loan_address=loan_address)
         if not markets:
-            logging.warning(f'No Morpho market found for {collateral_address} -> {loan_address} on chain {chain_id}')
             return None
 
-        # Return the market with highest liquidity (most total supply)
-        best_market = max(markets, key=lambda m: int(m['state']['supplyAssets'] or 0))
-        return self._parse_market(best_market, chain_id)
+        return select_best_market(markets=markets)
+
+    async def get_market_by_id(self, chain_id: int, market_id: str) -> MorphoMarket | None:
+        """
+        Get market data for a Morpho Blue market id, as stored on each AgentPosition.
+
+        Args:
+            chain_id: Chain ID
+            market_id: Unique key of the market (0x-prefixed bytes32)
+
+        Returns:
+            MorphoMarket with borrow rates, or None if no market exists
+        """
+        if not market_id:
+            return None
+        uniqueKey = market_id.lower()
+        entry = self._markets.get((chain_id, uniqueKey))
+        if entry is not None and self._is_fresh(fetchedTime=entry.stateFetchedTime):
+            return entry.market
+        try:
+            markets = await self._run_shared_query(key=('id', chain_id, uniqueKey, ''))
+        except Exception as e:
+            if entry is None:
+                raise
+            logging.warning(f'Failed to refresh Morpho market {uniqueKey}, serving the last known state: {e}')
+            return entry.market
+        return markets[0] if markets else None
 
     async def get_markets_for_collateral(
         self,
@@ -119,18 +370,48 @@ class MorphoClient:
 
         loan_address = chain_util.normalize_address(loan_address)
 
-        response = await self._query_graphql(
-            query=morpho_queries.LIST_MARKETS_QUERY,
-            variables={
-                'skip': 0,
-                'chainId': chain_id,
-                'collateralAssetAddress': collateral_address,
-                'loanAssetAddress': loan_address,
-            },
-        )
+        entry = self._collateralMarkets.get((chain_id, collateral_address, loan_address))
+        cachedMarkets = [market for market in (self._get_cached_market(chainId=chain_id, uniqueKey=uniqueKey) for uniqueKey in entry.uniqueKeys) if market is not None] if entry else []
+        if entry is not None and self._is_market_list_fresh(chainId=chain_id, entry=entry):
+            return cachedMarkets
+        try:
+            return await self._run_shared_query(key=('collateral', chain_id, collateral_address, loan_address))
+        except Exception as e:
+            if entry is None:
+                raise
+            logging.warning(f'Failed to refresh Morpho markets for {collateral_address} -> {loan_address}, serving the last known state: {e}')
+            return cachedMarkets
+
+    async def list_markets(self, chain_id: int, loan_address: str | None = None) -> list[MorphoMarket]:
+        """
+        Get every market lending a loan asset, paging through the API concurrently.
+
+        The sweep also fills the registry for each collateral, so later per collateral lookups are answered from memory.
+
+        Args:
+            chain_id: Chain ID
+            loan_address: Address of the loan asset, defaults to USDC
+
+        Returns:
+            List of MorphoMarket objects
+        """
+        if loan_address is None:
+            loan_address = constants.CHAIN_USDC_MAP.get(chain_id)
+            if loan_address is None:
+                return []
+        loan_address = chain_util.normalize_address(loan_address)
 
-        markets = response.get('data', {}).get('markets', {}).get('items', [])
-        return [self._parse_market(m, chain_id) for m in markets]
+        entry = self._loanMarkets.get((chain_id, loan_address))
+        cachedMarkets = [market for market in (self._get_cached_market(chainId=chain_id, uniqueKey=uniqueKey) for uniqueKey in entry.uniqueKeys) if market is not None] if entry else []
+        if entry is not None and self._is_market_list_fresh(chainId=chain_id, entry=entry):
+            return cachedMarkets
+        try:
+            return await self._run_shared_query(key=('loan', chain_id, loan_address, ''))
+        except Exception as e:
+            if entry is None:
+                raise
+            logging.warning(f'Failed to refresh Morpho markets for loan asset {loan_address}, serving the last known state: {e}')
+            return cachedMarkets
 
     async def get_borrow_apy(
         self,
@@ -1,3 +1,6 @@
+# NOTE: the API caps page size at 100, larger result sets are fetched with skip
+MARKETS_PAGE_SIZE = 100
+
 # Query for getting market (lending pool) data including borrow rates
 # Markets represent lending pools where you can supply collateral and borrow assets
 LIST_MARKETS_QUERY = """
@@ -56,6 +59,8 @@ query ListMarketsByLoanAsset($skip: Int!, $chainId: Int!, $loanAssetAddress: Str
         symbol
         decimals
       }
+      oracleAddress
+      irmAddress
       state {
         borrowApy
         supplyApy
@@ -76,3 +81,35 @@ query ListMarketsByLoanAsset($skip: Int!, $chainId: Int!, $loanAssetAddress: Str
   }
 }
 """
+
+# Query for getting a single market by its unique key (the Morpho Blue market id)
+MARKET_BY_UNIQUE_KEY_QUERY = """
+query MarketByUniqueKey($uniqueKey: String!, $chainId: Int!) {
+  marketByUniqueKey(uniqueKey: $uniqueKey, chainId: $chainId) {
+    uniqueKey
+    lltv
+    collateralAsset {
+      address
+      symbol
+      decimals
+    }
+    loanAsset {
+      address
+      symbol
+      decimals
+    }
+    oracleAddress
+    irmAddress
+    state {
+      borrowApy
+      supplyApy
+      utilization
+      supplyAssets
+      borrowAssets
+    }
+    oracleInfo {
+      type
+    }
+  }
+}
+"""
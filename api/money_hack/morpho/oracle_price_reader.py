@@ -0,0 +1,88 @@
+import asyncio
+
+from core.util import chain_util
+
+from money_hack.blockchain_data.blockchain_data_client import ClientAssetPrice
+from money_hack.blockchain_data.blockchain_data_client import PriceNotFoundException
+from money_hack.blockchain_data.hedged_price_resolver import PriceSource
+from money_hack.blockchain_data.multicall_client import MulticallClient
+from money_hack.blockchain_data.multicall_client import MulticallRequest
+from money_hack.morpho import morpho_abis
+from money_hack.morpho.morpho_client import MorphoClient
+from money_hack.morpho.morpho_client import MorphoMarket
+
+# NOTE: Morpho oracles quote one base unit of collateral in base units of the loan asset, scaled by 1e36
+MORPHO_ORACLE_PRICE_SCALE = 10**36
+
+
+def oracle_price_to_collateral_price(oraclePrice: int, collateralDecimals: int, loanDecimals: int) -> float:
+    """Convert a raw Morpho oracle price into the price of one whole collateral token in whole loan tokens."""
+    return float(oraclePrice * (10**collateralDecimals) / (MORPHO_ORACLE_PRICE_SCALE * (10**loanDecimals)))
+
+
+class MorphoOraclePriceReader:
+    """Reads collateral prices from the oracles Morpho markets liquidate against.
+    Prices come back in loan asset units (USDC for every supported market), so LTVs computed from them match the protocol's own.
+    All oracles are read in one Multicall3 request, pinned to the cycle's block when one is given.
+    """
+
+    def __init__(self, multicallClient: MulticallClient) -> None:
+        self.multicallClient = multicallClient
+
+    async def read_collateral_prices(self, markets: list[MorphoMarket], blockNumber: int | None = None) -> dict[str, float]:
+        """Return the oracle price of each market's collateral, keyed by normalized collateral address. Markets whose oracle read fails are left out."""
+        oracleAddresses = sorted({chain_util.normalize_address(market.oracle_address) for market in markets})
+        if len(oracleAddresses) == 0:
+            return {}
+        results = await self.multicallClient.call_many(
+            requests=[MulticallRequest(toAddress=oracleAddress, contractAbi=morpho_abis.MORPHO_ORACLE_ABI, functionName='price') for oracleAddress in oracleAddresses],
+            blockNumber=blockNumber,
+        )
+        oraclePrices = {oracleAddress: int(result[0]) for oracleAddress, result in zip(oracleAddresses, results, strict=True) if result is not None and int(result[0]) > 0}
+        collateralPrices: dict[str, float] = {}
+        for market in markets:
+            oraclePrice = oraclePrices.get(chain_util.normalize_address(market.oracle_address))
+            if oraclePrice is None:
+                continue
+            collateralPrices[chain_util.normalize_address(market.collateral_address)] = oracle_price_to_collateral_price(oraclePrice=oraclePrice, collateralDecimals=market.collateral_decimals, loanDecimals=market.loan_decimals)
+        return collateralPrices
+
+
+class MorphoOraclePriceSource(PriceSource):
+    """Exposes Morpho market oracles as a price source for the hedged resolver.
+    Oracle prices are quoted in the market's loan asset, so they are converted to USD with the loan asset's price from loanAssetPriceSource.
+    """
+
+    name = 'morpho-oracle'
+
+    def __init__(self, morphoClient: MorphoClient, oraclePriceReader: MorphoOraclePriceReader, loanAssetPriceSource: PriceSource) -> None:
+        self.morphoClient = morphoClient
+        self.oraclePriceReader = oraclePriceReader
+        self.loanAssetPriceSource = loanAssetPriceSource
+
+    async def get_asset_current_prices(self, chainId: int, assetAddresses: list[str]) -> dict[str, ClientAssetPrice]:
+        uniqueAddresses = list({assetAddress.lower(): assetAddress for assetAddress in assetAddresses}.values())
+        markets = [market for market in await asyncio.gather(*[self.morphoClient.get_market(chain_id=chainId, collateral_address=assetAddress) for assetAddress in uniqueAddresses]) if market is not None]
+        if len(markets) == 0:
+            return {}
+        loanAddresses = {chain_util.normalize_address(market.collateral_address): chain_util.normalize_address(market.loan_address) for market in markets}
+        collateralPrices, loanAssetPrices = await asyncio.gather(
+            self.oraclePriceReader.read_collateral_prices(markets=markets),
+            self.loanAssetPriceSource.get_asset_current_prices(chainId=chainId, assetAddresses=sorted(set(loanAddresses.values()))),
+        )
+        loanAssetPricesUsd = {chain_util.normalize_address(loanAddress): price.priceUsd for loanAddress, price in loanAssetPrices.items()}
+        prices: dict[str, ClientAssetPrice] = {}
+        for assetAddress in uniqueAddresses:
+            collateralAddress = chain_util.normalize_address(assetAddress)
+            collateralPrice = collateralPrices.get(collateralAddress)
+            loanAssetPriceUsd = loanAssetPricesUsd.get(loanAddresses.get(collateralAddress, ''))
+            if collateralPrice is not None and loanAssetPriceUsd is not None:
+                prices[assetAddress] = ClientAssetPrice(priceUsd=collateralPrice * loanAssetPriceUsd)
+        return prices
+
+    async def get_asset_current_price(self, chainId: int, assetAddress: str) -> ClientAssetPrice:
+        prices = await self.get_asset_current_prices(chainId=chainId, assetAddresses=[assetAddress])
+        price = prices.get(assetAddress)
+        if price is None:
+            raise PriceNotFoundException(f'No Morpho oracle price for asset {assetAddress} on chain {chainId}')
+        return price
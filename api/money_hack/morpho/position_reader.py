@@ -0,0 +1,90 @@
+from dataclasses import dataclass
+
+from money_hack.blockchain_data.multicall_client import MulticallClient
+from money_hack.blockchain_data.multicall_client import MulticallRequest
+from money_hack.morpho import morpho_abis
+from money_hack.morpho.transaction_builder import MORPHO_BLUE_ADDRESS
+
+
+@dataclass
+class PositionReadRequest:
+    wallet_address: str
+    morpho_market_id: str
+    collateral_address: str
+
+
+@dataclass
+class OnchainPositionState:
+    collateral_amount: int
+    borrow_amount: int
+    borrow_shares: int
+    vault_shares: int
+    vault_assets: int
+    wallet_collateral_balance: int
+    wallet_usdc_balance: int
+
+
+def _market_id_to_bytes(morphoMarketId: str) -> bytes:
+    return bytes.fromhex(morphoMarketId.removeprefix('0x'))
+
+
+def borrow_shares_to_assets(borrowShares: int, totalBorrowAssets: int, totalBorrowShares: int) -> int:
+    """Convert Morpho borrow shares to assets, rounding up as debt is rounded against the borrower."""
+    if borrowShares == 0 or totalBorrowShares == 0:
+        return 0
+    return (borrowShares * totalBorrowAssets + totalBorrowShares - 1) // totalBorrowShares
+
+
+class OnchainPositionReader:
+    """Reads Morpho positions, vault balances and wallet balances for many agent wallets with Multicall3.
+    All reads for a set of agents take two batched round trips: one for positions, markets and balances
+    and one for converting vault shares to assets.
+    """
+
+    def __init__(self, multicallClient: MulticallClient, usdcAddress: str, vaultAddress: str) -> None:
+        self.multicallClient = multicallClient
+        self.usdcAddress = usdcAddress
+        self.vaultAddress = vaultAddress
+
+    async def read_positions(self, requests: list[PositionReadRequest], blockNumber: int | None = None) -> list[OnchainPositionState | None]:
+        """Return the on-chain state for each request in order, or None where any of its reads failed."""
+        if len(requests) == 0:
+            return []
+        marketIds = sorted({request.morpho_market_id for request in requests})
+        calls: list[MulticallRequest] = []
+        for request in requests:
+            calls.append(MulticallRequest(toAddress=MORPHO_BLUE_ADDRESS, contractAbi=morpho_abis.MORPHO_BLUE_ABI, functionName='position', arguments={'id': _market_id_to_bytes(request.morpho_market_id), 'user': request.wallet_address}))
+            calls.append(MulticallRequest(toAddress=self.vaultAddress, contractAbi=morpho_abis.ERC4626_VAULT_ABI, functionName='balanceOf', arguments={'account': request.wallet_address}))
+            calls.append(MulticallRequest(toAddress=request.collateral_address, contractAbi=morpho_abis.ERC20_ABI, functionName='balanceOf', arguments={'account': request.wallet_address}))
+            calls.append(MulticallRequest(toAddress=self.usdcAddress, contractAbi=morpho_abis.ERC20_ABI, functionName='balanceOf', arguments={'account': request.wallet_address}))
+        calls += [MulticallRequest(toAddress=MORPHO_BLUE_ADDRESS, contractAbi=morpho_abis.MORPHO_BLUE_ABI, functionName='market', arguments={'id': _market_id_to_bytes(marketId)}) for marketId in marketIds]
+        results = await self.multicallClient.call_many(requests=calls, blockNumber=blockNumber)
+        marketResults = dict(zip(marketIds, results[len(requests) * 4 :], strict=True))
+        vaultSharesList = [int(results[index * 4 + 1][0]) if results[index * 4 + 1] is not None else 0 for index in range(len(requests))]  # type: ignore[index]
+        sharesToConvert = sorted({shares for shares in vaultSharesList if shares > 0})
+        conversionResults = await self.multicallClient.call_many(
+            requests=[MulticallRequest(toAddress=self.vaultAddress, contractAbi=morpho_abis.ERC4626_VAULT_ABI, functionName='convertToAssets', arguments={'shares': shares}) for shares in sharesToConvert],
+            blockNumber=blockNumber,
+        )
+        vaultAssetsMap = {shares: int(result[0]) for shares, result in zip(sharesToConvert, conversionResults, strict=True) if result is not None}
+        states: list[OnchainPositionState | None] = []
+        for index, request in enumerate(requests):
+            positionResult, vaultSharesResult, collateralBalanceResult, usdcBalanceResult = results[index * 4 : index * 4 + 4]
+            marketResult = marketResults[request.morpho_market_id]
+            vaultShares = vaultSharesList[index]
+            if positionResult is None or vaultSharesResult is None or collateralBalanceResult is None or usdcBalanceResult is None or marketResult is None or (vaultShares > 0 and vaultShares not in vaultAssetsMap):
+                states.append(None)
+                continue
+            borrowShares = int(positionResult[1])
+            states.append(
+                OnchainPositionState(
+                    collateral_amount=int(positionResult[2]),
+                    borrow_amount=borrow_shares_to_assets(borrowShares=borrowShares, totalBorrowAssets=int(marketResult[2]), totalBorrowShares=int(marketResult[3])),
+                    borrow_shares=borrowShares,
+                    vault_shares=vaultShares,
+                    vault_assets=vaultAssetsMap.get(vaultShares, 0),
+                    wallet_collateral_balance=int(collateralBalanceResult[0]),
+                    wallet_usdc_balance=int(usdcBalanceResult[0]),
+                )
+            )
+        return states
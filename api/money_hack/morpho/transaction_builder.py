@@ -567,3 +567,96 @@ class TransactionBuilder:
         transactions.append(TransactionCall(to=self.yoVaultAddress, data=deposit_calldata))
         logging.info(f'Added vault deposit tx: {borrow_amount} USDC to Yo vault')
         return transactions
+
+    def build_net_position_transactions_from_market(
+        self,
+        user_address: str,
+        collateral_address: str,
+        collateral_supply_amount: int,
+        debt_change: int,
+        vault_change: int,
+        market: 'MorphoMarket',
+    ) -> list[TransactionCall]:
+        return self.build_net_position_transactions(
+            user_address=user_address,
+            collateral_address=collateral_address,
+            collateral_supply_amount=collateral_supply_amount,
+            debt_change=debt_change,
+            vault_change=vault_change,
+            loan_token=market.loan_address,
+            oracle=market.oracle_address,
+            irm=market.irm_address,
+            lltv=market.lltv_raw,
+        )
+
+    def build_net_position_transactions(
+        self,
+        user_address: str,
+        collateral_address: str,
+        collateral_supply_amount: int,
+        debt_change: int,
+        vault_change: int,
+        loan_token: str,
+        oracle: str,
+        irm: str,
+        lltv: int,
+    ) -> list[TransactionCall]:
+        """Build one call bundle for net position changes: supply collateral, then borrow or repay the net debt change, with the net USDC flow deposited to or withdrawn from the vault."""
+        user = chain_util.normalize_address(user_address)
+        collateral = chain_util.normalize_address(collateral_address)
+        transactions: list[TransactionCall] = []
+        if collateral_supply_amount > 0:
+            approve_calldata = encode_approve(self.morphoAddress, collateral_supply_amount)
+            transactions.append(TransactionCall(to=collateral, data=approve_calldata))
+            logging.info(f'Added collateral approval tx: {collateral} -> Morpho for {collateral_supply_amount}')
+            supply_calldata = encode_supply_collateral(
+                loan_token=loan_token,
+                collateral_token=collateral,
+                oracle=oracle,
+                irm=irm,
+                lltv=lltv,
+                assets=collateral_supply_amount,
+                on_behalf=user,
+            )
+            transactions.append(TransactionCall(to=self.morphoAddress, data=supply_calldata))
+            logging.info(f'Added supply collateral tx: {collateral_supply_amount} to Morpho')
+        if debt_change > 0:
+            borrow_calldata = encode_borrow(
+                loan_token=loan_token,
+                collateral_token=collateral,
+                oracle=oracle,
+                irm=irm,
+                lltv=lltv,
+                assets=debt_change,
+                on_behalf=user,
+                receiver=user,
+            )
+            transactions.append(TransactionCall(to=self.morphoAddress, data=borrow_calldata))
+            logging.info(f'Added borrow tx: {debt_change} USDC from Morpho')
+        if vault_change < 0:
+            withdraw_calldata = encode_vault_withdraw(assets=-vault_change, receiver=user, owner=user)
+            transactions.append(TransactionCall(to=self.yoVaultAddress, data=withdraw_calldata))
+            logging.info(f'Added vault withdraw tx: {-vault_change} USDC from Yo vault')
+        if debt_change < 0:
+            usdc_approve_calldata = encode_approve(self.morphoAddress, -debt_change)
+            transactions.append(TransactionCall(to=self.usdcAddress, data=usdc_approve_calldata))
+            logging.info(f'Added USDC approval tx: USDC -> Morpho for {-debt_change}')
+            repay_calldata = encode_repay(
+                loan_token=loan_token,
+                collateral_token=collateral,
+                oracle=oracle,
+                irm=irm,
+                lltv=lltv,
+                assets=-debt_change,
+                on_behalf=user,
+            )
+            transactions.append(TransactionCall(to=self.morphoAddress, data=repay_calldata))
+            logging.info(f'Added repay tx: {-debt_change} USDC to Morpho')
+        if vault_change > 0:
+            usdc_approve_calldata = encode_approve(self.yoVaultAddress, vault_change)
+            transactions.append(TransactionCall(to=self.usdcAddress, data=usdc_approve_calldata))
+            logging.info(f'Added USDC approval tx: USDC -> Yo vault for {vault_change}')
+            deposit_calldata = encode_vault_deposit(vault_change, user)
+            transactions.append(TransactionCall(to=self.yoVaultAddress, data=deposit_calldata))
+            logging.info(f'Added vault deposit tx: {vault_change} USDC to Yo vault')
+        return transactions
@@ -0,0 +1,76 @@
+import datetime
+import math
+import random
+
+from core import logging
+from core.util import date_util
+
+from money_hack.model import AgentPosition
+from money_hack.store.database_store import DatabaseStore
+
+POSITION_LEASE_SECONDS = 180
+WORKER_HEARTBEAT_TIMEOUT_SECONDS = 180
+# NOTE: positions are only checked while the lease has at least this long left so an action never outlives ownership
+LEASE_SAFETY_MARGIN_SECONDS = 30
+# NOTE: a task lease outlasts the task's interval by this long so the holder renews it well before another worker can take over
+TASK_LEASE_GRACE_SECONDS = 60
+
+
+class PositionLeaseManager:
+    """Shares active positions between worker processes using lease rows in the database.
+    Each rebalance records a heartbeat, renews this worker's leases, releases any above its fair share of
+    ceil(positions / live workers) and claims unleased or expired positions up to that share. Leases of a
+    worker that stops heartbeating expire and are picked up by the remaining workers.
+    Tasks that only one worker should run, like reconciling user operations, are leased by name in the same way.
+    """
+
+    def __init__(self, databaseStore: DatabaseStore, workerId: str) -> None:
+        self.databaseStore = databaseStore
+        self.workerId = workerId
+        self._leaseExpiryDates: dict[int, datetime.datetime] = {}
+
+    def holds_lease(self, agentPositionId: int) -> bool:
+        leaseExpiryDate = self._leaseExpiryDates.get(agentPositionId)
+        return leaseExpiryDate is not None and leaseExpiryDate > date_util.datetime_from_now(seconds=LEASE_SAFETY_MARGIN_SECONDS)
+
+    async def rebalance(self, activePositions: list[AgentPosition]) -> list[AgentPosition]:
+        """Update this worker's leases against the current active positions and return the positions it owns."""
+        leaseExpiryDate = date_util.datetime_from_now(seconds=POSITION_LEASE_SECONDS)
+        await self.databaseStore.record_worker_heartbeat(workerId=self.workerId)
+        liveWorkers = await self.databaseStore.get_live_worker_heartbeats(since=date_util.datetime_from_now(seconds=-WORKER_HEARTBEAT_TIMEOUT_SECONDS))
+        fairShare = math.ceil(len(activePositions) / max(len(liveWorkers), 1))
+        activePositionIds = {position.agentPositionId for position in activePositions}
+        renewedLeases = await self.databaseStore.renew_position_leases(workerId=self.workerId, leaseExpiryDate=leaseExpiryDate)
+        ownedPositionIds = sorted(lease.agentPositionId for lease in renewedLeases if lease.agentPositionId in activePositionIds)
+        releasedPositionIds = [lease.agentPositionId for lease in renewedLeases if lease.agentPositionId not in activePositionIds] + ownedPositionIds[fairShare:]
+        ownedPositionIds = ownedPositionIds[:fairShare]
+        if releasedPositionIds:
+            await self.databaseStore.release_position_leases(workerId=self.workerId, agentPositionIds=releasedPositionIds)
+        if len(ownedPositionIds) < fairShare:
+            now = date_util.datetime_from_now()
+            leasedPositionIds = {lease.agentPositionId for lease in await self.databaseStore.get_position_leases() if lease.leaseExpiryDate > now}
+            candidatePositionIds = [positionId for positionId in activePositionIds if positionId not in leasedPositionIds]
+            # NOTE: shuffled so workers claiming at the same time mostly go for different positions
+            random.shuffle(candidatePositionIds)
+            for positionId in candidatePositionIds:
+                if len(ownedPositionIds) >= fairShare:
+                    break
+                lease = await self.databaseStore.claim_position_lease(agentPositionId=positionId, workerId=self.workerId, leaseExpiryDate=leaseExpiryDate)
+                if lease is not None:
+                    ownedPositionIds.append(positionId)
+        self._leaseExpiryDates = dict.fromkeys(ownedPositionIds, leaseExpiryDate)
+        logging.info(f'Worker {self.workerId} owns {len(ownedPositionIds)}/{len(activePositions)} positions ({len(liveWorkers)} live workers, fair share {fairShare})')
+        ownedPositionIdSet = set(ownedPositionIds)
+        return [position for position in activePositions if position.agentPositionId in ownedPositionIdSet]
+
+    async def acquire_task_lease(self, taskName: str, intervalSeconds: float) -> bool:
+        """Take or renew the lease on a task run every intervalSeconds. Returns whether this worker should run it."""
+        leaseExpiryDate = date_util.datetime_from_now(seconds=intervalSeconds + TASK_LEASE_GRACE_SECONDS)
+        lease = await self.databaseStore.claim_worker_task_lease(taskName=taskName, workerId=self.workerId, leaseExpiryDate=leaseExpiryDate)
+        return lease is not None
+
+    async def release_all(self) -> None:
+        self._leaseExpiryDates = {}
+        await self.databaseStore.release_position_leases(workerId=self.workerId)
+        await self.databaseStore.release_worker_task_leases(workerId=self.workerId)
+        await self.databaseStore.delete_worker_heartbeat(workerId=self.workerId)
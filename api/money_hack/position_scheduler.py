@@ -0,0 +1,121 @@
+import heapq
+import time
+
+from money_hack.model import AgentPosition
+
+MIN_CHECK_INTERVAL_SECONDS = 5.0
+MAX_CHECK_INTERVAL_SECONDS = 600.0
+FAILED_CHECK_RETRY_SECONDS = 60.0
+# NOTE: positions that keep failing or stay paused back off up to this, so they are still picked up reasonably soon once they recover
+MAX_FAILED_CHECK_RETRY_SECONDS = 1800.0
+ACTION_FOLLOW_UP_SECONDS = 30.0
+POSITION_SYNC_INTERVAL_SECONDS = 60.0
+BASELINE_HOURLY_VOLATILITY = 0.01
+# (max price drop to liquidation as a fraction of the collateral price, check interval in seconds)
+RISK_TIERS: list[tuple[float, float]] = [
+    (0.05, MIN_CHECK_INTERVAL_SECONDS),
+    (0.10, 15.0),
+    (0.20, 60.0),
+    (0.35, 180.0),
+]
+
+
+def calculate_check_interval(currentLtv: float, maxLtv: float, hourlyVolatility: float = 0.0) -> float:
+    """Pick how long until a position should be checked again from how far the collateral price can fall before liquidation.
+    The distance is shrunk when recent hourly volatility is above the baseline so fast markets are watched more closely.
+    """
+    if maxLtv <= 0 or currentLtv <= 0:
+        return MAX_CHECK_INTERVAL_SECONDS
+    liquidationDistance = max(1 - currentLtv / maxLtv, 0.0)
+    volatilityFactor = max(hourlyVolatility / BASELINE_HOURLY_VOLATILITY, 1.0)
+    effectiveDistance = liquidationDistance / volatilityFactor
+    for maxDistance, interval in RISK_TIERS:
+        if effectiveDistance < maxDistance:
+            return interval
+    return MAX_CHECK_INTERVAL_SECONDS
+
+
+def calculate_retry_interval(failureCount: int) -> float:
+    """Double the retry interval with each consecutive failed check, starting from FAILED_CHECK_RETRY_SECONDS."""
+    return float(min(FAILED_CHECK_RETRY_SECONDS * 2 ** max(failureCount - 1, 0), MAX_FAILED_CHECK_RETRY_SECONDS))
+
+
+class PositionScheduler:
+    """Priority queue of active positions keyed by the time each one is next due for a check."""
+
+    def __init__(self) -> None:
+        self._heap: list[tuple[float, int]] = []
+        self._dueTimes: dict[int, float] = {}
+        self._positions: dict[int, AgentPosition] = {}
+        self._failureCounts: dict[int, int] = {}
+        self.lastSyncTime: float | None = None
+
+    def __len__(self) -> int:
+        return len(self._positions)
+
+    def should_sync(self, now: float | None = None) -> bool:
+        now = now if now is not None else time.time()
+        return self.lastSyncTime is None or now - self.lastSyncTime >= POSITION_SYNC_INTERVAL_SECONDS
+
+    def sync_positions(self, positions: list[AgentPosition], now: float | None = None) -> None:
+        """Replace the tracked positions, scheduling new or unscheduled ones immediately and dropping ones that are no longer active."""
+        now = now if now is not None else time.time()
+        activePositionIds = {position.agentPositionId for position in positions}
+        for positionId in list(self._positions):
+            if positionId not in activePositionIds:
+                del self._positions[positionId]
+                self._dueTimes.pop(positionId, None)
+                self._failureCounts.pop(positionId, None)
+        for position in positions:
+            self._positions[position.agentPositionId] = position
+            if position.agentPositionId not in self._dueTimes:
+                self.schedule(positionId=position.agentPositionId, dueTime=now)
+        self.lastSyncTime = now
+
+    def schedule(self, positionId: int, dueTime: float) -> None:
+        if positionId not in self._positions:
+            return
+        self._dueTimes[positionId] = dueTime
+        heapq.heappush(self._heap, (dueTime, positionId))
+
+    def schedule_failed(self, positionId: int, now: float | None = None) -> None:
+        """Reschedule a position whose check failed or was skipped, backing off further with each consecutive failure."""
+        now = now if now is not None else time.time()
+        failureCount = self._failureCounts.get(positionId, 0) + 1
+        self._failureCounts[positionId] = failureCount
+        self.schedule(positionId=positionId, dueTime=now + calculate_retry_interval(failureCount=failureCount))
+
+    def schedule_checked(self, positionId: int, dueTime: float) -> None:
+        """Reschedule a position whose check succeeded, clearing any failure backoff."""
+        self._failureCounts.pop(positionId, None)
+        self.schedule(positionId=positionId, dueTime=dueTime)
+
+    def schedule_after_sync(self, positionId: int, now: float | None = None) -> None:
+        """Reschedule a position that could not be checked until the next sync, which will drop it if it is no longer tracked here."""
+        now = now if now is not None else time.time()
+        self.schedule(positionId=positionId, dueTime=(self.lastSyncTime if self.lastSyncTime is not None else now) + POSITION_SYNC_INTERVAL_SECONDS)
+
+    def schedule_now(self, positionId: int) -> None:
+        currentDueTime = self._dueTimes.get(positionId)
+        now = time.time()
+        if currentDueTime is None or currentDueTime > now:
+            self.schedule(positionId=positionId, dueTime=now)
+
+    def _discard_stale_entries(self) -> None:
+        # NOTE: rescheduling pushes a new entry rather than updating in place, so outdated entries are skipped lazily
+        while self._heap and self._dueTimes.get(self._heap[0][1]) != self._heap[0][0]:
+            heapq.heappop(self._heap)
+
+    def get_next_due_time(self) -> float | None:
+        self._discard_stale_entries()
+        return self._heap[0][0] if self._heap else None
+
+    def pop_due(self, now: float | None = None) -> list[AgentPosition]:
+        """Remove and return every position due at or before now. Callers must schedule them again after checking."""
+        now = now if now is not None else time.time()
+        duePositions: list[AgentPosition] = []
+        while (nextDueTime := self.get_next_due_time()) is not None and nextDueTime <= now:
+            _dueTime, positionId = heapq.heappop(self._heap)
+            del self._dueTimes[positionId]
+            duePositions.append(self._positions[positionId])
+        return duePositions
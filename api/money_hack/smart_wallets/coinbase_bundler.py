@@ -140,6 +140,23 @@ class CoinbaseBundler(Bundler):
         receipt = typing.cast(UserOperationReceipt, response['result'])
         return receipt
 
+    async def get_user_operation_receipts(self, userOperationHashes: list[str]) -> list[UserOperationReceipt | None]:
+        """Get the receipts of several user operations in one JSON-RPC batch request, in the order given.
+        Operations that have no receipt yet, or whose lookup errored, are None.
+        """
+        if len(userOperationHashes) == 0:
+            return []
+        response = await self.paymasterEthClient.requester.post_json(
+            url=self.paymasterEthClient.url,
+            dataDict=[{'jsonrpc': '2.0', 'method': 'eth_getUserOperationReceipt', 'params': [userOperationHash], 'id': index} for index, userOperationHash in enumerate(userOperationHashes)],
+            timeout=100,
+        )
+        responseData = response.json()
+        if not isinstance(responseData, list):
+            raise BadRequestException(message=f'Expected a batch response for user operation receipts: {responseData}')
+        resultMap = {typing.cast(int, item['id']): item.get('result') for item in responseData if isinstance(item, dict) and item.get('error') is None}
+        return [typing.cast(UserOperationReceipt | None, resultMap.get(index)) for index in range(len(userOperationHashes))]
+
     async def wait_for_user_operation_receipt(
         self,
         userOperationHash: str,
@@ -65,6 +65,8 @@ class Bundler(typing.Protocol):
     ) -> UserOperation: ...
     async def generate_user_operation_hash(self, userOperation: UserOperation) -> str: ...
     async def send_user_operation(self, userOperation: UserOperation, signature: str | None = None) -> str: ...
+    async def get_user_operation_receipt(self, userOperationHash: str) -> UserOperationReceipt | None: ...
+    async def get_user_operation_receipts(self, userOperationHashes: list[str]) -> list[UserOperationReceipt | None]: ...
     async def wait_for_user_operation_receipt(
         self,
         userOperationHash: str,
@@ -1,26 +1,60 @@
+import asyncio
+import contextvars
+import datetime as dt
+import typing
+from collections.abc import Awaitable
+from collections.abc import Callable
+
+import sqlalchemy
 from core.exceptions import NotFoundException
 from core.store.database import Database
+from core.store.retriever import DateFieldFilter
 from core.store.retriever import Direction
 from core.store.retriever import FieldFilter
+from core.store.retriever import IntegerFieldFilter
 from core.store.retriever import Order
 from core.store.retriever import StringFieldFilter
 from core.util import chain_util
+from core.util import date_util
+from sqlalchemy.dialects import postgresql as sqlalchemy_psql
 
 from money_hack.model import Agent
 from money_hack.model import AgentAction
 from money_hack.model import AgentPosition
 from money_hack.model import ChatEvent
 from money_hack.model import CrossChainAction
+from money_hack.model import HistoricalPrice
+from money_hack.model import LtvCheck
+from money_hack.model import LtvCheckRollup
+from money_hack.model import PendingUserOperation
+from money_hack.model import PositionLease
 from money_hack.model import User
 from money_hack.model import UserWallet
+from money_hack.model import VaultYieldSnapshot
+from money_hack.model import WorkerHeartbeat
+from money_hack.model import WorkerTaskLease
 from money_hack.store.entity_repository import UUIDFieldFilter
 from money_hack.store.schema import AgentActionsRepository
 from money_hack.store.schema import AgentPositionsRepository
 from money_hack.store.schema import AgentsRepository
 from money_hack.store.schema import ChatEventsRepository
 from money_hack.store.schema import CrossChainActionsRepository
+from money_hack.store.schema import HistoricalPricesRepository
+from money_hack.store.schema import LtvCheckRollupsRepository
+from money_hack.store.schema import LtvCheckRollupsTable
+from money_hack.store.schema import LtvChecksRepository
+from money_hack.store.schema import LtvChecksTable
+from money_hack.store.schema import PendingUserOperationsRepository
+from money_hack.store.schema import PositionLeasesRepository
+from money_hack.store.schema import PositionLeasesTable
 from money_hack.store.schema import UsersRepository
 from money_hack.store.schema import UserWalletsRepository
+from money_hack.store.schema import VaultYieldSnapshotsRepository
+from money_hack.store.schema import WorkerHeartbeatsRepository
+from money_hack.store.schema import WorkerTaskLeasesRepository
+from money_hack.store.schema import WorkerTaskLeasesTable
+
+ResultType = typing.TypeVar('ResultType')
 
 
 class DatabaseStore:
@@ -29,6 +63,16 @@ class DatabaseStore:
     def __init__(self, database: Database) -> None:
         self.database = database
 
+    async def run_in_own_context_connection(self, function: Callable[[], Awaitable[ResultType]]) -> ResultType:
+        """Run function in a context connection of its own whose transaction commits when it returns, even when the caller already holds one."""
+
+        async def run() -> ResultType:
+            async with self.database.create_context_connection():
+                return await function()
+
+        # NOTE: the database allows only one context connection per context and tasks inherit their creator's, so this runs in a task with a fresh context
+        return await asyncio.create_task(run(), context=contextvars.Context())
+
     async def get_user(self, userId: str) -> User | None:
         return await UsersRepository.get_one_or_none(
             database=self.database,
@@ -99,6 +143,14 @@ class DatabaseStore:
     async def get_agent_by_id(self, agentId: str) -> Agent | None:
         return await self.get_agent(agentId=agentId)
 
+    async def get_agents(self, agentIds: list[str]) -> list[Agent]:
+        if len(agentIds) == 0:
+            return []
+        return await AgentsRepository.list_many(
+            database=self.database,
+            fieldFilters=[UUIDFieldFilter(fieldName='agentId', containedIn=agentIds)],
+        )
+
     async def get_agents_by_user(self, userId: str) -> list[Agent]:
         return await AgentsRepository.list_many(
             database=self.database,
@@ -380,3 +432,242 @@ class DatabaseStore:
             connection=None,
             **kwargs,
         )
+
+    async def record_worker_heartbeat(self, workerId: str) -> WorkerHeartbeat:
+        return await WorkerHeartbeatsRepository.upsert(
+            database=self.database,
+            constraintColumnNames=['workerId'],
+            workerId=workerId,
+            heartbeatDate=date_util.datetime_from_now(),
+        )
+
+    async def delete_worker_heartbeat(self, workerId: str) -> None:
+        await WorkerHeartbeatsRepository.delete(
+            database=self.database,
+            fieldFilters=[StringFieldFilter(fieldName='workerId', eq=workerId)],
+        )
+
+    async def get_live_worker_heartbeats(self, since: dt.datetime) -> list[WorkerHeartbeat]:
+        return await WorkerHeartbeatsRepository.list_many(
+            database=self.database,
+            fieldFilters=[DateFieldFilter(fieldName='heartbeatDate', gt=since)],
+        )
+
+    async def get_position_leases(self) -> list[PositionLease]:
+        return await PositionLeasesRepository.list_many(database=self.database)
+
+    async def renew_position_leases(self, workerId: str, leaseExpiryDate: dt.datetime) -> list[PositionLease]:
+        return await PositionLeasesRepository.update_many(
+            database=self.database,
+            fieldFilters=[StringFieldFilter(fieldName='workerId', eq=workerId)],
+            leaseExpiryDate=leaseExpiryDate,
+        )
+
+    async def claim_position_lease(self, agentPositionId: int, workerId: str, leaseExpiryDate: dt.datetime) -> PositionLease | None:
+        """Take the lease on a position if it is unleased, expired or already held by this worker. Returns None if another worker holds it."""
+        now = date_util.datetime_to_utc_naive_datetime(dt=date_util.datetime_from_now())
+        return await PositionLeasesRepository.upsert_where(
+            database=self.database,
+            constraintColumnNames=['agentPositionId'],
+            updateWhere=(PositionLeasesTable.c.leaseExpiryDate < now) | (PositionLeasesTable.c.workerId == workerId),
+            agentPositionId=agentPositionId,
+            workerId=workerId,
+            leaseExpiryDate=leaseExpiryDate,
+        )
+
+    async def release_position_leases(self, workerId: str, agentPositionIds: list[int] | None = None) -> None:
+        fieldFilters: list[FieldFilter] = [StringFieldFilter(fieldName='workerId', eq=workerId)]
+        if agentPositionIds is not None:
+            fieldFilters.append(IntegerFieldFilter(fieldName='agentPositionId', containedIn=agentPositionIds))
+        await PositionLeasesRepository.delete(
+            database=self.database,
+            fieldFilters=fieldFilters,
+        )
+
+    async def claim_worker_task_lease(self, taskName: str, workerId: str, leaseExpiryDate: dt.datetime) -> WorkerTaskLease | None:
+        """Take or renew the lease on a task only one worker should run. Returns None if another worker holds it."""
+        now = date_util.datetime_to_utc_naive_datetime(dt=date_util.datetime_from_now())
+        return await WorkerTaskLeasesRepository.upsert_where(
+            database=self.database,
+            constraintColumnNames=['taskName'],
+            updateWhere=(WorkerTaskLeasesTable.c.leaseExpiryDate < now) | (WorkerTaskLeasesTable.c.workerId == workerId),
+            taskName=taskName,
+            workerId=workerId,
+            leaseExpiryDate=leaseExpiryDate,
+        )
+
+    async def release_worker_task_leases(self, workerId: str) -> None:
+        await WorkerTaskLeasesRepository.delete(
+            database=self.database,
+            fieldFilters=[StringFieldFilter(fieldName='workerId', eq=workerId)],
+        )
+
+    async def create_pending_user_operation(
+        self,
+        agentId: str,
+        agentPositionId: int | None,
+        walletAddress: str,
+        userOperationHash: str,
+        actionType: str,
+        details: dict[str, object],
+    ) -> PendingUserOperation:
+        return await PendingUserOperationsRepository.create(
+            database=self.database,
+            agentId=agentId,
+            agentPositionId=agentPositionId,
+            walletAddress=walletAddress,
+            userOperationHash=userOperationHash,
+            actionType=actionType,
+            status='pending',
+            transactionHash=None,
+            details=details,
+        )
+
+    async def get_pending_user_operations(self, agentId: str | None = None) -> list[PendingUserOperation]:
+        fieldFilters: list[FieldFilter] = [StringFieldFilter(fieldName='status', eq='pending')]
+        if agentId is not None:
+            fieldFilters.append(UUIDFieldFilter(fieldName='agentId', eq=agentId))
+        return await PendingUserOperationsRepository.list_many(
+            database=self.database,
+            fieldFilters=fieldFilters,
+            orders=[Order(fieldName='createdDate', direction=Direction.ASCENDING)],
+        )
+
+    async def resolve_pending_user_operation(self, pendingUserOperationId: int, status: str, transactionHash: str | None = None) -> PendingUserOperation | None:
+        """Move a user operation out of pending. Returns None if it was no longer pending, e.g. because another worker resolved it first."""
+        pendingUserOperations = await PendingUserOperationsRepository.update_many(
+            database=self.database,
+            fieldFilters=[
+                IntegerFieldFilter(fieldName='pendingUserOperationId', eq=pendingUserOperationId),
+                StringFieldFilter(fieldName='status', eq='pending'),
+            ],
+            status=status,
+            transactionHash=transactionHash,
+        )
+        return pendingUserOperations[0] if pendingUserOperations else None
+
+    async def create_ltv_checks(self, ltvChecks: list[dict[str, object]]) -> None:
+        await LtvChecksRepository.create_many(database=self.database, valuesList=ltvChecks)
+
+    async def get_ltv_checks(self, agentPositionId: int, since: dt.datetime) -> list[LtvCheck]:
+        return await LtvChecksRepository.list_many(
+            database=self.database,
+            fieldFilters=[
+                IntegerFieldFilter(fieldName='agentPositionId', eq=agentPositionId),
+                DateFieldFilter(fieldName='checkDate', gte=since),
+            ],
+            orders=[Order(fieldName='checkDate', direction=Direction.ASCENDING)],
+        )
+
+    async def get_ltv_check_rollups(self, agentPositionId: int, since: dt.datetime) -> list[LtvCheckRollup]:
+        return await LtvCheckRollupsRepository.list_many(
+            database=self.database,
+            fieldFilters=[
+                IntegerFieldFilter(fieldName='agentPositionId', eq=agentPositionId),
+                DateFieldFilter(fieldName='periodDate', gte=since),
+            ],
+            orders=[Order(fieldName='periodDate', direction=Direction.ASCENDING)],
+        )
+
+    async def rollup_ltv_checks(self, before: dt.datetime) -> None:
+        """Fold raw LTV checks older than before into hourly rollups and delete them. before is truncated to the hour so each hour is rolled up exactly once."""
+        before = date_util.datetime_to_utc_naive_datetime(dt=before).replace(minute=0, second=0, microsecond=0)
+        periodDate = sqlalchemy.func.date_trunc('hour', LtvChecksTable.c.checkDate)
+        # NOTE: decision code 0 means the check needed no action
+        rollupQuery = (
+            sqlalchemy.select(
+                LtvChecksTable.c.agentPositionId,
+                periodDate,
+                sqlalchemy.func.count(),
+                sqlalchemy.func.count().filter(LtvChecksTable.c.decisionCode != 0),
+                sqlalchemy.func.min(LtvChecksTable.c.currentLtv),
+                sqlalchemy.func.avg(LtvChecksTable.c.currentLtv),
+                sqlalchemy.func.max(LtvChecksTable.c.currentLtv),
+                sqlalchemy.func.avg(LtvChecksTable.c.targetLtv),
+                sqlalchemy.func.max(LtvChecksTable.c.maxLtv),
+            )
+            .where(LtvChecksTable.c.checkDate < before)
+            .group_by(LtvChecksTable.c.agentPositionId, periodDate)
+        )
+        rollupColumns = [
+            LtvCheckRollupsTable.c.agentPositionId,
+            LtvCheckRollupsTable.c.periodDate,
+            LtvCheckRollupsTable.c.checkCount,
+            LtvCheckRollupsTable.c.actionCount,
+            LtvCheckRollupsTable.c.minCurrentLtv,
+            LtvCheckRollupsTable.c.avgCurrentLtv,
+            LtvCheckRollupsTable.c.maxCurrentLtv,
+            LtvCheckRollupsTable.c.avgTargetLtv,
+            LtvCheckRollupsTable.c.maxLtv,
+        ]
+        # NOTE: rollups already written by an earlier interrupted run are kept so re-running is safe
+        insertQuery = sqlalchemy_psql.insert(LtvCheckRollupsTable).from_select(rollupColumns, rollupQuery).on_conflict_do_nothing().returning(LtvCheckRollupsTable.c.agentPositionId)
+        await self.database.execute(query=insertQuery)
+        await LtvChecksRepository.delete(database=self.database, fieldFilters=[DateFieldFilter(fieldName='checkDate', lt=before)])
+
+    async def create_historical_prices(self, historicalPrices: list[dict[str, object]]) -> None:
+        # NOTE: historical prices never change so points that are already stored are left as they are
+        await HistoricalPricesRepository.create_many(database=self.database, valuesList=historicalPrices, shouldIgnoreConflicts=True)
+
+    async def list_historical_prices(self, chainId: int, assetAddress: str, startDate: dt.datetime, endDate: dt.datetime) -> list[HistoricalPrice]:
+        return await HistoricalPricesRepository.list_many(
+            database=self.database,
+            fieldFilters=[
+                IntegerFieldFilter(fieldName='chainId', eq=chainId),
+                StringFieldFilter(fieldName='assetAddress', eq=chain_util.normalize_address(assetAddress)),
+                DateFieldFilter(fieldName='priceDate', gte=date_util.datetime_to_utc_naive_datetime(dt=startDate), lte=date_util.datetime_to_utc_naive_datetime(dt=endDate)),
+            ],
+            orders=[Order(fieldName='priceDate', direction=Direction.ASCENDING)],
+        )
+
+    async def get_historical_price_at_or_before(self, chainId: int, assetAddress: str, date: dt.datetime) -> HistoricalPrice | None:
+        historicalPrices = await HistoricalPricesRepository.list_many(
+            database=self.database,
+            fieldFilters=[
+                IntegerFieldFilter(fieldName='chainId', eq=chainId),
+                StringFieldFilter(fieldName='assetAddress', eq=chain_util.normalize_address(assetAddress)),
+                DateFieldFilter(fieldName='priceDate', lte=date_util.datetime_to_utc_naive_datetime(dt=date)),
+            ],
+            orders=[Order(fieldName='priceDate', direction=Direction.DESCENDING)],
+            limit=1,
+        )
+        return historicalPrices[0] if historicalPrices else None
+
+    async def get_historical_price_at_or_after(self, chainId: int, assetAddress: str, date: dt.datetime) -> HistoricalPrice | None:
+        historicalPrices = await HistoricalPricesRepository.list_many(
+            database=self.database,
+            fieldFilters=[
+                IntegerFieldFilter(fieldName='chainId', eq=chainId),
+                StringFieldFilter(fieldName='assetAddress', eq=chain_util.normalize_address(assetAddress)),
+                DateFieldFilter(fieldName='priceDate', gte=date_util.datetime_to_utc_naive_datetime(dt=date)),
+            ],
+            orders=[Order(fieldName='priceDate', direction=Direction.ASCENDING)],
+            limit=1,
+        )
+        return historicalPrices[0] if historicalPrices else None
+
+    async def create_vault_yield_snapshot(self, chainId: int, vaultAddress: str, snapshotDate: dt.datetime, apy: float, totalAssets: int) -> None:
+        # NOTE: snapshots have no created or updated dates, which create_many leaves out for tables without them
+        await VaultYieldSnapshotsRepository.create_many(
+            database=self.database,
+            valuesList=[
+                {
+                    'chainId': chainId,
+                    'vaultAddress': vaultAddress,
+                    'snapshotDate': snapshotDate,
+                    'apy': apy,
+                    'totalAssets': totalAssets,
+                },
+            ],
+        )
+
+    async def list_vault_yield_snapshots(self, chainId: int, vaultAddress: str, since: dt.datetime) -> list[VaultYieldSnapshot]:
+        return await VaultYieldSnapshotsRepository.list_many(
+            database=self.database,
+            fieldFilters=[
+                IntegerFieldFilter(fieldName='chainId', eq=chainId),
+                StringFieldFilter(fieldName='vaultAddress', eq=chain_util.normalize_address(vaultAddress)),
+                DateFieldFilter(fieldName='snapshotDate', gte=date_util.datetime_to_utc_naive_datetime(dt=since)),
+            ],
+            orders=[Order(fieldName='snapshotDate', direction=Direction.ASCENDING)],
+        )
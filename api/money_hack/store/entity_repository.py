@@ -123,6 +123,21 @@ class EntityRepository(typing.Generic[EntityType]):  # noqa: UP046
         result = await database.execute(query=self.table.insert().values(createValues).returning(self.table), connection=connection)
         return self.force_from_result(result=result)
 
+    async def create_many(self, database: Database, valuesList: list[dict[str, typing.Any]], connection: DatabaseConnection | None = None, shouldIgnoreConflicts: bool = False) -> None:  # type: ignore[explicit-any]
+        """Insert all rows in a single statement. Created and updated dates are only set on tables that have them.
+        With shouldIgnoreConflicts, rows that clash with an existing row on a unique constraint are skipped instead of failing the insert.
+        """
+        if len(valuesList) == 0:
+            return
+        hasCreatedDate = 'createdDate' in self.table.c
+        hasUpdatedDate = 'updatedDate' in self.table.c
+        insertValues = [self._create_values(kwargs=values, should_add_created_date=hasCreatedDate, should_add_updated_date=hasUpdatedDate) for values in valuesList]
+        # NOTE: returning the id column makes the insert a row-returning statement, which is what execute accepts
+        if shouldIgnoreConflicts:
+            await database.execute(query=sqlalchemy_psql.insert(self.table).values(insertValues).on_conflict_do_nothing().returning(self.idColumn), connection=connection)
+            return
+        await database.execute(query=self.table.insert().values(insertValues).returning(self.idColumn), connection=connection)
+
     async def update(self, database: Database, connection: DatabaseConnection | None = None, **kwargs) -> EntityType:  # type: ignore[no-untyped-def]  # noqa: ANN003
         updateValues = self._create_values(kwargs=kwargs, should_add_updated_date=True)
         idValue: typing.Any | None = updateValues.pop(self.idColumn)  # type: ignore[explicit-any]
@@ -145,6 +160,29 @@ class EntityRepository(typing.Generic[EntityType]):  # noqa: UP046
         result = await database.execute(query=doUpdateStatement.returning(self.table), connection=connection)
         return self.force_from_result(result=result)
 
+    async def upsert_where(self, database: Database, constraintColumnNames: list[str], updateWhere: sqlalchemy.ColumnElement[bool], connection: DatabaseConnection | None = None, **kwargs) -> EntityType | None:  # type: ignore[no-untyped-def]  # noqa: ANN003
+        """Atomically insert a row, or update the conflicting row only if it matches updateWhere. Returns None if the existing row was left untouched."""
+        updateValues = self._create_values(kwargs=kwargs, should_add_updated_date=True, should_add_created_date=False)
+        insertValues = self._create_values(kwargs=kwargs, should_add_updated_date=True, should_add_created_date=True)
+        if isinstance(self.idColumn.type, sqlalchemy_psql.UUID) and self.idColumn not in insertValues:
+            insertValues[self.idColumn] = uuid.uuid4()
+        insertStatement = sqlalchemy_psql.insert(self.table).values(insertValues)
+        constraintColumns = [getattr(self.table.c, columnName) for columnName in constraintColumnNames]
+        doUpdateStatement = insertStatement.on_conflict_do_update(
+            index_elements=constraintColumns,
+            set_=updateValues,
+            where=updateWhere,
+        )
+        result = await database.execute(query=doUpdateStatement.returning(self.table), connection=connection)
+        return next((self.from_row(row=row) for row in result.mappings()), None)
+
+    async def update_many(self, database: Database, fieldFilters: list[FieldFilter], connection: DatabaseConnection | None = None, **kwargs) -> list[EntityType]:  # type: ignore[no-untyped-def]  # noqa: ANN003
+        updateValues = self._create_values(kwargs=kwargs, should_add_updated_date=True)
+        query = self.table.update().values(updateValues)
+        query = self._apply_field_filters(query=query, table=self.table, fieldFilters=fieldFilters)  # type: ignore[assignment, arg-type]
+        result = await database.execute(query=query.returning(self.table), connection=connection)
+        return [self.from_row(row=row) for row in result.mappings()]
+
     async def delete(self, database: Database, fieldFilters: list[FieldFilter], connection: DatabaseConnection | None = None) -> None:
         query = self.table.delete()
         query = self._apply_field_filters(query=query, table=self.table, fieldFilters=fieldFilters)  # type: ignore[assignment, arg-type]
@@ -6,8 +6,16 @@ from money_hack.model import AgentAction
 from money_hack.model import AgentPosition
 from money_hack.model import ChatEvent
 from money_hack.model import CrossChainAction
+from money_hack.model import HistoricalPrice
+from money_hack.model import LtvCheck
+from money_hack.model import LtvCheckRollup
+from money_hack.model import PendingUserOperation
+from money_hack.model import PositionLease
 from money_hack.model import User
 from money_hack.model import UserWallet
+from money_hack.model import VaultYieldSnapshot
+from money_hack.model import WorkerHeartbeat
+from money_hack.model import WorkerTaskLease
 from money_hack.store.entity_repository import EntityRepository
 
 metadata = sqlalchemy.MetaData()
@@ -127,3 +135,117 @@ CrossChainActionsTable = sqlalchemy.Table(
 )
 
 CrossChainActionsRepository = EntityRepository(table=CrossChainActionsTable, modelClass=CrossChainAction)
+
+
+WorkerHeartbeatsTable = sqlalchemy.Table(
+    'tbl_worker_heartbeats',
+    metadata,
+    sqlalchemy.Column(key='workerId', name='id', type_=sqlalchemy.Text, primary_key=True, nullable=False),
+    sqlalchemy.Column(key='createdDate', name='created_date', type_=sqlalchemy.DateTime, nullable=False),
+    sqlalchemy.Column(key='updatedDate', name='updated_date', type_=sqlalchemy.DateTime, nullable=False),
+    sqlalchemy.Column(key='heartbeatDate', name='heartbeat_date', type_=sqlalchemy.DateTime, nullable=False),
+)
+
+WorkerHeartbeatsRepository = EntityRepository(table=WorkerHeartbeatsTable, modelClass=WorkerHeartbeat)
+
+
+PositionLeasesTable = sqlalchemy.Table(
+    'tbl_position_leases',
+    metadata,
+    sqlalchemy.Column(key='agentPositionId', name='agent_position_id', type_=sqlalchemy.Integer, primary_key=True, nullable=False),
+    sqlalchemy.Column(key='createdDate', name='created_date', type_=sqlalchemy.DateTime, nullable=False),
+    sqlalchemy.Column(key='updatedDate', name='updated_date', type_=sqlalchemy.DateTime, nullable=False),
+    sqlalchemy.Column(key='workerId', name='worker_id', type_=sqlalchemy.Text, nullable=False, index=True),
+    sqlalchemy.Column(key='leaseExpiryDate', name='lease_expiry_date', type_=sqlalchemy.DateTime, nullable=False),
+)
+
+PositionLeasesRepository = EntityRepository(table=PositionLeasesTable, modelClass=PositionLease)
+
+
+WorkerTaskLeasesTable = sqlalchemy.Table(
+    'tbl_worker_task_leases',
+    metadata,
+    sqlalchemy.Column(key='taskName', name='task_name', type_=sqlalchemy.Text, primary_key=True, nullable=False),
+    sqlalchemy.Column(key='createdDate', name='created_date', type_=sqlalchemy.DateTime, nullable=False),
+    sqlalchemy.Column(key='updatedDate', name='updated_date', type_=sqlalchemy.DateTime, nullable=False),
+    sqlalchemy.Column(key='workerId', name='worker_id', type_=sqlalchemy.Text, nullable=False),
+    sqlalchemy.Column(key='leaseExpiryDate', name='lease_expiry_date', type_=sqlalchemy.DateTime, nullable=False),
+)
+
+WorkerTaskLeasesRepository = EntityRepository(table=WorkerTaskLeasesTable, modelClass=WorkerTaskLease)
+
+
+PendingUserOperationsTable = sqlalchemy.Table(
+    'tbl_pending_user_operations',
+    metadata,
+    sqlalchemy.Column(key='pendingUserOperationId', name='id', type_=sqlalchemy.Integer, autoincrement=True, primary_key=True, nullable=False),
+    sqlalchemy.Column(key='createdDate', name='created_date', type_=sqlalchemy.DateTime, nullable=False),
+    sqlalchemy.Column(key='updatedDate', name='updated_date', type_=sqlalchemy.DateTime, nullable=False),
+    sqlalchemy.Column(key='agentId', name='agent_id', type_=sqlalchemy_psql.UUID, nullable=False, index=True),
+    sqlalchemy.Column(key='agentPositionId', name='agent_position_id', type_=sqlalchemy.Integer, nullable=True),
+    sqlalchemy.Column(key='walletAddress', name='wallet_address', type_=sqlalchemy.Text, nullable=False),
+    sqlalchemy.Column(key='userOperationHash', name='user_operation_hash', type_=sqlalchemy.Text, nullable=False),
+    sqlalchemy.Column(key='actionType', name='action_type', type_=sqlalchemy.Text, nullable=False),
+    sqlalchemy.Column(key='status', name='status', type_=sqlalchemy.Text, nullable=False, index=True),
+    sqlalchemy.Column(key='transactionHash', name='transaction_hash', type_=sqlalchemy.Text, nullable=True),
+    sqlalchemy.Column(key='details', name='details', type_=sqlalchemy_psql.JSONB, nullable=False),
+    sqlalchemy.UniqueConstraint('userOperationHash', name='tbl_pending_user_operations_ux_user_operation_hash'),
+)
+
+PendingUserOperationsRepository = EntityRepository(table=PendingUserOperationsTable, modelClass=PendingUserOperation)
+
+
+LtvChecksTable = sqlalchemy.Table(
+    'tbl_ltv_checks',
+    metadata,
+    sqlalchemy.Column(key='ltvCheckId', name='id', type_=sqlalchemy.BigInteger, autoincrement=True, primary_key=True, nullable=False),
+    sqlalchemy.Column(key='agentPositionId', name='agent_position_id', type_=sqlalchemy.Integer, nullable=False),
+    sqlalchemy.Column(key='checkDate', name='check_date', type_=sqlalchemy.DateTime, nullable=False),
+    sqlalchemy.Column(key='currentLtv', name='current_ltv', type_=sqlalchemy.Float, nullable=False),
+    sqlalchemy.Column(key='targetLtv', name='target_ltv', type_=sqlalchemy.Float, nullable=False),
+    sqlalchemy.Column(key='maxLtv', name='max_ltv', type_=sqlalchemy.Float, nullable=False),
+    sqlalchemy.Column(key='decisionCode', name='decision_code', type_=sqlalchemy.SmallInteger, nullable=False),
+    sqlalchemy.Index('ix_tbl_ltv_checks_agent_position_id_check_date', 'agentPositionId', 'checkDate'),
+    sqlalchemy.Index('ix_tbl_ltv_checks_check_date', 'checkDate'),
+)
+
+LtvChecksRepository = EntityRepository(table=LtvChecksTable, modelClass=LtvCheck)
+
+LtvCheckRollupsTable = sqlalchemy.Table(
+    'tbl_ltv_check_rollups',
+    metadata,
+    sqlalchemy.Column(key='agentPositionId', name='agent_position_id', type_=sqlalchemy.Integer, primary_key=True, nullable=False),
+    sqlalchemy.Column(key='periodDate', name='period_date', type_=sqlalchemy.DateTime, primary_key=True, nullable=False),
+    sqlalchemy.Column(key='checkCount', name='check_count', type_=sqlalchemy.Integer, nullable=False),
+    sqlalchemy.Column(key='actionCount', name='action_count', type_=sqlalchemy.Integer, nullable=False),
+    sqlalchemy.Column(key='minCurrentLtv', name='min_current_ltv', type_=sqlalchemy.Float, nullable=False),
+    sqlalchemy.Column(key='avgCurrentLtv', name='avg_current_ltv', type_=sqlalchemy.Float, nullable=False),
+    sqlalchemy.Column(key='maxCurrentLtv', name='max_current_ltv', type_=sqlalchemy.Float, nullable=False),
+    sqlalchemy.Column(key='avgTargetLtv', name='avg_target_ltv', type_=sqlalchemy.Float, nullable=False),
+    sqlalchemy.Column(key='maxLtv', name='max_ltv', type_=sqlalchemy.Float, nullable=False),
+)
+
+LtvCheckRollupsRepository = EntityRepository(table=LtvCheckRollupsTable, modelClass=LtvCheckRollup)
+
+HistoricalPricesTable = sqlalchemy.Table(
+    'tbl_historical_prices',
+    metadata,
+    sqlalchemy.Column(key='chainId', name='chain_id', type_=sqlalchemy.Integer, primary_key=True, nullable=False),
+    sqlalchemy.Column(key='assetAddress', name='asset_address', type_=sqlalchemy.Text, primary_key=True, nullable=False),
+    sqlalchemy.Column(key='priceDate', name='price_date', type_=sqlalchemy.DateTime, primary_key=True, nullable=False),
+    sqlalchemy.Column(key='priceUsd', name='price_usd', type_=sqlalchemy.Float, nullable=False),
+)
+
+HistoricalPricesRepository = EntityRepository(table=HistoricalPricesTable, modelClass=HistoricalPrice)
+
+VaultYieldSnapshotsTable = sqlalchemy.Table(
+    'tbl_vault_yield_snapshots',
+    metadata,
+    sqlalchemy.Column(key='chainId', name='chain_id', type_=sqlalchemy.Integer, primary_key=True, nullable=False),
+    sqlalchemy.Column(key='vaultAddress', name='vault_address', type_=sqlalchemy.Text, primary_key=True, nullable=False),
+    sqlalchemy.Column(key='snapshotDate', name='snapshot_date', type_=sqlalchemy.DateTime, primary_key=True, nullable=False),
+    sqlalchemy.Column(key='apy', name='apy', type_=sqlalchemy.Float, nullable=False),
+    sqlalchemy.Column(key='totalAssets', name='total_assets', type_=sqlalchemy.Numeric(precision=78, scale=0), nullable=False),
+)
+
+VaultYieldSnapshotsRepository = EntityRepository(table=VaultYieldSnapshotsTable, modelClass=VaultYieldSnapshot)
@@ -0,0 +1,130 @@
+import typing
+
+from core import logging
+from core.util import date_util
+from core.util import list_util
+
+from money_hack.model import PendingUserOperation
+from money_hack.notification_service import NotificationService
+from money_hack.smart_wallets.coinbase_bundler import CoinbaseBundler
+from money_hack.smart_wallets.model import UserOperationReceipt
+from money_hack.store.database_store import DatabaseStore
+
+USER_OPERATION_TIMEOUT_SECONDS = 600
+RECONCILE_INTERVAL_SECONDS = 2.0
+DEFAULT_RECEIPT_BATCH_SIZE = 50
+
+
+class UserOperationReconciler:
+    """Tracks user operations submitted by the monitoring loop and resolves them from bundler receipts.
+    Submitted operations are stored as pending, and each reconcile polls their receipts in JSON-RPC batches,
+    marks them confirmed, failed or timed out and runs the completion hook for the action that sent them.
+    An operation only leaves pending once, so when several workers reconcile the same one only the first runs its hook.
+    """
+
+    def __init__(self, databaseStore: DatabaseStore, coinbaseBundler: CoinbaseBundler, notificationService: NotificationService | None = None, receiptBatchSize: int = DEFAULT_RECEIPT_BATCH_SIZE) -> None:
+        self.databaseStore = databaseStore
+        self.coinbaseBundler = coinbaseBundler
+        self.notificationService = notificationService
+        self.receiptBatchSize = receiptBatchSize
+
+    async def track_user_operation(self, *, agentId: str, agentPositionId: int | None, walletAddress: str, userOperationHash: str, actionType: str, details: dict[str, object]) -> PendingUserOperation:
+        return await self.databaseStore.create_pending_user_operation(
+            agentId=agentId,
+            agentPositionId=agentPositionId,
+            walletAddress=walletAddress,
+            userOperationHash=userOperationHash,
+            actionType=actionType,
+            details=details,
+        )
+
+    async def has_pending_user_operations(self, agentId: str) -> bool:
+        pendingUserOperations = await self.databaseStore.get_pending_user_operations(agentId=agentId)
+        return len(pendingUserOperations) > 0
+
+    async def _get_receipt(self, userOperationHash: str) -> UserOperationReceipt | None:
+        try:
+            return await self.coinbaseBundler.get_user_operation_receipt(userOperationHash=userOperationHash)
+        except Exception as e:  # noqa: BLE001
+            logging.warning(f'Failed to get receipt for user operation {userOperationHash}: {e}')
+            return None
+
+    async def _get_receipts(self, userOperationHashes: list[str]) -> list[UserOperationReceipt | None]:
+        receipts: list[UserOperationReceipt | None] = []
+        for userOperationHashChunk in list_util.generate_chunks(lst=userOperationHashes, chunkSize=self.receiptBatchSize):
+            try:
+                receipts += await self.coinbaseBundler.get_user_operation_receipts(userOperationHashes=list(userOperationHashChunk))
+            except Exception as e:  # noqa: BLE001
+                logging.warning(f'Failed to get a batch of {len(userOperationHashChunk)} user operation receipts, falling back to individual requests: {e}')
+                receipts += [await self._get_receipt(userOperationHash=userOperationHash) for userOperationHash in userOperationHashChunk]
+        return receipts
+
+    async def reconcile_once(self) -> None:
+        """Resolve every pending user operation that has a receipt. Should be called within a database context."""
+        pendingUserOperations = await self.databaseStore.get_pending_user_operations()
+        if len(pendingUserOperations) == 0:
+            return
+        receipts = await self._get_receipts(userOperationHashes=[pendingUserOperation.userOperationHash for pendingUserOperation in pendingUserOperations])
+        # NOTE: database writes are done one at a time as they share the context connection
+        for pendingUserOperation, receipt in zip(pendingUserOperations, receipts, strict=True):
+            try:
+                await self._reconcile_user_operation(pendingUserOperation=pendingUserOperation, receipt=receipt)
+            except Exception:  # noqa: BLE001
+                logging.exception(f'Failed to reconcile user operation {pendingUserOperation.userOperationHash}')
+
+    async def _reconcile_user_operation(self, pendingUserOperation: PendingUserOperation, receipt: UserOperationReceipt | None) -> None:
+        if receipt is None:
+            isTimedOut = pendingUserOperation.createdDate < date_util.datetime_from_now(seconds=-USER_OPERATION_TIMEOUT_SECONDS)
+            if isTimedOut and await self.databaseStore.resolve_pending_user_operation(pendingUserOperationId=pendingUserOperation.pendingUserOperationId, status='timed_out') is not None:
+                logging.warning(f'User operation {pendingUserOperation.userOperationHash} ({pendingUserOperation.actionType}) timed out without a receipt')
+            return
+        transactionHash = typing.cast(str, receipt['receipt']['transactionHash'])
+        if not receipt.get('success'):
+            if await self.databaseStore.resolve_pending_user_operation(pendingUserOperationId=pendingUserOperation.pendingUserOperationId, status='failed', transactionHash=transactionHash) is not None:
+                logging.error(f'User operation {pendingUserOperation.userOperationHash} ({pendingUserOperation.actionType}) failed in {transactionHash}: {receipt.get("reason")}')
+            return
+        # NOTE: only the reconcile that moves the operation out of pending runs its completion hook, so notifications and action logs are never duplicated
+        if await self.databaseStore.resolve_pending_user_operation(pendingUserOperationId=pendingUserOperation.pendingUserOperationId, status='confirmed', transactionHash=transactionHash) is None:
+            return
+        logging.info(f'User operation {pendingUserOperation.userOperationHash} ({pendingUserOperation.actionType}) confirmed: {transactionHash}')
+        await self._on_user_operation_confirmed(pendingUserOperation=pendingUserOperation, transactionHash=transactionHash)
+
+    async def _on_user_operation_confirmed(self, pendingUserOperation: PendingUserOperation, transactionHash: str) -> None:
+        actions = typing.cast(list[dict[str, object]], pendingUserOperation.details.get('actions', []))
+        for action in actions:
+            await self._on_action_confirmed(pendingUserOperation=pendingUserOperation, action=action, transactionHash=transactionHash)
+
+    async def _on_action_confirmed(self, pendingUserOperation: PendingUserOperation, action: dict[str, object], transactionHash: str) -> None:
+        actionType = action['action_type']
+        if actionType in ('deploy_idle_collateral', 'deploy_idle_usdc'):
+            await self.databaseStore.log_agent_action(
+                agentId=pendingUserOperation.agentId,
+                actionType=str(actionType),
+                value=str(action.get('value')),
+                valueId=str(pendingUserOperation.agentPositionId) if pendingUserOperation.agentPositionId is not None else None,
+                details={**typing.cast(dict[str, object], action.get('action_details', {})), 'transaction_hash': transactionHash},
+            )
+            return
+        if self.notificationService is None or not action.get('should_notify'):
+            return
+        agent = await self.databaseStore.get_agent(agentId=pendingUserOperation.agentId)
+        user = await self.databaseStore.get_user(userId=agent.userId) if agent else None
+        if agent is None or user is None:
+            return
+        if actionType == 'auto_repay':
+            await self.notificationService.send_auto_repay_success(
+                agent=agent,
+                user=user,
+                repayAmount=typing.cast(float, action['repay_amount']),
+                oldLtv=typing.cast(float, action['old_ltv']),
+                newLtv=typing.cast(float, action['new_ltv']),
+            )
+        elif actionType == 'auto_optimize':
+            await self.notificationService.send_auto_optimize_success(
+                agent=agent,
+                user=user,
+                borrowAmount=typing.cast(float, action['borrow_amount']),
+                oldLtv=typing.cast(float, action['old_ltv']),
+                newLtv=typing.cast(float, action['new_ltv']),
+                priceContext=typing.cast(str | None, action.get('price_context')),
+            )
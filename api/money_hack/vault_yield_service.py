@@ -0,0 +1,108 @@
+import asyncio
+import datetime as dt
+import time
+from dataclasses import dataclass
+
+from core import logging
+
+from money_hack.forty_acres.forty_acres_client import FortyAcresClient
+from money_hack.model import VaultYieldSnapshot
+from money_hack.store.database_store import DatabaseStore
+from money_hack.yo.yo_client import YoClient
+
+VAULT_YIELD_REFRESH_INTERVAL_SECONDS = 60 * 5
+# NOTE: yields older than this are never served, a read past it waits for a fresh one instead
+DEFAULT_VAULT_YIELD_MAX_STALE_SECONDS = 60 * 30
+
+
+@dataclass
+class VaultYield:
+    vault_address: str
+    apy: float
+    total_assets: int
+    decimals: int
+    refreshed_time: float
+
+
+class VaultYieldService:
+    """Keeps a vault's APY and TVL in memory, refreshed in the background, so reads cost nothing per request or position.
+    Reads past the refresh interval return the held value and start a refresh, reads past maxStaleSeconds wait for one.
+    Concurrent refreshes share one request to the vault. Each refresh made by the worker is also recorded as a snapshot for APY charts.
+    """
+
+    def __init__(
+        self,
+        vaultClient: FortyAcresClient | YoClient,
+        chainId: int,
+        databaseStore: DatabaseStore | None = None,
+        refreshSeconds: float = VAULT_YIELD_REFRESH_INTERVAL_SECONDS,
+        maxStaleSeconds: float = DEFAULT_VAULT_YIELD_MAX_STALE_SECONDS,
+    ) -> None:
+        self.vaultClient = vaultClient
+        self.chainId = chainId
+        self.databaseStore = databaseStore
+        self.refreshSeconds = refreshSeconds
+        self.maxStaleSeconds = max(maxStaleSeconds, refreshSeconds)
+        self._vaultYield: VaultYield | None = None
+        self._inflightRefresh: asyncio.Task[VaultYield | None] | None = None
+
+    async def _refresh(self) -> VaultYield | None:
+        vaultInfo = await self.vaultClient.get_vault_info(chainId=self.chainId)
+        if vaultInfo is None:
+            return None
+        vaultYield = VaultYield(vault_address=vaultInfo.address, apy=vaultInfo.apy, total_assets=vaultInfo.total_assets, decimals=vaultInfo.decimals, refreshed_time=time.time())
+        self._vaultYield = vaultYield
+        return vaultYield
+
+    def _on_refresh_done(self, task: asyncio.Task[VaultYield | None]) -> None:
+        if self._inflightRefresh is task:
+            self._inflightRefresh = None
+        # NOTE: retrieving the exception here keeps failed background refreshes nobody awaited from being reported as unhandled
+        if not task.cancelled() and task.exception() is not None:
+            logging.warning(f'Vault yield refresh on chain {self.chainId} failed: {task.exception()}')
+
+    def _get_inflight_refresh(self) -> asyncio.Task[VaultYield | None]:
+        # NOTE: a finished refresh is replaced as its done callback may not have cleared it yet
+        if self._inflightRefresh is None or self._inflightRefresh.done():
+            self._inflightRefresh = asyncio.create_task(self._refresh())
+            self._inflightRefresh.add_done_callback(self._on_refresh_done)
+        return self._inflightRefresh
+
+    async def refresh(self) -> VaultYield | None:
+        # NOTE: shielded so one caller being cancelled does not cancel the refresh for everyone waiting on it
+        return await asyncio.shield(self._get_inflight_refresh())
+
+    async def refresh_and_record(self) -> VaultYield | None:
+        """Refresh the vault yield and store it as a snapshot. Called on the worker's schedule so the time series has one writer."""
+        vaultYield = await self.refresh()
+        if vaultYield is not None and self.databaseStore is not None:
+            await self.databaseStore.create_vault_yield_snapshot(
+                chainId=self.chainId,
+                vaultAddress=vaultYield.vault_address,
+                snapshotDate=dt.datetime.fromtimestamp(vaultYield.refreshed_time, tz=dt.UTC),
+                apy=vaultYield.apy,
+                totalAssets=vaultYield.total_assets,
+            )
+        return vaultYield
+
+    async def get_vault_yield(self) -> VaultYield | None:
+        vaultYield = self._vaultYield
+        if vaultYield is not None:
+            age = time.time() - vaultYield.refreshed_time
+            if age <= self.maxStaleSeconds:
+                if age > self.refreshSeconds:
+                    self._get_inflight_refresh()
+                return vaultYield
+        return await self.refresh()
+
+    async def get_yield_apy(self) -> float | None:
+        vaultYield = await self.get_vault_yield()
+        return vaultYield.apy if vaultYield is not None else None
+
+    async def list_yield_snapshots(self, since: dt.datetime) -> list[VaultYieldSnapshot]:
+        if self.databaseStore is None:
+            return []
+        vaultYield = await self.get_vault_yield()
+        if vaultYield is None:
+            return []
+        return await self.databaseStore.list_vault_yield_snapshots(chainId=self.chainId, vaultAddress=vaultYield.vault_address, since=since)
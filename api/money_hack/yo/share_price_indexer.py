@@ -0,0 +1,140 @@
+import asyncio
+import time
+from dataclasses import dataclass
+
+from core import logging
+from core.caching.cache import Cache
+from core.web3.eth_client import RestEthClient
+
+from money_hack import constants
+from money_hack import util
+from money_hack.blockchain_data.blockscout_client import BlockscoutClient
+from money_hack.blockchain_data.blockscout_client import BlockscoutLog
+
+# NOTE: a fresh index starts this far back so the longest APY window is covered straight away
+SHARE_PRICE_INITIAL_LOOKBACK_SECONDS = 60 * 60 * 24 * 31
+SHARE_PRICE_RETENTION_SECONDS = 60 * 60 * 24 * 90
+# NOTE: the newest blocks are left for the next sync so a reorg cannot leave a dropped update in the index
+SHARE_PRICE_CONFIRMATION_BLOCKS = 10
+# NOTE: kept well below the point where Blockscout truncates getLogs results
+SHARE_PRICE_MAX_BLOCK_RANGE = 500_000
+SHARE_PRICE_CACHE_EXPIRY_SECONDS = 60 * 60 * 24 * 365
+# NOTE: SharePriceUpdated data holds the price and timestamp as two ABI words of 32 bytes each
+ABI_WORD_HEX_LENGTH = 64
+SHARE_PRICE_UPDATE_DATA_HEX_LENGTH = 2 * ABI_WORD_HEX_LENGTH
+
+
+@dataclass
+class SharePriceUpdate:
+    block_number: int
+    log_index: int
+    price: int
+    timestamp: int
+
+
+def calculate_apy_between(start: SharePriceUpdate, end: SharePriceUpdate) -> float | None:
+    """Annualize the share price growth between two updates, or None if they do not span a valid, positive interval."""
+    secondsElapsed = end.timestamp - start.timestamp
+    if start.price <= 0 or end.price <= 0 or secondsElapsed <= 0:
+        return None
+    return float((end.price / start.price) ** (constants.SECONDS_PER_YEAR / secondsElapsed)) - 1
+
+
+class _VaultIndex:
+    def __init__(self) -> None:
+        self.lastScannedBlock: int | None = None
+        self.updates: list[SharePriceUpdate] = []
+        self.lock = asyncio.Lock()
+        self.isLoaded = False
+
+
+class SharePriceUpdateIndexer:
+    """Incrementally indexes a Yo oracle's SharePriceUpdated events for each vault.
+    Each sync fetches only the blocks after the last scanned one, and the update history and checkpoint are persisted to the cache,
+    so APYs over any window within the retained history are computed locally from the prices and timestamps the events carry.
+    """
+
+    def __init__(self, ethClient: RestEthClient, blockscoutClient: BlockscoutClient, cache: Cache | None = None) -> None:
+        self.ethClient = ethClient
+        self.blockscoutClient = blockscoutClient
+        self.cache = cache
+        self._indexes: dict[tuple[int, str], _VaultIndex] = {}
+
+    @staticmethod
+    def _get_cache_key(chainId: int, vaultAddress: str) -> str:
+        return f'yo-share-price-updates-{chainId}-{vaultAddress.lower()}'
+
+    def _get_index(self, chainId: int, vaultAddress: str) -> _VaultIndex:
+        key = (chainId, vaultAddress.lower())
+        index = self._indexes.get(key)
+        if index is None:
+            index = _VaultIndex()
+            self._indexes[key] = index
+        return index
+
+    async def _load(self, chainId: int, vaultAddress: str, index: _VaultIndex) -> None:
+        index.isLoaded = True
+        try:
+            indexData = await util.get_json_from_optional_cache(cache=self.cache, key=self._get_cache_key(chainId=chainId, vaultAddress=vaultAddress))
+        except Exception as e:  # noqa: BLE001
+            logging.warning(f'Failed to load share price updates for {vaultAddress}: {e}')
+            return
+        if not indexData:
+            return
+        index.lastScannedBlock = int(indexData['lastScannedBlock'])
+        index.updates = [SharePriceUpdate(block_number=int(blockNumber), log_index=int(logIndex), price=int(price), timestamp=int(timestamp)) for blockNumber, logIndex, price, timestamp in indexData['updates']]
+
+    async def _persist(self, chainId: int, vaultAddress: str, index: _VaultIndex) -> None:
+        indexData = {
+            'lastScannedBlock': index.lastScannedBlock,
+            # NOTE: prices are stored as strings since they can exceed the integer range of JSON parsers
+            'updates': [[update.block_number, update.log_index, str(update.price), update.timestamp] for update in index.updates],
+        }
+        try:
+            await util.save_json_to_optional_cache(cache=self.cache, key=self._get_cache_key(chainId=chainId, vaultAddress=vaultAddress), value=indexData, expirySeconds=SHARE_PRICE_CACHE_EXPIRY_SECONDS)
+        except Exception as e:  # noqa: BLE001
+            logging.warning(f'Failed to persist share price updates for {vaultAddress}: {e}')
+
+    @staticmethod
+    def _parse_log(log: BlockscoutLog) -> SharePriceUpdate | None:
+        if log.removed or log.blockNumber is None or log.data is None:
+            return None
+        data = log.data.removeprefix('0x')
+        if len(data) < SHARE_PRICE_UPDATE_DATA_HEX_LENGTH:
+            return None
+        return SharePriceUpdate(
+            block_number=int(log.blockNumber, 16),
+            log_index=int(log.logIndex, 16) if log.logIndex else 0,
+            price=int(data[:ABI_WORD_HEX_LENGTH], 16),
+            timestamp=int(data[ABI_WORD_HEX_LENGTH:SHARE_PRICE_UPDATE_DATA_HEX_LENGTH], 16),
+        )
+
+    async def _scan(self, *, chainId: int, vaultAddress: str, oracleAddress: str, eventTopic: str, fromBlock: int, toBlock: int) -> list[SharePriceUpdate]:
+        vaultAddressTopic = '0x' + vaultAddress[2:].lower().zfill(64)
+        updates: list[SharePriceUpdate] = []
+        for rangeStart in range(fromBlock, toBlock + 1, SHARE_PRICE_MAX_BLOCK_RANGE):
+            rangeEnd = min(rangeStart + SHARE_PRICE_MAX_BLOCK_RANGE - 1, toBlock)
+            logs = await self.blockscoutClient.get_logs_by_topic(chainId=chainId, address=oracleAddress, topic0=eventTopic, topic1=vaultAddressTopic, fromBlock=rangeStart, toBlock=rangeEnd)
+            updates.extend(update for update in (self._parse_log(log=log) for log in logs) if update is not None)
+        return updates
+
+    async def sync(self, chainId: int, vaultAddress: str, oracleAddress: str, eventTopic: str) -> list[SharePriceUpdate]:
+        """Index any updates since the last scanned block and return the vault's retained updates, oldest first."""
+        index = self._get_index(chainId=chainId, vaultAddress=vaultAddress)
+        async with index.lock:
+            if not index.isLoaded:
+                await self._load(chainId=chainId, vaultAddress=vaultAddress, index=index)
+            toBlock = await self.ethClient.get_latest_block_number() - SHARE_PRICE_CONFIRMATION_BLOCKS
+            fromBlock = index.lastScannedBlock + 1 if index.lastScannedBlock is not None else max(toBlock - SHARE_PRICE_INITIAL_LOOKBACK_SECONDS // constants.BASE_BLOCK_TIME_SECONDS, 0)
+            if fromBlock > toBlock:
+                return list(index.updates)
+            newUpdates = await self._scan(chainId=chainId, vaultAddress=vaultAddress, oracleAddress=oracleAddress, eventTopic=eventTopic, fromBlock=fromBlock, toBlock=toBlock)
+            knownUpdates = {(update.block_number, update.log_index) for update in index.updates}
+            retentionStart = time.time() - SHARE_PRICE_RETENTION_SECONDS
+            allUpdates = index.updates + [update for update in newUpdates if (update.block_number, update.log_index) not in knownUpdates]
+            index.updates = sorted((update for update in allUpdates if update.timestamp >= retentionStart), key=lambda update: (update.block_number, update.log_index))
+            index.lastScannedBlock = toBlock
+            if newUpdates:
+                logging.info(f'Indexed {len(newUpdates)} share price updates for {vaultAddress} in blocks {fromBlock}-{toBlock}')
+            await self._persist(chainId=chainId, vaultAddress=vaultAddress, index=index)
+            return list(index.updates)
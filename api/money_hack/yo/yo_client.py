@@ -1,4 +1,5 @@
 import asyncio
+import time
 import typing
 
 from core import logging
@@ -12,10 +13,15 @@ from web3 import Web3
 from money_hack import constants
 from money_hack.blockchain_data.blockscout_client import BlockscoutClient
 from money_hack.yo import yo_abis
+from money_hack.yo.share_price_indexer import SharePriceUpdate
+from money_hack.yo.share_price_indexer import SharePriceUpdateIndexer
+from money_hack.yo.share_price_indexer import calculate_apy_between
 
 VAULT_ADDRESS_MAP: dict[int, str] = {
     constants.BASE_CHAIN_ID: '0x0000000f2eB9f69274678c76222B35eEc7588a65',
 }
+# NOTE: an APY needs the share price at two points in time
+MIN_APY_UPDATE_COUNT = 2
 
 
 class YoVaultInfo(BaseModel):
@@ -26,13 +32,28 @@ class YoVaultInfo(BaseModel):
     decimals: int
     total_assets: int
     apy: float
+    apy_7d: float | None = None
+    apy_30d: float | None = None
+
+
+def calculate_average_apy(updates: list[SharePriceUpdate], days: int, now: float) -> float | None:
+    """Annualized share price growth from the start of the window to the latest update.
+    The window starts at the last update at or before its start so it is fully covered, or at the oldest update when the history is shorter.
+    """
+    if len(updates) < MIN_APY_UPDATE_COUNT:
+        return None
+    windowStart = now - days * 24 * constants.SECONDS_PER_HOUR
+    startUpdate = next((update for update in reversed(updates) if update.timestamp <= windowStart), updates[0])
+    return calculate_apy_between(start=startUpdate, end=updates[-1])
 
 
 class YoClient:
-    def __init__(self, requester: Requester, ethClient: RestEthClient, blockscoutClient: BlockscoutClient) -> None:
+    def __init__(self, requester: Requester, ethClient: RestEthClient, blockscoutClient: BlockscoutClient, sharePriceIndexer: SharePriceUpdateIndexer | None = None) -> None:
         self.requester = requester
         self.ethClient = ethClient
         self.blockscoutClient = blockscoutClient
+        self.sharePriceIndexer = sharePriceIndexer or SharePriceUpdateIndexer(ethClient=ethClient, blockscoutClient=blockscoutClient)
+        self._oracleAddresses: dict[str, str] = {}
 
     def _get_event_topic(self, abi: ABI, eventName: str) -> str:
         eventAbi = typing.cast(ABIEvent | None, next((item for item in abi if item.get('type') == 'event' and item.get('name') == eventName), None))
@@ -42,45 +63,29 @@ class YoClient:
         signature = f'{eventName}({",".join(types)})'
         return '0x' + Web3.keccak(text=signature).hex()
 
-    async def _get_share_price_update_blocks(self, chainId: int, vaultAddress: str, numUpdates: int = 2) -> list[int]:
-        oracleAddressResponse = await self.ethClient.call_function_by_name(toAddress=vaultAddress, contractAbi=yo_abis.VAULT_ABI, functionName='ORACLE_ADDRESS', arguments={})
-        oracleAddress = oracleAddressResponse[0]
+    async def _get_oracle_address(self, vaultAddress: str) -> str:
+        oracleAddress = self._oracleAddresses.get(vaultAddress)
+        if oracleAddress is None:
+            oracleAddressResponse = await self.ethClient.call_function_by_name(toAddress=vaultAddress, contractAbi=yo_abis.VAULT_ABI, functionName='ORACLE_ADDRESS', arguments={})
+            oracleAddress = str(oracleAddressResponse[0])
+            self._oracleAddresses[vaultAddress] = oracleAddress
+        return oracleAddress
+
+    async def _get_share_price_updates(self, chainId: int, vaultAddress: str) -> list[SharePriceUpdate]:
+        oracleAddress = await self._get_oracle_address(vaultAddress=vaultAddress)
         sharePriceUpdatedTopic = self._get_event_topic(abi=yo_abis.ORACLE_ABI, eventName='SharePriceUpdated')
-        vaultAddressTopic = '0x' + vaultAddress[2:].lower().zfill(64)
-        latestBlock = await self.ethClient.get_latest_block_number()
-        maxLookbackBlocks = int((3 * 24 * constants.SECONDS_PER_HOUR) / constants.BASE_BLOCK_TIME_SECONDS)
-        fromBlock = max(latestBlock - maxLookbackBlocks, 0)
-        logging.info(f'Fetching SharePriceUpdated logs from oracle {oracleAddress}, topic0={sharePriceUpdatedTopic}, topic1={vaultAddressTopic}, blocks {fromBlock}-{latestBlock}')
-        logs = await self.blockscoutClient.get_logs_by_topic(chainId=chainId, address=oracleAddress, topic0=sharePriceUpdatedTopic, topic1=vaultAddressTopic, fromBlock=fromBlock, toBlock=latestBlock)
-        logging.info(f'Found {len(logs)} SharePriceUpdated logs')
-        updateBlocks = sorted((int(str(log.blockNumber), 16) for log in logs), reverse=True)
-        return updateBlocks[:numUpdates]
-
-    async def _calculate_apy_from_share_price_updates(self, chainId: int, vaultAddress: str, decimals: int) -> float:
-        minUpdates = 2
-        updateBlocks = await self._get_share_price_update_blocks(chainId=chainId, vaultAddress=vaultAddress, numUpdates=minUpdates)
-        if len(updateBlocks) < minUpdates:
-            raise ValueError(f'Not enough share price updates for {vaultAddress}: found {len(updateBlocks)}, need {minUpdates}')
-        block1 = int(updateBlocks[1])
-        block2 = int(updateBlocks[0])
-        rate1Response, rate2Response, blockData1, blockData2 = await asyncio.gather(
-            self.ethClient.call_function_by_name(toAddress=vaultAddress, contractAbi=yo_abis.VAULT_ABI, functionName='convertToAssets', arguments={'shares': 10**decimals}, blockNumber=block1),
-            self.ethClient.call_function_by_name(toAddress=vaultAddress, contractAbi=yo_abis.VAULT_ABI, functionName='convertToAssets', arguments={'shares': 10**decimals}, blockNumber=block2),
-            self.ethClient.get_block(blockNumber=block1),
-            self.ethClient.get_block(blockNumber=block2),
-        )
-        rate1 = int(rate1Response[0])
-        rate2 = int(rate2Response[0])
-        timestamp1 = int(blockData1['timestamp'])
-        timestamp2 = int(blockData2['timestamp'])
-        if rate1 <= 0 or rate2 <= rate1:
-            raise ValueError(f'Invalid share price data for {vaultAddress}: rate1={rate1}, rate2={rate2}')
-        secondsElapsed = timestamp2 - timestamp1
-        if secondsElapsed <= 0:
-            raise ValueError(f'Invalid timestamps for {vaultAddress}: t1={timestamp1}, t2={timestamp2}')
-        rateChange = rate2 / rate1
-        apy = float((rateChange) ** (constants.SECONDS_PER_YEAR / secondsElapsed)) - 1
-        logging.info(f'Yo vault {vaultAddress}: Calculated APY from share price updates. Rate change: {rateChange:.6f}, Time: {secondsElapsed}s, APY: {apy:.4%}')
+        return await self.sharePriceIndexer.sync(chainId=chainId, vaultAddress=vaultAddress, oracleAddress=oracleAddress, eventTopic=sharePriceUpdatedTopic)
+
+    def _calculate_latest_apy(self, vaultAddress: str, updates: list[SharePriceUpdate]) -> float:
+        if len(updates) < MIN_APY_UPDATE_COUNT:
+            raise ValueError(f'Not enough share price updates for {vaultAddress}: found {len(updates)}, need {MIN_APY_UPDATE_COUNT}')
+        previousUpdate, latestUpdate = updates[-2], updates[-1]
+        if previousUpdate.price <= 0 or latestUpdate.price <= previousUpdate.price:
+            raise ValueError(f'Invalid share price data for {vaultAddress}: rate1={previousUpdate.price}, rate2={latestUpdate.price}')
+        apy = calculate_apy_between(start=previousUpdate, end=latestUpdate)
+        if apy is None:
+            raise ValueError(f'Invalid timestamps for {vaultAddress}: t1={previousUpdate.timestamp}, t2={latestUpdate.timestamp}')
+        logging.info(f'Yo vault {vaultAddress}: Calculated APY from share price updates. Rate change: {latestUpdate.price / previousUpdate.price:.6f}, Time: {latestUpdate.timestamp - previousUpdate.timestamp}s, APY: {apy:.4%}')
         return apy
 
     async def get_vault_info(self, chainId: int) -> YoVaultInfo | None:
@@ -95,7 +100,8 @@ class YoClient:
             self.ethClient.call_function_by_name(toAddress=vaultAddress, contractAbi=yo_abis.VAULT_ABI, functionName='totalAssets'),
         )
         decimals = int(decimalsResponse[0])
-        apy = await self._calculate_apy_from_share_price_updates(chainId=chainId, vaultAddress=vaultAddress, decimals=decimals)
+        updates = await self._get_share_price_updates(chainId=chainId, vaultAddress=vaultAddress)
+        apy = self._calculate_latest_apy(vaultAddress=vaultAddress, updates=updates)
         logging.info(f'Yo vault info loaded: {nameResponse[0]}, TVL: {int(totalAssetsResponse[0]) / 10**6:.2f} USDC, APY: {apy:.2%}')
         return YoVaultInfo(
             address=vaultAddress,
@@ -105,12 +111,21 @@ class YoClient:
             decimals=decimals,
             total_assets=int(totalAssetsResponse[0]),
             apy=apy,
+            apy_7d=calculate_average_apy(updates=updates, days=7, now=time.time()),
+            apy_30d=calculate_average_apy(updates=updates, days=30, now=time.time()),
         )
 
     async def get_yield_apy(self, chainId: int) -> float | None:
         vaultAddress = VAULT_ADDRESS_MAP.get(chainId)
         if vaultAddress is None:
             return None
-        decimalsResponse = await self.ethClient.call_function_by_name(toAddress=vaultAddress, contractAbi=yo_abis.VAULT_ABI, functionName='decimals')
-        decimals = int(decimalsResponse[0])
-        return await self._calculate_apy_from_share_price_updates(chainId=chainId, vaultAddress=vaultAddress, decimals=decimals)
+        updates = await self._get_share_price_updates(chainId=chainId, vaultAddress=vaultAddress)
+        return self._calculate_latest_apy(vaultAddress=vaultAddress, updates=updates)
+
+    async def get_average_apy(self, chainId: int, days: int) -> float | None:
+        """APY averaged over the last days from the indexed share price history."""
+        vaultAddress = VAULT_ADDRESS_MAP.get(chainId)
+        if vaultAddress is None:
+            return None
+        updates = await self._get_share_price_updates(chainId=chainId, vaultAddress=vaultAddress)
+        return calculate_average_apy(updates=updates, days=days, now=time.time())
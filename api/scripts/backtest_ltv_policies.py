@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""
+Replay an hourly collateral price series through LtvManager's decision rules for a grid of policy settings.
+Prices are read from a CSV whose last column is the USD price, one row per hour in chronological order.
+"""
+
+import argparse
+import csv
+import itertools
+import time
+
+import numpy as np
+from core import logging
+
+import _path_fix  # noqa: F401
+from money_hack.morpho.ltv_backtester import BacktestPositions
+from money_hack.morpho.ltv_backtester import FloatArray
+from money_hack.morpho.ltv_backtester import run_backtest
+from money_hack.morpho.ltv_manager import LtvPolicy
+
+logging.init_basic_logging()
+
+
+def _parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description='Backtest LTV policies over historical prices')
+    parser.add_argument('--prices-csv', required=True)
+    parser.add_argument('--position-count', type=int, default=10000)
+    parser.add_argument('--min-target-ltv', type=float, default=0.5)
+    parser.add_argument('--max-target-ltv', type=float, default=0.75)
+    parser.add_argument('--max-ltv', type=float, default=0.86)
+    parser.add_argument('--borrow-apy', type=float, default=0.05)
+    parser.add_argument('--yield-apy', type=float, default=0.08)
+    parser.add_argument('--margins', type=float, nargs='+', default=[0.03, 0.05, 0.08])
+    parser.add_argument('--min-optimize-gains', type=float, nargs='+', default=[0.0, 100.0])
+    parser.add_argument('--volatility-thresholds', type=float, nargs='+', default=[0.02, 1.0])
+    parser.add_argument('--seed', type=int, default=0)
+    return parser.parse_args()
+
+
+def _read_prices(path: str) -> FloatArray:
+    with open(path) as csvFile:
+        rows = [row for row in csv.reader(csvFile) if row]
+    prices = []
+    for row in rows:
+        try:
+            prices.append(float(row[-1]))
+        except ValueError:
+            continue
+    return np.array(prices, dtype=np.float64)
+
+
+def main() -> None:
+    args = _parse_args()
+    pricesUsd = _read_prices(path=args.prices_csv)
+    logging.info(f'Loaded {len(pricesUsd)} hourly prices from {args.prices_csv}')
+    randomGenerator = np.random.default_rng(seed=args.seed)
+    collateralValuesUsd = randomGenerator.lognormal(mean=np.log(5000), sigma=1.0, size=args.position_count)
+    positions = BacktestPositions.at_target(
+        collateralAmounts=collateralValuesUsd / pricesUsd[0],
+        targetLtvs=randomGenerator.uniform(low=args.min_target_ltv, high=args.max_target_ltv, size=args.position_count),
+        initialPriceUsd=float(pricesUsd[0]),
+    )
+    logging.info(f'{"margin":>7} {"min gain":>9} {"vol":>6} | {"repays":>8} {"manual":>8} {"borrows":>8} {"suppressed":>10} {"user ops":>9} {"near liq":>9} {"liquidated":>10} | {"seconds":>7}')
+    for margin, minOptimizeGain, volatilityThreshold in itertools.product(args.margins, args.min_optimize_gains, args.volatility_thresholds):
+        policy = LtvPolicy(margin_upper=margin, margin_lower=margin, min_optimize_annual_gain_usd=minOptimizeGain, volatility_threshold=volatilityThreshold)
+        startTime = time.time()
+        result = run_backtest(pricesUsd=pricesUsd, positions=positions, maxLtv=args.max_ltv, borrowApy=args.borrow_apy, yieldApy=args.yield_apy, policy=policy)
+        duration = time.time() - startTime
+        logging.info(
+            f'{margin:>7.2%} {minOptimizeGain:>9.0f} {volatilityThreshold:>6.2%} | '
+            f'{result.repay_count:>8} {result.manual_repay_count:>8} {result.borrow_count:>8} {result.suppressed_borrow_count:>10} '
+            f'{result.user_operation_count:>9} {result.near_liquidation_position_count:>9} {result.liquidation_count:>10} | {duration:>7.2f}'
+        )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,206 @@
+#!/usr/bin/env python3
+"""
+Benchmark full check_positions_once monitoring cycles against in-process stubs of the Base RPC, Alchemy prices,
+Morpho GraphQL, the Coinbase bundler and the CDP signer, with synthetic positions seeded into a local Postgres.
+Reads DB_HOST, DB_PORT, DB_NAME, DB_USERNAME and DB_PASSWORD, which should point at an empty database migrated with alembic.
+"""
+
+import argparse
+import asyncio
+import base64
+import os
+import random
+import time
+
+import numpy as np
+from core import logging
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import ec
+from cryptography.hazmat.primitives.asymmetric import ed25519
+from eth_account import Account
+from eth_utils import keccak
+
+import _path_fix  # noqa: F401
+from money_hack import constants
+from money_hack.agent_manager import SUPPORTED_COLLATERALS
+from money_hack.agent_manager import AgentManager
+from money_hack.benchmarking.stub_services import AlchemyPricesStubService
+from money_hack.benchmarking.stub_services import BundlerStubService
+from money_hack.benchmarking.stub_services import CdpStubService
+from money_hack.benchmarking.stub_services import ChainRpcStubService
+from money_hack.benchmarking.stub_services import MorphoGraphqlStubService
+from money_hack.benchmarking.stub_services import StubChainState
+from money_hack.benchmarking.stub_services import StubMarket
+from money_hack.benchmarking.stub_services import StubServiceConfig
+from money_hack.benchmarking.stub_services import StubServiceRunner
+from money_hack.benchmarking.stub_services import StubWalletState
+from money_hack.morpho.oracle_price_reader import MORPHO_ORACLE_PRICE_SCALE
+
+logging.init_basic_logging()
+
+YO_VAULT_ADDRESS = '0x0000000f2eB9f69274678c76222B35eEc7588a65'
+COLLATERAL_PRICES_USD = {
+    'WETH': 3000.0,
+    'cbBTC': 100000.0,
+}
+DEFAULT_LATENCIES_MS = {
+    'rpc': 30.0,
+    'alchemy-prices': 80.0,
+    'morpho-graphql': 120.0,
+    'bundler': 60.0,
+    'cdp': 100.0,
+}
+
+
+def _parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description='Benchmark the position monitoring cycle against stub services')
+    parser.add_argument('--position-count', type=int, default=500)
+    parser.add_argument('--cycles', type=int, default=5)
+    parser.add_argument('--warmup-cycles', type=int, default=1)
+    parser.add_argument('--latency-samples', type=int, default=100, help='Number of positions checked one at a time to sample per-position latency')
+    parser.add_argument('--concurrency', type=int, default=10)
+    parser.add_argument('--action-ratio', type=float, default=0.05, help='Fraction of positions seeded above their target LTV so they need a repay')
+    parser.add_argument('--latency-jitter-ms', type=float, default=10.0)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--keep-positions', action='store_true', help='Leave the seeded positions active after the run')
+    for serviceName, defaultLatencyMs in DEFAULT_LATENCIES_MS.items():
+        parser.add_argument(f'--{serviceName}-latency-ms', type=float, default=defaultLatencyMs)
+        parser.add_argument(f'--{serviceName}-error-rate', type=float, default=0.0)
+    return parser.parse_args()
+
+
+def _get_service_config(args: argparse.Namespace, serviceName: str) -> StubServiceConfig:
+    argName = serviceName.replace('-', '_')
+    return StubServiceConfig(
+        latency_seconds=getattr(args, f'{argName}_latency_ms') / 1000,
+        latency_jitter_seconds=args.latency_jitter_ms / 1000,
+        error_rate=getattr(args, f'{argName}_error_rate'),
+    )
+
+
+def _configure_environment(stubRunner: StubServiceRunner) -> None:
+    """Point create_agent_manager at the stub services and fill the remaining settings with throwaway values."""
+    os.environ['BASE_RPC_URL'] = stubRunner.urls['rpc']
+    os.environ['MAINNET_RPC_URL'] = stubRunner.urls['rpc']
+    os.environ['BASE_PAYMASTER_RPC_URL'] = stubRunner.urls['bundler']
+    os.environ['ALCHEMY_PRICES_API_URL'] = stubRunner.urls['alchemy-prices']
+    os.environ['MORPHO_GRAPHQL_URL'] = stubRunner.urls['morpho-graphql']
+    os.environ['CDP_API_URL'] = stubRunner.urls['cdp']
+    walletSecretKey = ec.generate_private_key(ec.SECP256R1()).private_bytes(encoding=serialization.Encoding.DER, format=serialization.PrivateFormat.PKCS8, encryption_algorithm=serialization.NoEncryption())
+    os.environ['CDP_WALLET_SECRET'] = base64.b64encode(walletSecretKey).decode()
+    os.environ['CDP_API_KEY_NAME'] = 'benchmark'
+    os.environ['CDP_API_KEY_PRIVATE_KEY'] = base64.b64encode(ed25519.Ed25519PrivateKey.generate().private_bytes_raw()).decode()
+    os.environ['DEPLOYER_PRIVATE_KEY'] = Account.create().key.hex()
+    for name in ('MORALIS_API_KEY', 'ALCHEMY_API_KEY', 'BLOCKSCOUT_API_KEY', 'TELEGRAM_API_TOKEN'):
+        os.environ[name] = 'benchmark'
+    os.environ['GEMINI_API_KEY'] = ''
+    os.environ.setdefault('KRT_API_URL', 'http://localhost:5000')
+    os.environ.setdefault('KRT_APP_URL', 'http://localhost:3000')
+
+
+def _build_address(label: str) -> str:
+    return '0x' + keccak(text=label)[-20:].hex()
+
+
+async def _reconcile_user_operations(agentManager: AgentManager) -> None:
+    # NOTE: confirm submitted user operations so the same positions can act again in the next check
+    if agentManager.userOperationReconciler:
+        await agentManager.databaseStore.run_in_own_context_connection(agentManager.userOperationReconciler.reconcile_once)
+
+
+async def main() -> None:
+    args = _parse_args()
+    randomGenerator = random.Random(args.seed)  # noqa: S311
+    usdcAddress = constants.CHAIN_USDC_MAP[constants.BASE_CHAIN_ID]
+    markets = [
+        StubMarket(unique_key='0x' + keccak(text=f'benchmark-market-{collateral.symbol}').hex(), collateral_address=collateral.address, collateral_symbol=collateral.symbol, collateral_decimals=collateral.decimals) for collateral in SUPPORTED_COLLATERALS
+    ]
+    chainState = StubChainState(usdc_address=usdcAddress, vault_address=YO_VAULT_ADDRESS)
+    for market in markets:
+        chainState.oracle_prices[market.get_oracle_address().lower()] = int(COLLATERAL_PRICES_USD[market.collateral_symbol] * 10**6) * MORPHO_ORACLE_PRICE_SCALE // 10**market.collateral_decimals
+    services = [
+        ChainRpcStubService(chainState=chainState, config=_get_service_config(args=args, serviceName='rpc'), seed=args.seed),
+        AlchemyPricesStubService(pricesUsd={collateral.address: COLLATERAL_PRICES_USD[collateral.symbol] for collateral in SUPPORTED_COLLATERALS}, config=_get_service_config(args=args, serviceName='alchemy-prices'), seed=args.seed),
+        MorphoGraphqlStubService(markets=markets, loanAddress=usdcAddress, config=_get_service_config(args=args, serviceName='morpho-graphql'), seed=args.seed),
+        BundlerStubService(chainState=chainState, config=_get_service_config(args=args, serviceName='bundler'), seed=args.seed),
+        CdpStubService(config=_get_service_config(args=args, serviceName='cdp'), seed=args.seed),
+    ]
+    stubRunner = StubServiceRunner(services=services)
+    await stubRunner.start()
+    _configure_environment(stubRunner=stubRunner)
+    # NOTE: imported late as the module reads its settings from the environment on import
+    from money_hack.create_agent_manager import create_agent_manager  # noqa: PLC0415
+
+    agentManager = create_agent_manager()
+    databaseStore = agentManager.databaseStore
+    await databaseStore.database.connect(poolSize=args.concurrency + 2)
+    seededPositionIds: list[int] = []
+    try:
+        async with databaseStore.database.create_context_connection():
+            existingPositions = await databaseStore.get_all_active_positions()
+            if len(existingPositions) > 0:
+                raise ValueError(f'Benchmark database already has {len(existingPositions)} active positions, use an empty database')
+            logging.info(f'Seeding {args.position_count} synthetic positions')
+            for index in range(args.position_count):
+                collateral = SUPPORTED_COLLATERALS[index % len(SUPPORTED_COLLATERALS)]
+                market = markets[index % len(markets)]
+                collateralValueUsd = randomGenerator.uniform(1_000, 100_000)
+                targetLtv = randomGenerator.uniform(0.5, 0.75)
+                needsRepay = randomGenerator.random() < args.action_ratio
+                currentLtv = targetLtv + 0.1 if needsRepay else targetLtv + randomGenerator.uniform(-0.02, 0.02)
+                borrowAmount = int(currentLtv * collateralValueUsd * 1e6)
+                agentWalletAddress = _build_address(label=f'benchmark-agent-{args.seed}-{index}')
+                chainState.wallets[agentWalletAddress.lower()] = StubWalletState(
+                    collateral_amount=int(collateralValueUsd / COLLATERAL_PRICES_USD[collateral.symbol] * 10**collateral.decimals),
+                    borrow_shares=borrowAmount,
+                    vault_shares=borrowAmount,
+                )
+                user = await databaseStore.get_or_create_user_by_wallet(walletAddress=_build_address(label=f'benchmark-user-{args.seed}-{index}'))
+                agent = await databaseStore.create_agent(userId=user.userId, name=f'Benchmark {index}', emoji='🤖', walletAddress=agentWalletAddress)
+                position = await databaseStore.create_position(agentId=agent.agentId, collateralAsset=collateral.address, targetLtv=targetLtv, morphoMarketId=market.unique_key)
+                seededPositionIds.append(position.agentPositionId)
+        cycleDurations: list[float] = []
+        requestCounts = {service.name: 0 for service in services}
+        for cycleIndex in range(args.warmup_cycles + args.cycles):
+            isWarmup = cycleIndex < args.warmup_cycles
+            requestCountsBefore = stubRunner.get_request_counts()
+            startTime = time.perf_counter()
+            await agentManager.check_positions_once(concurrency=args.concurrency)
+            duration = time.perf_counter() - startTime
+            requestCountsAfter = stubRunner.get_request_counts()
+            if not isWarmup:
+                cycleDurations.append(duration)
+                for serviceName, requestCount in requestCountsAfter.items():
+                    requestCounts[serviceName] += requestCount - requestCountsBefore[serviceName]
+            logging.info(f'{"Warmup cycle" if isWarmup else "Cycle"} {cycleIndex + 1} took {duration:.2f}s')
+            await _reconcile_user_operations(agentManager=agentManager)
+        # NOTE: per-position latency is sampled by checking positions one at a time, so each sample includes building that check's snapshot
+        positions = await databaseStore.run_in_own_context_connection(databaseStore.get_all_active_positions)
+        checkLatencies: list[float] = []
+        for position in randomGenerator.sample(positions, k=min(args.latency_samples, len(positions))):
+            startTime = time.perf_counter()
+            await agentManager.check_positions(positions=[position])
+            checkLatencies.append(time.perf_counter() - startTime)
+            await _reconcile_user_operations(agentManager=agentManager)
+        checkedPositionCount = args.position_count * args.cycles
+        totalDuration = sum(cycleDurations)
+        latenciesMs = np.array(checkLatencies, dtype=np.float64) * 1000
+        logging.info(f'positions: {args.position_count}, cycles: {args.cycles}, concurrency: {args.concurrency}, action ratio: {args.action_ratio:.0%}')
+        logging.info(f'cycles/sec: {args.cycles / totalDuration:.3f}, positions/sec: {checkedPositionCount / totalDuration:.1f}, mean cycle: {totalDuration / args.cycles:.2f}s')
+        if len(checkLatencies) > 0:
+            logging.info(f'per-position latency ({len(checkLatencies)} samples): p50 {np.percentile(latenciesMs, 50):.1f}ms, p99 {np.percentile(latenciesMs, 99):.1f}ms, max {np.max(latenciesMs):.1f}ms')
+        logging.info(f'external calls per position: {sum(requestCounts.values()) / checkedPositionCount:.2f}')
+        for service in services:
+            logging.info(f'  {service.name:>15}: {requestCounts[service.name] / checkedPositionCount:.3f} per position ({service.errorCount} injected errors)')
+    finally:
+        if not args.keep_positions and seededPositionIds:
+            async with databaseStore.database.create_context_connection():
+                for agentPositionId in seededPositionIds:
+                    await databaseStore.update_position(agentPositionId=agentPositionId, status='closed')
+        await agentManager.requester.close_connections()
+        await databaseStore.database.disconnect()
+        await stubRunner.stop()
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
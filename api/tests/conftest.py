@@ -0,0 +1,35 @@
+import pathlib
+from collections.abc import AsyncIterator
+
+import pytest
+import sqlalchemy
+from core.store.database import Database
+from sqlalchemy.dialects import postgresql as sqlalchemy_psql
+from sqlalchemy.ext.compiler import compiles
+
+from money_hack.store.database_store import DatabaseStore
+
+
+@compiles(sqlalchemy.BigInteger, 'sqlite')
+def _compile_big_integer_for_sqlite(element: sqlalchemy.BigInteger, compiler: object, **kwargs: object) -> str:  # noqa: ARG001
+    # NOTE: sqlite only autoincrements primary keys declared as INTEGER
+    return 'INTEGER'
+
+
+@compiles(sqlalchemy_psql.JSONB, 'sqlite')
+def _compile_jsonb_for_sqlite(element: sqlalchemy_psql.JSONB, compiler: object, **kwargs: object) -> str:  # noqa: ARG001
+    return 'JSON'
+
+
+@pytest.fixture
+async def databaseStore(tmp_path: pathlib.Path) -> AsyncIterator[DatabaseStore]:
+    database = Database(connectionString=Database.create_sqlite_connection_string(filename=str(tmp_path / 'test.db')))
+    await database.connect()
+    yield DatabaseStore(database=database)
+    await database.disconnect()
+
+
+async def create_tables(databaseStore: DatabaseStore, tables: list[sqlalchemy.Table]) -> None:
+    async with databaseStore.database.create_transaction() as connection:
+        for table in tables:
+            await connection.run_sync(table.create)
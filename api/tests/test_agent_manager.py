@@ -0,0 +1,177 @@
+import datetime
+import uuid
+from unittest import mock
+
+from core.util import date_util
+
+from money_hack.agent_manager import AgentManager
+from money_hack.model import AgentPosition
+from money_hack.morpho.ltv_manager import CycleSnapshot
+from money_hack.morpho.ltv_manager import LtvCheckResult
+from money_hack.morpho.ltv_manager import LtvManager
+from money_hack.morpho.position_reader import OnchainPositionState
+from money_hack.position_scheduler import POSITION_SYNC_INTERVAL_SECONDS
+from money_hack.position_scheduler import PositionScheduler
+from money_hack.store.database_store import DatabaseStore
+from money_hack.store.schema import AgentPositionsTable
+from money_hack.store.schema import AgentsTable
+from money_hack.store.schema import LtvCheckRollupsTable
+from money_hack.store.schema import LtvChecksTable
+from money_hack.user_operation_reconciler import UserOperationReconciler
+from tests.conftest import create_tables
+
+
+class FakeLtvManager:
+    def __init__(self, databaseStore: DatabaseStore) -> None:
+        self.databaseStore = databaseStore
+
+    async def build_cycle_snapshot(self, collateralAddresses: list[str], blockNumber: int | None = None, marketIds: list[str] | None = None) -> CycleSnapshot:  # noqa: ARG002
+        return CycleSnapshot(block_number=blockNumber)
+
+    log_ltv_checks = LtvManager.log_ltv_checks
+
+
+def _create_agent_manager(databaseStore: DatabaseStore, ltvManager: LtvManager | None = None, userOperationReconciler: UserOperationReconciler | None = None) -> AgentManager:
+    ethClient = mock.MagicMock()
+    ethClient.get_latest_block_number = mock.AsyncMock(return_value=100)
+    return AgentManager(
+        requester=mock.MagicMock(),
+        chainId=8453,
+        ethClient=ethClient,
+        moralisClient=mock.MagicMock(),
+        alchemyClient=mock.MagicMock(),
+        morphoClient=mock.MagicMock(),
+        fortyAcresClient=mock.MagicMock(),
+        telegramClient=mock.MagicMock(),
+        ensClient=mock.MagicMock(),
+        databaseStore=databaseStore,
+        coinbaseCdpClient=None,
+        coinbaseSmartWallet=None,
+        coinbaseBundler=None,
+        deployerPrivateKey='',
+        ltvManager=ltvManager or FakeLtvManager(databaseStore=databaseStore),  # type: ignore[arg-type]
+        notificationService=mock.MagicMock(),
+        userOperationReconciler=userOperationReconciler,
+    )
+
+
+def _create_position(agentPositionId: int) -> AgentPosition:
+    now = date_util.datetime_from_now()
+    return AgentPosition(agentPositionId=agentPositionId, createdDate=now, updatedDate=now, agentId=f'agent-{agentPositionId}', collateralAsset='0x4200000000000000000000000000000000000006', targetLtv=0.6, morphoMarketId='0x01', status='active')
+
+
+async def test_check_positions_within_outer_database_context(databaseStore: DatabaseStore) -> None:
+    await create_tables(databaseStore=databaseStore, tables=[LtvChecksTable])
+    agentManager = _create_agent_manager(databaseStore=databaseStore)
+    checkedPositionIds: list[int] = []
+
+    async def check_position(position: AgentPosition, snapshot: CycleSnapshot | None = None) -> LtvCheckResult:  # noqa: ARG001
+        # NOTE: every check must be able to use the database through its own context connection
+        await databaseStore.get_ltv_checks(agentPositionId=position.agentPositionId, since=date_util.datetime_from_now(days=-1))
+        checkedPositionIds.append(position.agentPositionId)
+        return LtvCheckResult(position_id=position.agentPositionId, agent_id=position.agentId, current_ltv=0.6, target_ltv=0.6, max_ltv=0.86, needs_action=False, action_type=None, action_amount=None, reason='ok')
+
+    agentManager._check_position = check_position  # type: ignore[method-assign]
+    positions = [_create_position(agentPositionId=agentPositionId) for agentPositionId in range(1, 6)]
+    async with databaseStore.database.create_context_connection():
+        results = await agentManager.check_positions(positions=positions, concurrency=3)
+    assert sorted(results.keys()) == [1, 2, 3, 4, 5]
+    assert sorted(checkedPositionIds) == [1, 2, 3, 4, 5]
+    # NOTE: the check log is written in its own transaction, so it is visible once the cycle returns
+    async with databaseStore.database.create_context_connection():
+        ltvChecks = await databaseStore.get_ltv_checks(agentPositionId=3, since=date_util.datetime_from_now(days=-1))
+    assert len(ltvChecks) == 1
+    assert ltvChecks[0].checkDate > date_util.datetime_from_now() - datetime.timedelta(minutes=1)
+
+
+async def test_ltv_history_records_the_policy_decision_before_overrides(databaseStore: DatabaseStore) -> None:
+    await create_tables(databaseStore=databaseStore, tables=[AgentsTable, AgentPositionsTable, LtvChecksTable, LtvCheckRollupsTable])
+    agentManager = _create_agent_manager(databaseStore=databaseStore)
+    async with databaseStore.database.create_context_connection():
+        agent = await databaseStore.create_agent(userId=str(uuid.uuid4()), name='Agent', emoji='🤖', walletAddress='0x1111111111111111111111111111111111111111')
+        position = await databaseStore.create_position(agentId=agent.agentId, collateralAsset='0x4200000000000000000000000000000000000006', targetLtv=0.6, morphoMarketId='0x01')
+    policyResult = LtvCheckResult(position_id=position.agentPositionId, agent_id=agent.agentId, current_ltv=0.62, target_ltv=0.6, max_ltv=0.86, needs_action=False, action_type=None, action_amount=None, reason='ok')
+    # NOTE: an ENS constitution max-ltv below the current LTV forces a repay the policy did not ask for
+    result = LtvCheckResult(position_id=position.agentPositionId, agent_id=agent.agentId, current_ltv=0.62, target_ltv=0.6, max_ltv=0.86, needs_action=True, action_type='auto_repay', action_amount=1_000_000, reason='ENS constitution max-ltv 55.00% exceeded', policy_result=policyResult)
+    async with databaseStore.database.create_context_connection():
+        await agentManager.ltvManager.log_ltv_checks(results=[result])  # type: ignore[union-attr]
+    async with databaseStore.database.create_context_connection():
+        points = await agentManager.get_agent_ltv_history(agent_id=agent.agentId, days=1)
+    assert [(point.current_ltv, point.check_count, point.action_count) for point in points] == [(0.62, 1, 0)]
+
+
+async def test_repay_is_sent_while_a_user_operation_is_pending() -> None:
+    position = _create_position(agentPositionId=1)
+    databaseStore = mock.MagicMock()
+    databaseStore.get_agent = mock.AsyncMock(return_value=mock.MagicMock(ensName=None, walletAddress='0x1111111111111111111111111111111111111111'))
+    databaseStore.get_user = mock.AsyncMock(return_value=mock.MagicMock())
+    ltvManager = mock.MagicMock()
+    ltvManager.check_position_ltv = mock.AsyncMock(return_value=LtvCheckResult(position_id=1, agent_id=position.agentId, current_ltv=0.84, target_ltv=0.6, max_ltv=0.86, needs_action=True, action_type='auto_repay', action_amount=480_000_000, reason='LTV above the upper margin'))
+    ltvManager.get_collateral_price = mock.AsyncMock(return_value=2000.0)
+    ltvManager.build_planned_action_transactions = mock.AsyncMock(return_value=[])
+    userOperationReconciler = mock.MagicMock()
+    userOperationReconciler.has_pending_user_operations = mock.AsyncMock(return_value=True)
+    agentManager = _create_agent_manager(databaseStore=databaseStore, ltvManager=ltvManager, userOperationReconciler=userOperationReconciler)
+    agentManager._submit_tracked_user_operation = mock.AsyncMock(return_value='0x01')  # type: ignore[method-assign]
+    # NOTE: the wallet also holds idle collateral and USDC, sweeping those has to wait for the pending operation
+    positionState = OnchainPositionState(collateral_amount=10**18, borrow_amount=1_680_000_000, borrow_shares=0, vault_shares=0, vault_assets=2_000_000_000, wallet_collateral_balance=10**17, wallet_usdc_balance=5_000_000)
+    result = await agentManager._check_position(position=position, snapshot=CycleSnapshot(block_number=100, position_states={1: positionState}))
+    assert result is not None
+    assert result.action_type == 'auto_repay'
+    plan = ltvManager.build_planned_action_transactions.await_args.kwargs['plan']
+    assert [action.action_type for action in plan.actions] == ['auto_repay']
+    assert plan.repay_amount == 480_000_000
+    agentManager._submit_tracked_user_operation.assert_awaited_once()
+
+
+async def test_due_positions_without_a_lease_stay_scheduled(databaseStore: DatabaseStore) -> None:
+    await create_tables(databaseStore=databaseStore, tables=[LtvChecksTable])
+    agentManager = _create_agent_manager(databaseStore=databaseStore)
+    checkedPositionIds: list[int] = []
+
+    async def check_position(position: AgentPosition, snapshot: CycleSnapshot | None = None) -> LtvCheckResult:  # noqa: ARG001
+        checkedPositionIds.append(position.agentPositionId)
+        return LtvCheckResult(position_id=position.agentPositionId, agent_id=position.agentId, current_ltv=0.6, target_ltv=0.6, max_ltv=0.86, needs_action=False, action_type=None, action_amount=None, reason='ok')
+
+    agentManager._check_position = check_position  # type: ignore[method-assign]
+    scheduler = PositionScheduler()
+    scheduler.sync_positions(positions=[_create_position(agentPositionId=agentPositionId) for agentPositionId in (1, 2)])
+    leaseManager = mock.MagicMock()
+    leaseManager.holds_lease = mock.MagicMock(side_effect=lambda agentPositionId: agentPositionId == 1)
+    await agentManager.check_due_positions(scheduler=scheduler, leaseManager=leaseManager)
+    assert checkedPositionIds == [1]
+    # NOTE: the position whose lease is lapsing is due again once the next sync has renewed or handed over its lease
+    assert scheduler.lastSyncTime is not None
+    assert 2 not in [position.agentPositionId for position in scheduler.pop_due(now=scheduler.lastSyncTime + POSITION_SYNC_INTERVAL_SECONDS - 1)]
+    assert 2 in [position.agentPositionId for position in scheduler.pop_due(now=scheduler.lastSyncTime + POSITION_SYNC_INTERVAL_SECONDS)]
+
+
+async def test_cycle_reads_are_pinned_to_one_block(databaseStore: DatabaseStore) -> None:
+    await create_tables(databaseStore=databaseStore, tables=[AgentsTable, AgentPositionsTable, LtvChecksTable])
+    ltvManager = FakeLtvManager(databaseStore=databaseStore)
+    ltvManager.build_cycle_snapshot = mock.AsyncMock(side_effect=ltvManager.build_cycle_snapshot)  # type: ignore[method-assign]
+    agentManager = _create_agent_manager(databaseStore=databaseStore, ltvManager=ltvManager)  # type: ignore[arg-type]
+    async with databaseStore.database.create_context_connection():
+        agent = await databaseStore.create_agent(userId=str(uuid.uuid4()), name='Agent', emoji='🤖', walletAddress='0x1111111111111111111111111111111111111111')
+        position = await databaseStore.create_position(agentId=agent.agentId, collateralAsset='0x4200000000000000000000000000000000000006', targetLtv=0.6, morphoMarketId='0x01')
+    onchainPositionReader = mock.MagicMock()
+    onchainPositionReader.read_positions = mock.AsyncMock(return_value=[OnchainPositionState(collateral_amount=10**18, borrow_amount=1_000_000_000, borrow_shares=10**15, vault_shares=0, vault_assets=0, wallet_collateral_balance=0, wallet_usdc_balance=0)])
+    agentManager.onchainPositionReader = onchainPositionReader
+    agentManager.morphoClient.get_expected_borrow_assets = mock.MagicMock(return_value=1_000_000_100)  # type: ignore[method-assign]
+    checkedSnapshots: list[CycleSnapshot | None] = []
+
+    async def check_position(position: AgentPosition, snapshot: CycleSnapshot | None = None) -> LtvCheckResult:
+        checkedSnapshots.append(snapshot)
+        return LtvCheckResult(position_id=position.agentPositionId, agent_id=position.agentId, current_ltv=0.6, target_ltv=0.6, max_ltv=0.86, needs_action=False, action_type=None, action_amount=None, reason='ok')
+
+    agentManager._check_position = check_position  # type: ignore[method-assign]
+    await agentManager.check_positions(positions=[position])
+    agentManager.ethClient.get_latest_block_number.assert_awaited_once()  # type: ignore[attr-defined]
+    assert ltvManager.build_cycle_snapshot.await_args_list[0].kwargs['blockNumber'] == 100
+    assert onchainPositionReader.read_positions.await_args_list[0].kwargs['blockNumber'] == 100
+    assert agentManager.morphoClient.get_expected_borrow_assets.call_args_list[0].kwargs['block_number'] == 100
+    # NOTE: the position is checked against the snapshot and state read at that block
+    assert len(checkedSnapshots) == 1
+    assert checkedSnapshots[0] is not None
+    assert checkedSnapshots[0].block_number == 100
+    assert checkedSnapshots[0].position_states[position.agentPositionId].borrow_amount == 1_000_000_100
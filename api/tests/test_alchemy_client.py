@@ -0,0 +1,35 @@
+from unittest import mock
+
+from core.exceptions import BadRequestException
+
+from money_hack.blockchain_data.alchemy_client import ALCHEMY_PRICES_MAX_ADDRESSES_PER_REQUEST
+from money_hack.blockchain_data.alchemy_client import AlchemyClient
+
+UNKNOWN_ADDRESS = '0x00000000000000000000000000000000000000ff'
+
+
+def _create_requester(requestedAddressLists: list[list[str]]) -> mock.MagicMock:
+    async def post_json(url: str, headers: dict[str, str], dataDict: dict[str, list[dict[str, str]]], timeout: int) -> mock.MagicMock:  # noqa: ARG001
+        addresses = [addressItem['address'] for addressItem in dataDict['addresses']]
+        requestedAddressLists.append(addresses)
+        if UNKNOWN_ADDRESS in addresses:
+            raise BadRequestException(f'Token not found: {UNKNOWN_ADDRESS}')
+        response = mock.MagicMock()
+        response.json.return_value = {'data': [{'network': 'base-mainnet', 'address': address.lower(), 'prices': [{'currency': 'usd', 'value': str(int(address, 16))}]} for address in addresses]}
+        return response
+
+    requester = mock.MagicMock()
+    requester.post_json = mock.AsyncMock(side_effect=post_json)
+    return requester
+
+
+async def test_current_prices_are_chunked_and_fall_back_to_single_requests_for_unknown_tokens() -> None:
+    requestedAddressLists: list[list[str]] = []
+    alchemyClient = AlchemyClient(requester=_create_requester(requestedAddressLists=requestedAddressLists), apiKey='key', cache=mock.MagicMock(), findBlockClient=mock.MagicMock())
+    knownAddresses = [f'0x{index:040X}' for index in range(1, 30)]
+    assetAddresses = [*knownAddresses[:27], UNKNOWN_ADDRESS, *knownAddresses[27:], knownAddresses[0]]
+    prices = await alchemyClient.get_asset_current_prices(chainId=8453, assetAddresses=assetAddresses)
+    assert {assetAddress: price.priceUsd for assetAddress, price in prices.items()} == {assetAddress: float(int(assetAddress, 16)) for assetAddress in knownAddresses}
+    # NOTE: the duplicate address is only requested once and only the chunk holding the unknown token is retried address by address
+    assert [len(addresses) for addresses in requestedAddressLists] == [ALCHEMY_PRICES_MAX_ADDRESSES_PER_REQUEST, 5, 1, 1, 1, 1, 1]
+    assert sorted(address for addresses in requestedAddressLists[2:] for address in addresses) == sorted([*knownAddresses[25:], UNKNOWN_ADDRESS])
@@ -0,0 +1,73 @@
+import asyncio
+from unittest import mock
+
+from core.caching.dict_cache import DictCache
+
+from money_hack import constants
+from money_hack.blockchain_data.block_time_index import BlockTimeIndex
+
+GENESIS_TIMESTAMP = 1_700_000_000
+# NOTE: the simulated chain stalls for 10 seconds before this block
+STALL_BLOCK_NUMBER = 1000
+
+
+def _get_block_timestamp(blockNumber: int) -> int:
+    return GENESIS_TIMESTAMP + blockNumber * constants.BASE_BLOCK_TIME_SECONDS + (10 if blockNumber >= STALL_BLOCK_NUMBER else 0)
+
+
+def _create_eth_client() -> mock.MagicMock:
+    ethClient = mock.MagicMock()
+    ethClient.get_block = mock.AsyncMock(side_effect=lambda blockNumber: {'timestamp': _get_block_timestamp(blockNumber=blockNumber)})
+    return ethClient
+
+
+def _get_fetched_block_numbers(ethClient: mock.MagicMock) -> list[int]:
+    return [call.kwargs['blockNumber'] for call in ethClient.get_block.await_args_list]
+
+
+async def test_timestamps_inside_a_regular_span_are_interpolated_and_redundant_anchors_pruned() -> None:
+    ethClient = _create_eth_client()
+    blockTimeIndex = BlockTimeIndex(ethClients={constants.BASE_CHAIN_ID: ethClient})
+    for blockNumber in (100, 200, 150, 300, 1100, 500):
+        assert await blockTimeIndex.get_block_timestamp(chainId=constants.BASE_CHAIN_ID, blockNumber=blockNumber) == _get_block_timestamp(blockNumber=blockNumber)
+    # NOTE: block 150 lies in the verified 100-200 span, block 500 does not as the span up to 1100 crosses the stall
+    assert _get_fetched_block_numbers(ethClient=ethClient) == [100, 200, 300, 1100, 500]
+    assert [blockNumber for blockNumber, _timestamp in blockTimeIndex._anchors[constants.BASE_CHAIN_ID]] == [100, 500, 1100]
+
+
+async def test_block_estimates_converge_across_a_stall() -> None:
+    ethClient = _create_eth_client()
+    blockTimeIndex = BlockTimeIndex(ethClients={constants.BASE_CHAIN_ID: ethClient})
+    await blockTimeIndex.get_block_timestamp(chainId=constants.BASE_CHAIN_ID, blockNumber=100)
+    blockNumber = await blockTimeIndex.get_block_number_at_timestamp(chainId=constants.BASE_CHAIN_ID, timestamp=_get_block_timestamp(blockNumber=1050) + 1)
+    assert blockNumber == 1050
+    # NOTE: the first estimate ignores the stall and overshoots, the second lands on the block
+    assert _get_fetched_block_numbers(ethClient=ethClient) == [100, 1055, 1050]
+    assert await blockTimeIndex.get_block_number_at_timestamp(chainId=constants.BASE_CHAIN_ID, timestamp=_get_block_timestamp(blockNumber=1052)) == 1052
+    assert len(_get_fetched_block_numbers(ethClient=ethClient)) == 3
+
+
+async def test_anchors_are_persisted_together_and_reloaded() -> None:
+    cache = DictCache()
+    ethClient = _create_eth_client()
+    with mock.patch.object(cache, 'set', wraps=cache.set) as setMock:
+        blockTimeIndex = BlockTimeIndex(ethClients={constants.BASE_CHAIN_ID: ethClient}, cache=cache, persistDelaySeconds=0.01)
+        for blockNumber in (100, 200, 1100):
+            await blockTimeIndex.get_block_timestamp(chainId=constants.BASE_CHAIN_ID, blockNumber=blockNumber)
+        assert setMock.await_count == 0
+        await asyncio.sleep(0.05)
+        assert setMock.await_count == 1
+    restartedEthClient = _create_eth_client()
+    restartedBlockTimeIndex = BlockTimeIndex(ethClients={constants.BASE_CHAIN_ID: restartedEthClient}, cache=cache)
+    assert await restartedBlockTimeIndex.get_block_timestamp(chainId=constants.BASE_CHAIN_ID, blockNumber=150) == _get_block_timestamp(blockNumber=150)
+    assert restartedEthClient.get_block.await_count == 0
+
+
+async def test_anchors_stop_being_added_at_the_cap() -> None:
+    ethClient = _create_eth_client()
+    blockTimeIndex = BlockTimeIndex(ethClients={constants.ETH_CHAIN_ID: ethClient})
+    with mock.patch('money_hack.blockchain_data.block_time_index.MAX_ANCHORS_PER_CHAIN', 2), mock.patch('money_hack.blockchain_data.block_time_index.logging.warning') as warningMock:
+        for blockNumber in (100, 200, 300, 400):
+            await blockTimeIndex.get_block_timestamp(chainId=constants.ETH_CHAIN_ID, blockNumber=blockNumber)
+    assert [blockNumber for blockNumber, _timestamp in blockTimeIndex._anchors[constants.ETH_CHAIN_ID]] == [100, 200]
+    assert warningMock.call_count == 1
@@ -0,0 +1,35 @@
+import datetime
+
+import pytest
+from core.util import chain_util
+
+from money_hack.store.database_store import DatabaseStore
+from money_hack.store.schema import VaultYieldSnapshotsTable
+from tests.conftest import create_tables
+
+VAULT_ADDRESS = '0x0000000f2eB9f69274678c76222B35eEc7588a65'
+
+
+async def test_create_vault_yield_snapshot(databaseStore: DatabaseStore) -> None:
+    await create_tables(databaseStore=databaseStore, tables=[VaultYieldSnapshotsTable])
+    snapshotDate = datetime.datetime(2026, 10, 1, 12, 0, tzinfo=datetime.UTC)
+    async with databaseStore.database.create_context_connection():
+        await databaseStore.create_vault_yield_snapshot(chainId=8453, vaultAddress=VAULT_ADDRESS, snapshotDate=snapshotDate, apy=0.0512, totalAssets=12_345_678_901_234)
+        await databaseStore.create_vault_yield_snapshot(chainId=8453, vaultAddress=VAULT_ADDRESS, snapshotDate=snapshotDate + datetime.timedelta(minutes=5), apy=0.0498, totalAssets=12_345_700_000_000)
+    async with databaseStore.database.create_context_connection():
+        snapshots = await databaseStore.list_vault_yield_snapshots(chainId=8453, vaultAddress=VAULT_ADDRESS, since=snapshotDate)
+    assert [snapshot.snapshotDate for snapshot in snapshots] == [snapshotDate, snapshotDate + datetime.timedelta(minutes=5)]
+    assert snapshots[0].vaultAddress == chain_util.normalize_address(VAULT_ADDRESS)
+    assert snapshots[0].apy == 0.0512
+    assert snapshots[0].totalAssets == 12_345_678_901_234
+
+
+async def test_own_context_connection_commits_inside_a_callers_context(databaseStore: DatabaseStore) -> None:
+    await create_tables(databaseStore=databaseStore, tables=[VaultYieldSnapshotsTable])
+    snapshotDate = datetime.datetime(2026, 10, 1, 12, 0, tzinfo=datetime.UTC)
+    with pytest.raises(ValueError, match='caller failed'):
+        async with databaseStore.database.create_context_connection():
+            await databaseStore.run_in_own_context_connection(lambda: databaseStore.create_vault_yield_snapshot(chainId=8453, vaultAddress=VAULT_ADDRESS, snapshotDate=snapshotDate, apy=0.05, totalAssets=1))
+            raise ValueError('caller failed')
+    snapshots = await databaseStore.run_in_own_context_connection(lambda: databaseStore.list_vault_yield_snapshots(chainId=8453, vaultAddress=VAULT_ADDRESS, since=snapshotDate))
+    assert len(snapshots) == 1
@@ -0,0 +1,73 @@
+import asyncio
+
+import pytest
+from core.exceptions import NotFoundException
+
+from money_hack.blockchain_data.blockchain_data_client import ClientAssetPrice
+from money_hack.blockchain_data.hedged_price_resolver import MIN_HEDGE_DELAY_SECONDS
+from money_hack.blockchain_data.hedged_price_resolver import HedgedPriceResolver
+from money_hack.blockchain_data.hedged_price_resolver import PriceSource
+
+WETH_ADDRESS = '0x4200000000000000000000000000000000000006'
+
+
+class _PriceSource(PriceSource):
+    def __init__(self, name: str, priceUsd: float) -> None:
+        self.name = name
+        self.priceUsd = priceUsd
+        self.error: Exception | None = None
+        self.requestCount = 0
+        self.cancelledCount = 0
+        self.releaseEvent = asyncio.Event()
+        self.releaseEvent.set()
+
+    async def get_asset_current_price(self, chainId: int, assetAddress: str) -> ClientAssetPrice:  # noqa: ARG002
+        self.requestCount += 1
+        try:
+            await self.releaseEvent.wait()
+        except asyncio.CancelledError:
+            self.cancelledCount += 1
+            raise
+        if self.error is not None:
+            raise self.error
+        return ClientAssetPrice(priceUsd=self.priceUsd)
+
+
+async def test_a_slow_source_is_hedged_after_its_p95_latency() -> None:
+    primarySource = _PriceSource(name='primary', priceUsd=3000.0)
+    backupSource = _PriceSource(name='backup', priceUsd=3001.0)
+    resolver = HedgedPriceResolver(sources=[primarySource, backupSource])
+    assert (await resolver.get_asset_current_price(chainId=8453, assetAddress=WETH_ADDRESS)).priceUsd == 3000.0
+    assert backupSource.requestCount == 0
+    # NOTE: the primary usually answers at once, so the backup is asked as soon as the minimum hedge delay passes
+    primarySource.releaseEvent.clear()
+    price = await asyncio.wait_for(resolver.get_asset_current_price(chainId=8453, assetAddress=WETH_ADDRESS), timeout=MIN_HEDGE_DELAY_SECONDS * 10)
+    assert price.priceUsd == 3001.0
+    assert (primarySource.requestCount, backupSource.requestCount) == (2, 1)
+    # NOTE: the losing request is cancelled rather than left running
+    await asyncio.sleep(0)
+    assert primarySource.cancelledCount == 1
+
+
+async def test_a_failing_source_hands_over_at_once_and_drops_down_the_order() -> None:
+    primarySource = _PriceSource(name='primary', priceUsd=3000.0)
+    backupSource = _PriceSource(name='backup', priceUsd=3001.0)
+    primarySource.error = NotFoundException('primary is down')
+    resolver = HedgedPriceResolver(sources=[primarySource, backupSource])
+    # NOTE: the untried primary has the maximum hedge delay, so answering well within it shows the failure was not waited out
+    price = await asyncio.wait_for(resolver.get_asset_current_price(chainId=8453, assetAddress=WETH_ADDRESS), timeout=MIN_HEDGE_DELAY_SECONDS * 10)
+    assert price.priceUsd == 3001.0
+    assert [source.name for source in resolver.get_source_order()] == ['backup', 'primary']
+    assert (await resolver.get_asset_current_price(chainId=8453, assetAddress=WETH_ADDRESS)).priceUsd == 3001.0
+    assert primarySource.requestCount == 1
+
+
+async def test_every_source_failing_raises_not_found() -> None:
+    primarySource = _PriceSource(name='primary', priceUsd=3000.0)
+    backupSource = _PriceSource(name='backup', priceUsd=-1.0)
+    primarySource.error = NotFoundException('primary is down')
+    resolver = HedgedPriceResolver(sources=[primarySource, backupSource])
+    # NOTE: a non-positive price counts as a failure of that source
+    with pytest.raises(NotFoundException, match='All price sources failed'):
+        await resolver.get_asset_current_price(chainId=8453, assetAddress=WETH_ADDRESS)
+    assert (primarySource.requestCount, backupSource.requestCount) == (1, 1)
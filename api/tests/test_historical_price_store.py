@@ -0,0 +1,38 @@
+import asyncio
+import datetime
+from unittest import mock
+
+import pytest
+
+from money_hack.blockchain_data.blockchain_data_client import ClientAssetHistoricPrice
+from money_hack.blockchain_data.historical_price_store import HistoricalPriceStore
+from money_hack.store.database_store import DatabaseStore
+from money_hack.store.schema import HistoricalPricesTable
+from tests.conftest import create_tables
+
+ASSET_ADDRESS = '0x4200000000000000000000000000000000000006'
+
+
+def _create_alchemy_client() -> mock.MagicMock:
+    async def list_asset_historic_prices(chainId: int, assetAddress: str, startDate: datetime.datetime, endDate: datetime.datetime, interval: str) -> list[ClientAssetHistoricPrice]:  # noqa: ARG001
+        hourCount = int((endDate - startDate).total_seconds() // 3600)
+        return [ClientAssetHistoricPrice(date=startDate + datetime.timedelta(hours=hour), priceUsd=1000.0 + hour) for hour in range(hourCount + 1)]
+
+    alchemyClient = mock.MagicMock()
+    alchemyClient.list_asset_historic_prices = mock.AsyncMock(side_effect=list_asset_historic_prices)
+    return alchemyClient
+
+
+async def test_backfill_commits_outside_the_callers_context(databaseStore: DatabaseStore) -> None:
+    await create_tables(databaseStore=databaseStore, tables=[HistoricalPricesTable])
+    historicalPriceStore = HistoricalPriceStore(databaseStore=databaseStore, alchemyClient=_create_alchemy_client())
+    date = datetime.datetime(2026, 9, 2, 12, 30, tzinfo=datetime.UTC)
+    with pytest.raises(ValueError, match='caller failed'):
+        async with databaseStore.database.create_context_connection():
+            prices = await asyncio.gather(*[historicalPriceStore.get_price_at(chainId=8453, assetAddress=ASSET_ADDRESS, date=date) for _ in range(3)])
+            assert prices[0] == prices[1] == prices[2]
+            raise ValueError('caller failed')
+    # NOTE: the shared backfill must survive the caller that started it rolling back
+    async with databaseStore.database.create_context_connection():
+        storedPrices = await databaseStore.list_historical_prices(chainId=8453, assetAddress=ASSET_ADDRESS, startDate=date - datetime.timedelta(hours=1), endDate=date + datetime.timedelta(hours=1))
+    assert len(storedPrices) == 2
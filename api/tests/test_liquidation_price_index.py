@@ -0,0 +1,16 @@
+import pytest
+
+from money_hack.morpho.liquidation_price_index import calculate_trigger_prices
+from money_hack.morpho.ltv_manager import LtvCheckResult
+from money_hack.morpho.ltv_manager import LtvPolicy
+
+COLLATERAL_ADDRESS = '0x4200000000000000000000000000000000000006'
+
+
+def test_trigger_prices_use_the_policy_margins() -> None:
+    result = LtvCheckResult(position_id=1, agent_id='agent-1', current_ltv=0.6, target_ltv=0.6, max_ltv=0.86, needs_action=False, action_type=None, action_amount=None, reason='ok', collateral_price_usd=2000.0)
+    triggerPrices = calculate_trigger_prices(result=result, collateralAddress=COLLATERAL_ADDRESS, policy=LtvPolicy(margin_upper=0.1, margin_lower=0.2))
+    assert triggerPrices is not None
+    assert triggerPrices.repay_price == pytest.approx(0.6 * 2000 / 0.7)
+    assert triggerPrices.optimize_price == pytest.approx(0.6 * 2000 / 0.4)
+    assert triggerPrices.liquidation_price == pytest.approx(0.6 * 2000 / 0.86)
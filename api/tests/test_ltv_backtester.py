@@ -0,0 +1,80 @@
+import datetime
+import itertools
+from unittest import mock
+
+import numpy as np
+import pytest
+
+from money_hack.model import AgentPosition
+from money_hack.morpho.ltv_backtester import BacktestPositions
+from money_hack.morpho.ltv_backtester import run_backtest
+from money_hack.morpho.ltv_manager import CycleSnapshot
+from money_hack.morpho.ltv_manager import LtvManager
+from money_hack.morpho.ltv_manager import LtvPolicy
+from money_hack.morpho.morpho_client import MorphoMarket
+
+USDC_ADDRESS = '0x833589fCD6eDb6E08f4c7C32D4f71b54bdA02913'
+WETH_ADDRESS = '0x4200000000000000000000000000000000000006'
+MARKET_ID = '0x8793cf302b8ffd655ab97bd1c695dbd967807e8367a65cb2f4edaf1380ba1bda'
+PRICE_USD = 2000.0
+COLLATERAL_AMOUNT = 2.0
+TARGET_LTV = 0.6
+MAX_LTV = 0.86
+BORROW_APY = 0.05
+
+
+def _create_market() -> MorphoMarket:
+    return MorphoMarket(
+        unique_key=MARKET_ID,
+        chain_id=8453,
+        collateral_address=WETH_ADDRESS,
+        collateral_symbol='WETH',
+        collateral_decimals=18,
+        loan_address=USDC_ADDRESS,
+        loan_symbol='USDC',
+        loan_decimals=6,
+        oracle_address=WETH_ADDRESS,
+        irm_address=WETH_ADDRESS,
+        lltv=MAX_LTV,
+        lltv_raw=860000000000000000,
+        borrow_apy=BORROW_APY,
+        supply_apy=0.04,
+        utilization=0.8,
+        total_supply=0,
+        total_borrow=0,
+    )
+
+
+async def _get_manager_decision(currentLtv: float, vaultAssetsUsd: float, yieldApy: float, policy: LtvPolicy) -> str | None:
+    morphoClient = mock.MagicMock()
+    morphoClient.get_market_by_id = mock.AsyncMock(return_value=_create_market())
+    ltvManager = LtvManager(chainId=8453, usdcAddress=USDC_ADDRESS, yoVaultAddress=USDC_ADDRESS, morphoClient=morphoClient, alchemyClient=mock.MagicMock(), databaseStore=mock.MagicMock(), policy=policy, vaultYieldService=mock.MagicMock())
+    now = datetime.datetime(2026, 10, 1, tzinfo=datetime.UTC)
+    position = AgentPosition(agentPositionId=1, createdDate=now, updatedDate=now, agentId='agent-1', collateralAsset=WETH_ADDRESS, targetLtv=TARGET_LTV, morphoMarketId=MARKET_ID, status='active')
+    snapshot = CycleSnapshot(collateral_prices={WETH_ADDRESS: PRICE_USD}, markets={WETH_ADDRESS: _create_market()}, markets_by_id={MARKET_ID: _create_market()}, yield_apy=yieldApy)
+    result = await ltvManager.check_position_ltv(
+        position=position,
+        onchainCollateral=int(COLLATERAL_AMOUNT * 10**18),
+        onchainBorrow=round(currentLtv * COLLATERAL_AMOUNT * PRICE_USD * 1e6),
+        onchainVaultAssets=round(vaultAssetsUsd * 1e6),
+        snapshot=snapshot,
+    )
+    if result.needs_action:
+        return result.action_type
+    return 'suppressed' if result.reason.startswith('Optimization suppressed') else None
+
+
+def _get_backtest_decision(currentLtv: float, vaultAssetsUsd: float, yieldApy: float, policy: LtvPolicy) -> str | None:
+    positions = BacktestPositions(collateral_amounts=np.array([COLLATERAL_AMOUNT]), debt_usd=np.array([currentLtv * COLLATERAL_AMOUNT * PRICE_USD]), vault_assets_usd=np.array([vaultAssetsUsd]), target_ltvs=np.array([TARGET_LTV]))
+    result = run_backtest(pricesUsd=np.array([PRICE_USD]), positions=positions, maxLtv=MAX_LTV, borrowApy=BORROW_APY, yieldApy=yieldApy, policy=policy)
+    decisions = {'auto_repay': result.repay_count, 'manual_repay': result.manual_repay_count, 'auto_optimize': result.borrow_count, 'suppressed': result.suppressed_borrow_count}
+    return next((decision for decision, count in decisions.items() if count > 0), None)
+
+
+@pytest.mark.parametrize('policy', [LtvPolicy(), LtvPolicy(margin_upper=0.03, margin_lower=0.08, min_action_value_usd=50.0, min_optimize_annual_gain_usd=10.0)])
+async def test_backtest_decisions_match_the_ltv_manager(policy: LtvPolicy) -> None:
+    # NOTE: the backtester re-implements the decision rules over arrays, so every branch is compared against the manager itself
+    for currentLtv, vaultAssetsUsd, yieldApy in itertools.product([0.3, 0.45, 0.51, 0.535, 0.58, 0.6, 0.64, 0.665, 0.7, 0.8], [0.0, 100.0, 10_000.0], [0.03, 0.08, 0.2]):
+        managerDecision = await _get_manager_decision(currentLtv=currentLtv, vaultAssetsUsd=vaultAssetsUsd, yieldApy=yieldApy, policy=policy)
+        backtestDecision = _get_backtest_decision(currentLtv=currentLtv, vaultAssetsUsd=vaultAssetsUsd, yieldApy=yieldApy, policy=policy)
+        assert backtestDecision == managerDecision, (currentLtv, vaultAssetsUsd, yieldApy)
@@ -0,0 +1,110 @@
+import datetime
+import typing
+from unittest import mock
+
+import pytest
+
+from money_hack.blockchain_data.blockchain_data_client import ClientAssetPrice
+from money_hack.model import AgentPosition
+from money_hack.morpho.ltv_manager import LtvManager
+from money_hack.morpho.morpho_client import MorphoMarket
+
+USDC_ADDRESS = '0x833589fCD6eDb6E08f4c7C32D4f71b54bdA02913'
+WETH_ADDRESS = '0x4200000000000000000000000000000000000006'
+CBBTC_ADDRESS = '0xcbB7C0000aB88B473b1f5aFd9ef808440eed33Bf'
+POSITION_MARKET_ID = '0x9103c3b4e834476c9a62ea009ba2c884ee42e94e6e314a26f04d312434191836'
+
+
+def _create_market(collateralAddress: str) -> MorphoMarket:
+    return MorphoMarket(
+        unique_key=f'0x{collateralAddress[2:].lower():0>64}',
+        chain_id=8453,
+        collateral_address=collateralAddress,
+        collateral_symbol='',
+        collateral_decimals=18,
+        loan_address=USDC_ADDRESS,
+        loan_symbol='USDC',
+        loan_decimals=6,
+        oracle_address=collateralAddress,
+        irm_address=collateralAddress,
+        lltv=0.86,
+        lltv_raw=860000000000000000,
+        borrow_apy=0.05,
+        supply_apy=0.04,
+        utilization=0.8,
+        total_supply=0,
+        total_borrow=0,
+    )
+
+
+def _create_ltv_manager() -> LtvManager:
+    morphoClient = mock.MagicMock()
+    morphoClient.get_market = mock.AsyncMock(side_effect=lambda chain_id, collateral_address: _create_market(collateralAddress=collateral_address))  # noqa: ARG005
+    morphoClient.uses_onchain_state = mock.MagicMock(return_value=False)
+    oraclePriceReader = mock.MagicMock()
+    # NOTE: only the WETH market's oracle reads, cbBTC falls back to the price oracle
+    oraclePriceReader.read_collateral_prices = mock.AsyncMock(return_value={WETH_ADDRESS: 2000.0})
+    usdPrices = {USDC_ADDRESS: ClientAssetPrice(priceUsd=0.999), CBBTC_ADDRESS: ClientAssetPrice(priceUsd=60000.0)}
+    priceOracle = mock.MagicMock()
+    priceOracle.get_asset_current_price = mock.AsyncMock(side_effect=lambda chainId, assetAddress: usdPrices[assetAddress])  # noqa: ARG005
+    priceOracle.get_asset_current_prices = mock.AsyncMock(side_effect=lambda chainId, assetAddresses: {assetAddress: usdPrices[assetAddress] for assetAddress in assetAddresses})  # noqa: ARG005
+    return LtvManager(chainId=8453, usdcAddress=USDC_ADDRESS, yoVaultAddress=USDC_ADDRESS, morphoClient=morphoClient, alchemyClient=mock.MagicMock(), databaseStore=mock.MagicMock(), priceOracle=priceOracle, oraclePriceReader=oraclePriceReader)
+
+
+async def test_oracle_prices_are_converted_to_usd_for_price_history() -> None:
+    ltvManager = _create_ltv_manager()
+    snapshot = await ltvManager.build_cycle_snapshot(collateralAddresses=[WETH_ADDRESS, CBBTC_ADDRESS])
+    assert snapshot.collateral_prices == {WETH_ADDRESS: 2000.0, CBBTC_ADDRESS: 60000.0}
+    assert snapshot.collateral_prices_usd == pytest.approx({WETH_ADDRESS: 1998.0, CBBTC_ADDRESS: 60000.0})
+    assert await ltvManager.get_collateral_price_with_usd(collateralAddress=WETH_ADDRESS) == pytest.approx((2000.0, 1998.0))
+
+
+async def test_positions_are_checked_against_their_own_market() -> None:
+    ltvManager = _create_ltv_manager()
+    positionMarket = _create_market(collateralAddress=WETH_ADDRESS).model_copy(update={'unique_key': POSITION_MARKET_ID, 'lltv': 0.77})
+    ltvManager.morphoClient.get_market_by_id = mock.AsyncMock(side_effect=lambda chain_id, market_id: positionMarket if market_id == POSITION_MARKET_ID else None)  # type: ignore[method-assign]  # noqa: ARG005
+    now = datetime.datetime(2026, 10, 1, tzinfo=datetime.UTC)
+    position = AgentPosition(agentPositionId=1, createdDate=now, updatedDate=now, agentId='agent-1', collateralAsset=WETH_ADDRESS, targetLtv=0.6, morphoMarketId=POSITION_MARKET_ID, status='active')
+    snapshot = await ltvManager.build_cycle_snapshot(collateralAddresses=[WETH_ADDRESS], marketIds=[position.morphoMarketId])
+    assert snapshot.get_market_by_id(marketId=position.morphoMarketId) == positionMarket
+    result = await ltvManager.check_position_ltv(position=position, onchainCollateral=10**18, onchainBorrow=1000 * 10**6, onchainVaultAssets=0, snapshot=snapshot)
+    assert result.max_ltv == 0.77
+    assert ltvManager.morphoClient.get_market_by_id.await_count == 1
+    # NOTE: without a snapshot the market is looked up by id, and a position whose market is unknown falls back to the collateral's market
+    assert await ltvManager.get_position_market(position=position) == positionMarket
+    unknownMarketPosition = position.model_copy(update={'morphoMarketId': '0x01'})
+    assert (await ltvManager.get_position_market(position=unknownMarketPosition)) == _create_market(collateralAddress=WETH_ADDRESS)
+
+
+async def test_positions_checked_against_a_cycle_snapshot_make_no_further_fetches() -> None:
+    ltvManager = _create_ltv_manager()
+    vaultYieldService = mock.MagicMock()
+    vaultYieldService.get_yield_apy = mock.AsyncMock(return_value=0.08)
+    ltvManager.vaultYieldService = vaultYieldService
+    now = datetime.datetime(2026, 10, 1, tzinfo=datetime.UTC)
+    positions = [
+        AgentPosition(
+            agentPositionId=agentPositionId, createdDate=now, updatedDate=now, agentId=f'agent-{agentPositionId}', collateralAsset=collateralAddress, targetLtv=0.6, morphoMarketId=_create_market(collateralAddress=collateralAddress).unique_key, status='active'
+        )
+        for agentPositionId, collateralAddress in enumerate([WETH_ADDRESS, WETH_ADDRESS, CBBTC_ADDRESS, WETH_ADDRESS])
+    ]
+    snapshot = await ltvManager.build_cycle_snapshot(collateralAddresses=[position.collateralAsset for position in positions], marketIds=[position.morphoMarketId for position in positions])
+    morphoClient = typing.cast(mock.MagicMock, ltvManager.morphoClient)
+    priceOracle = typing.cast(mock.MagicMock, ltvManager.priceOracle)
+    oraclePriceReader = typing.cast(mock.MagicMock, ltvManager.oraclePriceReader)
+    assert morphoClient.get_market.await_count == 2
+    assert oraclePriceReader.read_collateral_prices.await_count == 1
+    assert priceOracle.get_asset_current_prices.await_count == 1
+    assert vaultYieldService.get_yield_apy.await_count == 1
+    for mockObject in (morphoClient, priceOracle, oraclePriceReader, vaultYieldService):
+        mockObject.reset_mock()
+    # NOTE: the checks cover a repay, an optimization and a position within range
+    results = [
+        await ltvManager.check_position_ltv(position=position, onchainCollateral=100 * 10**18, onchainBorrow=int(100 * snapshot.collateral_prices[position.collateralAsset] * currentLtv * 1e6), onchainVaultAssets=10**12, snapshot=snapshot)
+        for position, currentLtv in zip(positions, [0.8, 0.3, 0.6, 0.6], strict=True)
+    ]
+    assert [result.action_type for result in results] == ['auto_repay', 'auto_optimize', None, None]
+    assert morphoClient.mock_calls == []
+    assert priceOracle.mock_calls == []
+    assert oraclePriceReader.mock_calls == []
+    assert vaultYieldService.get_yield_apy.await_count == 0
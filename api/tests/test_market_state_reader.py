@@ -0,0 +1,58 @@
+import math
+from unittest import mock
+
+import pytest
+
+from money_hack import constants
+from money_hack.morpho.market_state_reader import WAD
+from money_hack.morpho.market_state_reader import MorphoMarketState
+from money_hack.morpho.market_state_reader import w_taylor_compounded
+from money_hack.morpho.morpho_client import MorphoClient
+
+MARKET_ID = '0x8793cf302b8ffd655ab97bd1c695dbd967807e8367a65cb2f4edaf1380ba1bda'
+# NOTE: a 5% per 365 day year continuously compounded borrow rate, per second in WAD as the adaptive curve IRM returns it
+BORROW_RATE = 1_585_489_599
+SECONDS_PER_365_DAYS = 365 * 24 * constants.SECONDS_PER_HOUR
+LAST_UPDATE = 1_700_000_000
+
+
+def _create_market_state() -> MorphoMarketState:
+    # NOTE: 1M USDC borrowed against 1e6 shares per asset, the ratio Morpho Blue starts every market at
+    return MorphoMarketState(
+        market_id=MARKET_ID, total_supply_assets=2 * 10**12, total_supply_shares=2 * 10**18, total_borrow_assets=10**12, total_borrow_shares=10**18, last_update=LAST_UPDATE, fee=0, borrow_rate=BORROW_RATE, timestamp=LAST_UPDATE + 3600, block_number=100
+    )
+
+
+def test_taylor_compounding_matches_morpho_blue() -> None:
+    # NOTE: 0.1 compounds to 0.1 + 0.1^2/2 + 0.1^3/6, the last term rounded down as in MathLib.wTaylorCompounded
+    assert w_taylor_compounded(rate=WAD // 100, seconds=10) == 105_166_666_666_666_666
+    assert w_taylor_compounded(rate=BORROW_RATE, seconds=0) == 0
+    yearlyGrowth = w_taylor_compounded(rate=BORROW_RATE, seconds=SECONDS_PER_365_DAYS)
+    assert yearlyGrowth == 51_270_833_327_093_113
+    # NOTE: the third order approximation only drops the fourth and higher order terms of e^0.05 - 1
+    assert yearlyGrowth / WAD == pytest.approx(math.expm1(0.05), abs=0.05**4 / 12)
+
+
+def test_borrow_shares_convert_to_assets_with_accrued_interest_rounded_up() -> None:
+    marketState = _create_market_state()
+    assert marketState.get_expected_totals(timestamp=LAST_UPDATE + 3600) == (2_000_005_707_778, 1_000_005_707_778)
+    assert marketState.get_expected_borrow_assets(borrowShares=10**15, timestamp=LAST_UPDATE) == 1_000_000_000
+    assert marketState.get_expected_borrow_assets(borrowShares=10**15, timestamp=LAST_UPDATE + 3600) == 1_000_005_708
+    # NOTE: debt rounds up so even one share owes one unit
+    assert marketState.get_expected_borrow_assets(borrowShares=1, timestamp=LAST_UPDATE) == 1
+    assert marketState.get_expected_borrow_assets(borrowShares=0, timestamp=LAST_UPDATE) == 0
+    # NOTE: a timestamp before the last update accrues nothing
+    assert marketState.get_expected_borrow_assets(borrowShares=10**15, timestamp=LAST_UPDATE - 60) == 1_000_000_000
+
+
+def test_client_expected_borrow_assets_only_uses_a_state_from_the_same_block() -> None:
+    morphoClient = MorphoClient(requester=mock.MagicMock())
+    assert morphoClient.get_expected_borrow_assets(chain_id=8453, market_id=MARKET_ID, borrow_shares=10**15, block_number=100) is None
+    morphoClient._onchainStates[(8453, MARKET_ID)] = _create_market_state()
+    # NOTE: a state pinned to a block accrues interest up to that block's timestamp
+    assert morphoClient.get_expected_borrow_assets(chain_id=8453, market_id=MARKET_ID.upper().replace('0X', '0x'), borrow_shares=10**15, block_number=100) == 1_000_005_708
+    assert morphoClient.get_expected_borrow_assets(chain_id=8453, market_id=MARKET_ID, borrow_shares=10**15, block_number=101) is None
+    with mock.patch('money_hack.morpho.morpho_client.time.time', return_value=LAST_UPDATE + 3600 + 30):
+        assert morphoClient.get_expected_borrow_assets(chain_id=8453, market_id=MARKET_ID, borrow_shares=10**15) == _create_market_state().get_expected_borrow_assets(borrowShares=10**15, timestamp=LAST_UPDATE + 3600 + 30)
+    with mock.patch('money_hack.morpho.morpho_client.time.time', return_value=LAST_UPDATE + 3600 + morphoClient.stateTtlSeconds):
+        assert morphoClient.get_expected_borrow_assets(chain_id=8453, market_id=MARKET_ID, borrow_shares=10**15) is None
@@ -0,0 +1,48 @@
+import asyncio
+import typing
+from unittest import mock
+
+from money_hack.morpho import morpho_queries
+from money_hack.morpho.morpho_client import MorphoClient
+
+
+def _create_requester(itemCount: int, requestedSkips: list[int], pageInfo: dict[str, int] | None = None) -> tuple[mock.MagicMock, list[int]]:
+    inflightCounts: list[int] = []
+    inflight = 0
+
+    async def post_json(url: str, dataDict: dict[str, typing.Any], timeout: int) -> mock.MagicMock:  # type: ignore[explicit-any]  # noqa: ARG001
+        nonlocal inflight
+        skip = int(dataDict['variables']['skip'])
+        requestedSkips.append(skip)
+        inflight += 1
+        inflightCounts.append(inflight)
+        await asyncio.sleep(0)
+        inflight -= 1
+        items = [{'uniqueKey': f'0x{index:064x}'} for index in range(skip, min(skip + morpho_queries.MARKETS_PAGE_SIZE, itemCount))]
+        response = mock.MagicMock()
+        response.json = mock.MagicMock(return_value={'data': {'markets': {'items': items, 'pageInfo': pageInfo if pageInfo is not None else {'countTotal': itemCount}}}})
+        return response
+
+    requester = mock.MagicMock()
+    requester.post_json = mock.AsyncMock(side_effect=post_json)
+    return requester, inflightCounts
+
+
+async def test_remaining_market_pages_are_fetched_together_from_the_total_count() -> None:
+    requestedSkips: list[int] = []
+    requester, inflightCounts = _create_requester(itemCount=250, requestedSkips=requestedSkips)
+    morphoClient = MorphoClient(requester=requester)
+    items = await morphoClient._query_all_markets(query=morpho_queries.LIST_MARKETS_QUERY, variables={'chainId': 8453})
+    assert [item['uniqueKey'] for item in items] == [f'0x{index:064x}' for index in range(250)]
+    assert requestedSkips == [0, 100, 200]
+    # NOTE: the first page is needed for the count, the other two are requested at the same time
+    assert inflightCounts == [1, 1, 2]
+
+
+async def test_a_single_page_or_missing_count_needs_one_request() -> None:
+    requestedSkips: list[int] = []
+    requester, _inflightCounts = _create_requester(itemCount=40, requestedSkips=requestedSkips)
+    assert len(await MorphoClient(requester=requester)._query_all_markets(query=morpho_queries.LIST_MARKETS_QUERY, variables={'chainId': 8453})) == 40
+    requester, _inflightCounts = _create_requester(itemCount=100, requestedSkips=requestedSkips, pageInfo={})
+    assert len(await MorphoClient(requester=requester)._query_all_markets(query=morpho_queries.LIST_MARKETS_QUERY, variables={'chainId': 8453})) == 100
+    assert requestedSkips == [0, 0]
@@ -0,0 +1,54 @@
+from unittest import mock
+
+import pytest
+
+from money_hack.blockchain_data.blockchain_data_client import ClientAssetPrice
+from money_hack.morpho.morpho_client import MorphoMarket
+from money_hack.morpho.oracle_price_reader import MorphoOraclePriceSource
+from money_hack.morpho.oracle_price_reader import oracle_price_to_collateral_price
+
+USDC_ADDRESS = '0x833589fCD6eDb6E08f4c7C32D4f71b54bdA02913'
+WETH_ADDRESS = '0x4200000000000000000000000000000000000006'
+
+
+def _create_market(collateralAddress: str) -> MorphoMarket:
+    return MorphoMarket(
+        unique_key=f'0x{collateralAddress[2:].lower():0>64}',
+        chain_id=8453,
+        collateral_address=collateralAddress,
+        collateral_symbol='WETH',
+        collateral_decimals=18,
+        loan_address=USDC_ADDRESS,
+        loan_symbol='USDC',
+        loan_decimals=6,
+        oracle_address=collateralAddress,
+        irm_address=collateralAddress,
+        lltv=0.86,
+        lltv_raw=860000000000000000,
+        borrow_apy=0.05,
+        supply_apy=0.04,
+        utilization=0.8,
+        total_supply=0,
+        total_borrow=0,
+    )
+
+
+def test_oracle_price_is_in_whole_loan_tokens() -> None:
+    # NOTE: 2000 USDC (6 decimals) per WETH (18 decimals), scaled by 1e36
+    assert oracle_price_to_collateral_price(oraclePrice=2000 * 10**6 * 10**36 // 10**18, collateralDecimals=18, loanDecimals=6) == pytest.approx(2000.0)
+
+
+async def test_oracle_source_converts_loan_asset_prices_to_usd() -> None:
+    morphoClient = mock.MagicMock()
+    morphoClient.get_market = mock.AsyncMock(side_effect=lambda chain_id, collateral_address: _create_market(collateralAddress=collateral_address) if collateral_address == WETH_ADDRESS else None)  # noqa: ARG005
+    oraclePriceReader = mock.MagicMock()
+    oraclePriceReader.read_collateral_prices = mock.AsyncMock(return_value={WETH_ADDRESS: 2000.0})
+    loanAssetPriceSource = mock.MagicMock()
+    loanAssetPriceSource.get_asset_current_prices = mock.AsyncMock(return_value={USDC_ADDRESS: ClientAssetPrice(priceUsd=0.999)})
+    priceSource = MorphoOraclePriceSource(morphoClient=morphoClient, oraclePriceReader=oraclePriceReader, loanAssetPriceSource=loanAssetPriceSource)
+    prices = await priceSource.get_asset_current_prices(chainId=8453, assetAddresses=[WETH_ADDRESS, USDC_ADDRESS])
+    assert list(prices) == [WETH_ADDRESS]
+    assert prices[WETH_ADDRESS].priceUsd == pytest.approx(1998.0)
+    # NOTE: without a USD price for the loan asset the oracle price cannot be treated as USD
+    loanAssetPriceSource.get_asset_current_prices = mock.AsyncMock(return_value={})
+    assert await priceSource.get_asset_current_prices(chainId=8453, assetAddresses=[WETH_ADDRESS]) == {}
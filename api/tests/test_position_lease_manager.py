@@ -0,0 +1,23 @@
+
+from money_hack.position_lease_manager import PositionLeaseManager
+from money_hack.store.database_store import DatabaseStore
+from money_hack.store.schema import PositionLeasesTable
+from money_hack.store.schema import WorkerHeartbeatsTable
+from money_hack.store.schema import WorkerTaskLeasesTable
+from tests.conftest import create_tables
+
+
+async def test_task_lease_is_held_by_one_worker(databaseStore: DatabaseStore) -> None:
+    await create_tables(databaseStore=databaseStore, tables=[WorkerHeartbeatsTable, PositionLeasesTable, WorkerTaskLeasesTable])
+    leaseManager = PositionLeaseManager(databaseStore=databaseStore, workerId='worker-1')
+    otherLeaseManager = PositionLeaseManager(databaseStore=databaseStore, workerId='worker-2')
+    async with databaseStore.database.create_context_connection():
+        assert await leaseManager.acquire_task_lease(taskName='reconcile_user_operations', intervalSeconds=2)
+    async with databaseStore.database.create_context_connection():
+        assert not await otherLeaseManager.acquire_task_lease(taskName='reconcile_user_operations', intervalSeconds=2)
+        assert await otherLeaseManager.acquire_task_lease(taskName='rollup_ltv_checks', intervalSeconds=3600)
+    async with databaseStore.database.create_context_connection():
+        assert await leaseManager.acquire_task_lease(taskName='reconcile_user_operations', intervalSeconds=2)
+        await leaseManager.release_all()
+    async with databaseStore.database.create_context_connection():
+        assert await otherLeaseManager.acquire_task_lease(taskName='reconcile_user_operations', intervalSeconds=2)
@@ -0,0 +1,49 @@
+import typing
+from unittest import mock
+
+from money_hack.benchmarking.stub_services import ChainRpcStubService
+from money_hack.benchmarking.stub_services import StubChainState
+from money_hack.benchmarking.stub_services import StubWalletState
+from money_hack.blockchain_data.multicall_client import MulticallClient
+from money_hack.morpho.position_reader import OnchainPositionReader
+from money_hack.morpho.position_reader import OnchainPositionState
+from money_hack.morpho.position_reader import PositionReadRequest
+
+USDC_ADDRESS = '0x833589fCD6eDb6E08f4c7C32D4f71b54bdA02913'
+VAULT_ADDRESS = '0x0000000f2eB9f69274678c76222B35eEc7588a65'
+WETH_ADDRESS = '0x4200000000000000000000000000000000000006'
+MARKET_ID = '0x8793cf302b8ffd655ab97bd1c695dbd967807e8367a65cb2f4edaf1380ba1bda'
+FIRST_WALLET_ADDRESS = '0x0000000000000000000000000000000000000011'
+SECOND_WALLET_ADDRESS = '0x0000000000000000000000000000000000000022'
+
+
+def _create_eth_client(chainState: StubChainState, aggregateCalls: list[tuple[int | None, int]]) -> mock.MagicMock:
+    chainRpc = ChainRpcStubService(chainState=chainState)
+
+    async def call_function_by_name(toAddress: str, contractAbi: object, functionName: str, arguments: dict[str, list[tuple[str, bool, bytes]]], blockNumber: int | None = None) -> list[typing.Any]:  # type: ignore[explicit-any]  # noqa: ARG001
+        aggregateCalls.append((blockNumber, len(arguments['calls'])))
+        return [[(True, chainRpc._call_contract(toAddress=target, callData=callData, blockNumber=blockNumber or 0)) for target, _allowFailure, callData in arguments['calls']]]
+
+    ethClient = mock.MagicMock()
+    ethClient.call_function_by_name = mock.AsyncMock(side_effect=call_function_by_name)
+    return ethClient
+
+
+async def test_positions_are_read_at_one_block_and_repeated_reads_are_memoized() -> None:
+    chainState = StubChainState(usdc_address=USDC_ADDRESS, vault_address=VAULT_ADDRESS)
+    chainState.wallets[FIRST_WALLET_ADDRESS] = StubWalletState(collateral_amount=10**18, borrow_shares=5 * 10**6, vault_shares=7 * 10**6, wallet_usdc_balance=3 * 10**6)
+    chainState.wallets[SECOND_WALLET_ADDRESS] = StubWalletState(collateral_amount=2 * 10**18, borrow_shares=0, vault_shares=0, wallet_collateral_balance=10**17)
+    aggregateCalls: list[tuple[int | None, int]] = []
+    positionReader = OnchainPositionReader(multicallClient=MulticallClient(ethClient=_create_eth_client(chainState=chainState, aggregateCalls=aggregateCalls)), usdcAddress=USDC_ADDRESS, vaultAddress=VAULT_ADDRESS)
+    requests = [PositionReadRequest(wallet_address=walletAddress, morpho_market_id=MARKET_ID, collateral_address=WETH_ADDRESS) for walletAddress in (FIRST_WALLET_ADDRESS, SECOND_WALLET_ADDRESS)]
+    states = await positionReader.read_positions(requests=requests, blockNumber=100)
+    assert states == [
+        OnchainPositionState(collateral_amount=10**18, borrow_amount=5 * 10**6, borrow_shares=5 * 10**6, vault_shares=7 * 10**6, vault_assets=7 * 10**6, wallet_collateral_balance=0, wallet_usdc_balance=3 * 10**6),
+        OnchainPositionState(collateral_amount=2 * 10**18, borrow_amount=0, borrow_shares=0, vault_shares=0, vault_assets=0, wallet_collateral_balance=10**17, wallet_usdc_balance=0),
+    ]
+    # NOTE: both positions share one market() read and every read is pinned to the requested block
+    assert aggregateCalls == [(100, 4 * len(requests) + 1), (100, 1)]
+    await positionReader.read_positions(requests=requests[:1], blockNumber=100)
+    assert len(aggregateCalls) == 2
+    await positionReader.read_positions(requests=requests[:1], blockNumber=101)
+    assert aggregateCalls[2:] == [(101, 5), (101, 1)]
@@ -0,0 +1,31 @@
+import datetime
+
+from money_hack.model import AgentPosition
+from money_hack.position_scheduler import FAILED_CHECK_RETRY_SECONDS
+from money_hack.position_scheduler import MAX_FAILED_CHECK_RETRY_SECONDS
+from money_hack.position_scheduler import PositionScheduler
+
+
+def _create_position(agentPositionId: int) -> AgentPosition:
+    now = datetime.datetime(2026, 10, 1, tzinfo=datetime.UTC)
+    return AgentPosition(agentPositionId=agentPositionId, createdDate=now, updatedDate=now, agentId=f'agent-{agentPositionId}', collateralAsset='0x4200000000000000000000000000000000000006', targetLtv=0.6, morphoMarketId='0x01', status='active')
+
+
+def test_failed_checks_back_off_until_a_check_succeeds() -> None:
+    scheduler = PositionScheduler()
+    scheduler.sync_positions(positions=[_create_position(agentPositionId=1)], now=0)
+    retryIntervals: list[float] = []
+    now = 0.0
+    for _ in range(7):
+        assert [position.agentPositionId for position in scheduler.pop_due(now=now)] == [1]
+        scheduler.schedule_failed(positionId=1, now=now)
+        nextDueTime = scheduler.get_next_due_time()
+        assert nextDueTime is not None
+        retryIntervals.append(nextDueTime - now)
+        now = nextDueTime
+    assert retryIntervals == [FAILED_CHECK_RETRY_SECONDS * 2**index for index in range(5)] + [MAX_FAILED_CHECK_RETRY_SECONDS] * 2
+    scheduler.pop_due(now=now)
+    scheduler.schedule_checked(positionId=1, dueTime=now + 15)
+    scheduler.pop_due(now=now + 15)
+    scheduler.schedule_failed(positionId=1, now=now + 15)
+    assert scheduler.get_next_due_time() == now + 15 + FAILED_CHECK_RETRY_SECONDS
@@ -0,0 +1,38 @@
+import numpy as np
+import pytest
+
+from money_hack.blockchain_data.price_history_store import PRICE_HISTORY_MIN_VOLATILITY_RETURNS
+from money_hack.blockchain_data.price_history_store import PriceSample
+from money_hack.blockchain_data.price_history_store import _RollingWindow
+
+WINDOW_SECONDS = 600
+
+
+def test_running_volatility_matches_the_samples_left_in_the_window() -> None:
+    randomGenerator = np.random.default_rng(seed=7)
+    window = _RollingWindow(windowSeconds=WINDOW_SECONDS)
+    # NOTE: the first sample has no return, like the first price an asset history sees
+    window.append(sample=PriceSample(timestamp=0, price_usd=2000.0))
+    for index in range(1, 200):
+        window.append(sample=PriceSample(timestamp=index * 30, price_usd=2000.0, hourly_return=float(randomGenerator.normal(0, 0.01))))
+        returns = [sample.hourly_return for sample in window.samples if sample.hourly_return is not None]
+        assert window._returnCount == len(returns)
+        assert window._returnMean == pytest.approx(np.mean(returns), abs=1e-12)
+        expectedVolatility = float(np.std(returns)) if len(returns) >= PRICE_HISTORY_MIN_VOLATILITY_RETURNS else 0.0
+        assert window.get_volatility() == pytest.approx(expectedVolatility, abs=1e-12)
+    assert len(window.samples) == WINDOW_SECONDS // 30 + 1
+
+
+def test_evicting_every_return_resets_the_running_statistics() -> None:
+    window = _RollingWindow(windowSeconds=WINDOW_SECONDS)
+    window.append(sample=PriceSample(timestamp=0, price_usd=2000.0, hourly_return=0.02))
+    window.append(sample=PriceSample(timestamp=30, price_usd=2000.0, hourly_return=-0.01))
+    assert window.get_volatility() == pytest.approx(0.015)
+    window.evict(now=30 + WINDOW_SECONDS + 1)
+    assert len(window.samples) == 0
+    assert (window._returnCount, window._returnMean, window._returnM2) == (0, 0.0, 0.0)
+    assert window.get_volatility() == 0.0
+    # NOTE: a single return after the reset has no spread yet
+    window.append(sample=PriceSample(timestamp=1000, price_usd=2000.0, hourly_return=0.05))
+    assert window._returnMean == pytest.approx(0.05)
+    assert window.get_volatility() == 0.0
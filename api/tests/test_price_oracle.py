@@ -0,0 +1,68 @@
+import asyncio
+from unittest import mock
+
+from money_hack.blockchain_data.blockchain_data_client import ClientAssetPrice
+from money_hack.blockchain_data.hedged_price_resolver import PriceSource
+from money_hack.blockchain_data.price_oracle import PriceOracle
+
+WETH_ADDRESS = '0x4200000000000000000000000000000000000006'
+CBBTC_ADDRESS = '0xcbB7C0000aB88B473b1f5aFd9ef808440eed33Bf'
+
+
+class _PriceSource(PriceSource):
+    name = 'test'
+
+    def __init__(self) -> None:
+        self.prices = {WETH_ADDRESS: 3000.0, CBBTC_ADDRESS: 100000.0}
+        self.requests: list[list[str]] = []
+        self.releaseEvent = asyncio.Event()
+        self.releaseEvent.set()
+
+    async def get_asset_current_price(self, chainId: int, assetAddress: str) -> ClientAssetPrice:  # noqa: ARG002
+        self.requests.append([assetAddress])
+        await self.releaseEvent.wait()
+        return ClientAssetPrice(priceUsd=self.prices[assetAddress])
+
+    async def get_asset_current_prices(self, chainId: int, assetAddresses: list[str]) -> dict[str, ClientAssetPrice]:  # noqa: ARG002
+        self.requests.append(assetAddresses)
+        await self.releaseEvent.wait()
+        return {assetAddress: ClientAssetPrice(priceUsd=self.prices[assetAddress]) for assetAddress in assetAddresses if assetAddress in self.prices}
+
+
+async def test_prices_are_cached_then_served_stale_while_refreshing() -> None:
+    priceClient = _PriceSource()
+    priceOracle = PriceOracle(priceClient=priceClient, ttlSeconds=5, maxStaleSeconds=30)
+    with mock.patch('money_hack.blockchain_data.price_oracle.time.time') as timeMock:
+        timeMock.return_value = 1000
+        assert (await priceOracle.get_asset_current_price(chainId=8453, assetAddress=WETH_ADDRESS)).priceUsd == 3000.0
+        timeMock.return_value = 1004
+        assert (await priceOracle.get_asset_current_price(chainId=8453, assetAddress=WETH_ADDRESS)).priceUsd == 3000.0
+        assert len(priceClient.requests) == 1
+        # NOTE: past the ttl the cached price is returned straight away and refreshed in the background
+        priceClient.prices[WETH_ADDRESS] = 3100.0
+        timeMock.return_value = 1010
+        assert (await priceOracle.get_asset_current_price(chainId=8453, assetAddress=WETH_ADDRESS)).priceUsd == 3000.0
+        await asyncio.sleep(0)
+        assert len(priceClient.requests) == 2
+        assert (await priceOracle.get_asset_current_price(chainId=8453, assetAddress=WETH_ADDRESS)).priceUsd == 3100.0
+        # NOTE: past the max staleness callers wait for a fresh price
+        priceClient.prices[WETH_ADDRESS] = 3200.0
+        timeMock.return_value = 1050
+        assert (await priceOracle.get_asset_current_price(chainId=8453, assetAddress=WETH_ADDRESS)).priceUsd == 3200.0
+        assert len(priceClient.requests) == 3
+
+
+async def test_concurrent_callers_share_in_flight_requests() -> None:
+    priceClient = _PriceSource()
+    priceClient.releaseEvent.clear()
+    priceOracle = PriceOracle(priceClient=priceClient)
+    singleRequests = [asyncio.create_task(priceOracle.get_asset_current_price(chainId=8453, assetAddress=WETH_ADDRESS)) for _ in range(3)]
+    bulkRequest = asyncio.create_task(priceOracle.get_asset_current_prices(chainId=8453, assetAddresses=[WETH_ADDRESS, CBBTC_ADDRESS, '0x0000000000000000000000000000000000000001']))
+    await asyncio.sleep(0)
+    priceClient.releaseEvent.set()
+    singlePrices = await asyncio.gather(*singleRequests)
+    bulkPrices = await bulkRequest
+    assert [price.priceUsd for price in singlePrices] == [3000.0] * 3
+    # NOTE: the bulk request joins the in-flight WETH request and leaves out the asset without a price
+    assert {assetAddress: price.priceUsd for assetAddress, price in bulkPrices.items()} == {WETH_ADDRESS: 3000.0, CBBTC_ADDRESS: 100000.0}
+    assert priceClient.requests == [[WETH_ADDRESS], [CBBTC_ADDRESS, '0x0000000000000000000000000000000000000001']]
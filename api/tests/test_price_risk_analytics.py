@@ -0,0 +1,20 @@
+import numpy as np
+
+from money_hack.blockchain_data.price_risk_analytics import RISK_LOOKBACK_SECONDS
+from money_hack.blockchain_data.price_risk_analytics import compute_risk_metrics
+
+NOW = 1_800_000_000.0
+
+
+def test_assets_without_recent_samples_are_left_out() -> None:
+    recentTimestamps = NOW - np.arange(60, 0, -1, dtype=np.float64) * 60
+    staleTimestamps = recentTimestamps - RISK_LOOKBACK_SECONDS * 2
+    histories = {
+        'recent': (recentTimestamps, 2000 + np.sin(np.arange(60, dtype=np.float64))),
+        'stale': (staleTimestamps, 2000 + np.cos(np.arange(60, dtype=np.float64))),
+        'sparse': (np.concatenate((staleTimestamps, [NOW - 60])), np.full(61, 2000.0)),
+    }
+    riskMetrics = compute_risk_metrics(histories=histories, now=NOW)
+    assert list(riskMetrics) == ['recent']
+    assert riskMetrics['recent'].sample_count == 60
+    assert riskMetrics['recent'].coverage_seconds == 3600
@@ -0,0 +1,72 @@
+import time
+from unittest import mock
+
+import pytest
+from core.caching.dict_cache import DictCache
+
+from money_hack import constants
+from money_hack.blockchain_data.blockscout_client import BlockscoutLog
+from money_hack.yo.share_price_indexer import SHARE_PRICE_CONFIRMATION_BLOCKS
+from money_hack.yo.share_price_indexer import SHARE_PRICE_RETENTION_SECONDS
+from money_hack.yo.share_price_indexer import SharePriceUpdate
+from money_hack.yo.share_price_indexer import SharePriceUpdateIndexer
+from money_hack.yo.yo_client import calculate_average_apy
+
+VAULT_ADDRESS = '0x0000000f2eB9f69274678c76222B35eEc7588a65'
+ORACLE_ADDRESS = '0x00000000000000000000000000000000000000aa'
+EVENT_TOPIC = '0x' + '11' * 32
+SECONDS_PER_DAY = 24 * constants.SECONDS_PER_HOUR
+
+
+def _create_log(blockNumber: int, price: int, timestamp: int) -> BlockscoutLog:
+    return BlockscoutLog(blockNumber=hex(blockNumber), logIndex='0x0', data=f'0x{price:064x}{timestamp:064x}')
+
+
+def _create_blockscout_client(logs: list[BlockscoutLog], requestedRanges: list[tuple[int, int]]) -> mock.MagicMock:
+    async def get_logs_by_topic(chainId: int, address: str, topic0: str, topic1: str, fromBlock: int, toBlock: int) -> list[BlockscoutLog]:  # noqa: ARG001
+        requestedRanges.append((fromBlock, toBlock))
+        return [log for log in logs if fromBlock <= int(str(log.blockNumber), 16) <= toBlock]
+
+    blockscoutClient = mock.MagicMock()
+    blockscoutClient.get_logs_by_topic = mock.AsyncMock(side_effect=get_logs_by_topic)
+    return blockscoutClient
+
+
+async def test_sync_resumes_from_its_persisted_checkpoint_and_drops_expired_updates() -> None:
+    now = int(time.time())
+    logs = [
+        _create_log(blockNumber=10, price=10**18, timestamp=now - SHARE_PRICE_RETENTION_SECONDS - SECONDS_PER_DAY),
+        _create_log(blockNumber=20, price=11 * 10**17, timestamp=now - 2 * SECONDS_PER_DAY),
+        _create_log(blockNumber=95, price=12 * 10**17, timestamp=now - SECONDS_PER_DAY),
+    ]
+    requestedRanges: list[tuple[int, int]] = []
+    cache = DictCache()
+    ethClient = mock.MagicMock()
+    ethClient.get_latest_block_number = mock.AsyncMock(return_value=100)
+    indexer = SharePriceUpdateIndexer(ethClient=ethClient, blockscoutClient=_create_blockscout_client(logs=logs, requestedRanges=requestedRanges), cache=cache)
+    updates = await indexer.sync(chainId=8453, vaultAddress=VAULT_ADDRESS, oracleAddress=ORACLE_ADDRESS, eventTopic=EVENT_TOPIC)
+    # NOTE: the update older than the retention window is dropped and the unconfirmed block is left for the next sync
+    assert [update.block_number for update in updates] == [20]
+    assert requestedRanges == [(0, 100 - SHARE_PRICE_CONFIRMATION_BLOCKS)]
+    # NOTE: a fresh indexer picks the checkpoint up from the cache and only scans the blocks after it
+    ethClient.get_latest_block_number = mock.AsyncMock(return_value=110)
+    restartedIndexer = SharePriceUpdateIndexer(ethClient=ethClient, blockscoutClient=_create_blockscout_client(logs=logs, requestedRanges=requestedRanges), cache=cache)
+    updates = await restartedIndexer.sync(chainId=8453, vaultAddress=VAULT_ADDRESS, oracleAddress=ORACLE_ADDRESS, eventTopic=EVENT_TOPIC)
+    assert updates == [SharePriceUpdate(block_number=20, log_index=0, price=11 * 10**17, timestamp=now - 2 * SECONDS_PER_DAY), SharePriceUpdate(block_number=95, log_index=0, price=12 * 10**17, timestamp=now - SECONDS_PER_DAY)]
+    assert requestedRanges[1:] == [(100 - SHARE_PRICE_CONFIRMATION_BLOCKS + 1, 110 - SHARE_PRICE_CONFIRMATION_BLOCKS)]
+    # NOTE: nothing is scanned until another block is confirmed
+    assert await restartedIndexer.sync(chainId=8453, vaultAddress=VAULT_ADDRESS, oracleAddress=ORACLE_ADDRESS, eventTopic=EVENT_TOPIC) == updates
+    assert len(requestedRanges) == 2
+
+
+def test_average_apy_starts_at_the_last_update_covering_the_window() -> None:
+    now = 1_000 * SECONDS_PER_DAY
+    yearStart = SharePriceUpdate(block_number=1, log_index=0, price=10**18, timestamp=int(now - constants.SECONDS_PER_YEAR))
+    monthStart = SharePriceUpdate(block_number=2, log_index=0, price=105 * 10**16, timestamp=now - 40 * SECONDS_PER_DAY)
+    latest = SharePriceUpdate(block_number=3, log_index=0, price=11 * 10**17, timestamp=now)
+    updates = [yearStart, monthStart, latest]
+    assert calculate_average_apy(updates=updates, days=365, now=now) == pytest.approx(0.1)
+    assert calculate_average_apy(updates=updates, days=30, now=now) == pytest.approx((1.1 / 1.05) ** (constants.SECONDS_PER_YEAR / (40 * SECONDS_PER_DAY)) - 1)
+    # NOTE: a window longer than the history starts at the oldest update
+    assert calculate_average_apy(updates=updates[1:], days=365, now=now) == calculate_average_apy(updates=updates, days=30, now=now)
+    assert calculate_average_apy(updates=[latest], days=30, now=now) is None
@@ -0,0 +1,68 @@
+import pytest
+from core.exceptions import KibaException
+from core.requester import Requester
+from eth_abi import decode
+from eth_abi import encode
+
+from money_hack.benchmarking.stub_services import ERC20_BALANCE_OF_SELECTOR
+from money_hack.benchmarking.stub_services import MULTICALL3_AGGREGATE3_SELECTOR
+from money_hack.benchmarking.stub_services import AlchemyPricesStubService
+from money_hack.benchmarking.stub_services import ChainRpcStubService
+from money_hack.benchmarking.stub_services import StubChainState
+from money_hack.benchmarking.stub_services import StubServiceConfig
+from money_hack.benchmarking.stub_services import StubServiceRunner
+from money_hack.benchmarking.stub_services import StubWalletState
+
+USDC_ADDRESS = '0x833589fCD6eDb6E08f4c7C32D4f71b54bdA02913'
+VAULT_ADDRESS = '0x0000000f2eB9f69274678c76222B35eEc7588a65'
+WETH_ADDRESS = '0x4200000000000000000000000000000000000006'
+WALLET_ADDRESS = '0x00000000000000000000000000000000000000aa'
+
+
+async def test_chain_rpc_stub_answers_multicall_balance_reads() -> None:
+    chainState = StubChainState(usdc_address=USDC_ADDRESS, vault_address=VAULT_ADDRESS)
+    chainState.wallets[WALLET_ADDRESS] = StubWalletState(collateral_amount=10**18, borrow_shares=5 * 10**6, vault_shares=7 * 10**6, wallet_usdc_balance=3 * 10**6)
+    rpcService = ChainRpcStubService(chainState=chainState)
+    stubRunner = StubServiceRunner(services=[rpcService])
+    await stubRunner.start()
+    requester = Requester()
+    try:
+        balanceOfCallData = ERC20_BALANCE_OF_SELECTOR + encode(['address'], [WALLET_ADDRESS])
+        multicallData = MULTICALL3_AGGREGATE3_SELECTOR + encode(['(address,bool,bytes)[]'], [[(VAULT_ADDRESS, False, balanceOfCallData), (USDC_ADDRESS, False, balanceOfCallData)]])
+        rpcRequests = [
+            {'jsonrpc': '2.0', 'id': 1, 'method': 'eth_call', 'params': [{'to': '0xcA11bde05977b3631167028862bE2a173976CA11', 'data': '0x' + multicallData.hex()}, 'latest']},
+            {'jsonrpc': '2.0', 'id': 2, 'method': 'eth_unknownMethod', 'params': []},
+        ]
+        response = await requester.post_json(url=stubRunner.urls['rpc'], dataDict=rpcRequests)
+        callResponse, unknownMethodResponse = response.json()
+        (results,) = decode(['(bool,bytes)[]'], bytes.fromhex(callResponse['result'].removeprefix('0x')))
+        assert [decode(['uint256'], returnData)[0] for _success, returnData in results] == [7 * 10**6, 3 * 10**6]
+        assert unknownMethodResponse['error']['code'] == -32601
+        assert stubRunner.get_request_counts() == {'rpc': 1}
+        assert rpcService.methodCounts == {'eth_call': 1, 'eth_unknownMethod': 1}
+    finally:
+        await requester.close_connections()
+        await stubRunner.stop()
+
+
+async def test_alchemy_prices_stub_reports_unknown_tokens_and_injected_errors() -> None:
+    pricesService = AlchemyPricesStubService(pricesUsd={WETH_ADDRESS: 3000.0})
+    failingPricesService = AlchemyPricesStubService(pricesUsd={WETH_ADDRESS: 3000.0}, config=StubServiceConfig(error_rate=1.0))
+    failingPricesService.name = 'failing-alchemy-prices'
+    stubRunner = StubServiceRunner(services=[pricesService, failingPricesService])
+    await stubRunner.start()
+    requester = Requester()
+    try:
+        addresses = [{'network': 'base-mainnet', 'address': WETH_ADDRESS}, {'network': 'base-mainnet', 'address': USDC_ADDRESS}]
+        response = await requester.post_json(url=f'{stubRunner.urls["alchemy-prices"]}/key/tokens/by-address', dataDict={'addresses': addresses})
+        wethData, usdcData = response.json()['data']
+        assert wethData['prices'][0]['value'] == '3000.0'
+        assert usdcData['prices'] == []
+        assert usdcData['error'] == 'Token not found'
+        with pytest.raises(KibaException):
+            await requester.post_json(url=f'{stubRunner.urls["failing-alchemy-prices"]}/key/tokens/by-address', dataDict={'addresses': addresses})
+        assert failingPricesService.errorCount == 1
+        assert failingPricesService.methodCounts == {}
+    finally:
+        await requester.close_connections()
+        await stubRunner.stop()
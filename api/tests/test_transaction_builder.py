@@ -0,0 +1,67 @@
+from web3 import Web3
+
+from money_hack.api.v1_resources import TransactionCall
+from money_hack.morpho import morpho_abis
+from money_hack.morpho.transaction_builder import TransactionBuilder
+
+USDC_ADDRESS = '0x833589fCD6eDb6E08f4c7C32D4f71b54bdA02913'
+VAULT_ADDRESS = '0x0000000f2eB9f69274678c76222B35eEc7588a65'
+WETH_ADDRESS = '0x4200000000000000000000000000000000000006'
+USER_ADDRESS = '0x1111111111111111111111111111111111111111'
+ORACLE_ADDRESS = '0x2222222222222222222222222222222222222222'
+IRM_ADDRESS = '0x3333333333333333333333333333333333333333'
+LLTV = 860_000_000_000_000_000
+
+
+def _describe_transactions(transactionBuilder: TransactionBuilder, transactions: list[TransactionCall]) -> list[tuple[str, str, int]]:
+    contractAbis = {transactionBuilder.morphoAddress: morpho_abis.MORPHO_BLUE_ABI, transactionBuilder.yoVaultAddress: morpho_abis.ERC4626_VAULT_ABI}
+    descriptions: list[tuple[str, str, int]] = []
+    for transaction in transactions:
+        contract = Web3().eth.contract(abi=contractAbis.get(transaction.to, morpho_abis.ERC20_ABI))
+        function, arguments = contract.decode_function_input(transaction.data)
+        descriptions.append((transaction.to, function.fn_name, int(arguments.get('assets', arguments.get('amount', 0)))))
+    return descriptions
+
+
+def _build_net_position_transactions(transactionBuilder: TransactionBuilder, collateralSupplyAmount: int, debtChange: int, vaultChange: int) -> list[tuple[str, str, int]]:
+    transactions = transactionBuilder.build_net_position_transactions(
+        user_address=USER_ADDRESS,
+        collateral_address=WETH_ADDRESS,
+        collateral_supply_amount=collateralSupplyAmount,
+        debt_change=debtChange,
+        vault_change=vaultChange,
+        loan_token=USDC_ADDRESS,
+        oracle=ORACLE_ADDRESS,
+        irm=IRM_ADDRESS,
+        lltv=LLTV,
+    )
+    return _describe_transactions(transactionBuilder=transactionBuilder, transactions=transactions)
+
+
+def test_net_position_transactions_fund_each_step_before_it_runs() -> None:
+    transactionBuilder = TransactionBuilder(chainId=8453, usdcAddress=USDC_ADDRESS, yoVaultAddress=VAULT_ADDRESS)
+    morphoAddress = transactionBuilder.morphoAddress
+    vaultAddress = transactionBuilder.yoVaultAddress
+    usdcAddress = transactionBuilder.usdcAddress
+    # NOTE: collateral is supplied before borrowing against it and the borrowed USDC is what gets deposited
+    assert _build_net_position_transactions(transactionBuilder=transactionBuilder, collateralSupplyAmount=10**18, debtChange=500_000_000, vaultChange=500_000_000) == [
+        (WETH_ADDRESS, 'approve', 10**18),
+        (morphoAddress, 'supplyCollateral', 10**18),
+        (morphoAddress, 'borrow', 500_000_000),
+        (usdcAddress, 'approve', 500_000_000),
+        (vaultAddress, 'deposit', 500_000_000),
+    ]
+    # NOTE: the vault withdrawal comes before the repay it pays for
+    assert _build_net_position_transactions(transactionBuilder=transactionBuilder, collateralSupplyAmount=0, debtChange=-300_000_000, vaultChange=-300_000_000) == [
+        (vaultAddress, 'withdraw', 300_000_000),
+        (usdcAddress, 'approve', 300_000_000),
+        (morphoAddress, 'repay', 300_000_000),
+    ]
+    # NOTE: a borrow netted against a vault withdrawal still supplies collateral before borrowing
+    assert [functionName for _toAddress, functionName, _amount in _build_net_position_transactions(transactionBuilder=transactionBuilder, collateralSupplyAmount=10**17, debtChange=100_000_000, vaultChange=-50_000_000)] == [
+        'approve',
+        'supplyCollateral',
+        'borrow',
+        'withdraw',
+    ]
+    assert _build_net_position_transactions(transactionBuilder=transactionBuilder, collateralSupplyAmount=0, debtChange=0, vaultChange=0) == []
@@ -0,0 +1,78 @@
+import typing
+import uuid
+from unittest import mock
+
+from money_hack.smart_wallets.model import UserOperationReceipt
+from money_hack.store.database_store import DatabaseStore
+from money_hack.store.schema import AgentActionsTable
+from money_hack.store.schema import PendingUserOperationsTable
+from money_hack.user_operation_reconciler import UserOperationReconciler
+from tests.conftest import create_tables
+
+WALLET_ADDRESS = '0x1111111111111111111111111111111111111111'
+
+
+def _create_receipt(userOperationHash: str) -> UserOperationReceipt:
+    return typing.cast(UserOperationReceipt, {'userOpHash': userOperationHash, 'success': True, 'reason': '', 'logs': [], 'receipt': {'transactionHash': f'{userOperationHash}-transaction'}})
+
+
+def _create_bundler() -> mock.MagicMock:
+    bundler = mock.MagicMock()
+    bundler.get_user_operation_receipts = mock.AsyncMock(side_effect=lambda userOperationHashes: [_create_receipt(userOperationHash=userOperationHash) for userOperationHash in userOperationHashes])
+    bundler.get_user_operation_receipt = mock.AsyncMock(side_effect=lambda userOperationHash: _create_receipt(userOperationHash=userOperationHash))
+    return bundler
+
+
+async def _track_deposits(reconciler: UserOperationReconciler, count: int) -> None:
+    async with reconciler.databaseStore.database.create_context_connection():
+        for index in range(count):
+            await reconciler.track_user_operation(
+                agentId=str(uuid.uuid4()),
+                agentPositionId=index,
+                walletAddress=WALLET_ADDRESS,
+                userOperationHash=f'0x{index:064x}',
+                actionType='position_actions',
+                details={'actions': [{'action_type': 'deploy_idle_usdc', 'value': '$1.00', 'action_details': {'usdc_amount': 1_000_000}}]},
+            )
+
+
+async def test_reconcile_polls_receipts_in_batches(databaseStore: DatabaseStore) -> None:
+    await create_tables(databaseStore=databaseStore, tables=[PendingUserOperationsTable, AgentActionsTable])
+    bundler = _create_bundler()
+    reconciler = UserOperationReconciler(databaseStore=databaseStore, coinbaseBundler=bundler, receiptBatchSize=2)
+    await _track_deposits(reconciler=reconciler, count=5)
+    async with databaseStore.database.create_context_connection():
+        await reconciler.reconcile_once()
+    assert bundler.get_user_operation_receipts.await_count == 3
+    bundler.get_user_operation_receipt.assert_not_awaited()
+    async with databaseStore.database.create_context_connection():
+        assert await databaseStore.get_pending_user_operations() == []
+
+
+async def test_reconcile_falls_back_to_single_receipts_when_batch_fails(databaseStore: DatabaseStore) -> None:
+    await create_tables(databaseStore=databaseStore, tables=[PendingUserOperationsTable, AgentActionsTable])
+    bundler = _create_bundler()
+    bundler.get_user_operation_receipts = mock.AsyncMock(side_effect=ValueError('batch requests are not supported'))
+    reconciler = UserOperationReconciler(databaseStore=databaseStore, coinbaseBundler=bundler)
+    await _track_deposits(reconciler=reconciler, count=3)
+    async with databaseStore.database.create_context_connection():
+        await reconciler.reconcile_once()
+    assert bundler.get_user_operation_receipt.await_count == 3
+    async with databaseStore.database.create_context_connection():
+        assert await databaseStore.get_pending_user_operations() == []
+
+
+async def test_reconcile_runs_completion_hook_once_across_reconcilers(databaseStore: DatabaseStore) -> None:
+    await create_tables(databaseStore=databaseStore, tables=[PendingUserOperationsTable, AgentActionsTable])
+    reconciler = UserOperationReconciler(databaseStore=databaseStore, coinbaseBundler=_create_bundler())
+    otherReconciler = UserOperationReconciler(databaseStore=databaseStore, coinbaseBundler=_create_bundler())
+    await _track_deposits(reconciler=reconciler, count=1)
+    async with databaseStore.database.create_context_connection():
+        pendingUserOperations = await databaseStore.get_pending_user_operations()
+    # NOTE: both reconcilers saw the operation as pending before either resolved it
+    for currentReconciler in (reconciler, otherReconciler):
+        async with databaseStore.database.create_context_connection():
+            await currentReconciler._reconcile_user_operation(pendingUserOperation=pendingUserOperations[0], receipt=_create_receipt(userOperationHash=pendingUserOperations[0].userOperationHash))
+    async with databaseStore.database.create_context_connection():
+        agentActions = await databaseStore.get_agent_actions(agentId=pendingUserOperations[0].agentId)
+    assert [agentAction.actionType for agentAction in agentActions] == ['deploy_idle_usdc']
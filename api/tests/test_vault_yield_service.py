@@ -0,0 +1,69 @@
+import asyncio
+import datetime as dt
+from unittest import mock
+
+from money_hack.store.database_store import DatabaseStore
+from money_hack.store.schema import VaultYieldSnapshotsTable
+from money_hack.vault_yield_service import VaultYieldService
+from money_hack.yo.yo_client import YoVaultInfo
+from tests.conftest import create_tables
+
+VAULT_ADDRESS = '0x0000000f2eB9f69274678c76222B35eEc7588a65'
+
+
+def _create_vault_client(apys: list[float], releaseEvent: asyncio.Event | None = None) -> mock.MagicMock:
+    remainingApys = list(apys)
+
+    async def get_vault_info(chainId: int) -> YoVaultInfo:  # noqa: ARG001
+        if releaseEvent is not None:
+            await releaseEvent.wait()
+        return YoVaultInfo(address=VAULT_ADDRESS, name='yoUSD', symbol='yoUSD', asset_address=VAULT_ADDRESS, decimals=6, total_assets=10**12, apy=remainingApys.pop(0))
+
+    vaultClient = mock.MagicMock()
+    vaultClient.get_vault_info = mock.AsyncMock(side_effect=get_vault_info)
+    return vaultClient
+
+
+async def test_stale_yields_are_served_while_refreshing_until_too_stale() -> None:
+    vaultClient = _create_vault_client(apys=[0.05, 0.06, 0.07])
+    vaultYieldService = VaultYieldService(vaultClient=vaultClient, chainId=8453, refreshSeconds=300, maxStaleSeconds=1800)
+    with mock.patch('money_hack.vault_yield_service.time.time') as timeMock:
+        timeMock.return_value = 1000
+        assert await vaultYieldService.get_yield_apy() == 0.05
+        timeMock.return_value = 1200
+        assert await vaultYieldService.get_yield_apy() == 0.05
+        assert vaultClient.get_vault_info.await_count == 1
+        # NOTE: past the refresh interval the held yield is returned straight away and refreshed in the background
+        timeMock.return_value = 1400
+        assert await vaultYieldService.get_yield_apy() == 0.05
+        await asyncio.sleep(0)
+        assert vaultClient.get_vault_info.await_count == 2
+        assert await vaultYieldService.get_yield_apy() == 0.06
+        # NOTE: past maxStaleSeconds readers wait for a fresh yield
+        timeMock.return_value = 1400 + 1801
+        assert await vaultYieldService.get_yield_apy() == 0.07
+        assert vaultClient.get_vault_info.await_count == 3
+
+
+async def test_concurrent_reads_share_one_refresh() -> None:
+    releaseEvent = asyncio.Event()
+    vaultClient = _create_vault_client(apys=[0.05], releaseEvent=releaseEvent)
+    vaultYieldService = VaultYieldService(vaultClient=vaultClient, chainId=8453)
+    reads = [asyncio.create_task(vaultYieldService.get_yield_apy()) for _ in range(3)]
+    await asyncio.sleep(0)
+    releaseEvent.set()
+    assert await asyncio.gather(*reads) == [0.05] * 3
+    assert vaultClient.get_vault_info.await_count == 1
+
+
+async def test_only_refresh_and_record_writes_snapshots(databaseStore: DatabaseStore) -> None:
+    await create_tables(databaseStore=databaseStore, tables=[VaultYieldSnapshotsTable])
+    vaultYieldService = VaultYieldService(vaultClient=_create_vault_client(apys=[0.05, 0.06]), chainId=8453, databaseStore=databaseStore)
+    since = dt.datetime.now(tz=dt.UTC) - dt.timedelta(minutes=1)
+    async with databaseStore.database.create_context_connection():
+        await vaultYieldService.get_vault_yield()
+        assert await vaultYieldService.list_yield_snapshots(since=since) == []
+        vaultYield = await vaultYieldService.refresh_and_record()
+        snapshots = await vaultYieldService.list_yield_snapshots(since=since)
+    assert vaultYield is not None
+    assert [(snapshot.vaultAddress, snapshot.apy, snapshot.totalAssets) for snapshot in snapshots] == [(VAULT_ADDRESS, 0.06, 10**12)]
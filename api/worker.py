@@ -1,15 +1,27 @@
 import asyncio
 import os
+import socket
 
 from core import logging
 from core.util.value_holder import RequestIdHolder
 
+from money_hack.agent_manager import AgentManager
+from money_hack.blockchain_data.price_history_store import PRICE_HISTORY_PERSIST_INTERVAL_SECONDS
 from money_hack.create_agent_manager import create_agent_manager
+from money_hack.morpho.liquidation_price_index import LiquidationPriceIndex
+from money_hack.morpho.ltv_manager import LTV_CHECK_ROLLUP_INTERVAL_SECONDS
+from money_hack.position_lease_manager import PositionLeaseManager
+from money_hack.position_scheduler import FAILED_CHECK_RETRY_SECONDS
+from money_hack.position_scheduler import PositionScheduler
+from money_hack.user_operation_reconciler import RECONCILE_INTERVAL_SECONDS
+from money_hack.vault_yield_service import VAULT_YIELD_REFRESH_INTERVAL_SECONDS
 
 name = os.environ.get('NAME', 'money-hack-worker')
 version = os.environ.get('VERSION', 'local')
 environment = os.environ.get('ENV', 'dev')
 isRunningDebugMode = environment == 'dev'
+positionCheckConcurrency = int(os.environ.get('POSITION_CHECK_CONCURRENCY', '10'))
+workerId = os.environ.get('WORKER_ID', f'{socket.gethostname()}-{os.getpid()}')
 
 requestIdHolder = RequestIdHolder()
 if isRunningDebugMode:
@@ -19,20 +31,98 @@ else:
 logging.init_external_loggers(loggerNames=['httpx'])
 
 
+async def run_monitoring_loop(agentManager: AgentManager, leaseManager: PositionLeaseManager) -> None:
+    scheduler = PositionScheduler()
+    priceIndex = LiquidationPriceIndex()
+    while True:
+        sleepSeconds = FAILED_CHECK_RETRY_SECONDS
+        try:
+            # NOTE: not wrapped in a database context, the cycle opens short ones for its lease, snapshot and log writes and one per position check
+            sleepSeconds = await agentManager.check_due_positions(scheduler=scheduler, concurrency=positionCheckConcurrency, priceIndex=priceIndex, leaseManager=leaseManager)
+        except Exception:  # noqa: BLE001
+            logging.exception('Error in position monitoring loop')
+        await asyncio.sleep(sleepSeconds)
+
+
+async def acquire_task_lease(leaseManager: PositionLeaseManager, taskName: str, intervalSeconds: float) -> bool:
+    # NOTE: committed on its own so the lease row is never locked while the task runs
+    return await leaseManager.databaseStore.run_in_own_context_connection(lambda: leaseManager.acquire_task_lease(taskName=taskName, intervalSeconds=intervalSeconds))
+
+
+async def run_reconcile_loop(agentManager: AgentManager, leaseManager: PositionLeaseManager) -> None:
+    if agentManager.userOperationReconciler is None:
+        return
+    while True:
+        try:
+            if await acquire_task_lease(leaseManager=leaseManager, taskName='reconcile_user_operations', intervalSeconds=RECONCILE_INTERVAL_SECONDS):
+                async with agentManager.databaseStore.database.create_context_connection():
+                    await agentManager.userOperationReconciler.reconcile_once()
+        except Exception:  # noqa: BLE001
+            logging.exception('Error in user operation reconcile loop')
+        await asyncio.sleep(RECONCILE_INTERVAL_SECONDS)
+
+
+async def run_ltv_check_rollup_loop(agentManager: AgentManager, leaseManager: PositionLeaseManager) -> None:
+    if agentManager.ltvManager is None:
+        return
+    while True:
+        try:
+            if await acquire_task_lease(leaseManager=leaseManager, taskName='rollup_ltv_checks', intervalSeconds=LTV_CHECK_ROLLUP_INTERVAL_SECONDS):
+                async with agentManager.databaseStore.database.create_context_connection():
+                    await agentManager.ltvManager.rollup_ltv_checks()
+        except Exception:  # noqa: BLE001
+            logging.exception('Error in LTV check rollup loop')
+        await asyncio.sleep(LTV_CHECK_ROLLUP_INTERVAL_SECONDS)
+
+
+async def run_price_history_persist_loop(agentManager: AgentManager, leaseManager: PositionLeaseManager) -> None:
+    while True:
+        await asyncio.sleep(PRICE_HISTORY_PERSIST_INTERVAL_SECONDS)
+        try:
+            if await acquire_task_lease(leaseManager=leaseManager, taskName='persist_price_history', intervalSeconds=PRICE_HISTORY_PERSIST_INTERVAL_SECONDS):
+                await agentManager.persist_price_history()
+        except Exception:  # noqa: BLE001
+            logging.exception('Error in price history persist loop')
+
+
+async def run_vault_yield_refresh_loop(agentManager: AgentManager, leaseManager: PositionLeaseManager) -> None:
+    while True:
+        try:
+            if await acquire_task_lease(leaseManager=leaseManager, taskName='record_vault_yield', intervalSeconds=VAULT_YIELD_REFRESH_INTERVAL_SECONDS):
+                async with agentManager.databaseStore.database.create_context_connection():
+                    await agentManager.vaultYieldService.refresh_and_record()
+        except Exception:  # noqa: BLE001
+            logging.exception('Error in vault yield refresh loop')
+        await asyncio.sleep(VAULT_YIELD_REFRESH_INTERVAL_SECONDS)
+
+
 async def main() -> None:
     agentManager = create_agent_manager()
-    await agentManager.databaseStore.database.connect(poolSize=2)
-    logging.info('Worker started, beginning AgentManager monitoring loop...')
-    LTV_CHECK_INTERVAL_SECONDS = 300
+    # NOTE: one extra connection for each of the monitoring, reconcile, rollup and vault yield loops
+    await agentManager.databaseStore.database.connect(poolSize=positionCheckConcurrency + 4)
+    logging.info(f'Worker {workerId} started, beginning AgentManager monitoring loop...')
+    leaseManager = PositionLeaseManager(databaseStore=agentManager.databaseStore, workerId=workerId)
+    await agentManager.load_price_history()
     try:
-        while True:
-            try:
-                async with agentManager.databaseStore.database.create_context_connection():
-                    await agentManager.check_positions_once()
-            except Exception:  # noqa: BLE001
-                logging.exception('Error in position monitoring loop')
-            await asyncio.sleep(LTV_CHECK_INTERVAL_SECONDS)
+        await asyncio.gather(
+            run_monitoring_loop(agentManager=agentManager, leaseManager=leaseManager),
+            # NOTE: these run on every worker but only the one holding each task's lease does the work
+            run_reconcile_loop(agentManager=agentManager, leaseManager=leaseManager),
+            run_ltv_check_rollup_loop(agentManager=agentManager, leaseManager=leaseManager),
+            run_price_history_persist_loop(agentManager=agentManager, leaseManager=leaseManager),
+            run_vault_yield_refresh_loop(agentManager=agentManager, leaseManager=leaseManager),
+        )
     finally:
+        try:
+            if await acquire_task_lease(leaseManager=leaseManager, taskName='persist_price_history', intervalSeconds=PRICE_HISTORY_PERSIST_INTERVAL_SECONDS):
+                await agentManager.persist_price_history()
+        except Exception:  # noqa: BLE001
+            logging.exception('Failed to persist price history')
+        try:
+            async with agentManager.databaseStore.database.create_context_connection():
+                await leaseManager.release_all()
+        except Exception:  # noqa: BLE001
+            logging.exception('Failed to release position and task leases')
         await agentManager.requester.close_connections()
         await agentManager.databaseStore.database.disconnect()
 